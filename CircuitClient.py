@@ -0,0 +1,134 @@
+'''Sends requests to a CircuitDaemon, from scripts or from the command line.
+
+Usage: python -m CircuitClient [--socket PATH] [--params JSON] [--output FILE] [--repeat N] METHOD [FILE]
+
+Without --socket, the client starts its own daemon that reads from the stdin of the client's pipe, which is fine for
+trying out the methods but pays the startup of the daemon every time. With --repeat, the request is sent N times at
+once (to test the concurrency of the daemon), and the latency counters of the daemon are printed afterwards.
+'''
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+
+class CircuitClient(object):
+    '''CircuitClient talks JSON-RPC with a CircuitDaemon over a Unix socket, or with a daemon that it starts itself'''
+
+    def __init__(self, socket_path=None):
+        '''Initializes the CircuitClient, and connects to the daemon
+
+        Parameters
+        ----------
+        socket_path = None : string
+            The Unix socket of a running daemon. If None, a daemon is started that talks through stdin and stdout.
+        '''
+        self.socket = None
+        self.process = None
+        if socket_path:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(socket_path)
+            self.reader = self.socket.makefile('rb')
+            self.writer = self.socket.makefile('wb')
+        else:
+            daemon = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CircuitDaemon.py')
+            self.process = subprocess.Popen([sys.executable, daemon], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            self.reader = self.process.stdout
+            self.writer = self.process.stdin
+        self.next_id = 0
+
+    def call_many(self, requests):
+        '''Sends several requests at once, and waits for all their responses
+
+        Parameters
+        ----------
+        requests : list of (method, params) tuples
+            The requests
+
+        Output
+        ------
+        List with the response of every request, in the order of the requests: the 'result' or the 'error' object
+        '''
+        ids = []
+        for method, params in requests:
+            ids.append(self.next_id)
+            request = {'jsonrpc': '2.0', 'id': self.next_id, 'method': method, 'params': params}
+            self.writer.write( (json.dumps(request) + '\n').encode('utf-8') )
+            self.next_id += 1
+        self.writer.flush()
+
+        #The daemon answers in the order in which the requests finish
+        responses = {}
+        while len(responses) < len(ids):
+            line = self.reader.readline()
+            if not line:
+                raise ConnectionError('The daemon closed the connection')
+            response = json.loads(line)
+            responses[response['id']] = response
+        return [responses[request_id] for request_id in ids]
+
+    def call(self, method, **params):
+        '''Sends one request, returns its result, raises a RuntimeError with the message of an error'''
+        response = self.call_many([ (method, params) ])[0]
+        if 'error' in response:
+            raise RuntimeError(f"{response['error']['message']} (code {response['error']['code']})")
+        return response['result']
+
+    def close(self):
+        '''Closes the connection, and stops the daemon if we started it'''
+        self.writer.close()
+        if self.socket is not None:
+            self.socket.close()
+        if self.process is not None:
+            self.process.wait()
+
+def main(argv=None):
+    '''Sends a request from the command line, see the module docstring.'''
+    argparser = argparse.ArgumentParser(prog='python -m CircuitClient', description='Sends a request to a CircuitDaemon.')
+    argparser.add_argument('method', help='parse, validate, layout, export_svg, run, stats or shutdown')
+    argparser.add_argument('file', nargs='?', default=None, help='.qc file of the request')
+    argparser.add_argument('--socket', default=None, help='Unix socket of a running daemon')
+    argparser.add_argument('--params', default='{}', help='other parameters as a JSON object, e.g. {"backend": "mps"}')
+    argparser.add_argument('--output', default=None, help='file to write the SVG of export_svg to')
+    argparser.add_argument('--repeat', type=int, default=1, help='amount of times that the request is sent at once')
+    args = argparser.parse_args(argv)
+
+    try:
+        params = json.loads(args.params)
+    except ValueError as e:
+        sys.stderr.write(f'Invalid --params: {e}\n')
+        return 1
+    if args.file:
+        #The daemon might run in another directory
+        params['file'] = os.path.abspath(args.file)
+
+    try:
+        client = CircuitClient(args.socket)
+    except OSError as e:
+        sys.stderr.write(f'Cannot connect to the daemon: {e}\n')
+        return 1
+    try:
+        responses = client.call_many([ (args.method, params) ] * max(1, args.repeat))
+        response = responses[-1]
+        if 'error' in response:
+            sys.stderr.write(f"{response['error']['message']}\n")
+            return 1
+        result = response['result']
+        if args.output and 'svg' in result:
+            with open(args.output, 'w') as file:
+                file.write(result['svg'])
+            result = {'output': args.output, 'bytes': len(result['svg'])}
+        sys.stdout.write(json.dumps(result, indent=2) + '\n')
+        if args.repeat > 1:
+            stats = client.call('stats')['methods'].get(args.method)
+            sys.stdout.write(json.dumps(stats, indent=2) + '\n')
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f'{e}\n')
+        return 1
+    finally:
+        client.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
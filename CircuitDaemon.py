@@ -0,0 +1,650 @@
+'''Serves the parser, the layout and the simulators from one long-running process, such that tools do not pay the
+startup of Python (and NumPy) for every circuit.
+
+Usage: python -m CircuitDaemon [--socket PATH] [--workers N] [--exe FILE]
+
+Requests are JSON-RPC 2.0, one JSON object per line, read from stdin (responses on stdout) or from every connection
+to a Unix socket. Every request runs in a pool of worker threads, so the responses can come back in another order than
+the requests: match them by their id. The methods, with a 'code' or a 'file' parameter for the circuit:
+
+    parse       the figures of the circuit and its diagnostics ('state': true also returns the parsed state)
+    validate    whether the circuit has diagnostics, and which
+    layout      the items that the circuit canvas would draw, for a 'width' and 'height' in pixels, with the
+                subroutines that start at the columns in 'expanded' drawn expanded (see the 'subroutines' of parse)
+    export_svg  the same drawing as an SVG document (written to 'output' if given)
+    run         the output of a 'backend' of the TextEditor, with 'seed' and the backend 'options'
+    stats       the amount and the latency of the requests per method, and the hits of the caches
+    shutdown    stops the daemon once the running requests are done
+
+The parsed circuits are kept per content hash, and the outputs of runs with a seed per code, backend and options.
+The layout is made by the CircuitRender itself, drawn on a canvas that records its items instead of Tk. As there is no
+Tk, the font metrics are those of the monospace fallback font of the CircuitRender, computed from its size.
+'''
+import argparse
+import collections
+import concurrent.futures
+import json
+import math
+import os
+import re
+import socketserver
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from xml.sax.saxutils import escape
+
+from CircuitRender2 import CircuitRender, CircuitModel
+from ParseCache import ParseCache
+from ResourceEstimator import ResourceEstimator
+
+class RpcError(Exception):
+    '''A request that cannot be handled, with its JSON-RPC error code'''
+
+    PARSE_ERROR = -32700
+    INVALID_REQUEST = -32600
+    METHOD_NOT_FOUND = -32601
+    INVALID_PARAMS = -32602
+    SERVER_ERROR = -32000
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+class MetricFont(object):
+    '''Stands in for a tkinter Font without Tk: the metrics of a monospace font, computed from its size'''
+
+    #Width of a character and height of a line, relative to the size of the font in pixels
+    CHAR_WIDTH = 0.6
+    LINE_SPACING = 1.2
+    #Tk font sizes are in points, the canvas is in pixels at 96 dots per inch
+    PIXELS_PER_POINT = 96 / 72
+
+    def __init__(self, family='Courier', size=14):
+        self.family = family
+        self.size = size
+        self.pixels = size * self.PIXELS_PER_POINT
+
+    def measure(self, text):
+        '''Returns the width of text in pixels'''
+        return int(round(len(text) * self.CHAR_WIDTH * self.pixels))
+
+    def metrics(self, option=None):
+        '''Returns the metrics of the font, or one of them, like tkinter.font.Font.metrics'''
+        linespace = int(round(self.LINE_SPACING * self.pixels))
+        metrics = {'ascent': int(round(0.8 * self.pixels)), 'descent': linespace - int(round(0.8 * self.pixels)), \
+                   'linespace': linespace, 'fixed': 1}
+        return metrics[option] if option else metrics
+
+    def __str__(self):
+        return f'{self.family} {self.size}'
+
+class RecordingCanvas(object):
+    '''Stands in for a tkinter Canvas without Tk: records the items that a CircuitRender draws, such that they can be
+    returned as a layout or written as SVG. Only the part of the Canvas that render() uses is there.'''
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        #The items in the order in which they were drawn: (type, coords, options)
+        self.items = []
+
+    def winfo_width(self):
+        return self.width
+
+    def winfo_height(self):
+        return self.height
+
+    def cget(self, option):
+        return {'width': self.width, 'height': self.height}[option]
+
+    def delete(self, *tags):
+        if 'all' in tags:
+            self.items = []
+
+    def create(self, kind, coords, options):
+        '''Records an item, returns its id: like Tk, the ids start at 1 in the order of creation'''
+        self.items.append( (kind, [float(coord) for coord in coords], options) )
+        return len(self.items)
+
+    def create_line(self, *coords, **options):
+        return self.create('line', coords, options)
+
+    def create_rectangle(self, *coords, **options):
+        return self.create('rectangle', coords, options)
+
+    def create_oval(self, *coords, **options):
+        return self.create('oval', coords, options)
+
+    def create_arc(self, *coords, **options):
+        return self.create('arc', coords, options)
+
+    def create_text(self, *coords, **options):
+        return self.create('text', coords, options)
+
+    def move(self, tag, dx, dy):
+        if tag == 'all':
+            self.items = [ (kind, [coord + (dy if idx % 2 else dx) for idx, coord in enumerate(coords)], options) \
+                           for kind, coords, options in self.items ]
+
+    def tag_bind(self, *args):
+        #Nothing can be clicked on
+        pass
+
+class Cache(object):
+    '''Thread-safe cache of at most max_entries values, the least recently used entries are removed first'''
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        '''Returns the value of key, or None'''
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        '''Stores the value of key'''
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        '''Returns the amount of entries, hits and misses'''
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+class CircuitDaemon(object):
+    '''CircuitDaemon handles the JSON-RPC requests, see the module docstring'''
+
+    #Standard maximum amount of parsed circuits and of run outputs that are kept
+    MAX_MODELS = 64
+    MAX_RESULTS = 256
+    #Amount of recent latencies per method that the percentiles are computed from
+    LATENCY_SAMPLES = 1000
+    #Size in pixels of a column and a row of the circuit, if the layout request does not give a width and height
+    CELL_SIZE = (60, 50)
+
+    #The backends of the run method (the TextEditor.SIMULATOR_BACKENDS), and the options that each one takes
+    BACKEND_OPTIONS = {'statevector': ('top', 'single'), 'stabilizer': (), 'mps': ('max_bond', 'cutoff', 'shots', 'top'), \
+                       'noisy': ('trajectories', 'target', 'confidence', 'jobs', 'batch', 'top'), 'exe': ('timeout',)}
+
+    def __init__(self, workers=None, exe_filename=None, max_models=None, max_results=None):
+        '''Initializes the CircuitDaemon
+
+        Parameters
+        ----------
+        workers = None : integer
+            The amount of requests that are handled at the same time, defaults to the amount of CPUs
+        exe_filename = None : string
+            The Simulator .exe of the 'exe' backend. Clients cannot choose it, as they could run any program otherwise.
+        max_models = None : integer
+            The maximum amount of parsed circuits that are kept, defaults to MAX_MODELS
+        max_results = None : integer
+            The maximum amount of run outputs that are kept, defaults to MAX_RESULTS
+        '''
+        self.workers = workers if workers else (os.cpu_count() or 2)
+        self.exe_filename = exe_filename
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+
+        self.models = Cache(max_models if max_models else self.MAX_MODELS)
+        self.results = Cache(max_results if max_results else self.MAX_RESULTS)
+        self.font = MetricFont(**CircuitRender.STD_FONTS[-1])
+
+        self.methods = {'parse': self.parse, 'validate': self.validate, 'layout': self.layout, \
+                        'export_svg': self.export_svg, 'run': self.run, 'stats': self.stats, 'shutdown': self.shutdown}
+
+        #Per method: the amount of requests, of errors, the total and maximum latency, and the recent latencies
+        self.counters = { method: {'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0, \
+                                   'recent': collections.deque(maxlen=self.LATENCY_SAMPLES)} for method in self.methods }
+        self.counters_lock = threading.Lock()
+        self.in_flight = 0
+        self.start_time = time.time()
+
+        self.stopped = threading.Event()
+        self.server = None
+
+    ######################## The methods
+
+    @staticmethod
+    def source(params):
+        '''Returns the code of the circuit, given as the 'code' or the 'file' in params'''
+        if isinstance(params.get('code'), str):
+            return params['code']
+        if isinstance(params.get('file'), str):
+            with open(params['file'], 'r') as file:
+                return file.read()
+        raise RpcError(RpcError.INVALID_PARAMS, "Expected the circuit as a 'code' or 'file' string")
+
+    def model(self, params):
+        '''Returns the parsed circuit of the 'code' or 'file' in params, from the cache if it was parsed before, and
+        whether it came from the cache. The model is shared, so it may not be changed.'''
+        code = self.source(params)
+        pack = bool(params.get('pack', False))
+        key = (ParseCache.content_hash(code), pack)
+        model = self.models.get(key)
+        if model is not None:
+            return model, True
+        model = CircuitModel()
+        model.pack_columns = pack
+        model.read(code)
+        self.models.put(key, model)
+        return model, False
+
+    def parse(self, params):
+        '''Returns the figures of the circuit: its qubits, the gates, the depth, the subroutines and the diagnostics'''
+        model, cached = self.model(params)
+        result = {'nr_qubits': model.nr_qubits, 'channel_names': model.channel_names, 'diagnostics': model.diagnostics, \
+                  'subroutines': model.subroutines, 'cached': cached}
+        if model.nr_qubits > 0:
+            profile = ResourceEstimator.profile(model)
+            result.update( {'gates': dict(profile['gates']), 'nr_gates': profile['nr_gates'], \
+                            'measurements': profile['measurements'], 'depth': profile['depth']} )
+        if params.get('state'):
+            result['state'] = model.get_state()
+        return result
+
+    def validate(self, params):
+        '''Returns whether the circuit is valid, and its diagnostics'''
+        model, cached = self.model(params)
+        diagnostics = list(model.diagnostics)
+        if model.nr_qubits <= 0 and not diagnostics:
+            diagnostics.append( {'line': 0, 'col': 0, 'end': 0, 'message': 'The circuit has no qubits'} )
+        return {'valid': not diagnostics, 'diagnostics': diagnostics, 'cached': cached}
+
+    def draw(self, params):
+        '''Draws the circuit on a RecordingCanvas, returns the canvas and the CircuitRender'''
+        model, cached = self.model(params)
+        if model.nr_qubits <= 0:
+            raise RpcError(RpcError.INVALID_PARAMS, 'The circuit has no qubits')
+        nr_rows = model.nr_qubits + sum(1 for grid_row in model.grid[model.nr_qubits:] if grid_row)
+        try:
+            width = int(params.get('width') or (model.max_col + 2) * self.CELL_SIZE[0])
+            height = int(params.get('height') or nr_rows * self.CELL_SIZE[1])
+        except (TypeError, ValueError):
+            raise RpcError(RpcError.INVALID_PARAMS, "Expected a number as 'width' and 'height'")
+
+        canvas = RecordingCanvas(width + CircuitRender.RENDER_MARGINS['w'], height + CircuitRender.RENDER_MARGINS['h'])
+        renderer = CircuitRender(canvas, model=model)
+        renderer.font = self.font
+        try:
+            renderer.expanded_subroutines = set(int(start) for start in params.get('expanded', []))
+        except (TypeError, ValueError):
+            raise RpcError(RpcError.INVALID_PARAMS, "Expected a list of start columns as 'expanded'")
+        try:
+            renderer.render()
+        finally:
+            #The shared GridElements remember how they are drawn on every canvas, forget this one
+            for grid_row in model.grid:
+                for ge in grid_row.values():
+                    ge.canvas_elems.pop(canvas, None)
+        return canvas, renderer
+
+    def layout(self, params):
+        '''Returns the items that the circuit canvas would draw: their type, coordinates and options'''
+        canvas, renderer = self.draw(params)
+        items = [ {'type': kind, 'coords': coords, 'options': {key: json_option(value) for key, value in options.items()}} \
+                  for kind, coords, options in canvas.items ]
+        return {'width': canvas.width, 'height': canvas.height, 'lod': renderer.lod, 'items': items}
+
+    def export_svg(self, params):
+        '''Returns the drawing of the circuit as an SVG document, or writes it to the 'output' file'''
+        canvas, renderer = self.draw(params)
+        document = svg(canvas)
+        if params.get('output'):
+            with open(params['output'], 'w') as file:
+                file.write(document)
+            return {'output': params['output'], 'bytes': len(document)}
+        return {'svg': document}
+
+    def run(self, params):
+        '''Returns the output of a simulator backend. Outputs of runs with a seed are cached.'''
+        backend = params.get('backend', 'statevector')
+        if backend not in self.BACKEND_OPTIONS:
+            raise RpcError(RpcError.INVALID_PARAMS, f"Unknown backend {backend}, expected one of " + \
+                                                    ', '.join(self.BACKEND_OPTIONS))
+        options = params.get('options', {})
+        if not isinstance(options, dict) or set(options) - set(self.BACKEND_OPTIONS[backend]):
+            raise RpcError(RpcError.INVALID_PARAMS, f"The options of {backend} are " + \
+                                                    (', '.join(self.BACKEND_OPTIONS[backend]) or 'none'))
+        code = self.source(params)
+        seed = params.get('seed')
+
+        #Without a seed the measurements differ per run, and the Simulator .exe might change on disk
+        key = None
+        if seed is not None and backend != 'exe':
+            key = (ParseCache.content_hash(code), backend, seed, json.dumps(options, sort_keys=True))
+            result = self.results.get(key)
+            if result is not None:
+                return dict(result, cached=True)
+
+        start = time.perf_counter()
+        if backend == 'exe':
+            result = self.run_exe(params, code, options)
+        else:
+            #NumPy is only needed for these backends, so they are imported as late as possible
+            if backend == 'statevector':
+                import StatevectorSimulator as simulator
+            elif backend == 'stabilizer':
+                import StabilizerSimulator as simulator
+            elif backend == 'mps':
+                import MPSSimulator as simulator
+            else:
+                import NoisySimulator as simulator
+            result = {'output': simulator.simulate(code, seed=seed, **options), 'exit_code': 0}
+        result['seconds'] = time.perf_counter() - start
+
+        if key is not None:
+            self.results.put(key, result)
+        return dict(result, cached=False)
+
+    def run_exe(self, params, code, options):
+        '''Runs the Simulator .exe on the circuit, returns its output and exit code'''
+        if not self.exe_filename:
+            raise RpcError(RpcError.INVALID_PARAMS, 'The daemon was started without a Simulator .exe, see --exe')
+        #The .exe only reads files, so code is written to a temporary one
+        temporary = isinstance(params.get('code'), str)
+        if temporary:
+            fd, filename = tempfile.mkstemp(suffix='.qc')
+            with os.fdopen(fd, 'w') as file:
+                file.write(code)
+        else:
+            filename = params['file']
+        try:
+            process = subprocess.run([self.exe_filename, filename], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, \
+                                     timeout=options.get('timeout'))
+        finally:
+            if temporary:
+                os.remove(filename)
+        return {'output': process.stdout.decode('utf-8', errors='replace'), 'exit_code': process.returncode}
+
+    def stats(self, params):
+        '''Returns the latency counters per method, in seconds, and the statistics of the caches'''
+        methods = {}
+        with self.counters_lock:
+            for method, counter in self.counters.items():
+                recent = sorted(counter['recent'])
+                methods[method] = {'count': counter['count'], 'errors': counter['errors'], \
+                                   'mean': counter['total'] / counter['count'] if counter['count'] else 0.0, \
+                                   'p50': recent[len(recent)//2] if recent else 0.0, \
+                                   'p95': recent[min(len(recent)*95//100, len(recent)-1)] if recent else 0.0, \
+                                   'max': counter['max']}
+            in_flight = self.in_flight
+        return {'uptime': time.time() - self.start_time, 'workers': self.workers, 'in_flight': in_flight, \
+                'methods': methods, 'models': self.models.stats(), 'results': self.results.stats()}
+
+    def shutdown(self, params):
+        '''Stops serving, the requests that are already running still get their response'''
+        self.stopped.set()
+        if self.server is not None:
+            #shutdown() waits for serve_forever() to return, so it cannot be called from a request of the server
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        return {'stopping': True}
+
+    ######################## The protocol
+
+    def handle(self, line):
+        '''Handles one request, returns the response as a line of JSON, or None for a notification (no id)
+
+        Parameters
+        ----------
+        line : string
+            The request, a JSON-RPC 2.0 object
+        '''
+        start = time.perf_counter()
+        request, method = None, None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                raise RpcError(RpcError.PARSE_ERROR, f'Invalid JSON: {e}')
+            if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+                raise RpcError(RpcError.INVALID_REQUEST, 'Expected an object with a method')
+            if request['method'] not in self.methods:
+                raise RpcError(RpcError.METHOD_NOT_FOUND, f"Unknown method {request['method']}, expected one of " + \
+                                                          ', '.join(self.methods))
+            method = request['method']
+            params = request.get('params', {})
+            if not isinstance(params, dict):
+                raise RpcError(RpcError.INVALID_PARAMS, 'Expected the params as an object')
+            response = {'result': self.methods[method](params)}
+        except RpcError as e:
+            response = {'error': {'code': e.code, 'message': str(e)}}
+        except Exception as e:
+            response = {'error': {'code': RpcError.SERVER_ERROR, 'message': f'{type(e).__name__}: {e}'}}
+
+        if method is not None:
+            elapsed = time.perf_counter() - start
+            with self.counters_lock:
+                counter = self.counters[method]
+                counter['count'] += 1
+                counter['errors'] += 'error' in response
+                counter['total'] += elapsed
+                counter['max'] = max(counter['max'], elapsed)
+                counter['recent'].append(elapsed)
+
+        if isinstance(request, dict) and 'id' not in request:
+            return None
+        response['jsonrpc'] = '2.0'
+        response['id'] = request.get('id') if isinstance(request, dict) else None
+        return json.dumps(response)
+
+    def submit(self, line, respond):
+        '''Handles a request in the worker pool, and passes the response line to respond(...). Returns the Future.'''
+        with self.counters_lock:
+            self.in_flight += 1
+
+        def work():
+            try:
+                response = self.handle(line)
+                if response is not None:
+                    respond(response)
+            except OSError:
+                #The client went away
+                pass
+            finally:
+                with self.counters_lock:
+                    self.in_flight -= 1
+        return self.pool.submit(work)
+
+    def serve_stdio(self, stdin, stdout):
+        '''Handles the requests from stdin until its end, or until a shutdown request
+
+        Parameters
+        ----------
+        stdin, stdout : text files
+            One request per line is read from stdin, one response per line is written to stdout
+        '''
+        lock = threading.Lock()
+        def respond(response):
+            with lock:
+                stdout.write(response + '\n')
+                stdout.flush()
+
+        futures = []
+        for line in iter(stdin.readline, ''):
+            if line.strip():
+                future = self.submit(line, respond)
+                futures.append(future)
+                #The shutdown runs in the worker pool, so wait for it here instead of blocking on the next line
+                if is_shutdown(line):
+                    future.result()
+            futures = [future for future in futures if not future.done()]
+            if self.stopped.is_set():
+                break
+        concurrent.futures.wait(futures)
+        self.close()
+
+    def serve_socket(self, path):
+        '''Handles the requests from every connection to a Unix socket, until a shutdown request
+
+        Parameters
+        ----------
+        path : string
+            The path of the socket, which only the current user can connect to
+        '''
+        if not hasattr(socketserver, 'ThreadingUnixStreamServer'):
+            raise OSError('Unix sockets are not available on this platform, use stdin and stdout instead')
+        #Replace the socket of a previous daemon, but never another kind of file
+        if os.path.exists(path):
+            if not stat.S_ISSOCK(os.stat(path).st_mode):
+                raise OSError(f'{path} exists and is not a socket')
+            os.remove(path)
+
+        daemon = self
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                lock = threading.Lock()
+                def respond(response):
+                    with lock:
+                        self.wfile.write( (response + '\n').encode('utf-8') )
+                        self.wfile.flush()
+                futures = []
+                for line in self.rfile:
+                    if line.strip():
+                        futures.append(daemon.submit(line.decode('utf-8', errors='replace'), respond))
+                #The connection closes as soon as this returns
+                concurrent.futures.wait(futures)
+
+        old_umask = os.umask(0o177)
+        try:
+            self.server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        finally:
+            os.umask(old_umask)
+        self.server.daemon_threads = True
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            self.server = None
+            os.remove(path)
+            self.close()
+
+    def close(self):
+        '''Stops the worker pool, after the running requests'''
+        self.pool.shutdown(wait=True)
+
+def is_shutdown(line):
+    '''Returns True if a request line is a shutdown request'''
+    #Most requests do not even contain the word, and they can be large
+    if 'shutdown' not in line:
+        return False
+    try:
+        request = json.loads(line)
+    except ValueError:
+        return False
+    return isinstance(request, dict) and request.get('method') == 'shutdown'
+
+def json_option(value):
+    '''Returns an option of a canvas item as JSON: fonts as text, tuples as lists'''
+    if isinstance(value, MetricFont):
+        return str(value)
+    if isinstance(value, tuple):
+        return list(value)
+    return value
+
+#The greys of Tk, such as 'gray30', which SVG does not know
+TK_GREY = re.compile(r'gr[ae]y(\d{1,3})')
+
+def svg_colour(colour):
+    '''Returns a Tk colour as an SVG colour, 'none' for an empty colour'''
+    if not colour:
+        return 'none'
+    match = TK_GREY.fullmatch(colour.lower())
+    if match:
+        level = round(int(match.group(1)) * 2.55)
+        return f'rgb({level},{level},{level})'
+    return colour.lower()
+
+def svg(canvas):
+    '''Returns the items of a RecordingCanvas as an SVG document, with the defaults of the Tk canvas items'''
+    def number(value):
+        return f'{value:g}'
+
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{canvas.width}" height="{canvas.height}" ' + \
+             f'viewBox="0 0 {canvas.width} {canvas.height}">',
+             '<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="5" markerHeight="5" ' + \
+             'orient="auto-start-reverse"><path d="M0,0 L10,5 L0,10 z"/></marker></defs>',
+             '<rect width="100%" height="100%" fill="white"/>']
+    for kind, coords, options in canvas.items:
+        width = options.get('width', 1)
+        if kind == 'text':
+            font = options.get('font')
+            font = font if isinstance(font, MetricFont) else MetricFont()
+            parts.append(f'<text x="{number(coords[0])}" y="{number(coords[1])}" text-anchor="middle" ' + \
+                         f'dominant-baseline="central" font-family="{escape(font.family)}" ' + \
+                         f'font-size="{number(font.pixels)}" fill="{svg_colour(options.get("fill", "black"))}">' + \
+                         f'{escape(options.get("text", ""))}</text>')
+            continue
+
+        stroke = f'stroke="{svg_colour(options.get("fill" if kind == "line" else "outline", "black"))}" ' + \
+                 f'stroke-width="{number(width)}"' if width else 'stroke="none"'
+        if kind == 'line':
+            points = ' '.join(f'{number(x)},{number(y)}' for x, y in zip(coords[::2], coords[1::2]))
+            extra = ''
+            if options.get('dash'):
+                extra += f''' stroke-dasharray="{' '.join(str(dash) for dash in options['dash'])}"'''
+            if options.get('arrow') in ('first', 'both'):
+                extra += ' marker-start="url(#arrow)"'
+            if options.get('arrow') in ('last', 'both'):
+                extra += ' marker-end="url(#arrow)"'
+            parts.append(f'<polyline points="{points}" fill="none" {stroke}{extra}/>')
+            continue
+
+        x1, y1, x2, y2 = coords[:4]
+        fill = svg_colour(options.get('fill', ''))
+        if kind == 'rectangle':
+            parts.append(f'<rect x="{number(x1)}" y="{number(y1)}" width="{number(x2-x1)}" height="{number(y2-y1)}" ' + \
+                         f'fill="{fill}" {stroke}/>')
+        elif kind == 'oval':
+            parts.append(f'<ellipse cx="{number((x1+x2)/2)}" cy="{number((y1+y2)/2)}" rx="{number((x2-x1)/2)}" ' + \
+                         f'ry="{number((y2-y1)/2)}" fill="{fill}" {stroke}/>')
+        elif kind == 'arc':
+            #Tk measures the angles counterclockwise from 3 o'clock, with the y axis pointing down
+            cx, cy, rx, ry = (x1+x2)/2, (y1+y2)/2, (x2-x1)/2, (y2-y1)/2
+            start, extent = float(options.get('start', 0)), float(options.get('extent', 90))
+            def point(angle):
+                radians = math.radians(angle)
+                return f'{number(cx + rx*math.cos(radians))},{number(cy - ry*math.sin(radians))}'
+            parts.append(f'<path d="M{point(start)} A{number(rx)},{number(ry)} 0 {int(abs(extent) > 180)},' + \
+                         f'{int(extent < 0)} {point(start+extent)}" fill="none" {stroke}/>')
+    parts.append('</svg>')
+    return '\n'.join(parts) + '\n'
+
+def main(argv=None):
+    '''Starts the daemon from the command line, see the module docstring.'''
+    argparser = argparse.ArgumentParser(prog='python -m CircuitDaemon', \
+                                        description='Serves parse, validate, layout, export_svg and run requests ' + \
+                                                    'as JSON-RPC, from stdin/stdout or a Unix socket.')
+    argparser.add_argument('--socket', default=None, help='path of the Unix socket, stdin and stdout if not given')
+    argparser.add_argument('--workers', type=int, default=None, help='amount of requests that are handled at once')
+    argparser.add_argument('--exe', default=None, help='the Simulator .exe of the exe backend')
+    args = argparser.parse_args(argv)
+
+    daemon = CircuitDaemon(workers=args.workers, exe_filename=args.exe)
+    try:
+        if args.socket:
+            daemon.serve_socket(args.socket)
+        else:
+            daemon.serve_stdio(sys.stdin, sys.stdout)
+    except OSError as e:
+        sys.stderr.write(f'{e}\n')
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
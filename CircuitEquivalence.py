@@ -0,0 +1,227 @@
+'''Checks whether two circuits are equivalent, i.e. whether they apply the same unitary up to a global phase.
+
+Usage: python -m CircuitEquivalence FILE1 FILE2 [--method {auto,clifford,unitary,states}] [--states K] [--seed SEED]
+
+Three methods, 'auto' picks the first one that applies:
+    - clifford: if both circuits only use Clifford gates, their stabilizer tableaux after starting from the identity
+      are compared. The tableau lists the image of every X and Z, with its sign, so it identifies a Clifford unitary up
+      to a global phase. This works for thousands of qubits.
+    - unitary: for at most MAX_UNITARY_QUBITS qubits, the full unitaries are built (the circuit is applied to all
+      basis states at once) and compared.
+    - states: for more qubits, both circuits are applied to the same batch of random states, and the overlaps of the
+      results must all have modulus 1 and the same phase. Two different unitaries agree on a random state with
+      probability 0, so a few states are plenty.
+
+Measurements are only allowed as the last statement on their qubit, and the measured qubits have to be the same in
+both circuits. Only the measure statements themselves are dropped: the measured qubits are still compared as quantum
+states, so a gate that cannot change a measurement outcome (such as a z right before a measure) still makes the
+circuits differ. prepz and classically controlled gates are not unitary, circuits with them are rejected.
+
+The exit code is 0 if the circuits are equivalent, 1 if they are not, and 2 if they cannot be compared.
+'''
+import argparse
+import cmath
+import math
+import sys
+
+import numpy as np
+
+from CircuitRender2 import CircuitModel
+from NoisySimulator import BatchSimulator, NoiseModel
+from StabilizerSimulator import StabilizerSimulator
+from StatevectorSimulator import StatevectorSimulator
+
+class CircuitEquivalence(object):
+    '''CircuitEquivalence compares the unitaries of two parsed circuits'''
+
+    #Above this amount of qubits, the unitaries are compared on random states
+    MAX_UNITARY_QUBITS = 10
+    #Standard amount of random states
+    STATES = 8
+    #Maximum amount of amplitudes of all the random states together (256 MB)
+    MAX_AMPLITUDES = 2**24
+    #Largest deviation of an amplitude that is still considered equal
+    TOLERANCE = 1e-8
+
+    METHODS = ('auto', 'clifford', 'unitary', 'states')
+
+    def __init__(self, model1, model2):
+        '''Initializes the CircuitEquivalence
+
+        Parameters
+        ----------
+        model1, model2 : CircuitModel
+            The parsed circuits, which have to be free of diagnostics
+        '''
+        for idx, model in enumerate((model1, model2)):
+            if model.diagnostics:
+                raise ValueError(f'CircuitEquivalence cannot compare circuit {idx+1}, it has problems: ' + \
+                                 '; '.join(f"line {d['line']}: {d['message']}" for d in model.diagnostics))
+        if model1.nr_qubits != model2.nr_qubits:
+            raise ValueError(f'CircuitEquivalence cannot compare {model1.nr_qubits} qubits with {model2.nr_qubits} qubits')
+        self.nr_qubits = model1.nr_qubits
+
+        self.operations1, measured1 = self.unitary_operations(model1)
+        self.operations2, measured2 = self.unitary_operations(model2)
+        if measured1 != measured2:
+            raise ValueError('CircuitEquivalence needs the same measured qubits in both circuits, not ' + \
+                             f'{sorted(measured1)} and {sorted(measured2)}')
+
+    def unitary_operations(self, model):
+        '''Returns the operations of a circuit without its final measurements, and the measured qubits'''
+        n = model.nr_qubits
+        operations = []
+        measured = set()
+        for gate, rows, angle in model.operations():
+            if gate == 'measure':
+                measured.add(rows[0])
+                continue
+            if gate == 'prepz' or any(row >= n for row in rows):
+                raise ValueError(f'CircuitEquivalence only compares unitary circuits, {gate} is not unitary')
+            if measured.intersection(rows):
+                raise ValueError(f'CircuitEquivalence only allows measurements at the end, {gate} comes after one')
+            operations.append( (gate, rows, angle) )
+        return operations, measured
+
+    def is_clifford(self):
+        '''Returns whether both circuits only use Clifford gates'''
+        return not StabilizerSimulator.non_clifford(self.operations1) and \
+               not StabilizerSimulator.non_clifford(self.operations2)
+
+    def check(self, method='auto', states=None, seed=None):
+        '''Compares the circuits
+
+        Parameters
+        ----------
+        method = 'auto' : string
+            One of METHODS, see the module docstring
+        states = None : integer
+            The amount of random states of the 'states' method, defaults to STATES
+        seed = None : integer
+            Seed of the random states
+
+        Output
+        ------
+        Dictionary with whether they are 'equivalent', the 'method' that was used, the global 'phase' (a complex
+        number of modulus 1, None if unknown) and the largest 'deviation' of an amplitude
+        '''
+        if method not in self.METHODS:
+            raise ValueError(f'CircuitEquivalence does not know the method {method}')
+        if method == 'auto':
+            if self.is_clifford():
+                method = 'clifford'
+            elif self.nr_qubits <= self.MAX_UNITARY_QUBITS:
+                method = 'unitary'
+            else:
+                method = 'states'
+
+        if method == 'clifford':
+            return self.clifford()
+        if self.nr_qubits > StatevectorSimulator.MAX_QUBITS:
+            raise ValueError(f'CircuitEquivalence needs Clifford-only circuits above {StatevectorSimulator.MAX_QUBITS} qubits')
+        if method == 'unitary':
+            if self.nr_qubits > self.MAX_UNITARY_QUBITS:
+                raise ValueError(f'CircuitEquivalence builds unitaries of at most {self.MAX_UNITARY_QUBITS} qubits')
+            batch = 2**self.nr_qubits
+            initial = np.eye(batch, dtype=np.complex128)
+        else:
+            batch = states if states else self.STATES
+            batch = max(1, min(batch, self.MAX_AMPLITUDES // 2**self.nr_qubits))
+            rng = np.random.default_rng(seed)
+            initial = rng.normal(size=(2**self.nr_qubits, batch)) + 1j*rng.normal(size=(2**self.nr_qubits, batch))
+            initial /= np.linalg.norm(initial, axis=0)
+
+        result1 = self.apply(self.operations1, initial)
+        result2 = self.apply(self.operations2, initial)
+        return self.compare(result1, result2, method)
+
+    def apply(self, operations, initial):
+        '''Returns the states (columns) that the operations make of the initial states (columns)'''
+        simulator = BatchSimulator(self.nr_qubits, initial.shape[1])
+        simulator.state[...] = initial.reshape(-1)
+        simulator.run(operations, NoiseModel())
+        return simulator.state.reshape(initial.shape)
+
+    def compare(self, result1, result2, method):
+        '''Compares the states of both circuits, see check(...)'''
+        overlap = np.vdot(result1, result2)
+        if abs(overlap) == 0:
+            return {'equivalent': False, 'method': method, 'phase': None, 'deviation': float(np.max(np.abs(result2)))}
+        phase = overlap / abs(overlap)
+        deviation = float(np.max(np.abs(result2 - phase*result1)))
+        return {'equivalent': deviation <= self.TOLERANCE, 'method': method, 'phase': complex(phase), \
+                'deviation': deviation}
+
+    def clifford(self):
+        '''Compares the stabilizer tableaux of both circuits, see check(...)'''
+        tableaux = []
+        for operations in (self.operations1, self.operations2):
+            simulator = StabilizerSimulator(self.nr_qubits)
+            simulator.run(operations)
+            tableaux.append(simulator)
+        first, second = tableaux
+        differences = (first.x != second.x).any(axis=1) | (first.z != second.z).any(axis=1) | (first.r != second.r)
+        #The images of X_i and Z_i that differ
+        return {'equivalent': not differences.any(), 'method': 'clifford', 'phase': None, \
+                'deviation': int(np.count_nonzero(differences))}
+
+def report(result):
+    '''Returns the result of CircuitEquivalence.check(...) as text'''
+    method = {'clifford': 'stabilizer tableaux', 'unitary': 'full unitaries', 'states': 'random states'}[result['method']]
+    lines = [('Equivalent' if result['equivalent'] else 'NOT equivalent') + f' (compared the {method})']
+    if result['method'] == 'clifford':
+        if not result['equivalent']:
+            lines.append(f"{result['deviation']} image(s) of the Paulis X and Z differ")
+    else:
+        if result['equivalent'] and result['phase'] is not None:
+            lines.append(f"Global phase: {cmath.phase(result['phase'])/math.pi:+.6f} pi")
+        lines.append(f"Largest deviation of an amplitude: {result['deviation']:.3e}")
+    return '\n'.join(lines) + '\n'
+
+def compare(data1, data2, method='auto', states=None, seed=None):
+    '''Parses and compares the code of two circuits
+
+    Parameters
+    ----------
+    data1, data2 : string
+        The code of the circuits
+    method, states, seed : see CircuitEquivalence.check(...)
+
+    Output
+    ------
+    Tuple (result of CircuitEquivalence.check(...), report as text)
+    '''
+    models = []
+    for data in (data1, data2):
+        model = CircuitModel()
+        model.read(data)
+        models.append(model)
+    result = CircuitEquivalence(*models).check(method=method, states=states, seed=seed)
+    return result, report(result)
+
+def compare_files(filename1, filename2, **kwargs):
+    '''Compares the circuits in two .qc files, see compare(...)'''
+    with open(filename1, 'r') as file1, open(filename2, 'r') as file2:
+        return compare(file1.read(), file2.read(), **kwargs)
+
+def main(argv=None):
+    '''Compares two files from the command line, see the module docstring.'''
+    argparser = argparse.ArgumentParser(prog='python -m CircuitEquivalence', \
+                                        description='Checks whether two .qc files apply the same unitary.')
+    argparser.add_argument('file1', help='first .qc file')
+    argparser.add_argument('file2', help='second .qc file')
+    argparser.add_argument('--method', choices=CircuitEquivalence.METHODS, default='auto', help='how to compare')
+    argparser.add_argument('--states', type=int, default=None, help=f'amount of random states ({CircuitEquivalence.STATES})')
+    argparser.add_argument('--seed', type=int, default=None, help='seed of the random states')
+    args = argparser.parse_args(argv)
+
+    try:
+        result, text = compare_files(args.file1, args.file2, method=args.method, states=args.states, seed=args.seed)
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f'{e}\n')
+        return 2
+    sys.stdout.write(text)
+    return 0 if result['equivalent'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+'''Validates every .qc file under one or more directories with the grammar of the CircuitRender, without a GUI.
+
+Usage: python -m CircuitLinter [-j JOBS] [--index FILE] [--no-index] PATH [PATH ...]
+
+Every diagnostic is printed as one JSON line. Files that did not change since the previous run (same mtime and
+size, or same content hash) are not parsed again: their diagnostics come from an index that is stored on disk.
+The exit code is 1 if any file has a diagnostic, which makes this usable as a pre-commit check.
+'''
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import sys
+
+from CircuitRender2 import CircuitModel
+
+#Version of the index format. The index is also thrown away if the parser itself changes.
+INDEX_VERSION = 1
+#Standard file name of the index, stored in the current working directory
+INDEX_FILE_NAME = '.qclint_index.json'
+#Extension of the files that we validate
+EXTENSION = '.qc'
+#Amount of files that a worker handles at once
+CHUNK_SIZE = 32
+
+def parser_version():
+    '''Returns a hash of the parser source code, such that the index is invalidated whenever the grammar changes'''
+    import CircuitRender2
+    with open(CircuitRender2.__file__, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+def find_files(paths):
+    '''Finds all the .qc files in paths, which can be directories or files
+
+    Parameters
+    ----------
+    paths : list of strings
+        The directories (searched recursively) and files to validate
+
+    Output
+    ------
+    Sorted list of normalized file paths
+    '''
+    files = set()
+    for path in paths:
+        if os.path.isfile(path):
+            files.add(os.path.normpath(path))
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            #Skip hidden directories such as .git
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for filename in filenames:
+                if filename.endswith(EXTENSION):
+                    files.add(os.path.normpath(os.path.join(dirpath, filename)))
+    return sorted(files)
+
+def lint_file(path, known_hash=None):
+    '''Parses one file. Runs inside a worker process.
+
+    Parameters
+    ----------
+    path : string
+        The path to the file
+    known_hash = None : string
+        The content hash stored in the index. If the content still has this hash, the file is not parsed.
+
+    Output
+    ------
+    Tuple (path, content hash, diagnostics), where diagnostics is None if the file was not parsed
+    '''
+    try:
+        with open(path, 'rb') as file:
+            content = file.read()
+    except OSError as e:
+        return path, None, [{'line': 0, 'col': 0, 'end': 0, 'message': f'Cannot read file: {e}'}]
+
+    content_hash = hashlib.sha1(content).hexdigest()
+    if content_hash == known_hash:
+        return path, content_hash, None
+
+    model = CircuitModel()
+    try:
+        model.read(content.decode('utf-8', errors='replace'))
+    except Exception as e:
+        return path, content_hash, [{'line': 0, 'col': 0, 'end': 0, 'message': f'Parser crashed: {e}'}]
+    return path, content_hash, model.diagnostics
+
+def load_index(filename):
+    '''Loads the index of previous results, or returns an empty index if it is missing, corrupt or outdated
+
+    Parameters
+    ----------
+    filename : string
+        The path to the index
+    '''
+    try:
+        with open(filename, 'r') as file:
+            index = json.load(file)
+        if index.get('version') == INDEX_VERSION and index.get('parser') == parser_version():
+            return index['files']
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+    return {}
+
+def write_index(filename, files):
+    '''Writes the index to disk, through a temporary file such that an interrupted write never corrupts it
+
+    Parameters
+    ----------
+    filename : string
+        The path to the index
+    files : dictionary
+        Per file path: the 'mtime', 'size', 'hash' and 'diagnostics'
+    '''
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as file:
+        json.dump({'version': INDEX_VERSION, 'parser': parser_version(), 'files': files}, file)
+    os.replace(tmp_filename, filename)
+
+def lint(paths, index_filename=None, jobs=None):
+    '''Validates all the .qc files in paths
+
+    Parameters
+    ----------
+    paths : list of strings
+        The directories and files to validate
+    index_filename = None : string
+        The path to the index of previous results. If None, every file is parsed.
+    jobs = None : integer
+        The amount of worker processes, defaults to the amount of CPUs
+
+    Output
+    ------
+    Dictionary with the diagnostics per file path, and the amount of files that were actually parsed
+    '''
+    index = load_index(index_filename) if index_filename else {}
+    new_index = {}
+
+    #Only the files whose mtime or size changed have to be read
+    todo = {}
+    for path in find_files(paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entry = index.get(path)
+        if entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+            new_index[path] = entry
+        else:
+            todo[path] = (stat, entry['hash'] if entry else None)
+
+    parsed = 0
+    if todo:
+        paths_todo = list(todo.keys())
+        known_hashes = [todo[path][1] for path in paths_todo]
+        #Starting processes is only worth it for more than a handful of files
+        if len(paths_todo) > CHUNK_SIZE and jobs != 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+                results = list(executor.map(lint_file, paths_todo, known_hashes, chunksize=CHUNK_SIZE))
+        else:
+            results = [lint_file(path, known_hash) for path, known_hash in zip(paths_todo, known_hashes)]
+
+        for path, content_hash, diagnostics in results:
+            stat = todo[path][0]
+            #The content did not change, only the mtime did
+            if diagnostics is None:
+                diagnostics = index[path]['diagnostics']
+            else:
+                parsed += 1
+            new_index[path] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'hash': content_hash, \
+                               'diagnostics': diagnostics}
+
+    if index_filename:
+        write_index(index_filename, new_index)
+
+    return {path: entry['diagnostics'] for path, entry in new_index.items()}, parsed
+
+def main(argv=None):
+    '''Runs the linter from the command line, see the module docstring.'''
+    argparser = argparse.ArgumentParser(prog='python -m CircuitLinter', \
+                                        description='Validates .qc files and prints the diagnostics as JSON lines.')
+    argparser.add_argument('paths', nargs='+', help='directories (searched recursively) or .qc files')
+    argparser.add_argument('-j', '--jobs', type=int, default=None, help='amount of worker processes')
+    argparser.add_argument('--index', default=INDEX_FILE_NAME, help=f'index of previous results (default {INDEX_FILE_NAME})')
+    argparser.add_argument('--no-index', action='store_true', help='parse every file, and do not store an index')
+    args = argparser.parse_args(argv)
+
+    results, parsed = lint(args.paths, index_filename=None if args.no_index else args.index, jobs=args.jobs)
+
+    nr_problems = 0
+    for path in sorted(results.keys()):
+        for diagnostic in results[path]:
+            nr_problems += 1
+            sys.stdout.write(json.dumps(dict(file=path, **diagnostic)) + '\n')
+
+    sys.stderr.write(f'{len(results)} file(s) checked, {parsed} parsed, {nr_problems} problem(s)\n')
+    return 1 if nr_problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import bisect
+import tkinter as tk
+
+class CircuitMinimap(object):
+    '''CircuitMinimap: a strip under the circuit canvas that shows the density of the whole circuit, and the part of
+    it that is visible. Clicking or dragging in the strip moves the visible part there.
+
+    The columns of the circuit are divided into at most MAX_BUCKETS buckets. Every bucket is drawn as a stacked bar of
+    its single-qubit gates, multi-qubit gates and measurements, so the strip never has more than a few hundred items.
+    '''
+
+    #The height of the strip in pixels
+    HEIGHT = 40
+    #The maximum amount of buckets
+    MAX_BUCKETS = 200
+    #The colours of the parts of a bar, from the bottom up, and of the viewport rectangle
+    COLOURS = {'multi':'SteelBlue', 'single':'gray60', 'measure':'DarkOrange3'}
+    VIEWPORT_COLOUR = 'red'
+    #The gap in pixels between the bars and the edges of the strip
+    MARGIN = 2
+
+    def __init__(self, master, circuit_builder):
+        '''Initializes the CircuitMinimap.
+
+        Parameters
+        ----------
+        master : tkinter widget
+            The widget that contains the strip, the caller places the strip through self.canvas
+        circuit_builder : CircuitRender
+            The CircuitRender of the circuit canvas, whose model and viewport are shown
+        '''
+        self.circuit_builder = circuit_builder
+
+        self.canvas = tk.Canvas(master, height=self.HEIGHT, background='white', highlightthickness=0)
+
+        #Keep track of the counts per circuit column: [gates, multi-qubit gates, measurements]
+        self.column_counts = []
+        #Keep track of the counts per bucket, and of the canvas items of every bucket (one per part of its bar)
+        self.bucket_counts = []
+        self.bucket_items = []
+        #Keep track of the count that fills the whole height of the strip
+        self.scale = 0
+        #Keep track of the width of the strip that the bars were drawn for
+        self.drawn_width = 0
+
+        self.viewport_item = None
+
+        #Set up the event handling
+        self.setup_event_handling()
+
+    def setup_event_handling(self):
+        '''Sets up all the event handling that this CircuitMinimap does.'''
+        self.canvas.bind('<Configure>', lambda e: self.update(redraw=True))
+        self.canvas.bind('<ButtonPress-1>', self.navigate)
+        self.canvas.bind('<B1-Motion>', self.navigate)
+        self.circuit_builder.on_view = self.update_viewport
+
+    @staticmethod
+    def count_columns(model):
+        '''Counts the gates in every column of a parsed circuit, in one single pass over its GridElements.
+
+        Parameters
+        ----------
+        model : CircuitModel
+            The parsed circuit
+
+        Output
+        ------
+        List with [gates, multi-qubit gates, measurements] per column. A gate is counted once, at its topmost
+        participant, and a measurement once per measured qubit.
+        '''
+        counts = [ [0, 0, 0] for _ in range(max(model.max_col, 0)) ]
+        for grid_row in model.grid[:model.nr_qubits]:
+            for col, ge in grid_row.items():
+                if ge.row != min(ge.participant_rows) or col >= len(counts):
+                    continue
+                column = counts[col]
+                column[0] += 1
+                if ge.gate == 'measure':
+                    column[2] += 1
+                elif len(ge.participant_rows) > 1:
+                    column[1] += 1
+        return counts
+
+    @staticmethod
+    def bucket_bounds(nr_cols, nr_buckets):
+        '''Returns the first column of every bucket, and the end of the last bucket'''
+        return [ bucket*nr_cols // nr_buckets for bucket in range(nr_buckets+1) ]
+
+    @staticmethod
+    def changed_columns(old_counts, new_counts):
+        '''Returns the range of columns between the first and the last column whose counts differ, as (start, end)'''
+        start = 0
+        while start < len(new_counts) and new_counts[start] == old_counts[start]:
+            start += 1
+        end = len(new_counts)
+        while end > start and new_counts[end-1] == old_counts[end-1]:
+            end -= 1
+        return start, end
+
+    def sum_bucket(self, bounds, bucket):
+        '''Returns the summed [gates, multi-qubit gates, measurements] of the columns of a bucket'''
+        columns = self.column_counts[bounds[bucket]:bounds[bucket+1]]
+        return [ sum(counts) for counts in zip(*columns) ] if columns else [0, 0, 0]
+
+    def update(self, redraw=False):
+        '''Updates the strip to the current model. The counts per column are kept, such that only the buckets that
+        contain a changed column are summed again and only their bars are moved. When the amount of columns changes,
+        the columns shift between the buckets and all buckets are summed again. When the scale or the width of the
+        strip changes, all bars are moved, and bars are only created or deleted when the amount of buckets changes.
+
+        Parameters
+        ----------
+        redraw = False : Boolean
+            Sums all the buckets and recreates all the bars, such as after a resize
+        '''
+        model = self.circuit_builder.model
+        column_counts = self.count_columns(model) if model.nr_qubits > 0 else []
+        nr_cols = len(column_counts)
+        nr_buckets = min(nr_cols, self.MAX_BUCKETS)
+        bounds = self.bucket_bounds(nr_cols, nr_buckets)
+
+        if redraw or nr_cols != len(self.column_counts) or nr_buckets != len(self.bucket_counts):
+            self.column_counts = column_counts
+            bucket_counts = [ self.sum_bucket(bounds, bucket) for bucket in range(nr_buckets) ]
+        else:
+            #The bounds of the buckets stay the same, only sum the buckets from the first to the last changed column
+            start, end = self.changed_columns(self.column_counts, column_counts)
+            self.column_counts = column_counts
+            bucket_counts = list(self.bucket_counts)
+            if start < end:
+                for bucket in range(bisect.bisect_right(bounds, start) - 1, bisect.bisect_right(bounds, end-1)):
+                    bucket_counts[bucket] = self.sum_bucket(bounds, bucket)
+
+        if redraw:
+            self.canvas.delete('all')
+            self.viewport_item = None
+            self.bucket_items = []
+        #Only create or delete the bars of the buckets that were added or removed
+        while len(self.bucket_items) > len(bucket_counts):
+            for item in self.bucket_items.pop():
+                self.canvas.delete(item)
+        while len(self.bucket_items) < len(bucket_counts):
+            self.bucket_items.append([ self.canvas.create_rectangle(0, 0, 0, 0, fill=self.COLOURS[part], width=0) \
+                                       for part in ('multi', 'single', 'measure') ])
+        if self.viewport_item is not None:
+            self.canvas.tag_raise(self.viewport_item)
+
+        width = int(self.canvas.winfo_width())
+        scale = max( (counts[0] for counts in bucket_counts), default=0 )
+        if redraw or len(bucket_counts) != len(self.bucket_counts) or scale != self.scale or width != self.drawn_width:
+            changed = range(len(bucket_counts))
+        else:
+            changed = [ bucket for bucket, counts in enumerate(bucket_counts) if counts != self.bucket_counts[bucket] ]
+        self.bucket_counts = bucket_counts
+        self.scale = scale
+        self.drawn_width = width
+
+        for bucket in changed:
+            self.draw_bucket(bucket)
+        self.update_viewport()
+
+    def draw_bucket(self, bucket):
+        '''Moves the bar of a bucket to its counts'''
+        gates, multi, measurements = self.bucket_counts[bucket]
+        nr_buckets = len(self.bucket_counts)
+        x1 = self.MARGIN + bucket * (self.drawn_width - 2*self.MARGIN) / nr_buckets
+        x2 = self.MARGIN + (bucket+1) * (self.drawn_width - 2*self.MARGIN) / nr_buckets
+        unit = (self.HEIGHT - 2*self.MARGIN) / self.scale if self.scale else 0
+
+        #Stack the parts from the bottom up
+        y = self.HEIGHT - self.MARGIN
+        for item, count in zip(self.bucket_items[bucket], (multi, gates-multi-measurements, measurements)):
+            self.canvas.coords(item, x1, y - count*unit, x2, y)
+            y -= count*unit
+
+    def update_viewport(self):
+        '''Moves the viewport rectangle to the part of the circuit that is visible on the circuit canvas'''
+        if not self.bucket_counts:
+            if self.viewport_item is not None:
+                self.canvas.delete(self.viewport_item)
+                self.viewport_item = None
+            return
+        left, right = self.circuit_builder.viewport()
+        width = self.drawn_width - 2*self.MARGIN
+        x1, x2 = self.MARGIN + left*width, self.MARGIN + right*width
+        if self.viewport_item is None:
+            self.viewport_item = self.canvas.create_rectangle(x1, 1, x2, self.HEIGHT-1, width=2, \
+                                                              outline=self.VIEWPORT_COLOUR)
+        else:
+            self.canvas.coords(self.viewport_item, x1, 1, x2, self.HEIGHT-1)
+
+    def navigate(self, event):
+        '''Moves the visible part of the circuit to the position that the user clicks on or drags to
+
+        Parameters
+        ----------
+        event : tkinter event
+            The <ButtonPress-1> or <B1-Motion> event
+        '''
+        if not self.bucket_counts:
+            return
+        width = self.drawn_width - 2*self.MARGIN
+        fraction = min( max( (event.x - self.MARGIN) / width, 0.0 ), 1.0 ) if width > 0 else 0.0
+        self.circuit_builder.center_on(fraction)
@@ -0,0 +1,348 @@
+'''Peephole optimizer that removes redundant gates from a circuit, and writes the smaller circuit as a .qc file.
+
+Usage: python -m CircuitOptimizer FILE [-o OUTPUT]
+
+The rewrites are applied until nothing changes anymore:
+    - self-inverse pairs cancel: h h, x x, y y, z z, cnot a,b cnot a,b, toffoli, cz and swap
+    - t tdag and tdag t cancel
+    - t t becomes s, s s becomes z
+    - rotations around the same axis merge: rz q0,a rz q0,b becomes rz q0,a+b, and disappear if the angle is a
+      multiple of 4 pi (which is exactly the identity)
+
+Two gates are only combined if no other statement touches any of their qubits in between. Measurements, prepz and
+classically controlled gates are never combined, and neither 'display' nor 'error_model' statements nor the boundaries
+of subroutines are crossed: a subroutine is optimized on its own, and keeps its repeat count.
+'''
+import argparse
+import collections
+import math
+import os
+import sys
+
+from CircuitRender2 import CircuitModel
+
+class CircuitOptimizer(object):
+    '''CircuitOptimizer applies peephole rewrites to a parsed CircuitModel'''
+
+    #Names of the same gate
+    ALIASES = {'not': 'x', 'ph': 's', 'cx': 'cnot', 'cphase': 'cz'}
+    #Gates that cancel when they are applied twice to the same qubits
+    SELF_INVERSE = ('h', 'x', 'y', 'z', 'cnot', 'toffoli', 'cz', 'swap')
+    #Gates of which only the set of rows matters, not their order
+    SYMMETRIC = ('cz', 'swap')
+    ROTATIONS = ('rx', 'ry', 'rz')
+    #Pairs of single-qubit gates that are replaced by one gate, or by nothing (None)
+    PAIRS = {('t', 'tdag'): None, ('tdag', 't'): None, ('t', 't'): 's', ('s', 's'): 'z'}
+
+    #Angles below this tolerance (modulo 4 pi) are considered zero
+    ANGLE_TOLERANCE = 1e-12
+
+    def __init__(self, model):
+        '''Initializes the CircuitOptimizer
+
+        Parameters
+        ----------
+        model : CircuitModel
+            The parsed circuit. It has to be free of diagnostics, as skipped statements would get lost.
+        '''
+        if model.diagnostics:
+            raise ValueError('CircuitOptimizer cannot optimize a circuit with problems: ' + \
+                             '; '.join(f"line {d['line']}: {d['message']}" for d in model.diagnostics))
+        self.model = model
+
+        #Gate counts before and after the optimization
+        self.before = collections.Counter()
+        self.after = collections.Counter()
+
+    def canonical(self, gate, rows):
+        '''Returns the name of a gate that is used to compare gates, e.g. 'cnot' for 'cx q0,q1' '''
+        if gate == 'cx' and len(rows) != 2:
+            return 'toffoli' if len(rows) == 3 else gate
+        return self.ALIASES.get(gate, gate)
+
+    def inverse_key(self, operation):
+        '''Returns a key that is equal for two self-inverse gates that cancel each other, or None'''
+        gate, rows, _ = operation
+        gate = self.canonical(gate, rows)
+        if gate not in self.SELF_INVERSE:
+            return None
+        if gate in self.SYMMETRIC:
+            return (gate, frozenset(rows))
+        #The order of the controls does not matter, but the target does
+        return (gate, frozenset(rows[:-1]), rows[-1])
+
+    def combine(self, first, second):
+        '''Combines two gates on the same qubits that follow each other directly
+
+        Output
+        ------
+        None if the gates cannot be combined, otherwise the list of operations that replaces both (can be empty)
+        '''
+        key = self.inverse_key(first)
+        if key is not None and key == self.inverse_key(second):
+            return []
+
+        (gate1, rows1, angle1), (gate2, rows2, angle2) = first, second
+        if len(rows1) != 1 or rows1 != rows2:
+            return None
+        gate1, gate2 = self.canonical(gate1, rows1), self.canonical(gate2, rows2)
+
+        if (gate1, gate2) in self.PAIRS:
+            gate = self.PAIRS[(gate1, gate2)]
+            return [] if gate is None else [ (gate, rows1, None) ]
+
+        if gate1 == gate2 and gate1 in self.ROTATIONS:
+            try:
+                angle = float(angle1) + float(angle2)
+            except (TypeError, ValueError):
+                #Symbolic angles such as {theta} cannot be merged
+                return None
+            if abs(math.remainder(angle, 4*math.pi)) < self.ANGLE_TOLERANCE:
+                return []
+            return [ (gate1, rows1, f'{angle:.12g}') ]
+
+        return None
+
+    def touched_rows(self, item):
+        '''Returns the rows that an operation or directive depends on or changes'''
+        nr_rows = 2*self.model.nr_qubits
+        if item[0] == 'directive':
+            return list(range(nr_rows))
+        gate, rows, _ = item
+        if gate == 'measure':
+            #A measurement writes its classical bit
+            return rows + [row + self.model.nr_qubits for row in rows]
+        return rows
+
+    def optimize_items(self, items):
+        '''Optimizes one segment of the circuit
+
+        Parameters
+        ----------
+        items : list
+            Operations (gate, rows, angle) and directives ('directive', statement, None) in order of execution
+
+        Output
+        ------
+        The optimized list of items
+        '''
+        output = []
+        #Per row, the indices in output of the live items that touch it, the last one is the most recent
+        stacks = [ [] for _ in range(2*self.model.nr_qubits) ]
+
+        def remove(idx):
+            for row in self.touched_rows(output[idx]):
+                stacks[row].pop()
+            output[idx] = None
+
+        def push(item):
+            rows = self.touched_rows(item)
+            if item[0] != 'directive':
+                #The gate can only be combined with the previous item on its rows if that is one and the same item,
+                #which touches exactly the same rows
+                previous = set(stacks[row][-1] if stacks[row] else None for row in rows)
+                if len(previous) == 1 and None not in previous:
+                    idx = previous.pop()
+                    if set(self.touched_rows(output[idx])) == set(rows):
+                        result = self.combine(output[idx], item)
+                        if result is not None:
+                            remove(idx)
+                            #The result might combine with the gate before it
+                            for new_item in result:
+                                push(new_item)
+                            return
+            output.append(item)
+            for row in rows:
+                stacks[row].append(len(output)-1)
+
+        for item in items:
+            push(item)
+        return [item for item in output if item is not None]
+
+    def segments(self):
+        '''Splits the circuit into segments: the top-level code between subroutines, and the subroutines themselves
+
+        Output
+        ------
+        List of dictionaries with the 'subroutine' (None for top-level code) and the 'items' in order of execution
+        '''
+        model = self.model
+
+        #Directives per (subroutine index, column)
+        directives = collections.OrderedDict()
+        for directive in model.directives:
+            directives.setdefault( (directive['subroutine'], directive['col']), [] ).append( \
+                ('directive', directive['statement'], None) )
+
+        def column(subroutine_idx, col, items):
+            items += directives.pop( (subroutine_idx, col), [] )
+            items += model.column_operations(col)
+
+        starts = {}
+        for idx, subroutine in enumerate(model.subroutines):
+            starts.setdefault(subroutine['start'], []).append(idx)
+
+        top = {'subroutine': None, 'items': []}
+        segments = [top]
+        col = 0
+        while col <= model.max_col:
+            if col in starts:
+                for idx in starts.pop(col):
+                    subroutine = model.subroutines[idx]
+                    segment = {'subroutine': subroutine, 'items': []}
+                    for sub_col in range(subroutine['start'], subroutine['end']):
+                        column(idx, sub_col, segment['items'])
+                    #Statements at the very end of the subroutine
+                    segment['items'] += directives.pop( (idx, subroutine['end']), [] )
+                    segments.append(segment)
+                    col = max(col, subroutine['end'])
+                    #Everything after a subroutine is top-level code again
+                    top = {'subroutine': None, 'items': []}
+                    segments.append(top)
+                continue
+            column(None, col, top['items'])
+            col += 1
+
+        #Statements after the last gate
+        for items in directives.values():
+            top['items'] += items
+        return segments
+
+    def optimize(self):
+        '''Optimizes every segment up to a fixpoint, returns the optimized segments (see segments())'''
+        segments = self.segments()
+        for segment in segments:
+            items = segment['items']
+            self.before.update(item[0] for item in items if item[0] != 'directive')
+            while True:
+                new_items = self.optimize_items(items)
+                if len(new_items) == len(items):
+                    break
+                items = new_items
+            segment['items'] = items
+            self.after.update(item[0] for item in items if item[0] != 'directive')
+        return segments
+
+    def row_name(self, row):
+        '''Returns the numeric name of a row: qN or bN'''
+        n = self.model.nr_qubits
+        return f'q{row}' if row < n else f'b{row-n}'
+
+    def statement(self, item):
+        '''Returns the .qc statement of an operation or directive'''
+        gate, rows, angle = item
+        if gate == 'directive':
+            return rows
+        #The parser renames a cx or cz with classical controls, the code uses the original name
+        gate = {'class_cx': 'cx', 'class_cz': 'cz'}.get(gate, gate)
+        arguments = [self.row_name(row) for row in rows]
+        if angle is not None:
+            arguments.append(str(angle))
+        return f'{gate} ' + ', '.join(arguments)
+
+    def code(self, segments, header=()):
+        '''Returns the .qc code of optimized segments
+
+        Parameters
+        ----------
+        segments : list
+            The output of optimize()
+        header = () : list of strings
+            Lines that come before the 'qubits' statement, such as 'version 1.0'
+        '''
+        lines = list(header) + [f'qubits {self.model.nr_qubits}']
+        for segment in segments:
+            subroutine = segment['subroutine']
+            if subroutine is None:
+                if segment['items']:
+                    lines.append('')
+                lines += [self.statement(item) for item in segment['items']]
+            else:
+                repeat = f"({subroutine['repeat']})" if subroutine['repeat'] != 1 else ''
+                lines += ['', f".{subroutine['name']}{repeat}"]
+                lines += ['    ' + self.statement(item) for item in segment['items']]
+        return '\n'.join(lines) + '\n'
+
+    def report(self):
+        '''Returns the gate counts before and after the optimization as text'''
+        total_before, total_after = sum(self.before.values()), sum(self.after.values())
+        lines = [f'{total_before} gate(s) before, {total_after} after: {total_before-total_after} removed']
+        for gate in sorted(set(self.before) | set(self.after)):
+            if self.before[gate] != self.after[gate]:
+                lines.append(f'    {gate}: {self.before[gate]} -> {self.after[gate]}')
+        return '\n'.join(lines)
+
+def header_lines(data):
+    '''Returns the lines of data before the 'qubits' statement, without comments and white lines'''
+    header = []
+    for line in data.split('\n'):
+        code = line[:line.index('#')] if '#' in line else line
+        if 'qubits' in code:
+            break
+        if code.strip():
+            header.append(code.rstrip())
+    return header
+
+def optimize_code(data):
+    '''Optimizes the code of a circuit
+
+    Parameters
+    ----------
+    data : string
+        The code of the circuit
+
+    Output
+    ------
+    Tuple (optimized code, report)
+    '''
+    model = CircuitModel()
+    model.read(data)
+    optimizer = CircuitOptimizer(model)
+    segments = optimizer.optimize()
+    return optimizer.code(segments, header=header_lines(data)), optimizer.report()
+
+def optimized_filename(filename):
+    '''Returns the file name of the optimized version of a .qc file: name.opt.qc'''
+    return os.path.splitext(filename)[0] + '.opt.qc'
+
+def optimize_file(filename, out_filename=None):
+    '''Optimizes a .qc file and writes the result
+
+    Parameters
+    ----------
+    filename : string
+        The .qc file
+    out_filename = None : string
+        Where to write the result, defaults to optimized_filename(filename)
+
+    Output
+    ------
+    Tuple (out_filename, report)
+    '''
+    with open(filename, 'r') as file:
+        code, report = optimize_code(file.read())
+    out_filename = out_filename if out_filename else optimized_filename(filename)
+    with open(out_filename, 'w') as file:
+        file.write(f'# Optimized version of {os.path.basename(filename)}\n')
+        file.write(''.join(f'# {line}\n' for line in report.split('\n')))
+        file.write(code)
+    return out_filename, report
+
+def main(argv=None):
+    '''Runs the optimizer from the command line, see the module docstring.'''
+    argparser = argparse.ArgumentParser(prog='python -m CircuitOptimizer', \
+                                        description='Removes redundant gates from a .qc file.')
+    argparser.add_argument('file', help='.qc file to optimize')
+    argparser.add_argument('-o', '--output', help='optimized .qc file (default FILE.opt.qc)')
+    args = argparser.parse_args(argv)
+
+    try:
+        out_filename, report = optimize_file(args.file, args.output)
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f'{e}\n')
+        return 1
+    sys.stderr.write(f'{report}\nWritten to {out_filename}\n')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
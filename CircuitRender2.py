@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter.font import Font
 import re
+import bisect
 
 class CircuitRender(object):
     '''CircuitRender renders the circuit of the code inside a tkinter canvas'''
@@ -25,35 +26,118 @@ class CircuitRender(object):
     #Collection of all the operations that are multiple-qubit gates
     MULTIPLE_QUBIT_GATES = ('cnot','cx','c-x','toffoli','swap','cphase','cz','cr')
     
-    def __init__(self, canvas):
-        '''Initializes the CircuitRender: needs a canvas.'''
+    #Level of detail thresholds, in pixels of the average cell size. Below LOD_BOX_SIZE the gates are drawn as plain
+    #filled rectangles, below LOD_SPAN_SIZE adjacent gates on a wire are merged into one single span.
+    LOD_BOX_SIZE = 12
+    LOD_SPAN_SIZE = 4
+    
+    #Zooming: the factor per mouse wheel step, the allowed range, and the time in milliseconds after the last
+    #zoom step after which we check whether the circuit needs a new layout.
+    ZOOM_STEP = 1.25
+    ZOOM_RANGE = (1/64, 64)
+    ZOOM_SETTLE_TIME = 400
+    #Text smaller than this font size is hidden whilst zooming
+    ZOOM_MIN_FONT_SIZE = 4
+    
+    #The colour of the selected gate, and the canvas tag of its items
+    SELECT_COLOUR = 'DodgerBlue2'
+    SELECT_TAG = 'selected'
+    
+    def __init__(self, canvas, model=None):
+        '''Initializes the CircuitRender: needs a canvas.
+        
+        Parameters
+        ----------
+        canvas : tk.Canvas
+            The canvas on which we draw
+        model = None : CircuitModel
+            The parsed circuit that we draw, which may be shared with other CircuitRenders. If None, we get our own.
+        '''
         
         #Keep track of the canvas on which we draw 
         self.canvas = canvas
         
-        #Keep track of the amount of qubits in the circuit
-        self.nr_qubits = -1
-        #Keep track of the names of the qubits and classical bits, assigned through the 'map' command
-        #will always have len(...) = 2 * self.nr_qubits, set through the .read(...) method
-        self.channel_names = []
+        #Keep track of the parsed circuit
+        self.model = model if model else CircuitModel()
+
+        #Keep track of the start columns of the subroutines that are drawn expanded, all others are drawn as a single
+        #box. Several subroutines can have the same name, but no two non-empty subroutines start at the same column.
+        self.expanded_subroutines = set()
+
+        #Keep track of font used to render
+        self.font = None
+        #Keep track of the fonts used for the text whilst zoomed, one per font size
+        self.zoom_fonts = {}
         
-        #Keep track of the entire grid that is updated in read(...). Each element represents a ROW
-        #Elements in self.grid are dictionaries, keys are COLUMNs, and values are GridElements.
-        self.grid = []
-        #Keep track of the total amount of columns, calculated by read(...)
-        self.max_col = -1
+        #Keep track of the zoom and the canvas position of the origin of the drawing, changed through zoom and pan
+        self.zoom = 1.0
+        self.view_x = 0
+        self.view_y = 0
+        #Keep track of the level of detail of the last render
+        self.lod = None
+        #Keep track of the width of the drawing of the last render, before it is scaled with the zoom
+        self.layout_width = 0
         
-        #Keep track of the subroutines in the data
-        self.subroutines = []
+        #Keep track of the mouse drag, and of the scheduled check after zooming
+        self.drag_start = None
+        self.drag_moved = False
+        self.zoom_settle_id = None
         
-        #Keep track of font used to render
-        self.font = None
+        #Index of the canvas items of the last render. Items are numbered in the order in which they are created, and
+        #every GridElement creates its items in one go, so each one owns an interval of ids: item_starts and item_ends
+        #are sorted, item_elements[i] owns the ids item_starts[i]...item_ends[i]. element_items is the reverse.
+        self.item_starts = []
+        self.item_ends = []
+        self.item_elements = []
+        self.element_items = {}
+        
+        #Keep track of the selected source position (line, col), and of the highlighted items with their original
+        #colours: (item, option, colour)
+        self.selection = None
+        self.highlighted = []
+        #Called with the GridElement that the user clicks on, if any
+        self.on_select = None
+        #Called without arguments whenever the visible part of the circuit changes, if any
+        self.on_view = None
+        
+    #The parsed circuit lives in the CircuitModel, these give access to it as if it were our own.
+    nr_qubits = property(lambda self: self.model.nr_qubits)
+    channel_names = property(lambda self: self.model.channel_names)
+    grid = property(lambda self: self.model.grid)
+    max_col = property(lambda self: self.model.max_col)
+    subroutines = property(lambda self: self.model.subroutines)
+    col_rows = property(lambda self: self.model.col_rows)
+    
+    @property
+    def pack_columns(self):
+        return self.model.pack_columns
+    
+    @pack_columns.setter
+    def pack_columns(self, value):
+        self.model.pack_columns = value
+        
+    def set_model(self, model):
+        '''Sets the CircuitModel that this CircuitRender draws
+        
+        Parameters
+        ----------
+        model : CircuitModel
+            The parsed circuit
+        '''
+        self.model = model
+        
+    def read(self, data, verbose=False, strict=False):
+        '''Reads the <data> into our CircuitModel, see CircuitModel.read(...)'''
+        self.model.read(data, verbose=verbose, strict=strict)
         
     def render(self):
         '''Renders the circuit to the self.canvas'''
         
         #First, remove everything from the canvas
         self.canvas.delete('all')
+        self.item_starts, self.item_ends, self.item_elements = [], [], []
+        self.element_items = {}
+        self.highlighted = []
 
         if not self.font:
             self.build_font()
@@ -65,6 +149,10 @@ class CircuitRender(object):
         if width <= 1 or height <= 1:
             width = int(self.canvas.cget('width')) - self.RENDER_MARGINS['w']
             height = int(self.canvas.cget('height')) - self.RENDER_MARGINS['h']
+        
+        #The circuit is laid out at zoom 1, such that the sizes of the boxes match the text in self.font, and is
+        #scaled with the zoom afterwards, just like zoom_at(...) does
+        self.layout_width = width
             
         #To determine nr of rows, first determine which classical bits might not be in use
         classical_bits_in_use = [len(self.grid[x]) > 0 for x in range(self.nr_qubits,2*self.nr_qubits)]
@@ -73,9 +161,29 @@ class CircuitRender(object):
         to_gridrow = [x for x in range(self.nr_qubits)] + \
                         [x+self.nr_qubits for x in range(self.nr_qubits) if classical_bits_in_use[x] ]
         
-        #We need an extra column to display the initial names, and an extra row if we have subroutines
-        extra_row = len(self.subroutines) > 0
-        nr_cols = self.max_col+1
+        #Find out which columns to display. Each entry is either a circuit column, or a collapsed subroutine
+        #(a dictionary from self.subroutines) whose columns are all drawn as one single box.
+        display_cols = []
+        #Keep track of the display column of each circuit column that is actually displayed
+        to_displaycol = {}
+        collapsed_starts = { subroutine['start']:subroutine for subroutine in self.subroutines \
+                                if subroutine['start'] not in self.expanded_subroutines and \
+                                   subroutine['end'] > subroutine['start'] }
+        ccol = 0
+        while ccol < self.max_col:
+            if ccol in collapsed_starts:
+                display_cols.append( collapsed_starts[ccol] )
+                ccol = collapsed_starts[ccol]['end']
+            else:
+                to_displaycol[ccol] = len(display_cols)
+                display_cols.append( ccol )
+                ccol += 1
+        
+        #We need an extra column to display the initial names, and an extra row if we have expanded subroutines
+        expanded = [subroutine for subroutine in self.subroutines if subroutine['start'] in self.expanded_subroutines \
+                        and subroutine['end'] > subroutine['start'] ]
+        extra_row = len(expanded) > 0
+        nr_cols = len(display_cols)+1
         nr_rows = self.nr_qubits + sum(classical_bits_in_use) + extra_row
         
         #Produce the first naming col
@@ -89,18 +197,23 @@ class CircuitRender(object):
             else:
                 txt = f'|q{grid_row}>' if grid_row < self.nr_qubits else f'b{grid_row-self.nr_qubits}'
             
-            ge = GridElement(self.canvas, row=grid_row, col=-1, gate=txt, participant_rows = [grid_row])
-            ge.canvas_elem.draw_rect = False
+            ge = GridElement(row=grid_row, col=-1, gate=txt, participant_rows = [grid_row])
+            ge.get_canvas_elem(self.canvas, self.font).draw_rect = False
             first_col[grid_row] = ge
         
         #Find out how large each column has to be, but let it be -1 for the first (naming) col
-        min_col_widths = [-1] + [ max( self.grid[row][col].get_min_dims()[0] for row in \
-             range(2*self.nr_qubits) if col in self.grid[row].keys() ) for col in range(self.max_col) ]
+        min_col_widths = [-1]
+        for entry in display_cols:
+            if isinstance(entry, dict):
+                min_col_widths.append( self.font.measure(self.subroutine_label(entry)) + 4*CanvasElem.BORDER_WIDTH )
+            else:
+                min_col_widths.append( max( (self.grid[row][entry].get_min_dims(self.canvas, self.font)[0] \
+                                             for row in self.col_rows[entry]), default=0 ) )
         #Manually set the first column
-        min_col_widths[0] = max( ge.get_min_dims()[0] for ge in first_col )
+        min_col_widths[0] = max( ge.get_min_dims(self.canvas, self.font)[0] for ge in first_col )
         
         #Specify the width of the columns: add any left-over width evenly
-        col_widths = [ int( x + (width-sum(min_col_widths))/nr_cols ) for x in min_col_widths ]
+        col_widths = [ x + (width-sum(min_col_widths))/nr_cols for x in min_col_widths ]
         #Specify the height per row: simply evenly space it, except for the subroutine row
         if extra_row:
             extra_row_size = self.font.metrics('linespace')*2
@@ -108,145 +221,243 @@ class CircuitRender(object):
         else:
             row_heights = [ int(height/nr_rows) ] * nr_rows
         
-        #Prepare each GridElement for drawing. This has to be done BEFORE ge.draw()'s are called, because we need
-        #to connect adjacent GridElements but cannot do this unless each GridElement has already gotten a bbox.
-        for col in range(nr_cols):
-            for draw_row in range(nr_rows-extra_row):
-                grid_row = to_gridrow[draw_row]
-                bbox = {'x': sum(col_widths[:col]), 'y': sum(row_heights[:draw_row]), \
-                        'w':col_widths[col], 'h':row_heights[draw_row]}
-                if col == 0:
-                    first_col[grid_row].set_bbox(bbox)
-                    continue
+        #Helper function that finds the GridElement at a certain display column, if any
+        def cell(grid_row, col):
+            entry = display_cols[col-1]
+            if isinstance(entry, dict):
+                return None
+            return self.grid[grid_row].get(entry)
+        
+        #Keep track of the x-coord of each column and the y-coord of each row
+        col_x = [0]
+        for w in col_widths:
+            col_x.append( col_x[-1] + w )
+        row_y = [0]
+        for h in row_heights:
+            row_y.append( row_y[-1] + h )
+        
+        #The boxes of the collapsed subroutines span all circuit rows, keep track of their bboxes per display col
+        collapsed_boxes = {}
+        margin = CanvasElem.BORDER_WIDTH
+        for col in range(1, nr_cols):
+            if isinstance(display_cols[col-1], dict):
+                collapsed_boxes[col] = {'x': col_x[col] + margin, 'y': margin, \
+                                        'w': col_widths[col] - 2*margin, \
+                                        'h': row_y[nr_rows-extra_row] - 2*margin}
+        
+        #Find out how much detail we can draw: text is unreadable if the cells are too small once they are zoomed
+        lod = self.level_of_detail( [w*self.zoom for w in col_widths[1:]], \
+                                    [h*self.zoom for h in row_heights[:nr_rows-extra_row]] )
+        self.lod = lod
+        
+        if lod == CanvasElem.LOD_FULL:
+            #Prepare each GridElement for drawing. This has to be done BEFORE ge.draw()'s are called, because we need
+            #to connect adjacent GridElements but cannot do this unless each GridElement has already gotten a bbox.
+            for col in range(nr_cols):
+                for draw_row in range(nr_rows-extra_row):
+                    grid_row = to_gridrow[draw_row]
+                    bbox = {'x': col_x[col], 'y': row_y[draw_row], \
+                            'w':col_widths[col], 'h':row_heights[draw_row]}
+                    if col == 0:
+                        first_col[grid_row].set_bbox(self.canvas, bbox)
+                        continue
                 
-                ccol = col-1
-                if ccol in self.grid[grid_row].keys():
-                    self.grid[grid_row][ccol].set_bbox(bbox)
+                    ge = cell(grid_row, col)
+                    if ge:
+                        ge.set_bbox(self.canvas, bbox)
         
-        #Draw the GridElements and the horizontal quantum/classical lines
-        for col in range(nr_cols):
-            for draw_row in range(nr_rows-extra_row):
-                grid_row = to_gridrow[draw_row]
-                #Create a bbox for this region
-                bbox = {'x': sum(col_widths[:col]), 'y': sum(row_heights[:draw_row]), \
-                        'w':col_widths[col], 'h':row_heights[draw_row]}
-                if col == 0:
-                    ge = first_col[grid_row]
-                    ge.draw()
-                    continue
-                    
-                #Now, make a circuit column that is shifted!
-                ccol = col-1
+            #Draw the GridElements and the horizontal quantum/classical lines
+            for col in range(nr_cols):
+                for draw_row in range(nr_rows-extra_row):
+                    grid_row = to_gridrow[draw_row]
+                    #Create a bbox for this region
+                    bbox = {'x': col_x[col], 'y': row_y[draw_row], \
+                            'w':col_widths[col], 'h':row_heights[draw_row]}
+                    if col == 0:
+                        ge = first_col[grid_row]
+                        ge.draw(self.canvas)
+                        continue
                 
-                #Find the x-coord for the quantum/classical line that is attached to the LEFT GridElement
-                #if no such GridElement exists, set it to bbox['x'].
-                if ccol == 0:
-                    x1 = first_col[grid_row].get_attachments()['right']
-                else:
-                    x1 = self.grid[grid_row][ccol-1].get_attachments()['right'] if \
-                                ccol-1 in self.grid[grid_row].keys() else bbox['x']
+                    #Find the x-coord for the quantum/classical line that is attached to the LEFT element
+                    #if no such element exists, set it to bbox['x'].
+                    if col == 1:
+                        x1 = first_col[grid_row].get_attachments(self.canvas)['right']
+                    elif col-1 in collapsed_boxes:
+                        x1 = collapsed_boxes[col-1]['x'] + collapsed_boxes[col-1]['w']
+                    else:
+                        x1 = cell(grid_row, col-1).get_attachments(self.canvas)['right'] if cell(grid_row, col-1) else bbox['x']
                     
-                #If this cell actually has a GridElement, then draw it
-                ge = None
-                if ccol in self.grid[grid_row].keys():
-                    ge = self.grid[grid_row][ccol]
-                    ge.draw()
+                    #If this cell actually has a GridElement, then draw it
+                    ge = cell(grid_row, col)
+                    if ge:
+                        ge.draw(self.canvas)
+                        self.index_items(ge)
                     
-                #Find the second x-coord for the quantum/classical line by attaching to the RIGHT GridElement
-                #if no such GridElement exists, set it to bbox['x']+bbox['w'].
-                x2 = ge.get_attachments()['left'] if ge else bbox['x']+bbox['w']
+                    #Find the second x-coord for the quantum/classical line by attaching to the RIGHT element
+                    #if no such element exists, set it to bbox['x']+bbox['w'].
+                    if col in collapsed_boxes:
+                        x2 = collapsed_boxes[col]['x']
+                    else:
+                        x2 = ge.get_attachments(self.canvas)['left'] if ge else bbox['x']+bbox['w']
                 
-                #Find the middle y coordinate
-                y_mid = int( bbox['y'] + bbox['h']/2 )
+                    #Find the middle y coordinate
+                    y_mid = int( bbox['y'] + bbox['h']/2 )
                 
-                #Determine whether this should be a quantum (single) wire, or a classical (double) wire.
-                if draw_row < self.nr_qubits:
-                    self.canvas.create_line(x1,y_mid, x2, y_mid)
-                else:
-                    self.canvas.create_line(x1,y_mid-2,x2,y_mid-2)
-                    self.canvas.create_line(x1,y_mid+2,x2,y_mid+2)
-                    
-                #If this is the last column, draw the last line if this is a GridElement
-                if ccol == nr_cols-2 and ge:
-                    x1 = ge.get_attachments()['right']
-                    x2 = bbox['x']+bbox['w']
+                    #Determine whether this should be a quantum (single) wire, or a classical (double) wire.
                     if draw_row < self.nr_qubits:
-                        self.canvas.create_line(x1,y_mid,x2,y_mid)
+                        self.canvas.create_line(x1,y_mid, x2, y_mid)
                     else:
                         self.canvas.create_line(x1,y_mid-2,x2,y_mid-2)
                         self.canvas.create_line(x1,y_mid+2,x2,y_mid+2)
                     
-        #Helper function that draws vertical lines between GridElements.
-        def draw_vertical(ge, col, x, classical=False):
-            nonlocal row_heights, to_gridrow, extra_row, nr_rows
-            
-            #Helper function that draws a vertical line between y1 and y2 at x.
-            def draw_line(x,y1,y2):
-                nonlocal classical
-                if classical:
-                    self.canvas.create_line(x-2,y1,x-2,y2)
-                    self.canvas.create_line(x+2,y1,x+2,y2)
-                else:
-                    self.canvas.create_line(x,y1,x,y2)
-            
-            #Determine between which rows we need a wire
-            target_rows = ge.participant_rows
-            start_grid_row, end_grid_row = min(target_rows),  max(target_rows)
+                    #If this is the last column, draw the last line if this is a GridElement or a collapsed subroutine
+                    if col == nr_cols-1 and (ge or col in collapsed_boxes):
+                        if ge:
+                            x1 = ge.get_attachments(self.canvas)['right']
+                        else:
+                            x1 = collapsed_boxes[col]['x'] + collapsed_boxes[col]['w']
+                        x2 = bbox['x']+bbox['w']
+                        if draw_row < self.nr_qubits:
+                            self.canvas.create_line(x1,y_mid,x2,y_mid)
+                        else:
+                            self.canvas.create_line(x1,y_mid-2,x2,y_mid-2)
+                            self.canvas.create_line(x1,y_mid+2,x2,y_mid+2)
+                    
+            #Helper function that draws a vertical wire in col between the GridElements of start_row and end_row
+            def draw_vertical(col, start_row, end_row, x, classical=False):
             
-            #Find the starting position of the wire: attach it to the bottom of the topmost participant.
-            y1 = self.grid[start_grid_row][col].get_attachments()['bottom']
+                #Helper function that draws a vertical line between y1 and y2 at x.
+                def draw_line(x,y1,y2):
+                    nonlocal classical
+                    if classical:
+                        self.canvas.create_line(x-2,y1,x-2,y2)
+                        self.canvas.create_line(x+2,y1,x+2,y2)
+                    else:
+                        self.canvas.create_line(x,y1,x,y2)
+                
+                #The wire only has to be interrupted at the occupied cells of this column. The rows in between are
+                #either empty, or unused classical rows that are not drawn at all.
+                occupied = self.col_rows[col]
+                first = bisect.bisect_right(occupied, start_row)
+                last = bisect.bisect_right(occupied, end_row)
             
-            #As we always draw all quantum registers, we can safely start with draw_row = start_grid_row.
-            draw_row = start_grid_row
+                #Find the starting position of the wire: attach it to the bottom of the topmost participant.
+                y1 = self.grid[start_row][col].get_attachments(self.canvas)['bottom']
+                for grid_row in occupied[first:last]:
+                    attachments = self.grid[grid_row][col].get_attachments(self.canvas)
+                    draw_line(x, y1, attachments['top'])
+                    y1 = attachments['bottom']
             
-            while draw_row < nr_rows-1-extra_row:
-                draw_row += 1
+            #Draw the vertical quantum/classical lines, skip over naming index and collapsed subroutines
+            for col in range(1,nr_cols):
+                if col in collapsed_boxes:
+                    continue
+                mid_x = int(col_x[col] + col_widths[col]/2)
+                
+                #Collect the spans of the multi-gates (either measure or multi-qubit) in this column. Every participant
+                #knows the span, but each wire only has to be drawn once. Circuit col is shifted!
+                ccol = display_cols[col-1]
+                spans = {False:[], True:[]}
+                for row in self.col_rows[ccol]:
+                    ge = self.grid[row][ccol]
+                    if len(ge.participant_rows) > 1 and row < self.nr_qubits:
+                        classical = ge.gate in ('measure','c-x','c-z') or 'class' in ge.gate
+                        spans[classical].append( (min(ge.participant_rows), max(ge.participant_rows)) )
+                
+                #Overlapping spans, such as those of a measurement of all qubits, are merged into one wire
+                for classical, col_spans in spans.items():
+                    col_spans.sort()
+                    merged = []
+                    for start_row, end_row in col_spans:
+                        if merged and start_row <= merged[-1][1]:
+                            merged[-1][1] = max(merged[-1][1], end_row)
+                        else:
+                            merged.append( [start_row, end_row] )
+                    for start_row, end_row in merged:
+                        draw_vertical(ccol, start_row, end_row, mid_x, classical=classical)
+        
+        else:
+            #Zoomed out: draw the names, and one wire per row underneath the gates instead of a segment per cell
+            for draw_row in range(nr_rows-extra_row):
                 grid_row = to_gridrow[draw_row]
-
-                row_y = sum(row_heights[:draw_row])
-                row_h = row_heights[draw_row]
+                bbox = {'x': 0, 'y': row_y[draw_row], 'w':col_widths[0], 'h':row_heights[draw_row]}
+                first_col[grid_row].set_bbox(self.canvas, bbox)
+                first_col[grid_row].draw(self.canvas)
                 
-                #If this (row,col) contains a GridElement, attach the vertical line to its top.
-                if col in self.grid[grid_row].keys():
-                    y2 = self.grid[grid_row][col].get_attachments()['top']
-                    draw_line(x,y1,y2)
-                    y1 = self.grid[grid_row][col].get_attachments()['bottom']
+                x1 = first_col[grid_row].get_attachments(self.canvas)['right']
+                x2 = col_x[-1]
+                y_mid = int( bbox['y'] + bbox['h']/2 )
+                if draw_row < self.nr_qubits:
+                    self.canvas.create_line(x1,y_mid, x2, y_mid)
                 else:
-                    y2 = row_y + row_h
-                    draw_line(x,y1,y2)
-                    y1 = y2
-                    
-                if grid_row == end_grid_row:
-                    break
-                    
+                    self.canvas.create_line(x1,y_mid-2,x2,y_mid-2)
+                    self.canvas.create_line(x1,y_mid+2,x2,y_mid+2)
             
-        #Draw the vertical quantum/classical lines, skip over naming index
-        for col in range(1,nr_cols):
-            #Only loop over the quantum registers!
-            for row in range(self.nr_qubits):
-                mid_x = int(sum(col_widths[:col]) + col_widths[col]/2)
-                
-                #Circuit col is shifted!
-                ccol = col-1
-                if ccol in self.grid[row].keys():
-                    ge = self.grid[row][ccol]
-                    #If this is a multi-gate (either measure or multi-qubit)
-                    if len(ge.participant_rows) > 1:
-                        draw_vertical(ge, ccol, mid_x, classical=\
-                                      (ge.gate in ('measure','c-x','c-z') or 'class' in ge.gate) )
+            if lod == CanvasElem.LOD_BOX:
+                #Every gate becomes a plain filled rectangle, multi-gates get one single vertical line
+                to_drawrow = { grid_row:draw_row for draw_row, grid_row in enumerate(to_gridrow) }
+                for col in range(1, nr_cols):
+                    if col in collapsed_boxes:
+                        continue
+                    for draw_row in range(nr_rows-extra_row):
+                        ge = cell(to_gridrow[draw_row], col)
+                        if not ge:
+                            continue
+                        
+                        #Draw the vertical line once per gate, starting from its topmost participant
+                        if len(ge.participant_rows) > 1 and ge.row == min(ge.participant_rows):
+                            x = int( col_x[col] + col_widths[col]/2 )
+                            y1 = int( row_y[draw_row] + row_heights[draw_row]/2 )
+                            last_row = to_drawrow.get( max(ge.participant_rows), draw_row )
+                            y2 = int( row_y[last_row] + row_heights[last_row]/2 )
+                            self.canvas.create_line(x, y1, x, y2)
                         
-        #Draw the subroutines, if any
+                        ge.set_bbox( self.canvas, {'x': col_x[col], 'y': row_y[draw_row], \
+                                      'w':col_widths[col], 'h':row_heights[draw_row]} )
+                        ge.draw(self.canvas, lod=lod)
+                        self.index_items(ge)
+            else:
+                #Runs of adjacent gates on a wire are merged into one single span
+                for draw_row in range(nr_rows-extra_row):
+                    grid_row = to_gridrow[draw_row]
+                    y_mid = row_y[draw_row] + row_heights[draw_row]/2
+                    half_h = max( row_heights[draw_row]/4, 1 )
+                    run_start = None
+                    for col in range(1, nr_cols+1):
+                        occupied = col < nr_cols and col not in collapsed_boxes and cell(grid_row, col) is not None
+                        if occupied and run_start is None:
+                            run_start = col
+                        elif not occupied and run_start is not None:
+                            self.canvas.create_rectangle(col_x[run_start], y_mid-half_h, col_x[col], y_mid+half_h, \
+                                                         fill=CanvasElem.LOD_FILL, width=0)
+                            run_start = None
+        
+        #Draw the collapsed subroutines as a single box, clicking on it expands the subroutine
+        for col, bbox in collapsed_boxes.items():
+            subroutine = display_cols[col-1]
+            tag = self.subroutine_tag(subroutine)
+            self.canvas.create_rectangle(bbox['x'], bbox['y'], bbox['x']+bbox['w'], bbox['y']+bbox['h'], \
+                                         width=CanvasElem.BORDER_WIDTH, fill='white', tags=(tag,) )
+            if lod == CanvasElem.LOD_FULL:
+                self.canvas.create_text(int(bbox['x']+bbox['w']/2), int(bbox['y']+bbox['h']/2), font=self.font, \
+                                        justify=tk.CENTER, text=self.subroutine_label(subroutine), tags=(tag,'text') )
+            self.canvas.tag_bind(tag, '<ButtonRelease-1>', lambda e, start=subroutine['start']: self.toggle_subroutine(start))
+                        
+        #Draw the expanded subroutines, if any. Clicking on them collapses them again.
         if extra_row:
             draw_row = nr_rows-1
-            for subroutine in self.subroutines:
-                start_col = subroutine['start']+1 #note +1 as the first column has become the naming column!
-                end_col = subroutine['end'] #no +1 as this is an inclusive end!
+            for subroutine in expanded:
+                #Note +1 as the first column has become the naming column!
+                start_col = to_displaycol[subroutine['start']]+1
+                end_col = to_displaycol[subroutine['end']-1]+1
                 repeat = subroutine['repeat']
                 name = subroutine['name']
-                bbox = {'x': sum(col_widths[:start_col]), 'y':sum(row_heights[:draw_row]), \
-                       'w': sum(col_widths[start_col:end_col+1]), 'h':row_heights[draw_row]}
+                bbox = {'x': col_x[start_col], 'y':row_y[draw_row], \
+                       'w': col_x[end_col+1] - col_x[start_col], 'h':row_heights[draw_row]}
                 
-                y2 = self.draw_subroutine(bbox, name, repeat)
+                tag = self.subroutine_tag(subroutine)
+                y2 = self.draw_subroutine(bbox, name, repeat, tag=tag)
+                self.canvas.tag_bind(tag, '<ButtonRelease-1>', lambda e, start=subroutine['start']: self.toggle_subroutine(start))
                 
                 #Additionally, add dashed vertical lines throughout the entire circuit to denote a subroutine.
                 x1 = bbox['x']
@@ -254,8 +465,136 @@ class CircuitRender(object):
                 y1 = int(row_heights[0] * 1/4)
                 self.canvas.create_line(x1,y1,x1,y2, dash=(5,1), width=2 )
                 self.canvas.create_line(x2,y1,x2,y2, dash=(5,1), width=2)
+        
+        #Scale the drawing and its text with the zoom, and move everything to the panned position
+        if self.zoom != 1:
+            self.canvas.scale('all', 0, 0, self.zoom, self.zoom)
+            self.zoom_text()
+        if self.view_x or self.view_y:
+            self.canvas.move('all', self.view_x, self.view_y)
+        
+        #The new items of the selected gate have to be highlighted again
+        if self.selection:
+            self.select_source(*self.selection)
+        if self.on_view:
+            self.on_view()
+    
+    def index_items(self, ge):
+        '''Adds the canvas items that were just drawn for a GridElement to the item index'''
+        items = ge.get_items(self.canvas)
+        if items:
+            self.item_starts.append(min(items))
+            self.item_ends.append(max(items))
+            self.item_elements.append(ge)
+            self.element_items[ge] = (min(items), max(items))
+    
+    def element_at_item(self, item):
+        '''Returns the GridElement that drew a canvas item, or None (such as for a wire). Found through a binary search.
+        
+        Parameters
+        ----------
+        item : integer
+            The id of the canvas item
+        '''
+        idx = bisect.bisect_right(self.item_starts, item) - 1
+        if idx >= 0 and item <= self.item_ends[idx]:
+            return self.item_elements[idx]
+        return None
+    
+    def element_at(self, x, y):
+        '''Returns the GridElement that is drawn at the canvas coordinates (x,y), or None
+        
+        Parameters
+        ----------
+        x, y : numbers
+            The canvas coordinates
+        '''
+        #The topmost items come last
+        for item in reversed(self.canvas.find_overlapping(x-1, y-1, x+1, y+1)):
+            ge = self.element_at_item(item)
+            if ge:
+                return ge
+        return None
+    
+    def select_source(self, line, col=None):
+        '''Highlights the gates of a source position, by recolouring their existing canvas items. Nothing is re-rendered,
+        a later render highlights the gates again.
+        
+        Parameters
+        ----------
+        line : integer
+            The source line, starting at 1, or None to clear the selection
+        col = None : integer
+            The position in the line, to pick one of the gates of a parallel line
+        '''
+        #Restore the colours of the previous selection
+        for item, option, colour in self.highlighted:
+            self.canvas.itemconfigure(item, **{option: colour})
+        self.canvas.dtag(self.SELECT_TAG, self.SELECT_TAG)
+        self.highlighted = []
+        
+        self.selection = (line, col) if line is not None else None
+        if line is None:
+            return
+        
+        for gate in self.model.gates_at(line, col):
+            for ge in gate:
+                if ge not in self.element_items:
+                    continue
+                start, end = self.element_items[ge]
+                for item in range(start, end+1):
+                    #Only recolour what is drawn: an empty fill or outline stays empty
+                    options = ('fill',) if self.canvas.type(item) in ('line', 'text') else ('fill', 'outline')
+                    for option in options:
+                        colour = self.canvas.itemcget(item, option)
+                        if colour:
+                            self.highlighted.append( (item, option, colour) )
+                            self.canvas.itemconfigure(item, **{option: self.SELECT_COLOUR})
+                    self.canvas.addtag_withtag(self.SELECT_TAG, item)
+    
+    def click(self, event):
+        '''Selects the gate that the user clicked on, and passes it on to self.on_select
+        
+        Parameters
+        ----------
+        event : tkinter event
+            The <ButtonRelease-1> event
+        '''
+        #This was the end of a drag, not a click
+        if self.drag_moved:
+            return
+        ge = self.element_at(event.x, event.y)
+        if ge is None or ge.source is None:
+            return
+        self.select_source(ge.source[0], ge.source[1])
+        if self.on_select:
+            self.on_select(ge)
                     
-    def draw_subroutine(self, bbox, name, repeat):
+    def level_of_detail(self, col_widths, row_heights):
+        '''Determines the level of detail with which the gates can be drawn, given the size of the cells.
+        
+        Parameters
+        ----------
+        col_widths : list of numbers
+            The widths of the circuit columns, without the naming column
+        row_heights : list of numbers
+            The heights of the circuit rows, without the subroutine row
+        
+        Output
+        ------
+        One of CanvasElem.LOD_FULL, CanvasElem.LOD_BOX and CanvasElem.LOD_SPAN
+        '''
+        if not col_widths or not row_heights:
+            return CanvasElem.LOD_FULL
+        
+        cell_size = min( sum(col_widths)/len(col_widths), min(row_heights) )
+        if cell_size < self.LOD_SPAN_SIZE:
+            return CanvasElem.LOD_SPAN
+        if cell_size < self.LOD_BOX_SIZE:
+            return CanvasElem.LOD_BOX
+        return CanvasElem.LOD_FULL
+    
+    def draw_subroutine(self, bbox, name, repeat, tag=None):
         '''Draws a subroutine in the provided bbox'''
         txt = name + '(' + str(repeat) + ')' if repeat > 1 else name
         margin = 3
@@ -268,10 +607,188 @@ class CircuitRender(object):
         text_midy = int(bbox['y'] + bbox['h'] - size_y/2 - margin/2)
         arrow_y = int( bbox['y'] + leftover_h/2 )
 
-        self.canvas.create_line(bbox['x'], arrow_y, bbox['x']+bbox['w'], arrow_y, arrow=tk.BOTH, width=2)
-        self.canvas.create_text(text_midx, text_midy, text=txt, font=self.font, justify=tk.CENTER )
+        tags = (tag,) if tag else ()
+        self.canvas.create_line(bbox['x'], arrow_y, bbox['x']+bbox['w'], arrow_y, arrow=tk.BOTH, width=2, tags=tags)
+        self.canvas.create_text(text_midx, text_midy, text=txt, font=self.font, justify=tk.CENTER, tags=tags+('text',) )
         
         return arrow_y
+    
+    def subroutine_label(self, subroutine):
+        '''Returns the text that describes a subroutine, i.e. its name and its repeat count'''
+        if subroutine['repeat'] > 1:
+            return subroutine['name'] + '(' + str(subroutine['repeat']) + ')'
+        return subroutine['name']
+    
+    def subroutine_tag(self, subroutine):
+        '''Returns the canvas tag shared by all the canvas items that represent a subroutine'''
+        return f"subroutine{self.subroutines.index(subroutine)}"
+    
+    def toggle_subroutine(self, start):
+        '''Expands a collapsed subroutine, or collapses an expanded one, and re-renders the circuit
+        
+        Parameters
+        ----------
+        start : integer
+            The start column of the subroutine
+        '''
+        #This was the end of a drag, not a click
+        if self.drag_moved:
+            return
+        
+        if start in self.expanded_subroutines:
+            self.expanded_subroutines.remove(start)
+        else:
+            self.expanded_subroutines.add(start)
+        self.render()
+        
+    def enable_navigation(self):
+        '''Binds the mouse events that zoom (mouse wheel) and pan (drag) the circuit on the self.canvas. Both transform
+        the items that are already drawn, the circuit only gets a new layout if the zoom changes the level of detail.
+        Right-clicking resets the view, clicking on a gate selects it.'''
+        
+        #Windows and MacOS send <MouseWheel>, X11 sends <Button-4> and <Button-5>
+        self.canvas.bind('<MouseWheel>', lambda e: self.zoom_at(e.x, e.y, self.ZOOM_STEP if e.delta > 0 else 1/self.ZOOM_STEP))
+        self.canvas.bind('<Button-4>', lambda e: self.zoom_at(e.x, e.y, self.ZOOM_STEP))
+        self.canvas.bind('<Button-5>', lambda e: self.zoom_at(e.x, e.y, 1/self.ZOOM_STEP))
+        
+        self.canvas.bind('<ButtonPress-1>', self.drag_begin)
+        self.canvas.bind('<B1-Motion>', self.drag_move)
+        self.canvas.bind('<ButtonRelease-1>', self.click)
+        self.canvas.bind('<Button-3>', lambda e: self.reset_view())
+        
+    def zoom_at(self, x, y, factor):
+        '''Zooms the drawn circuit by factor, keeping the canvas point (x,y) in place
+        
+        Parameters
+        ----------
+        x, y : numbers
+            The canvas coordinates around which we zoom
+        factor : number
+            The zoom factor, >1 zooms in and <1 zooms out.
+        '''
+        #Stay within the allowed zoom range
+        new_zoom = min( max(self.zoom*factor, self.ZOOM_RANGE[0]), self.ZOOM_RANGE[1] )
+        factor = new_zoom / self.zoom
+        if factor == 1:
+            return
+        
+        self.zoom = new_zoom
+        self.view_x = x + (self.view_x - x)*factor
+        self.view_y = y + (self.view_y - y)*factor
+        
+        self.canvas.scale('all', x, y, factor, factor)
+        self.zoom_text()
+        if self.on_view:
+            self.on_view()
+        
+        #Only check the layout once the user stops zooming
+        if self.zoom_settle_id is not None:
+            self.canvas.after_cancel(self.zoom_settle_id)
+        self.zoom_settle_id = self.canvas.after(self.ZOOM_SETTLE_TIME, self.zoom_settled)
+        
+    def zoom_settled(self):
+        '''Called once the zooming has stopped: re-renders the circuit only if its level of detail has changed'''
+        self.zoom_settle_id = None
+        if self.lod is None or not self.grid:
+            return
+        
+        #Scale the cells of the last layout with the zoom, and find out whether that changes the level of detail
+        bbox = self.canvas.bbox('all')
+        if not bbox:
+            return
+        nr_cols = max(self.max_col, 1)
+        nr_rows = max(self.nr_qubits, 1)
+        if self.level_of_detail( [ (bbox[2]-bbox[0])/nr_cols ], [ (bbox[3]-bbox[1])/nr_rows ] ) != self.lod:
+            self.render()
+        
+    def zoom_text(self):
+        '''Sets the font of all the text on the canvas to the font that belongs to the current zoom.'''
+        if not self.font:
+            self.build_font()
+        
+        size = int( round( abs(self.font.actual('size')) * self.zoom ) )
+        if size < self.ZOOM_MIN_FONT_SIZE:
+            self.canvas.itemconfigure('text', state=tk.HIDDEN)
+            return
+        
+        #Creating a font is expensive, so keep one per size
+        if size not in self.zoom_fonts:
+            self.zoom_fonts[size] = Font(family=self.font.actual('family'), size=size)
+        self.canvas.itemconfigure('text', font=self.zoom_fonts[size], state=tk.NORMAL)
+        
+    def drag_begin(self, event):
+        '''Starts panning the circuit
+        
+        Parameters
+        ----------
+        event : tkinter event
+            The <ButtonPress-1> event
+        '''
+        self.drag_start = (event.x, event.y)
+        self.drag_moved = False
+        
+    def drag_move(self, event):
+        '''Pans the circuit with the mouse
+        
+        Parameters
+        ----------
+        event : tkinter event
+            The <B1-Motion> event
+        '''
+        if self.drag_start is None:
+            return
+        dx, dy = event.x - self.drag_start[0], event.y - self.drag_start[1]
+        #Small movements are still considered to be a click
+        if not self.drag_moved and abs(dx) + abs(dy) < 4:
+            return
+        
+        self.drag_moved = True
+        self.drag_start = (event.x, event.y)
+        self.pan(dx, dy)
+        
+    def pan(self, dx, dy):
+        '''Moves the drawn circuit by (dx,dy) pixels, without re-rendering it
+        
+        Parameters
+        ----------
+        dx, dy : numbers
+            The distance in canvas coordinates
+        '''
+        self.view_x += dx
+        self.view_y += dy
+        self.canvas.move('all', dx, dy)
+        if self.on_view:
+            self.on_view()
+    
+    def viewport(self):
+        '''Returns the horizontal part of the drawn circuit that is visible on the canvas, as the fractions
+        (left, right) of its width'''
+        if self.layout_width <= 0:
+            return (0.0, 1.0)
+        total = self.layout_width * self.zoom
+        left = -self.view_x / total
+        right = left + max(int(self.canvas.winfo_width()), 1) / total
+        return ( min(max(left, 0.0), 1.0), min(max(right, 0.0), 1.0) )
+    
+    def center_on(self, fraction):
+        '''Pans the drawn circuit horizontally, such that a position in it ends up in the middle of the canvas
+        
+        Parameters
+        ----------
+        fraction : number
+            The position, as a fraction of the width of the drawn circuit
+        '''
+        if self.layout_width <= 0:
+            return
+        total = self.layout_width * self.zoom
+        self.pan(int(self.canvas.winfo_width())/2 - fraction*total - self.view_x, 0)
+        
+    def reset_view(self):
+        '''Resets the zoom and pan, and re-renders the circuit'''
+        self.zoom = 1.0
+        self.view_x = self.view_y = 0
+        if self.grid:
+            self.render()
         
     def build_font(self):
         '''Builds the font needed to render'''
@@ -285,8 +802,80 @@ class CircuitRender(object):
         else:
             raise ValueError(f'{self} build_font could not produce any font!')
         
-    def read(self,data, verbose=False):
-        '''Reads the <data> and builds the <self.grid>'''
+class CircuitModel(object):
+    '''CircuitModel keeps track of a parsed circuit, which can be drawn by one or more CircuitRenders'''
+    
+    #Possible statements, and the amount of arguments expected after the statement
+    POSS_STATEMENTS = CircuitRender.POSS_STATEMENTS
+    #Possible statements that have a variable amount of arguments, POSS_STATEMENTS then gives the minimum
+    POSS_STATEMENTS_EXCEPT = CircuitRender.POSS_STATEMENTS_EXCEPT
+    
+    #The numeric names of the qubits and classical bits: 'q3' or 'b4' for an arbitrary number without leading zeros,
+    #nothing more or less
+    NUMERIC_NAME = re.compile(r'([qb])(0|[1-9]\d*)')
+    #A symbolic angle such as {theta} at the end of a statement, which is filled in by a ParameterSweep
+    TRAILING_PARAMETER = re.compile(r'\{\s*[A-Za-z_]\w*\s*\}\s*$')
+    
+    #The noise channels of an 'error_model' statement: error_model channel, probability[, gate, gate, ...]
+    ERROR_MODEL_CHANNELS = ('depolarizing_channel', 'bit_flip_channel', 'phase_flip_channel', 'measurement_error')
+    
+    def __init__(self):
+        '''Initializes an empty CircuitModel, fill it through read(...)'''
+        
+        #Keep track of the amount of qubits in the circuit
+        self.nr_qubits = -1
+        #Keep track of the names of the qubits and classical bits, assigned through the 'map' command
+        #will always have len(...) = 2 * self.nr_qubits, set through the .read(...) method
+        self.channel_names = []
+        #Keep track of the row of every valid name: 'qN', 'bN' and the names assigned through 'map'
+        self.symbols = {}
+        
+        #Keep track of the entire grid that is updated in read(...). Each element represents a ROW
+        #Elements in self.grid are dictionaries, keys are COLUMNs, and values are GridElements.
+        self.grid = []
+        #Keep track of the total amount of columns, calculated by read(...)
+        self.max_col = -1
+        #Keep track of the occupied rows per column, self.col_rows[col] is a sorted list of the rows that have a
+        #GridElement in col. Calculated by read(...)
+        self.col_rows = []
+        
+        #Keep track of the subroutines in the data
+        self.subroutines = []
+        
+        #Keep track of the statements that are not drawn, but that matter to a simulator ('display', 'error_model'):
+        #dictionaries with the 'statement', the 'col' before which it is executed, and the index of the 'subroutine'
+        #that it is a part of (or None)
+        self.directives = []
+        
+        #Keep track of the noise of the 'error_model' statements: dictionaries with the 'channel', its 'probability'
+        #and the 'gates' that it applies to (an empty list for all gates)
+        self.error_models = []
+        
+        #Keep track of the problems that read(...) found in the code: dictionaries with the source 'line' (starting
+        #at 1), the 'col' and 'end' of the statement in that line, and a 'message'
+        self.diagnostics = []
+        
+        #Index of the gates by their source line, see find_source_index(): the sorted source lines, and per line the
+        #GridElements of one statement (all the participants of a gate, or all measurements of 'measure')
+        self.source_lines = []
+        self.source_gates = []
+
+        #If True, read(...) moves every gate to the earliest column in which all its rows are free
+        self.pack_columns = False
+        
+    def read(self,data, verbose=False, strict=False):
+        '''Reads the <data> and builds the <self.grid>
+        
+        Parameters
+        ----------
+        data : string
+            The code of the circuit
+        verbose = False : Boolean
+            Prints the progress of the parser
+        strict = False : Boolean
+            If True, raises a SyntaxWarning on the first bad statement. Otherwise, every bad statement is skipped and
+            recorded in self.diagnostics, such that the rest of the circuit can still be built.
+        '''
         if verbose: print('Running renderer')
         
         #We can only read lists/tuples of data, or multi-strings separated by \n statements
@@ -295,38 +884,60 @@ class CircuitRender(object):
             
         if isinstance(data,str):
             data = data.split('\n')
+        
+        #Keep track of where each line of data comes from: (index of the source line, column offset in that line),
+        #as a parallel line is split up into several lines of data
+        source = data
+        origins = [ (idx, 0) for idx in range(len(data)) ]
+        
+        #Keep track of all the problems in the code
+        self.diagnostics = []
             
         curr_row = 0
         
         #Let us first look for the amount of qubits, disregard rows previous to that
         if verbose: print('Finding nr of qubits...')
-        while True:
-            line = data[curr_row]
-            #Consider only that part of the line that is not a comment
-            if '#' in line:
-                line = line[0:line.index('#')]
-            
-            #If this line contains the 'qubits' statement, this is the row that we are looking for
-            if 'qubits' in line:
-                break
+        try:
+            while True:
+                if curr_row == len(data):
+                    raise ValueError('CircuitRender did not find "qubits"-line in code')
+                line = data[curr_row]
+                #Consider only that part of the line that is not a comment
+                if '#' in line:
+                    line = line[0:line.index('#')]
                 
-            curr_row += 1
-            if curr_row == len(data):
-                raise ValueError('CircuitRender did not find "qubits"-line in code')
-        if verbose: print(f'Found nr of qubits on line {curr_row+1}: {line}')
-            
-        if verbose: print('Setting up for line-by-line decoding...')
-        #Now, we know curr_row contains the "qubits" mark, let us see how many
-        self.nr_qubits = int(data[curr_row].split(' ')[1])
+                #If this line contains the 'qubits' statement, this is the row that we are looking for
+                if 'qubits' in line:
+                    break
+                    
+                curr_row += 1
+            if verbose: print(f'Found nr of qubits on line {curr_row+1}: {line}')
+                
+            if verbose: print('Setting up for line-by-line decoding...')
+            #Now, we know curr_row contains the "qubits" mark, let us see how many
+            self.nr_qubits = int(line.split()[1])
+        except (ValueError, IndexError) as e:
+            if strict:
+                raise
+            #Without the amount of qubits there is no circuit at all
+            self.diagnostics.append( {'line': min(curr_row, len(data)-1)+1, 'col': 0, \
+                                      'end': len(data[min(curr_row, len(data)-1)]), 'message': str(e)} )
+            self.nr_qubits = 0
         
         #Keep track of the 'map' possibilities
         self.channel_names = [None for _ in range(2*self.nr_qubits)]
         
+        #Build the symbol table with the numeric names, 'map' will add to it
+        self.symbols = { f'q{x}':x for x in range(self.nr_qubits) }
+        self.symbols.update( { f'b{x}':x+self.nr_qubits for x in range(self.nr_qubits) } )
+        
         #Initialize the grid for q0...qn and b0...bn
         self.grid = [ {} for _ in range(2*self.nr_qubits) ]
         
-        #Initalize the subroutines
+        #Initalize the subroutines, the directives and the noise
         self.subroutines = []
+        self.directives = []
+        self.error_models = []
         
         #Keep track of whether we are in a subroutine
         subroutine_name = None
@@ -334,8 +945,9 @@ class CircuitRender(object):
         subroutine_repeat = -1
         subroutine_start = -1
         
-        #Keep track of which column we are in the circuit
+        #Keep track of which column we are in the circuit, and the column of the last gate
         curr_col = 0
+        last_col = -1
         #If we have multiple gates in parallel, freeze the curr_col for the number of gates
         curr_col_parallel = -1
         
@@ -355,6 +967,19 @@ class CircuitRender(object):
                                      'end':curr_col, 'name':subroutine_name} )
             
             in_subroutine = False
+            
+        #Returns the source span (line starting at 1, col, end) of the statement in the current line of data
+        def statement_span():
+            source_row, offset = origins[curr_row]
+            statement = line.split('#')[0]
+            return (source_row+1, offset + len(statement)-len(statement.lstrip()), offset + len(statement.rstrip()))
+        
+        #Records a statement that is not drawn, but that a simulator needs
+        def add_directive(statement):
+            #An indented statement is still part of the current subroutine, which is not flushed yet
+            inside = in_subroutine and source[origins[curr_row][0]][0] == ' '
+            self.directives.append( {'statement': statement.strip(), 'col': curr_col, \
+                                     'subroutine': len(self.subroutines) if inside else None} )
         
         if verbose: print('Starting line-by-line examination...')
 
@@ -364,194 +989,227 @@ class CircuitRender(object):
             curr_row += 1
             line = data[curr_row]
             
-            if verbose: print(f'Analyzing row {curr_row} : {line}')
+            try:
+                if verbose: print(f'Analyzing row {curr_row} : {line}')
             
-            #Is this line a white line? Continue
-            if len(line.strip()) == 0:
-                if verbose: print('White Line! Continuing...')
-                continue
+                #Is this line a white line? Continue
+                if len(line.strip()) == 0:
+                    if verbose: print('White Line! Continuing...')
+                    continue
                 
-            #Consider only that part of the line that is not a comment
-            if '#' in line:
-                line, comment = line[0:line.index('#')] , line[line.index('#'):]
+                #Consider only that part of the line that is not a comment
+                if '#' in line:
+                    line, comment = line[0:line.index('#')] , line[line.index('#'):]
             
-                #If the entire line was a comment, UPDATE: comment might also be indented, so we make it line.lstrip()
-                if len(line.lstrip()) == 0:
-                    if verbose: print('Comment line! Continuing...')
-                    continue
-                if verbose: print(f'Found a comment on this line! Now only considering part <{line}>')
+                    #If the entire line was a comment, UPDATE: comment might also be indented, so we make it line.lstrip()
+                    if len(line.lstrip()) == 0:
+                        if verbose: print('Comment line! Continuing...')
+                        continue
+                    if verbose: print(f'Found a comment on this line! Now only considering part <{line}>')
             
-            #Exclude 'display' from the files
-            if 'display' in line:
-                if verbose: print('This is a <display> line! Continuing...')
-                continue
+                #Exclude 'display' from the files
+                if 'display' in line:
+                    if verbose: print('This is a <display> line! Continuing...')
+                    add_directive(line)
+                    continue
                 
-            #If this is multiple gates in parallel, which is given by a line like "h q0 | x q1 | toffoli q2,q3,q4"
-            if '|' in line:
-                if verbose: print('This is a parallel-do line! Splitting up the line...')
-                lines = line.split('|')
-                first = lines[0]
-                last = lines[-1]
-                #Remove the tokens '{' and '}' if they are present
-                if '{' in first:
-                    lines[0] = first[first.index('{')+1:]
-                if '}' in last:
-                    lines[-1] = last[:last.index('}')]
+                #If this is multiple gates in parallel, which is given by a line like "h q0 | x q1 | toffoli q2,q3,q4"
+                if '|' in line:
+                    if verbose: print('This is a parallel-do line! Splitting up the line...')
+                    lines = line.split('|')
+                    first = lines[0]
+                    last = lines[-1]
+                    #Find the position of every statement in the source line
+                    source_row, offset = origins[curr_row]
+                    offsets = []
+                    for subline in lines:
+                        offsets.append(offset)
+                        offset += len(subline)+1 #+1 for the '|' itself!
+                    
+                    #Remove the tokens '{' and '}' if they are present, but keep symbolic angles such as {theta}
+                    if first.lstrip().startswith('{'):
+                        lines[0] = first[first.index('{')+1:]
+                        offsets[0] += first.index('{')+1
+                    if '}' in last and not self.TRAILING_PARAMETER.search(last):
+                        lines[-1] = last[:last.rindex('}')]
                     
-                #Add this to the queue
-                data = data[:curr_row+1] + lines + data[curr_row+1:]
+                    #Add this to the queue
+                    data = data[:curr_row+1] + lines + data[curr_row+1:]
+                    origins = origins[:curr_row+1] + [(source_row, x) for x in offsets] + origins[curr_row+1:]
                 
-                #Continue, but freeze the column for the coming lines!
-                curr_col_parallel = len(lines)
+                    #Continue, but freeze the column for the coming lines!
+                    curr_col_parallel = len(lines)
                 
-                #Now, simply continue doing the routine for each statement
-                continue
+                    #Now, simply continue doing the routine for each statement
+                    continue
             
-            #Split the line into the required elements
-            elems = []
-            #If the line exists entirely of only one statement, such as 'measure'
-            if len(line.split()) == 1:
-                elems = [line.strip()]
-            else:
-                #Remove any starting spaces from the line
-                line_s = line.lstrip()
-                #split on the first space
-                elems.append( line_s[:line_s.index(' ')] )
-                #loop over the arguments and parse them correctly
-                elems += [arg.strip() for arg in line_s[line_s.index(' ')+1:].split(',') ]
-            #The command is case-insensitive
-            elems[0] = elems[0].lower()
+                #Split the line into the required elements
+                elems = []
+                #If the line exists entirely of only one statement, such as 'measure'
+                if len(line.split()) == 1:
+                    elems = [line.strip()]
+                else:
+                    #Remove any starting spaces from the line
+                    line_s = line.lstrip()
+                    #split on the first space
+                    elems.append( line_s[:line_s.index(' ')] )
+                    #loop over the arguments and parse them correctly
+                    elems += [arg.strip() for arg in line_s[line_s.index(' ')+1:].split(',') ]
+                #The command is case-insensitive
+                elems[0] = elems[0].lower()
                     
-            if verbose: print(f'Split line into parts: {elems}')
-            
-            #If this is the start of a subroutine
-            if '.' in elems[0]:
-                if verbose: print('This is a subroutine call!')
-                #If we were still in a subroutine, this is the end of it, and we need to write it
-                if in_subroutine:
-                    if verbose: print('Flushing the previous subroutine...')
-                    flush_subroutine()
+                if verbose: print(f'Split line into parts: {elems}')
+            
+                #If this is the start of a subroutine
+                if '.' in elems[0]:
+                    if verbose: print('This is a subroutine call!')
+                    #If we were still in a subroutine, this is the end of it, and we need to write it
+                    if in_subroutine:
+                        if verbose: print('Flushing the previous subroutine...')
+                        flush_subroutine()
                 
-                in_subroutine = True
-                subroutine_start = curr_col
+                    in_subroutine = True
+                    subroutine_start = curr_col
             
-                #If this subroutine has to be run multiple times, it is indicated by ".subroutine(nr_of_times)"
-                if '(' in line:
-                    subroutine_repeat = int( line[ line.index('(')+1:line.index(')') ] )
-                    subroutine_name = line[ line.index('.')+1:line.index('(') ].strip()
-                else:
-                    subroutine_repeat = 1
-                    subroutine_name = line[ line.index('.')+1: ].strip()
+                    #If this subroutine has to be run multiple times, it is indicated by ".subroutine(nr_of_times)"
+                    if '(' in line:
+                        subroutine_repeat = int( line[ line.index('(')+1:line.index(')') ] )
+                        subroutine_name = line[ line.index('.')+1:line.index('(') ].strip()
+                    else:
+                        subroutine_repeat = 1
+                        subroutine_name = line[ line.index('.')+1: ].strip()
 
-                #This line contains no more information
-                continue
+                    #This line contains no more information
+                    continue
                 
-            #If this is the end of a subroutine, which we can check because the line is not indented
-            if in_subroutine and line[0] != ' ':
-                if verbose: print('We were in a subroutine, but this line does not start with a space, so ending routine...')
-                flush_subroutine()
+                #If this is the end of a subroutine, which we can check because the source line is not indented
+                if in_subroutine and source[origins[curr_row][0]][0] != ' ':
+                    if verbose: print('We were in a subroutine, but this line does not start with a space, so ending routine...')
+                    flush_subroutine()
                 
-            #TODO : I have not implemented this, so I'll just skip it
-            if 'error_model' in line:
-                if verbose: print('This is an error_model line! Skipping...')
-                continue
+                #The noise is not drawn, but a NoisySimulator needs it
+                if 'error_model' in line:
+                    if verbose: print('This is an error_model line! Recording the noise...')
+                    self.error_models.append(self.parse_error_model(line))
+                    add_directive(line)
+                    continue
                 
-            #Check whether this is a valid command
-            if elems[0] not in self.POSS_STATEMENTS.keys():
-                raise SyntaxWarning(f'CircuitRenderer does not understand command {line}')
-        
-            #Check whether this has a valid amount of parameters
-            if (elems[0] not in self.POSS_STATEMENTS_EXCEPT and self.POSS_STATEMENTS[elems[0]] != len(elems)-1 )\
-                or (elems[0] in self.POSS_STATEMENTS_EXCEPT and self.POSS_STATEMENTS[elems[0]] > len(elems)-1):
-                raise SyntaxWarning(f'CircuitRenderer: this command has the incorrect amount of parameters: {line}')
-            
-            #Check whether this is a 'map' statement
-            if elems[0] == 'map':
-                if verbose: print('This is a mapping! Producing the map...')
-                target = elems[1]
-                #The target HAS to be either of the form 'q3' or 'b4' for an arbitrary number.
-                if 'q' in target:
-                    nr = int( target[ target.index('q')+1: ] )
-                elif 'b' in target:
-                    nr = int( target[ target.index('b')+1: ]) + self.nr_qubits
-                else:
-                    raise SyntaxWarning(f'CircuitRenderer: cannot map {target} because it is not a qubit or classical bit in line {line}')
-                self.channel_names[nr] = elems[2]
+                #Check whether this is a valid command
+                if elems[0] not in self.POSS_STATEMENTS.keys():
+                    raise SyntaxWarning(f'CircuitRenderer does not understand command {line}')
+        
+                #Check whether this has a valid amount of parameters
+                if (elems[0] not in self.POSS_STATEMENTS_EXCEPT and self.POSS_STATEMENTS[elems[0]] != len(elems)-1 )\
+                    or (elems[0] in self.POSS_STATEMENTS_EXCEPT and self.POSS_STATEMENTS[elems[0]] > len(elems)-1):
+                    raise SyntaxWarning(f'CircuitRenderer: this command has the incorrect amount of parameters: {line}')
+            
+                #Check whether this is a 'map' statement
+                if elems[0] == 'map':
+                    if verbose: print('This is a mapping! Producing the map...')
+                    target = elems[1]
+                    #The target HAS to be either of the form 'q3' or 'b4' for an arbitrary number.
+                    nr = self.numeric_row(target)
+                    if nr is None:
+                        raise SyntaxWarning(f'CircuitRenderer: cannot map {target} because it is not a qubit or classical bit in line {line}')
                 
-                #Don't update the column, but if this is parallel, keep track of it
-                if curr_col_parallel > 1:
-                    if verbose: print(f'This was a parallel operation, still {curr_col_parallel-1} to go!')
-                    curr_col_parallel -= 1
-                continue
+                    #The previous name of this channel is no longer valid, unless it is a numeric name itself
+                    old_name = self.channel_names[nr]
+                    if old_name is not None and self.symbols.get(old_name) == nr:
+                        del self.symbols[old_name]
+                        if self.numeric_row(old_name) is not None:
+                            self.symbols[old_name] = self.numeric_row(old_name)
+                    self.channel_names[nr] = elems[2]
+                    self.symbols[elems[2]] = nr
+                
+                    #Don't update the column, but if this is parallel, keep track of it
+                    if curr_col_parallel > 1:
+                        if verbose: print(f'This was a parallel operation, still {curr_col_parallel-1} to go!')
+                        curr_col_parallel -= 1
+                    continue
+            
+                #Now, we know that we have a valid <gate> statement. Let us implement this gate.
+                #One exception that does not have extra arguments:
+                span = statement_span()
+                if elems[0] == 'measure' and len(elems) == 1:
+                    if verbose: print('Doing a measurement on ALL the qubits...')
+                    #Set the qubits to 'measure'
+                    for x in range(self.nr_qubits):
+                        ge = GridElement(row=x, col=curr_col, gate='measure',\
+                                        participant_rows=[x,x+self.nr_qubits], source=span)
+                        self.grid[x][curr_col] = ge
+                    #Set the classical channels to 'measure'
+                    for x in range(self.nr_qubits,2*self.nr_qubits):
+                        ge = GridElement(row=x, col=curr_col, gate='measure',\
+                                         participant_rows=[x,x-self.nr_qubits], source=span)
+                        self.grid[x][curr_col] = ge
             
-            #Now, we know that we have a valid <gate> statement. Let us implement this gate.
-            #One exception that does not have extra arguments:
-            if elems[0] == 'measure' and len(elems) == 1:
-                if verbose: print('Doing a measurement on ALL the qubits...')
-                #Set the qubits to 'measure'
-                for x in range(self.nr_qubits):
-                    ge = GridElement(self.canvas, row=x, col=curr_col, gate='measure',\
-                                    participant_rows=[x,x+self.nr_qubits])
-                    self.grid[x][curr_col] = ge
-                #Set the classical channels to 'measure'
-                for x in range(self.nr_qubits,2*self.nr_qubits):
-                    ge = GridElement(self.canvas, row=x, col=curr_col, gate='measure',\
-                                     participant_rows=[x,x-self.nr_qubits])
-                    self.grid[x][curr_col] = ge
-            
-            #Check if this is a gate with classical info in it
-            if elems[0] in ('rx','ry','rz'):
-                if verbose: print('This is a gate with an angle! Recording the angle...')
-                #It is always an angle, and it is always the last element
-                angle = elems.pop()
+                #Check if this is a gate with classical info in it
+                if elems[0] in ('rx','ry','rz'):
+                    if verbose: print('This is a gate with an angle! Recording the angle...')
+                    #It is always an angle, and it is always the last element
+                    angle = elems.pop()
                 
-            #Let us find the row indices corresponding to the qubits involved
-            row_indices = []
-            for elem in elems[1:]:
-                if elem in self.channel_names: #this is a user-defined name through 'map'
-                    row_indices.append( self.channel_names.index(elem) )
-                elif re.search(r'q\d+',elem): #Check if this is of the form qx for some number x:
-                    row_indices.append( int( elem[ elem.index('q')+1 : ] ) )
-                elif re.search(r'b\d+',elem): #Check if this is of the form bx for some number x:
-                    row_indices.append( int( elem[ elem.index('b')+1 : ]) + self.nr_qubits )
-                else: 
-                    raise SyntaxWarning(f'CircuitRenderer: cant find qubit name: {elem} in line {line}')
-            if verbose: print(f'From elements {elems[1:]} we produced the row numbers {row_indices}')        
-            
-            #Check if this is an ambiguous gate, and check which situation we have
-            if elems[0] in ('cx','cz'):
-                #This is the classical-quantum situation 'cx b0,b1,q1' for example
-                if row_indices[0] >= self.nr_qubits:
-                    elems[0] = 'class_'+elems[0]
-                    if verbose: print(f'Found classical-qubit gate {elems[0]}')
-            
-            #Now, we have all participants captured in row_indices
-            if verbose: print('Producing the GridElements...')
-            for row in row_indices:
-                participant_rows = row_indices[:]
-                if elems[0] == 'measure':
-                    participant_rows.append(row+self.nr_qubits)
+                #Let us find the row indices corresponding to the qubits involved
+                row_indices = []
+                for elem in elems[1:]:
+                    #This is either of the form qx or bx for some number x, or a user-defined name through 'map'
+                    if elem in self.symbols:
+                        row_indices.append( self.symbols[elem] )
+                    else: 
+                        raise SyntaxWarning(f'CircuitRenderer: cant find qubit name: {elem} in line {line}')
+                if verbose: print(f'From elements {elems[1:]} we produced the row numbers {row_indices}')        
+            
+                #Check if this is an ambiguous gate, and check which situation we have
+                if elems[0] in ('cx','cz'):
+                    #This is the classical-quantum situation 'cx b0,b1,q1' for example
+                    if row_indices[0] >= self.nr_qubits:
+                        elems[0] = 'class_'+elems[0]
+                        if verbose: print(f'Found classical-qubit gate {elems[0]}')
+            
+                #Now, we have all participants captured in row_indices
+                if verbose: print('Producing the GridElements...')
+                for row in row_indices:
+                    participant_rows = row_indices[:]
+                    if elems[0] == 'measure':
+                        participant_rows.append(row+self.nr_qubits)
                     
-                ge = GridElement(self.canvas, row=row, col=curr_col, gate=elems[0],\
-                                 participant_rows=participant_rows)
-                self.grid[ row ][curr_col] = ge
+                    ge = GridElement(row=row, col=curr_col, gate=elems[0],\
+                                     participant_rows=participant_rows, source=span)
+                    self.grid[ row ][curr_col] = ge
                 
-                #If the operation corresponds to a measurement, also set the classical channels
-                if elems[0] == 'measure':
-                    ge = GridElement(self.canvas, row=row+self.nr_qubits, col=curr_col, gate='measure',\
-                                    participant_rows = participant_rows)
-                    self.grid[row+self.nr_qubits][curr_col] = ge
-            
-            if not angle is None:
-                ge.angle = angle
-                angle = None
+                    #If the operation corresponds to a measurement, also set the classical channels
+                    if elems[0] == 'measure':
+                        ge = GridElement(row=row+self.nr_qubits, col=curr_col, gate='measure',\
+                                        participant_rows = participant_rows, source=span)
+                        self.grid[row+self.nr_qubits][curr_col] = ge
             
-            #Update the column of the circuit, but only if it wasn't a parallel-gates style!
-            if curr_col_parallel <= 1:
-                curr_col += 1
-            else:
-                if verbose: print(f'This was a parallel operation, still {curr_col_parallel-1} to go!')
-                curr_col_parallel -= 1
+                if not angle is None:
+                    ge.angle = angle
+                    angle = None
+                last_col = curr_col
+            
+                #Update the column of the circuit, but only if it wasn't a parallel-gates style!
+                if curr_col_parallel <= 1:
+                    curr_col += 1
+                else:
+                    if verbose: print(f'This was a parallel operation, still {curr_col_parallel-1} to go!')
+                    curr_col_parallel -= 1
+            except (SyntaxWarning, ValueError, IndexError) as e:
+                if strict:
+                    raise
+                
+                #Record the problem, and recover by simply skipping this statement
+                if verbose: print(f'Skipping this statement: {e}')
+                source_line, col, end = statement_span()
+                self.diagnostics.append( {'line': source_line, 'col': col, 'end': end, 'message': str(e)} )
+                angle = None
+                
+                #Keep the columns in order: a parallel block still has to end up in one single column
+                if curr_col_parallel > 1:
+                    curr_col_parallel -= 1
+                elif last_col == curr_col:
+                    curr_col += 1
+                    
         #if we ended with a subroutine, we still need to flush it
         if in_subroutine:
             flush_subroutine()
@@ -560,7 +1218,242 @@ class CircuitRender(object):
         
         #Set up the maximum nr of columns
         self.max_col = curr_col
+
+        #Shrink the circuit width if the user wants to
+        if self.pack_columns:
+            if verbose: print('Packing the columns...')
+            self.pack()
+            
+        self.find_col_rows()
+        self.find_source_index()
+        
+    def operations(self):
+        '''Returns the gates of the circuit in the order in which they are executed, with the repeats of the
+        subroutines unrolled.
+        
+        Output
+        ------
+        List of (gate, rows, angle) tuples, where rows are the participant rows in the order of the statement. A
+        measurement gives one ('measure', [row], None) per measured qubit.
+        '''
+        #The columns in order of execution
+        repeats = { subroutine['start']: subroutine for subroutine in self.subroutines \
+                    if subroutine['repeat'] > 1 and subroutine['end'] > subroutine['start'] }
+        columns = []
+        col = 0
+        while col <= self.max_col:
+            if col in repeats:
+                subroutine = repeats[col]
+                columns += list(range(subroutine['start'], subroutine['end'])) * subroutine['repeat']
+                col = subroutine['end']
+            else:
+                columns.append(col)
+                col += 1
+        
+        col_operations = { col: self.column_operations(col) for col in set(columns) }
+        return [operation for col in columns for operation in col_operations[col]]
+    
+    def column_operations(self, col):
+        '''Returns the gates in one column, as (gate, rows, angle) tuples, see operations()
         
+        Parameters
+        ----------
+        col : integer
+            The column
+        '''
+        #Every participant of a gate has its own GridElement, so keep one per gate
+        operations = []
+        seen = set()
+        for row in self.col_rows[col] if col < len(self.col_rows) else []:
+            ge = self.grid[row][col]
+            if ge.gate == 'measure':
+                if row < self.nr_qubits:
+                    operations.append( ('measure', [row], None) )
+                continue
+            key = (ge.gate, tuple(ge.participant_rows), ge.angle)
+            if key not in seen:
+                seen.add(key)
+                operations.append( (ge.gate, list(ge.participant_rows), ge.angle) )
+        return operations
+    
+    def get_state(self):
+        '''Returns the parsed circuit as plain lists and dictionaries, such that it can be stored (see ParseCache)
+        and restored with set_state(...) without parsing the code again'''
+        elements = [ [ge.row, ge.col, ge.gate, ge.participant_rows, ge.angle, ge.source] \
+                     for grid_row in self.grid for ge in grid_row.values() ]
+        return {'nr_qubits': self.nr_qubits, 'channel_names': self.channel_names, 'symbols': self.symbols, \
+                'max_col': self.max_col, 'elements': elements, 'subroutines': self.subroutines, \
+                'directives': self.directives, 'error_models': self.error_models, 'diagnostics': self.diagnostics, \
+                'pack_columns': self.pack_columns}
+    
+    def set_state(self, state):
+        '''Restores a parsed circuit that was produced by get_state()
+        
+        Parameters
+        ----------
+        state : dictionary
+            The output of get_state()
+        '''
+        self.nr_qubits = state['nr_qubits']
+        self.channel_names = list(state['channel_names'])
+        self.symbols = dict(state['symbols'])
+        self.max_col = state['max_col']
+        self.subroutines = [ dict(subroutine) for subroutine in state['subroutines'] ]
+        self.directives = [ dict(directive) for directive in state['directives'] ]
+        self.error_models = [ dict(error_model) for error_model in state['error_models'] ]
+        self.diagnostics = [ dict(diagnostic) for diagnostic in state['diagnostics'] ]
+        self.pack_columns = state['pack_columns']
+        
+        self.grid = [ {} for _ in range(2*self.nr_qubits) ]
+        for row, col, gate, participant_rows, angle, source in state['elements']:
+            self.grid[row][col] = GridElement(row=row, col=col, gate=gate, participant_rows=list(participant_rows), \
+                                              angle=angle, source=tuple(source) if source else None)
+        self.find_col_rows()
+        self.find_source_index()
+    
+    def parse_error_model(self, line):
+        '''Returns the noise of an 'error_model' statement, raises a SyntaxWarning if the statement is invalid
+        
+        Parameters
+        ----------
+        line : string
+            The statement, such as "error_model depolarizing_channel, 0.001" or
+            "error_model depolarizing_channel, 0.01, cnot, toffoli" for the two-qubit and three-qubit gates only
+        
+        Output
+        ------
+        Dictionary with the 'channel', its 'probability' and the 'gates' that it applies to (empty for all gates)
+        '''
+        arguments = [argument.strip() for argument in line.strip()[len('error_model'):].split(',')]
+        if len(arguments) < 2 or arguments[0] not in self.ERROR_MODEL_CHANNELS:
+            raise SyntaxWarning(f'CircuitRenderer expects error_model channel, probability[, gates] with a channel in ' + \
+                                f'{", ".join(self.ERROR_MODEL_CHANNELS)}, not {line.strip()}')
+        try:
+            probability = float(arguments[1])
+        except ValueError:
+            raise SyntaxWarning(f'CircuitRenderer does not understand the probability {arguments[1]} of {line.strip()}')
+        if not 0 <= probability <= 1:
+            raise SyntaxWarning(f'CircuitRenderer needs a probability between 0 and 1 in {line.strip()}')
+        gates = arguments[2:]
+        for gate in gates:
+            if gate not in self.POSS_STATEMENTS:
+                raise SyntaxWarning(f'CircuitRenderer does not know the gate {gate} of {line.strip()}')
+        return {'channel': arguments[0], 'probability': probability, 'gates': gates}
+    
+    def numeric_row(self, name):
+        '''Returns the row of a numeric name such as 'q3' or 'b4', or None if name is not a valid numeric name
+        
+        Parameters
+        ----------
+        name : string
+            The name of a qubit or classical bit
+        '''
+        match = self.NUMERIC_NAME.fullmatch(name)
+        if not match or int(match.group(2)) >= self.nr_qubits:
+            return None
+        return int(match.group(2)) + (self.nr_qubits if match.group(1) == 'b' else 0)
+    
+    def find_col_rows(self):
+        '''Finds the sorted list of occupied rows for every column, and stores it in self.col_rows'''
+        self.col_rows = [ [] for _ in range(self.max_col+1) ]
+        #Looping over the rows in order keeps every list sorted
+        for row, grid_row in enumerate(self.grid):
+            for col in grid_row.keys():
+                self.col_rows[col].append(row)
+
+    def find_source_index(self):
+        '''Groups the GridElements per statement, and sorts the statements by their source line. Stores the result in
+        self.source_lines and self.source_gates, which gates_at(...) searches.'''
+        gates = {}
+        for grid_row in self.grid:
+            for ge in grid_row.values():
+                if ge.source:
+                    gates.setdefault(ge.source, []).append(ge)
+        spans = sorted(gates)
+        self.source_lines = [span[0] for span in spans]
+        self.source_gates = [gates[span] for span in spans]
+    
+    def gates_at(self, line, col=None):
+        '''Returns the gates of a source line: one list of GridElements per statement. Found through a binary search.
+        
+        Parameters
+        ----------
+        line : integer
+            The source line, starting at 1
+        col = None : integer
+            A position in the line. If it lies within some statements of a parallel line, only those are returned.
+        '''
+        first = bisect.bisect_left(self.source_lines, line)
+        last = bisect.bisect_right(self.source_lines, line)
+        gates = self.source_gates[first:last]
+        if col is not None:
+            inside = [gate for gate in gates if gate[0].source[1] <= col <= gate[0].source[2]]
+            if inside:
+                return inside
+        return gates
+    
+    def pack(self):
+        '''Schedules every gate in self.grid as soon as possible, i.e. in the earliest column in which all the
+        rows it spans are free. The order of gates that share a row is kept, subroutines stay in their own columns.'''
+
+        nr_rows = 2*self.nr_qubits
+
+        #A gate blocks every row between its topmost and bottommost participant, as its vertical wire is drawn
+        #through them. frontier[row] is the first column in which row is free again.
+        frontier = [0] * nr_rows
+        #Gates can never be moved to a column before the barrier, which is raised at every subroutine boundary and
+        #at every directive (such as 'display'), as the order of the gates around those matters to a simulator
+        barrier = 0
+
+        #Find the columns at which a subroutine starts or ends, or a directive is executed
+        boundaries = {}
+        for subroutine in self.subroutines:
+            boundaries.setdefault(subroutine['start'], []).append( (subroutine, 'start') )
+            boundaries.setdefault(subroutine['end'], []).append( (subroutine, 'end') )
+        for directive in self.directives:
+            boundaries.setdefault(directive['col'], []).append( (directive, 'col') )
+
+        new_grid = [ {} for _ in range(nr_rows) ]
+
+        #Note the inclusive max_col: the last subroutine might end there.
+        for col in range(self.max_col+1):
+            #Nothing may cross a boundary, so the boundary lies after everything scheduled so far
+            if col in boundaries:
+                barrier = max([barrier] + frontier)
+                for boundary, key in boundaries[col]:
+                    boundary[key] = barrier
+
+            #Group the GridElements of this column into gates. Elements of the same gate with overlapping spans
+            #(such as the measure of all qubits) stay together in one column.
+            spans = []
+            for row in range(nr_rows):
+                if col in self.grid[row].keys():
+                    ge = self.grid[row][col]
+                    spans.append( [min(ge.participant_rows), max(ge.participant_rows), ge.gate, [ge]] )
+            spans.sort(key=lambda span: span[0])
+
+            groups = []
+            for span in spans:
+                for group in groups:
+                    if group[2] == span[2] and span[0] <= group[1] and group[0] <= span[1]:
+                        group[0], group[1] = min(group[0], span[0]), max(group[1], span[1])
+                        group[3] += span[3]
+                        break
+                else:
+                    groups.append(span)
+
+            #Place every group in the earliest column where all its rows are free
+            for first_row, last_row, _, elems in groups:
+                new_col = max( [barrier] + frontier[first_row:last_row+1] )
+                for row in range(first_row, last_row+1):
+                    frontier[row] = new_col + 1
+                for ge in elems:
+                    ge.col = new_col
+                    new_grid[ge.row][new_col] = ge
+
+        self.grid = new_grid
+        self.max_col = max([barrier] + frontier)
+
 class GridElement(object):
     '''GridElement keeps track of a Circuit-element in a specific grid location'''
     
@@ -576,76 +1469,83 @@ class GridElement(object):
     CLASSICAL_QUBIT_SIGNS = { 'class_cx':('circ','x'),'c-x':('circ','x'),\
                              'class_cz':('circ','z'), 'c-z':('circ','z')}
 
-    def __init__(self, canvas, row=0, col=0, gate=None, participant_rows = None, angle=None):
-        self.canvas = canvas
+    def __init__(self, row=0, col=0, gate=None, participant_rows = None, angle=None, source=None):
         self.row = row
         self.col = col
         self.participant_rows = participant_rows if participant_rows else [self.row]
         self.angle = angle
+        self.gate = gate
+        #The position of the statement in the code: (line starting at 1, col, end), shared by all participants
+        self.source = source
         
-        self.canvas_elem = None
-        if gate:
-            self.set_gate(gate)
+        #Keep track of the CanvasElem that draws us, one per canvas, as a GridElement can be drawn on several canvases
+        self.canvas_elems = {}
         
     def set_gate(self,gate):
         self.gate = gate
+        self.canvas_elems = {}
+        
+    def get_canvas_elem(self, canvas, font=None):
+        '''Returns the CanvasElem that draws this GridElement on canvas, and creates it if it does not exist yet.
+        
+        Parameters
+        ----------
+        canvas : tk.Canvas
+            The canvas on which the GridElement is drawn
+        font = None : tkinter.font.Font
+            The font of the CanvasElem if it has to be created. If None, the CanvasElem creates its own font.
+        '''
+        if canvas in self.canvas_elems:
+            return self.canvas_elems[canvas]
+        
         #If the gate is a standard one-qubit gate, draw it as a square
         if self.gate in self.GATE_MASKS.keys():
             #Unless this is a measurement gate, and this is the classical part
             if self.gate == 'measure' and self.row == max(self.participant_rows):
-                self.canvas_elem = CanvasElem(self.canvas, gate=self.gate, special_node = 'circ')
+                canvas_elem = CanvasElem(canvas, gate=self.gate, font=font, special_node = 'circ')
             else:
-                self.canvas_elem = CanvasElem(self.canvas, gate=self.gate, aspect=(1,1) )
+                canvas_elem = CanvasElem(canvas, gate=self.gate, font=font, aspect=(1,1) )
         
         #If the gate is a multi-qubit gate, find out which element we are, and pass this along
         elif self.gate in self.MULTI_QUBIT_SIGNS.keys():
             idx = self.participant_rows.index(self.row)
-            self.canvas_elem = CanvasElem(self.canvas, gate=self.gate, \
-                                          special_node = self.MULTI_QUBIT_SIGNS[self.gate][idx])
+            canvas_elem = CanvasElem(canvas, gate=self.gate, font=font, \
+                                     special_node = self.MULTI_QUBIT_SIGNS[self.gate][idx])
         #If the gate is a classical-qubit gate
         elif self.gate in self.CLASSICAL_QUBIT_SIGNS.keys():
             #Simple trick: there's always only one quantum channel involved, and this must be the smallest!
             if self.row == min(self.participant_rows): #we are the quantum channel involved
                 gate = self.CLASSICAL_QUBIT_SIGNS[self.gate][-1]
-                self.canvas_elem = CanvasElem(self.canvas, gate=gate, aspect=(1,1))
+                canvas_elem = CanvasElem(canvas, gate=gate, font=font, aspect=(1,1))
             else:
                 node = self.CLASSICAL_QUBIT_SIGNS[self.gate][0]
-                self.canvas_elem = CanvasElem(self.canvas, gate=self.gate,\
-                                             special_node = node)
+                canvas_elem = CanvasElem(canvas, gate=self.gate, font=font, special_node = node)
         
         else:
-            self.canvas_elem = CanvasElem(self.canvas, gate=self.gate)
-            
-    def set_bbox(self,bbox):
-        if not self.canvas_elem:
-            raise ValueError(f'{self.__str__()} has no canvas_elem and thus cannot set bbox')
+            canvas_elem = CanvasElem(canvas, gate=self.gate, font=font)
+        
+        self.canvas_elems[canvas] = canvas_elem
+        return canvas_elem
             
-        self.canvas_elem.set_bbox(bbox)
+    def set_bbox(self, canvas, bbox):
+        canvas_elem = self.get_canvas_elem(canvas)
+        canvas_elem.set_bbox(bbox)
         #Automatically also reset the draw coords
-        self.set_draw_coords()
-        
-    def set_draw_coords(self):
-        if not self.canvas_elem:
-            raise ValueError(f'{self.__str__()} has no canvas_elem and thus cannot set draw coords')
-        self.canvas_elem.find_draw_coords()
+        canvas_elem.find_draw_coords()
         
-    def draw(self):
-        if not self.canvas_elem:
-            raise ValueError(f'{self.__str__()} has no canvas_elem and thus cannot draw')
-        
-        self.canvas_elem.draw()
-            
-    def get_min_dims(self):
-        if not self.canvas_elem:
-            raise ValueError(f'{self.__str__()} has no canvas_elem to get min dimensions from')
-            
-        return (self.canvas_elem.min_w, self.canvas_elem.min_h)
+    def draw(self, canvas, lod=0):
+        self.get_canvas_elem(canvas).draw(lod=lod)
     
-    def get_attachments(self):
-        if not self.canvas_elem:
-            raise ValueError(f'{self.__str__()} has no canvas_elem to get attachments from')
+    def get_items(self, canvas):
+        '''Returns the ids of the canvas items that were drawn for this GridElement on canvas'''
+        return self.get_canvas_elem(canvas).items()
             
-        return self.canvas_elem.attachments
+    def get_min_dims(self, canvas, font=None):
+        canvas_elem = self.get_canvas_elem(canvas, font)
+        return (canvas_elem.min_w, canvas_elem.min_h)
+    
+    def get_attachments(self, canvas):
+        return self.get_canvas_elem(canvas).attachments
         
     def __str__(self):
         return f'G.E.(row={self.row},col={self.col},gate={self.gate},part={self.participant_rows}' +\
@@ -675,8 +1575,15 @@ class CanvasElem(object):
     #Determine the margins around the gates.
     MARGINS = (0,0) #(5,5)
     
+    #Levels of detail: everything, plain filled rectangles, or spans of merged gates (drawn by the CircuitRender)
+    LOD_FULL = 0
+    LOD_BOX = 1
+    LOD_SPAN = 2
+    #The fill colour of the simplified gates
+    LOD_FILL = 'gray30'
+    
     def __init__(self, canvas, gate=None, aspect = (-1,-1), bbox=None, font_dict=None,\
-                 special_node = None, draw_rect = True):
+                 special_node = None, draw_rect = True, font=None):
         self.canvas = canvas
         
         self.aspect = aspect
@@ -699,11 +1606,11 @@ class CanvasElem(object):
         
         #Keep track of the text within the rectangle
         self.text = None
-        #Set the font
-        self.font = None
-        if font_dict:
+        #Set the font, if we have not been handed one
+        self.font = font
+        if self.font is None and font_dict:
             self.font = Font(family=font_dict['family'], size=font_dict['size'])
-        else:
+        elif self.font is None:
             for font_dict in self.STD_FONTS:
                 try:
                     self.font = Font(family=font_dict['family'],size=font_dict['size'])
@@ -795,10 +1702,33 @@ class CanvasElem(object):
         self.attachments['bottom'] = self.draw_y + self.draw_h
 
         
-    def draw(self):
-        '''Draws the element on the canvas'''
+    def draw(self, lod=0):
+        '''Draws the element on the canvas
+        
+        Parameters
+        ----------
+        lod = 0 : integer
+            The level of detail, either LOD_FULL or LOD_BOX. The latter draws a plain filled rectangle without text.
+        '''
         #First, find the coords at which we should draw.
         self.find_draw_coords()
+        #Forget the items of a previous drawing, they have been deleted from the canvas
+        self.rect_canvas = None
+        self.text_canvas = None
+        self.specials_canvas = []
+        
+        #If we are zoomed out, draw a plain rectangle: text, measurement arcs and special nodes are unreadable anyway
+        if lod >= self.LOD_BOX:
+            if self.special_node:
+                mid_x = self.bbox['x'] + self.bbox['w']/2
+                mid_y = self.bbox['y'] + self.bbox['h']/2
+                r = min( self.RADII[self.special_node], self.bbox['w']/2, self.bbox['h']/2 )
+                self.specials_canvas.append( self.canvas.create_rectangle(mid_x-r, mid_y-r, mid_x+r, mid_y+r,\
+                                                                           fill=self.LOD_FILL, width=0) )
+            elif self.draw_rect:
+                self.rect_canvas = self.canvas.create_rectangle(self.draw_x,self.draw_y,\
+                                        self.draw_x+self.draw_w,self.draw_y+self.draw_h,fill=self.LOD_FILL,width=0)
+            return
         
         #If we are a normal node:
         if self.special_node is None:
@@ -813,7 +1743,7 @@ class CanvasElem(object):
             #If we have text:
             elif self.text:
                 self.text_canvas = self.canvas.create_text(self.text_x,self.text_y,font=self.font, justify=tk.CENTER,\
-                                                          text=self.text)
+                                                          text=self.text, tags=('text',))
         
         else: #We are special: we need to draw either a circ, an oplus or a cross
             def node(xy, r, circ=False, fill=False, plus=False, cross=False):
@@ -838,6 +1768,11 @@ class CanvasElem(object):
             else:
                 self.specials_canvas += node((mid_x,mid_y), self.RADII['cross'], cross=True)
                 
+    def items(self):
+        '''Returns the ids of the canvas items of the last drawing'''
+        items = [item for item in (self.rect_canvas, self.text_canvas) if item is not None]
+        return items + list(self.specials_canvas)
+    
     def draw_measurement(self):
         '''Draws a measurement device'''
         mid_x = int(self.draw_x + self.draw_w/2)
@@ -0,0 +1,93 @@
+import tkinter as tk
+
+from CircuitRender2 import CircuitRender
+
+class CircuitWindow(object):
+    '''CircuitWindow: a separate window that renders the circuit of the TextEditor. All CircuitWindows draw the
+    same CircuitModel as the docked circuit canvas, but each one has its own viewport and zoom.'''
+    
+    TITLE = 'Circuit Window'
+    
+    def __init__(self, texteditor, model):
+        '''Initializes the CircuitWindow.
+        
+        Parameters
+        ----------
+        texteditor : TextEditor
+            The TextEditor that this CircuitWindow is a part of
+        model : CircuitModel
+            The parsed circuit that this CircuitWindow draws, shared with the TextEditor
+        '''
+        
+        self.texteditor = texteditor
+        
+        self.window = tk.Toplevel(texteditor.root)
+        self.window.title(self.TITLE)
+        #Delay the setting of the geometry, as the geometry of the root might not yet be updated.
+        self.window.after(100, lambda : self.window.geometry(texteditor.root.winfo_geometry()) )
+        
+        self.canvas = tk.Canvas(self.window, background='white')
+        self.canvas.pack(fill=tk.BOTH, expand=1)
+        
+        self.circuit_builder = CircuitRender(self.canvas, model)
+        self.circuit_builder.enable_navigation()
+        
+        #Keep track of the scheduled re-render after a resize
+        self.resize_id = None
+        self.fullscreen = False
+        
+        #Set up the event handling
+        self.setup_event_handling()
+        
+    def setup_event_handling(self):
+        '''Sets up all the event handling that this CircuitWindow does.'''
+        self.canvas.bind('<Configure>', self.canvas_resize)
+        self.window.bind('<F11>', self.toggle_fullscreen)
+        self.window.bind('<Escape>', lambda e: self.fullscreen and self.toggle_fullscreen())
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
+    def canvas_resize(self, *args):
+        '''Event handler that is called when the canvas gets resized, re-renders once the resizing stops.
+                
+        Parameters
+        ----------
+        *args : object
+            Specifically added such that event handler that automatically pass along an event object can call this function
+        '''
+        if not self.texteditor.circuit_resize_render.get():
+            return
+        
+        if self.resize_id is not None:
+            self.canvas.after_cancel(self.resize_id)
+        self.resize_id = self.canvas.after(int(self.texteditor.RENDER_TIME_INTERVAL*1000), self.render)
+        
+    def render(self):
+        '''Renders the shared circuit on our own canvas'''
+        self.resize_id = None
+        #Nothing has been parsed yet
+        if not self.circuit_builder.grid:
+            return
+        #The TextEditor already reports the errors of the circuit itself, so a failed render of this window only shows
+        #in its title instead of popping up on every resize
+        try:
+            self.circuit_builder.render()
+        except (ValueError, tk.TclError) as e:
+            self.window.title(f'{self.TITLE} - cannot render: {e}')
+            return
+        self.window.title(self.TITLE)
+        
+    def toggle_fullscreen(self, *args):
+        '''Toggles the fullscreen mode of this window, useful for a render on a second monitor
+        
+        Parameters
+        ----------
+        *args : object
+            Specifically added such that event handler that automatically pass along an event object can call this function
+        '''
+        self.fullscreen = not self.fullscreen
+        self.window.attributes('-fullscreen', self.fullscreen)
+        
+    def close(self):
+        '''Closes this CircuitWindow.'''
+        self.texteditor.circuit_window_closed(self)
+        self.window.destroy()
@@ -1,3 +1,4 @@
+import difflib
 import tkinter as tk
 from tkinter import messagebox
 from tkinter import filedialog
@@ -13,7 +14,7 @@ class FileEditor(object):
     HIGHLIGHT_KEYWORDS=  ('h','x','y','z', 'rx','ry','rz','s','ph', 't','tdag', 'cnot', 'cx', 'c-x', 'toffoli',\
                           'prepz', 'measure','not','swap','cphase','cz','c-z','cr','map')
     
-    def __init__(self, texteditor, paned_window, column, filename = None, file = None):
+    def __init__(self, texteditor, paned_window, column, filename = None, file = None, deferred = False):
         '''Initializes the FileEditor. 
         
         Parameters
@@ -28,6 +29,9 @@ class FileEditor(object):
             The path to the file that this FileEditor displays
         file = None : File
             The file that this FileEditor will display
+        deferred = False : Boolean
+            If True, this FileEditor is only a placeholder for filename, which is read as soon as load_from_disk()
+            or ensure_loaded() is called.
         '''
         
         self.texteditor = texteditor
@@ -36,6 +40,24 @@ class FileEditor(object):
         self.filename = filename
         self.short_filename = None
         
+        #Keep track of the problems that the circuit parser found, per source line
+        self.diagnostics = {}
+        
+        #The output of the last Simulator run of this file
+        self.run_output = None
+        
+        #Keep track of whether the contents of the file have been read already
+        self.loaded = not deferred
+        
+        #The contents of the file as they were last read from or written to disk, see reload_from_disk()
+        self.disk_text = None
+        
+        #The text as it was read from disk, its path and content hash, and the ParseCache entry that belongs to it
+        self.cache_text = None
+        self.cache_path = None
+        self.cache_hash = None
+        self.cache_entry = None
+        
         #Further initialize
         self.init(file=file)
         
@@ -64,11 +86,16 @@ class FileEditor(object):
         self.runbutton = ttk.Button(self.frame, text='Run', command=self.run_file)
         self.runbutton.grid(row=0,column=2, sticky='nesw')
         
+        #The estimated memory and runtime of a run, see ResourceEstimator
+        self.estimate = tk.StringVar()
+        self.estimatelabel = ttk.Label(self.frame, textvariable = self.estimate, borderwidth=2)
+        self.estimatelabel.grid(row=0,column=3, sticky='nesw')
+        
         self.buildbutton = ttk.Button(self.frame, text='Build', command=lambda: self.build_circuit(suppress=False))
-        self.buildbutton.grid(row=0,column=3, sticky='nesw')
+        self.buildbutton.grid(row=0,column=4, sticky='nesw')
         
         self.txtarea = tkst.ScrolledText( master=self.frame, wrap = 'none', font=self.TEXT_FONT, state='normal', relief=tk.GROOVE )
-        self.txtarea.grid(row=1,column=0, columnspan=4, sticky='nesw')
+        self.txtarea.grid(row=1,column=0, columnspan=5, sticky='nesw')
         
         #Set title to filename if available
         if self.filename:
@@ -78,18 +105,186 @@ class FileEditor(object):
             
         #Set highlighter tag configs
         self.highlighter_set_configs()
+        
+        #A placeholder cannot be edited until its file has been read
+        if not self.loaded:
+            self.title.set(f'{self.short_filename} (loading...)')
+            self.txtarea.configure(state='disabled')
             
         #Read file if available
         if file:
-            try:
-                for line in file:
-                    self.txtarea.insert(tk.END, line)
-            except Exception as e:
-                messagebox.showerror('Exception', e)
-                return
-            self.highlighter(all_=True)
+            self.load(file)
             
         self.frame_configure()
+        
+    def load(self, file):
+        '''Reads the file into the text area, and highlights it.
+        
+        Parameters
+        ----------
+        file : File
+            The file that this FileEditor will read and display.
+        '''
+        self.txtarea.configure(state='normal')
+        self.loaded = True
+        if self.short_filename:
+            self.title.set(self.short_filename)
+        
+        try:
+            content = file.read()
+        except Exception as e:
+            messagebox.showerror('Exception', e)
+            return
+        finally:
+            file.close()
+        self.txtarea.insert(tk.END, content)
+        self.txtarea.edit_modified(False)
+        self.disk_text = content
+        
+        #An unchanged file that was opened before does not have to be tokenized again
+        parse_cache = self.texteditor.parse_cache
+        if parse_cache is not None and self.filename:
+            self.cache_text = self.txtarea.get('1.0', tk.END)
+            self.cache_path = self.filename
+            self.cache_hash = parse_cache.content_hash(content)
+            self.cache_entry = parse_cache.get(self.filename, self.cache_hash)
+            
+        if self.cache_entry and self.cache_entry['tokens'] is not None:
+            self.apply_tokens(1, self.cache_entry['tokens'])
+        else:
+            tokens = self.tokenize(self.txtarea.get('1.0', 'end-1c'))
+            self.apply_tokens(1, tokens)
+            if self.cache_text is not None:
+                self.cache_entry = {'tokens': tokens, 'model': None}
+                parse_cache.put(self.cache_path, self.cache_hash, tokens=tokens)
+        
+    def load_from_disk(self):
+        '''Reads the file of a placeholder FileEditor from disk. Does nothing if it has been read already.'''
+        if self.loaded:
+            return
+        
+        try:
+            file = open(self.filename, 'r')
+        except Exception as e:
+            #Keep the error visible in the editor itself, we might be loading in the background
+            self.txtarea.configure(state='normal')
+            self.loaded = True
+            self.title.set(f'{self.short_filename} (could not load)')
+            self.txtarea.insert(tk.END, f'# Could not load {self.filename}: {e}\n')
+            return
+        self.load(file)
+        
+    def reload_from_disk(self):
+        '''Reads the file again after another program changed it, and replaces only the lines that changed. Asks
+        first if the text has unsaved changes.
+        
+        Output
+        ------
+        True if the text changed
+        '''
+        try:
+            with open(self.filename, 'r') as file:
+                content = file.read()
+        except OSError:
+            return False
+        #Nothing new, such as after our own save
+        if content == self.disk_text:
+            return False
+        self.disk_text = content
+        
+        if self.txtarea.edit_modified() and not messagebox.askyesno('File changed on disk', \
+                f'{self.short_filename} was changed by another program. Reload it, and lose your unsaved changes?'):
+            return False
+        
+        ranges = self.apply_text(content)
+        self.txtarea.edit_modified(False)
+        
+        #The ParseCache entry of the new contents, if they were opened before
+        parse_cache = self.texteditor.parse_cache
+        if parse_cache is not None:
+            self.cache_text = self.txtarea.get('1.0', tk.END)
+            self.cache_path = self.filename
+            self.cache_hash = parse_cache.content_hash(content)
+            self.cache_entry = parse_cache.get(self.filename, self.cache_hash)
+        return len(ranges) > 0
+        
+    @staticmethod
+    def split_lines(text):
+        '''Splits text into lines that keep their newline, such that joining them gives the text again'''
+        lines = text.split('\n')
+        return [line + '\n' for line in lines[:-1]] + ([lines[-1]] if lines[-1] else [])
+        
+    def apply_text(self, content):
+        '''Changes the text into content, by only replacing the line ranges that differ. Only those are highlighted
+        again, the tags of the other lines move along with their text.
+        
+        Parameters
+        ----------
+        content : string
+            The new text
+        
+        Output
+        ------
+        List of the (first, last) rows of the replaced ranges in the new text, starting at 1
+        '''
+        old = self.split_lines(self.txtarea.get('1.0', 'end-1c'))
+        new = self.split_lines(content)
+        opcodes = difflib.SequenceMatcher(None, old, new).get_opcodes()
+        
+        #Replace from the bottom up, such that the rows of the ranges above stay valid
+        ranges = []
+        for tag, i1, i2, j1, j2 in reversed(opcodes):
+            if tag == 'equal':
+                continue
+            self.txtarea.delete(f'{i1+1}.0', f'{i2+1}.0' if i2 < len(old) else 'end-1c')
+            self.txtarea.insert(f'{i1+1}.0', ''.join(new[j1:j2]))
+            if j2 > j1:
+                ranges.append( (j1+1, j2) )
+        
+        for first, last in ranges:
+            self.apply_tokens(first, self.tokenize(self.txtarea.get(f'{first}.0', f'{last}.end')))
+        return ranges
+        
+    def ensure_loaded(self):
+        '''Makes sure that the file has been read before anyone uses the contents of this FileEditor.'''
+        if not self.loaded:
+            self.load_from_disk()
+            
+    def load_cached_model(self, model, data):
+        '''Restores model from the ParseCache, if data is still the text that was read from disk.
+        
+        Parameters
+        ----------
+        model : CircuitModel
+            The model that has to hold the parsed circuit of data
+        data : string
+            The current text of the FileEditor
+        
+        Output
+        ------
+        True if the model was restored, False if data has to be parsed
+        '''
+        if data != self.cache_text or not self.cache_entry or not self.cache_entry['model']:
+            return False
+        if self.cache_entry['model']['pack_columns'] != model.pack_columns:
+            return False
+        model.set_state(self.cache_entry['model'])
+        return True
+    
+    def store_cached_model(self, model, data):
+        '''Stores the parsed model in the ParseCache, if data is still the text that was read from disk.
+        
+        Parameters
+        ----------
+        model : CircuitModel
+            The model that holds the parsed circuit of data
+        data : string
+            The current text of the FileEditor
+        '''
+        if data != self.cache_text or not self.cache_entry:
+            return
+        self.cache_entry['model'] = model.get_state()
+        self.texteditor.parse_cache.put(self.cache_path, self.cache_hash, **self.cache_entry)
             
     def frame_configure(self):
         '''Configures the relative widths of the different columns of the FileEditor'''
@@ -98,6 +293,7 @@ class FileEditor(object):
         self.frame.grid_columnconfigure(1, weight=1)
         self.frame.grid_columnconfigure(2, weight=1)
         self.frame.grid_columnconfigure(3, weight=1)
+        self.frame.grid_columnconfigure(4, weight=1)
         self.frame.grid_rowconfigure(1, weight=1)
         
     def update_column(self,column):
@@ -128,8 +324,8 @@ class FileEditor(object):
             messagebox.showerror('Error!', 'Attempting to run file, but the filename has not been set. Strange!')
             return
         
-        #Run the file through the TextEditor.
-        self.texteditor.run_file(self.filename)
+        #Queue the file in the TextEditor, which shows the output in our output view once it is done.
+        self.texteditor.run_file(self.filename, fe=self)
         
     def build_circuit(self,suppress=False, from_keypress=False, *args):
         '''Builds the circuit
@@ -164,9 +360,13 @@ class FileEditor(object):
             Contains the new path to the file.
         '''
         
+        if self.filename and self.filename != new_filename and \
+           not any(other is not self and other.filename == self.filename for other in self.texteditor.file_editors):
+            self.texteditor.file_watcher.unwatch(self.filename)
         self.filename = new_filename
         self.short_filename = self.filename.split('/')[-1]
         self.title.set(self.short_filename)
+        self.texteditor.file_watcher.watch(self.filename)
         
     def setup_event_handling(self):
         '''Sets up all the event handling that this FileEditor does. '''
@@ -238,6 +438,21 @@ class FileEditor(object):
         #Handle the focus
         self.txtarea.bind('<FocusIn>', lambda e: self.texteditor.set_active_editor(self))
         
+        #Show the message of a diagnostic in the title bar whilst hovering over it
+        def diagnostic_enter(event):
+            row = int( self.txtarea.index(f'@{event.x},{event.y}').split('.')[0] )
+            if row in self.diagnostics:
+                self.title.set( f'Line {row}: ' + '; '.join(self.diagnostics[row]) )
+        def diagnostic_leave(event):
+            self.title.set( self.short_filename if self.short_filename else 'Untitled' )
+        self.txtarea.tag_bind('diagnostic', '<Enter>', diagnostic_enter)
+        self.txtarea.tag_bind('diagnostic', '<Leave>', diagnostic_leave)
+        
+        #Highlight the gates of the statement under the cursor in the drawn circuit
+        for key in ('Up', 'Down', 'Left', 'Right', 'Home', 'End', 'Prior', 'Next'):
+            self.txtarea.bind(f'<KeyRelease-{key}>', lambda e: self.cursor_moved())
+        self.txtarea.bind('<ButtonRelease-1>', lambda e: self.cursor_moved())
+        
         #Handle automatic builder
         def return_button(event):
             #Only use the return button if it is NOT used in combination with Ctrl or Ctrl+Shift
@@ -301,13 +516,37 @@ class FileEditor(object):
             start_row = int( self.txtarea.index(tk.INSERT).split('.')[0])
             end_row = start_row
             
+        text = self.txtarea.get(f'{start_row}.0', f'{end_row}.end')
+        self.apply_tokens(start_row, self.tokenize(text))
+        
+    @classmethod
+    def tokenize(cls, text):
+        '''Returns the highlight tokens of every line in text, see tokenize_line(...)
+        
+        Parameters
+        ----------
+        text : string
+            The code, possibly spanning multiple lines
+        '''
+        return [ cls.tokenize_line(line) for line in text.split('\n') ]
+        
+    @classmethod
+    def tokenize_line(cls, line):
+        '''Finds the relevant parts of one line of code.
+        
+        Parameters
+        ----------
+        line : string
+            One line of code
+        
+        Output
+        ------
+        List of [tag, start, end] tokens, where start and end are the columns of the text that gets the tag
+        '''
+        tokens = []
+        line_end = len(line)
+        
         def analyze_line(line, offset=0):
-            nonlocal row, row_end
-            
-            def str_idx(idx):
-                nonlocal row, offset
-                return str(row)+'.'+str(idx+offset)
-            
             #Is this line a white line? Continue
             if len(line.strip()) == 0:
                 return
@@ -315,8 +554,7 @@ class FileEditor(object):
             #Get the comment index if it exists
             if '#' in line:
                 comment_index = line.index('#')
-                #print(f'Adding tag comment, {str_idx(comment_index)}, {row_end}')
-                self.txtarea.tag_add('comment', str_idx(comment_index), row_end)
+                tokens.append( ['comment', comment_index+offset, line_end] )
                 
                 line = line[0:line.index('#')]
                 
@@ -324,61 +562,68 @@ class FileEditor(object):
                     return
                     
             if 'display' in line:
-                display_index = line.index('display')
-                #self.txtarea.tag_add('display',str(row)+'.'+str(display_index), str(row)+'.'+str(display_index+len('display')))
-                #Update: make the entire line this style, it might be a display_something namely.
-                self.txtarea.tag_add('display',str_idx(display_index), str_idx(len(line)))
+                #Make the entire line this style, it might be a display_something namely.
+                tokens.append( ['display', line.index('display')+offset, len(line)+offset] )
                 return
             
             if 'qubits' in line:
-                self.txtarea.tag_add('qubits',str_idx(0), str_idx(len(line)))
+                tokens.append( ['qubits', offset, len(line)+offset] )
                 return
             
             if line[0] == '.':
                 end_idx = line.index('(') if '(' in line else len(line)
-                self.txtarea.tag_add('subroutine', str_idx(0), str_idx(end_idx))
+                tokens.append( ['subroutine', offset, end_idx+offset] )
             
             if '|' in line:
                 lines = line.split('|')
                 curr_offset = offset
                 for subline in lines:
-                    #print(f'Analyzing subline {subline} with offset {curr_offset}!')
                     analyze_line(subline, offset=curr_offset)
                     curr_offset += len(subline)+1 #+1 for the '|' itself!
                     
                 indices = [i for i,x in enumerate(line) if x=='|']
                 for idx in indices:
-                    self.txtarea.tag_add('bracket', str_idx(idx), str_idx(idx+1))
+                    tokens.append( ['bracket', idx+offset, idx+offset+1] )
             
             for bracket in ('{', '}', '(', ')'):
                 if bracket in line:
                     idx = line.index(bracket)
-                    self.txtarea.tag_add('bracket', str_idx(idx), str_idx(idx+1))
+                    tokens.append( ['bracket', idx+offset, idx+offset+1] )
                     
-            for keyword in self.HIGHLIGHT_KEYWORDS:
+            for keyword in cls.HIGHLIGHT_KEYWORDS:
                 if keyword in line.lower():
                     idx = line.lower().index(keyword)
-                    self.txtarea.tag_add(keyword, str_idx(idx), str_idx(idx+len(keyword)))
-                
-                
-            
-        for row in range(start_row,end_row+1):
-            #Convert to tkinter indices
-            row_start = self.txtarea.index(str(row)+'.0')
-            row_end   = self.txtarea.index(str(row)+'.end')
-            
-            #Remove all previous tags on this line
-            for tag in self.txtarea.tag_names():
-                #Update: do NOT remove selections!
-                if tag == tk.SEL:
-                    continue
-                self.txtarea.tag_remove(tag, row_start, row_end)
-            
-            #Get the text from the row
-            line = self.txtarea.get(row_start, row_end)
-            
-            #Analyze the text: this borrows from CircuitRender2.Circuitrender.read()
-            analyze_line(line)
+                    tokens.append( [keyword, idx+offset, idx+offset+len(keyword)] )
+        
+        #This borrows from CircuitRender2.CircuitModel.read()
+        analyze_line(line)
+        return tokens
+    
+    def apply_tokens(self, start_row, tokens):
+        '''Replaces the tags of a range of rows by the highlight tokens.
+        
+        Parameters
+        ----------
+        start_row : integer
+            The first row of the range
+        tokens : list
+            Per row, the output of tokenize_line(...)
+        '''
+        end_row = start_row + len(tokens) - 1
+        
+        #Remove all previous tags on these rows, but do NOT remove selections!
+        for tag in self.txtarea.tag_names():
+            if tag == tk.SEL:
+                continue
+            self.txtarea.tag_remove(tag, f'{start_row}.0', f'{end_row}.end')
+        
+        #Add all ranges of a tag in one go, one call per range is slow for long files
+        ranges = {}
+        for row, row_tokens in enumerate(tokens, start_row):
+            for tag, start, end in row_tokens:
+                ranges.setdefault(tag, []).extend( (f'{row}.{start}', f'{row}.{end}') )
+        for tag, indices in ranges.items():
+            self.txtarea.tag_add(tag, *indices)
                 
         
     def highlighter_set_configs(self):
@@ -390,6 +635,50 @@ class FileEditor(object):
         self.txtarea.tag_config('subroutine',foreground='purple')
         for keyword in self.HIGHLIGHT_KEYWORDS:
             self.txtarea.tag_config(keyword, foreground='purple')
+        #The diagnostics of the parser should be visible on top of all the other tags
+        self.txtarea.tag_config('diagnostic', background='MistyRose', underline=True)
+        self.txtarea.tag_raise('diagnostic')
+        
+    def show_diagnostics(self, diagnostics):
+        '''Marks the statements that the circuit parser could not understand. Hovering over them shows the message.
+        
+        Parameters
+        ----------
+        diagnostics : list of dictionaries
+            The diagnostics as given by CircuitModel.read(...): dictionaries with 'line', 'col', 'end' and 'message'
+        '''
+        self.txtarea.tag_remove('diagnostic', '1.0', tk.END)
+        self.diagnostics = {}
+        
+        for diagnostic in diagnostics:
+            row = diagnostic['line']
+            #An empty range would be invisible, so mark the whole line instead
+            if diagnostic['end'] > diagnostic['col']:
+                self.txtarea.tag_add('diagnostic', f"{row}.{diagnostic['col']}", f"{row}.{diagnostic['end']}")
+            else:
+                self.txtarea.tag_add('diagnostic', f'{row}.0', f'{row}.end')
+            self.diagnostics.setdefault(row, []).append(diagnostic['message'])
+        
+    def cursor_moved(self):
+        '''Passes the position of the cursor on to the TextEditor, which highlights the gates at that position'''
+        line, col = map(int, self.txtarea.index(tk.INSERT).split('.'))
+        self.texteditor.select_source(self, line, col)
+        
+    def show_source(self, line, col, end):
+        '''Selects a statement, and scrolls it into view
+        
+        Parameters
+        ----------
+        line : integer
+            The line of the statement, starting at 1
+        col, end : integer
+            The position of the statement in the line
+        '''
+        self.txtarea.tag_remove(tk.SEL, '1.0', tk.END)
+        self.txtarea.tag_add(tk.SEL, f'{line}.{col}', f'{line}.{end}')
+        self.txtarea.mark_set(tk.INSERT, f'{line}.{col}')
+        self.txtarea.see(tk.INSERT)
+        self.txtarea.focus_set()
         
     def close(self):
         '''Attempt to close this FileEditor.'''
@@ -0,0 +1,252 @@
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import sys
+import threading
+
+class Inotify(object):
+    '''Inotify wakes up the FileWatcher as soon as something changes in a watched directory, through the inotify API
+    of Linux (called through ctypes). It only says that something changed, the FileWatcher finds out what.'''
+
+    #The events of a directory that can change a file in it: written, closed after writing, renamed into it
+    #(how most scripts replace a file), created, deleted, or its metadata (such as the mtime) changed
+    IN_MODIFY = 0x2
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    #Size of the buffer that the pending events are read into
+    BUFFER_SIZE = 65536
+
+    def __init__(self, libc, fd):
+        '''Initializes the Inotify, use create() instead
+
+        Parameters
+        ----------
+        libc : ctypes.CDLL
+            The C library with the inotify functions
+        fd : integer
+            The file descriptor of the inotify instance
+        '''
+        self.libc = libc
+        self.fd = fd
+        #A pipe that wakes up wait() when the FileWatcher stops
+        self.wake_fd, self.waker_fd = os.pipe()
+        #The watch descriptor of every watched directory
+        self.directories = {}
+
+    @classmethod
+    def create(cls):
+        '''Returns an Inotify, or None if inotify is not available (such as on Windows and MacOS)'''
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        return cls(libc, fd)
+
+    def add(self, directory):
+        '''Watches a directory, returns False if that is not possible'''
+        if directory in self.directories:
+            return True
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            return False
+        self.directories[directory] = wd
+        return True
+
+    def remove(self, directory):
+        '''Stops watching a directory'''
+        wd = self.directories.pop(directory, None)
+        if wd is not None:
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def wait(self, timeout):
+        '''Waits at most timeout seconds for events, and discards them. Returns whether there were any.'''
+        readable = select.select([self.fd, self.wake_fd], [], [], timeout)[0]
+        if self.fd not in readable:
+            return False
+        try:
+            while os.read(self.fd, self.BUFFER_SIZE):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def wake(self):
+        '''Makes a pending wait() return at once, and every next one as well'''
+        os.write(self.waker_fd, b'\0')
+
+    def close(self):
+        '''Closes the inotify instance'''
+        for fd in (self.fd, self.wake_fd, self.waker_fd):
+            os.close(fd)
+
+class FileWatcher(object):
+    '''Notices when open files are changed by another program, such as a script that regenerates them.
+
+    A background thread compares the modification time and the size of every watched file with those it saw last.
+    On Linux it wakes up as soon as inotify reports a change in one of their directories, elsewhere (and as a fallback
+    for file systems that do not report changes) it checks every interval. The changed files are passed back through
+    a queue that is polled from the tkinter main loop, as tkinter is not thread-safe.
+    '''
+
+    #Amount of seconds between two checks of the background thread
+    INTERVAL = 1.0
+    #Amount of seconds to wait after an inotify event, such that a file that is written in several parts is complete
+    SETTLE_TIME = 0.05
+    #Amount of milliseconds between two polls of the changed files in the main loop
+    POLL_INTERVAL = 250
+
+    def __init__(self, root, on_change, interval=None):
+        '''Initializes the FileWatcher, call start() to start watching
+
+        Parameters
+        ----------
+        root : tkinter widget
+            Widget whose after(...) is used to poll the changed files
+        on_change : callable
+            Called with the absolute path of a changed file, from the tkinter main loop
+        interval = None : float
+            Amount of seconds between two checks, defaults to INTERVAL
+        '''
+        self.root = root
+        self.on_change = on_change
+        self.interval = interval if interval else self.INTERVAL
+
+        #The (mtime, size) of every watched file as it was last seen (None if it does not exist), shared with the
+        #background thread
+        self.files = {}
+        self.lock = threading.Lock()
+
+        self.inotify = Inotify.create()
+        #Changed files, put by the background thread
+        self.changes = queue.Queue()
+
+        self.thread = None
+        self.stopped = threading.Event()
+        self.poll_id = None
+
+    @staticmethod
+    def stat(path):
+        '''Returns the (mtime, size) of a file, or None if it does not exist'''
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def watch(self, filename):
+        '''Starts watching a file, its current contents count as seen
+
+        Parameters
+        ----------
+        filename : string
+            The path of the file
+        '''
+        path = os.path.abspath(filename)
+        with self.lock:
+            self.files[path] = self.stat(path)
+            if self.inotify:
+                self.inotify.add(os.path.dirname(path))
+
+    def unwatch(self, filename):
+        '''Stops watching a file
+
+        Parameters
+        ----------
+        filename : string
+            The path of the file
+        '''
+        path = os.path.abspath(filename)
+        with self.lock:
+            self.files.pop(path, None)
+            directory = os.path.dirname(path)
+            if self.inotify and not any(os.path.dirname(other) == directory for other in self.files):
+                self.inotify.remove(directory)
+
+    def refresh(self, filename):
+        '''Marks the current contents of a watched file as seen, such as after the editor saved it itself'''
+        path = os.path.abspath(filename)
+        with self.lock:
+            if path in self.files:
+                self.files[path] = self.stat(path)
+
+    def start(self):
+        '''Starts the background thread, and the polling of the changes in the main loop'''
+        if self.thread is not None:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.work, daemon=True)
+        self.thread.start()
+        self.poll_id = self.root.after(self.POLL_INTERVAL, self.poll)
+
+    def stop(self):
+        '''Stops the background thread and the polling, and closes the inotify instance'''
+        self.stopped.set()
+        if self.inotify:
+            self.inotify.wake()
+        if self.poll_id is not None:
+            self.root.after_cancel(self.poll_id)
+            self.poll_id = None
+        #The thread finishes its current wait first, its file descriptor may only be closed after that
+        if self.thread is not None:
+            self.thread.join(self.interval + self.SETTLE_TIME + 1.0)
+            if self.thread.is_alive():
+                return
+            self.thread = None
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
+
+    def work(self):
+        '''Checks the watched files until stopped. Runs inside a separate thread, so this may never touch tkinter.'''
+        while not self.stopped.is_set():
+            if self.inotify:
+                if self.inotify.wait(self.interval):
+                    self.stopped.wait(self.SETTLE_TIME)
+                    self.inotify.wait(0)
+            else:
+                self.stopped.wait(self.interval)
+            self.check()
+
+    def check(self):
+        '''Compares every watched file with how it was last seen, and queues the changed ones'''
+        with self.lock:
+            paths = list(self.files)
+        for path in paths:
+            stat = self.stat(path)
+            with self.lock:
+                #The file might have been unwatched or refreshed in the mean time
+                if path not in self.files or self.files[path] == stat:
+                    continue
+                self.files[path] = stat
+            #A deleted file is kept open in the editor, only new contents are reported
+            if stat is not None:
+                self.changes.put(path)
+
+    def poll(self):
+        '''Passes the changed files to on_change. Runs in the tkinter main loop.'''
+        self.poll_id = None
+        changed = []
+        while True:
+            try:
+                path = self.changes.get_nowait()
+            except queue.Empty:
+                break
+            if path not in changed:
+                changed.append(path)
+        for path in changed:
+            self.on_change(path)
+
+        if not self.stopped.is_set():
+            self.poll_id = self.root.after(self.POLL_INTERVAL, self.poll)
@@ -0,0 +1,240 @@
+import queue
+import subprocess
+import threading
+import time
+
+class Job(object):
+    '''Job keeps track of one run of the Simulator (or any other function) in the JobQueue'''
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, job_id, name, command=None, function=None, editor=None, description=''):
+        '''Initializes the Job. Exactly one of command and function should be given.
+
+        Parameters
+        ----------
+        job_id : integer
+            Unique number of the job
+        name : string
+            The name that is shown in the jobs panel, usually the file name
+        command = None : list of strings
+            The command that starts the process, its stdout is the output of the job
+        function = None : callable
+            Function without arguments that is called in a thread, its return value is the output of the job
+        editor = None : FileEditor
+            The FileEditor that submitted the job, its output view receives the output
+        description = '' : string
+            Text that is shown above the output
+        '''
+        self.job_id = job_id
+        self.name = name
+        self.command = command
+        self.function = function
+        self.editor = editor
+        self.description = description
+        #The ResourceEstimator estimate of the job, if any, which calibrates the estimator once the job is done
+        self.estimate = None
+        #The file, code hash and simulator of a run, if any, under which the RunHistory records the job once it is done
+        self.run_info = None
+        #What a function job reports about the work that it actually did (such as the backend that ran), so that only
+        #runs that match their estimate calibrate the estimator
+        self.work = {}
+
+        self.status = self.QUEUED
+        self.output = ''
+        self.error = None
+        #The exit code of the process, or 0 (1) if the function returned (raised)
+        self.exit_code = None
+
+        self.submit_time = time.time()
+        self.start_time = None
+        self.end_time = None
+
+        #The process of a running command, such that it can be cancelled
+        self.process = None
+        #Set by JobQueue.cancel(...), a command whose process has not started yet checks it before it starts one
+        self.cancel_requested = False
+
+    def elapsed(self):
+        '''Returns the amount of seconds that this Job has been running, or ran'''
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time if self.end_time is not None else time.time()) - self.start_time
+
+    def finished(self):
+        '''Returns True if this Job will not run anymore'''
+        return self.status in (self.DONE, self.FAILED, self.CANCELLED)
+
+    def __str__(self):
+        return f'Job({self.job_id},{self.name},{self.status})'
+
+    def __repr__(self):
+        return str(self)
+
+class JobQueue(object):
+    '''Runs Jobs in the background, at most max_workers at the same time, without blocking the tkinter main loop.
+
+    Every job runs in its own thread, which waits for the Simulator process (or calls the function). The results are
+    passed back through a queue that is polled from the tkinter main loop, as tkinter is not thread-safe.
+    '''
+
+    #Amount of milliseconds between two polls of the results
+    POLL_INTERVAL = 100
+    #Amount of finished jobs that are remembered for the jobs panel
+    MAX_FINISHED = 50
+
+    def __init__(self, root, max_workers=2, on_finish=None):
+        '''Initializes the JobQueue
+
+        Parameters
+        ----------
+        root : tkinter widget
+            Widget whose after(...) is used to poll the results
+        max_workers = 2 : integer
+            Maximum amount of jobs that run at the same time
+        on_finish = None : callable
+            Called with the Job as soon as a job has finished, from the tkinter main loop
+        '''
+        self.root = root
+        self.max_workers = max_workers
+        self.on_finish = on_finish
+
+        #All the jobs that are queued, running or recently finished, in order of submission
+        self.jobs = []
+        self.next_id = 0
+
+        #Results of the threads: (job, output, error, exit code, end time)
+        self.results = queue.Queue()
+        self.poll_id = None
+
+    def set_max_workers(self, max_workers):
+        '''Changes the maximum amount of jobs that run at the same time
+
+        Parameters
+        ----------
+        max_workers : integer
+            At least 1
+        '''
+        self.max_workers = max(1, int(max_workers))
+        self.dispatch()
+
+    def submit(self, name, command=None, function=None, editor=None, description=''):
+        '''Adds a Job to the queue, see Job for the parameters. Returns the Job.'''
+        job = Job(self.next_id, name, command=command, function=function, editor=editor, description=description)
+        self.next_id += 1
+        self.jobs.append(job)
+        self.dispatch()
+        return job
+
+    def queued(self):
+        '''Returns the jobs that wait to be started, in order'''
+        return [job for job in self.jobs if job.status == Job.QUEUED]
+
+    def running(self):
+        '''Returns the jobs that are running'''
+        return [job for job in self.jobs if job.status == Job.RUNNING]
+
+    def active(self):
+        '''Returns the jobs whose thread has not reported back yet, including cancelled jobs that are still stopping'''
+        return [job for job in self.jobs if job.start_time is not None and job.end_time is None]
+
+    def queue_position(self, job):
+        '''Returns the position (starting at 1) of a queued job, or None if the job is not queued'''
+        if job.status != Job.QUEUED:
+            return None
+        return self.queued().index(job) + 1
+
+    @staticmethod
+    def cancellable(job):
+        '''Returns True if cancel(job) can stop a job: a queued job, or a running command. A running function cannot
+        be interrupted.'''
+        return job.status == Job.QUEUED or (job.status == Job.RUNNING and job.command is not None)
+
+    def cancel(self, job):
+        '''Cancels a queued job, or terminates the process of a running command. Does nothing to a running function,
+        see cancellable(...).
+
+        Parameters
+        ----------
+        job : Job
+            The job to cancel
+        '''
+        if not self.cancellable(job):
+            return
+        if job.status == Job.QUEUED:
+            job.status = Job.CANCELLED
+            job.end_time = time.time()
+            return
+        #The thread notices that the process ended (or does not start it at all), and reports the cancellation.
+        #The request is set before the process is read, and the thread sets the process before it reads the request,
+        #so one of both stops the process if they run at the same time.
+        job.cancel_requested = True
+        job.status = Job.CANCELLED
+        process = job.process
+        if process is not None:
+            process.terminate()
+
+    def dispatch(self):
+        '''Starts queued jobs as long as less than max_workers are running'''
+        nr_running = len(self.active())
+        for job in self.queued():
+            if nr_running >= self.max_workers:
+                break
+            job.status = Job.RUNNING
+            job.start_time = time.time()
+            threading.Thread(target=self.work, args=(job,), daemon=True).start()
+            nr_running += 1
+
+        if self.active() and self.poll_id is None:
+            self.poll_id = self.root.after(self.POLL_INTERVAL, self.poll)
+
+    def work(self, job):
+        '''Runs a job. Runs inside a separate thread, so this may never touch tkinter.'''
+        output, error, exit_code = '', None, 0
+        try:
+            if job.command is not None:
+                if job.cancel_requested:
+                    #Cancelled before its process started, so there is no exit code either
+                    self.results.put( (job, output, error, None, time.time()) )
+                    return
+                job.process = subprocess.Popen(job.command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+                if job.cancel_requested:
+                    job.process.terminate()
+                output = job.process.communicate()[0].decode('utf-8', errors='replace')
+                exit_code = job.process.returncode
+                if exit_code != 0 and job.status != Job.CANCELLED:
+                    error = f'Process exited with code {exit_code}'
+            else:
+                output = job.function()
+        except Exception as e:
+            error, exit_code = str(e), 1
+        self.results.put( (job, output, error, exit_code, time.time()) )
+
+    def poll(self):
+        '''Handles the results of the finished jobs, and starts the next ones. Runs in the tkinter main loop.'''
+        self.poll_id = None
+        while True:
+            try:
+                job, output, error, exit_code, end_time = self.results.get_nowait()
+            except queue.Empty:
+                break
+            job.end_time = end_time
+            job.output = output if isinstance(output, str) else str(output)
+            job.error = error
+            job.exit_code = exit_code
+            job.process = None
+            if job.status != Job.CANCELLED:
+                job.status = Job.FAILED if error else Job.DONE
+            if self.on_finish:
+                self.on_finish(job)
+
+        #Forget the oldest finished jobs
+        finished = [job for job in self.jobs if job.finished()]
+        for job in finished[:max(0, len(finished) - self.MAX_FINISHED)]:
+            self.jobs.remove(job)
+
+        self.dispatch()
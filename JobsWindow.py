@@ -0,0 +1,112 @@
+import tkinter as tk
+from tkinter import ttk
+
+class JobsWindow(object):
+    '''JobsWindow: a separate window that lists the jobs of the JobQueue of the TextEditor, with their status, elapsed
+    time and position in the queue. Selecting a finished job shows its output.'''
+
+    #Amount of milliseconds between two refreshes of the list
+    REFRESH_INTERVAL = 500
+
+    COLUMNS = ('file', 'status', 'elapsed', 'position')
+
+    def __init__(self, texteditor, job_queue):
+        '''Initializes the JobsWindow.
+
+        Parameters
+        ----------
+        texteditor : TextEditor
+            The TextEditor that this JobsWindow is a part of
+        job_queue : JobQueue
+            The JobQueue whose jobs are listed
+        '''
+
+        self.texteditor = texteditor
+        self.job_queue = job_queue
+
+        self.window = tk.Toplevel(texteditor.root)
+        self.window.title('Simulator Jobs')
+        self.window.geometry('520x260')
+
+        self.tree = ttk.Treeview(self.window, columns=self.COLUMNS, show='headings', selectmode='browse')
+        for column, width in zip(self.COLUMNS, (220, 90, 90, 90)):
+            self.tree.heading(column, text=column.capitalize())
+            self.tree.column(column, width=width, anchor=tk.W if column == 'file' else tk.CENTER)
+        self.tree.pack(fill=tk.BOTH, expand=1)
+
+        self.buttons = ttk.Frame(self.window)
+        self.buttons.pack(fill=tk.X)
+        self.cancelbutton = ttk.Button(self.buttons, text='Cancel job', command=self.cancel_selected)
+        self.cancelbutton.pack(side=tk.LEFT)
+        self.outputbutton = ttk.Button(self.buttons, text='Show output', command=self.show_selected)
+        self.outputbutton.pack(side=tk.LEFT)
+
+        #Keep track of the scheduled refresh
+        self.refresh_id = None
+
+        #Set up the event handling
+        self.setup_event_handling()
+        self.refresh()
+
+    def setup_event_handling(self):
+        '''Sets up all the event handling that this JobsWindow does.'''
+        self.tree.bind('<Double-1>', lambda e: self.show_selected())
+        self.tree.bind('<<TreeviewSelect>>', lambda e: self.update_buttons())
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+    def selected_job(self):
+        '''Returns the selected Job, or None'''
+        selection = self.tree.selection()
+        if not selection:
+            return None
+        job_id = int(selection[0])
+        for job in self.job_queue.jobs:
+            if job.job_id == job_id:
+                return job
+        return None
+
+    def update_buttons(self):
+        '''Enables the Cancel button only if the selected Job can be cancelled, a running function cannot'''
+        job = self.selected_job()
+        self.cancelbutton.state(['!disabled'] if job and self.job_queue.cancellable(job) else ['disabled'])
+
+    def cancel_selected(self):
+        '''Cancels the selected Job'''
+        job = self.selected_job()
+        if job:
+            self.job_queue.cancel(job)
+            self.refresh()
+
+    def show_selected(self):
+        '''Shows the output of the selected Job in the output view'''
+        job = self.selected_job()
+        if job and job.finished():
+            self.texteditor.show_output(job.name, job.output if not job.error else job.error + '\n' + job.output)
+
+    def refresh(self):
+        '''Updates the list of jobs, and schedules the next refresh'''
+        self.refresh_id = None
+
+        items = set(self.tree.get_children())
+        for job in self.job_queue.jobs:
+            position = self.job_queue.queue_position(job)
+            values = (job.name, job.status, f'{job.elapsed():.1f} s', position if position else '')
+            item = str(job.job_id)
+            if item in items:
+                self.tree.item(item, values=values)
+                items.remove(item)
+            else:
+                self.tree.insert('', tk.END, iid=item, values=values)
+        #Jobs that the JobQueue forgot
+        if items:
+            self.tree.delete(*items)
+        self.update_buttons()
+
+        self.refresh_id = self.window.after(self.REFRESH_INTERVAL, self.refresh)
+
+    def close(self):
+        '''Closes this JobsWindow.'''
+        if self.refresh_id is not None:
+            self.window.after_cancel(self.refresh_id)
+        self.texteditor.jobs_window_closed(self)
+        self.window.destroy()
@@ -0,0 +1,383 @@
+'''Built-in matrix product state (MPS) simulator, for wide circuits with little entanglement.
+
+Usage: python -m MPSSimulator FILE [--max-bond CHI] [--cutoff EPS] [--shots SHOTS] [--seed SEED]
+
+The state of n qubits is a chain of n tensors of shape (left bond, 2, right bond), one per site. The chain is kept in
+mixed canonical form around one orthogonality center, so the singular values of a cut are the Schmidt coefficients and
+truncating them is optimal. A gate on k qubits contracts k neighbouring sites, applies the gate and splits the result
+again with singular value decompositions, which keep at most max_bond singular values and drop those that are smaller
+than cutoff. Every truncation that drops a weight w multiplies the estimated fidelity of the state by 1 - w, and the
+truncation error 1 - fidelity is reported: the state is exact if it is 0.
+
+The qubits of a gate that are not neighbours are moved next to each other by a network of adjacent swaps, which are
+undone after the gate, so a long-range cnot or toffoli costs a number of swaps proportional to its length. A swap
+statement itself only relabels the sites and is free.
+
+Mid-circuit measurements collapse the state and write their classical bits, just like the StatevectorSimulator. After
+the circuit, shots samples of all the qubits are drawn from the final state without collapsing it.
+'''
+import collections
+import math
+import sys
+import time
+
+import numpy as np
+
+from StatevectorSimulator import StatevectorSimulator, classical_bits, read_circuit, run_main, simulation_report, \
+                                 simulator_argparser
+
+class MPSSimulator(object):
+    '''MPSSimulator keeps track of the matrix product state of the qubits and of the classical bits of a circuit'''
+
+    #Standard maximum bond dimension
+    MAX_BOND = 64
+    #Standard relative cutoff of the singular values
+    CUTOFF = 1e-12
+    #Amount of different shot outcomes that report() lists
+    TOP_OUTCOMES = 32
+
+    MATRICES = StatevectorSimulator.MATRICES
+    CONTROLLED_GATES = StatevectorSimulator.CONTROLLED_GATES
+    CLASSICAL_GATES = StatevectorSimulator.CLASSICAL_GATES
+    SWAP = np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]], dtype=np.complex128)
+
+    def __init__(self, nr_qubits, max_bond=None, cutoff=None, seed=None):
+        '''Initializes the MPSSimulator in the state |0...0>
+
+        Parameters
+        ----------
+        nr_qubits : integer
+            The amount of qubits
+        max_bond = None : integer
+            The maximum bond dimension, defaults to MAX_BOND
+        cutoff = None : float
+            Singular values below cutoff times the largest one are dropped, defaults to CUTOFF
+        seed = None : integer
+            Seed of the random generator of the measurements and the shots
+        '''
+        self.nr_qubits = nr_qubits
+        self.max_bond = max_bond if max_bond else self.MAX_BOND
+        self.cutoff = self.CUTOFF if cutoff is None else cutoff
+
+        self.tensors = []
+        for _ in range(nr_qubits):
+            tensor = np.zeros((1, 2, 1), dtype=np.complex128)
+            tensor[0, 0, 0] = 1
+            self.tensors.append(tensor)
+        #A product state is canonical around every site
+        self.center = 0
+        #The qubit on every site, and the site of every qubit
+        self.order = list(range(nr_qubits))
+        self.sites = list(range(nr_qubits))
+
+        #The classical bits b0, b1, ... that the measurements write to
+        self.bits = [0] * nr_qubits
+        self.rng = np.random.default_rng(seed)
+
+        #Amount of gates that have been applied, and of the swaps that the swap networks added
+        self.nr_gates = 0
+        self.nr_swaps = 0
+        #Product of 1 - the weight of the dropped singular values, over all the truncations
+        self.fidelity = 1.0
+        self.largest_bond = 1
+
+    def move_center(self, site):
+        '''Moves the orthogonality center to site with QR decompositions'''
+        while self.center < site:
+            tensor = self.tensors[self.center]
+            left, _, right = tensor.shape
+            q, r = np.linalg.qr(tensor.reshape(left*2, right))
+            self.tensors[self.center] = q.reshape(left, 2, q.shape[1])
+            self.tensors[self.center+1] = np.tensordot(r, self.tensors[self.center+1], axes=(1, 0))
+            self.center += 1
+        while self.center > site:
+            tensor = self.tensors[self.center]
+            left, _, right = tensor.shape
+            #LQ decomposition, through the QR decomposition of the transpose
+            q, r = np.linalg.qr(tensor.reshape(left, 2*right).T)
+            self.tensors[self.center] = q.T.reshape(q.shape[1], 2, right)
+            self.tensors[self.center-1] = np.tensordot(self.tensors[self.center-1], r.T, axes=(2, 0))
+            self.center -= 1
+
+    def apply_local(self, matrix, site):
+        '''Applies a 2x2 matrix to the qubit on site, which keeps the canonical form'''
+        self.tensors[site] = np.einsum('ij,ajb->aib', np.asarray(matrix, dtype=np.complex128), self.tensors[site])
+
+    def apply_block(self, gate, site, k):
+        '''Applies a gate to the k neighbouring sites site, ..., site+k-1
+
+        Parameters
+        ----------
+        gate : NumPy array
+            The gate as a 2^k x 2^k matrix, in which the qubit on the first site is the most significant bit
+        site : integer
+            The first site
+        k : integer
+            The amount of sites
+        '''
+        self.move_center(site)
+        theta = self.tensors[site]
+        for offset in range(1, k):
+            theta = np.tensordot(theta, self.tensors[site+offset], axes=(theta.ndim-1, 0))
+        left, right = theta.shape[0], theta.shape[-1]
+        theta = theta.reshape(left, 2**k, right)
+        theta = np.einsum('ij,ajb->aib', gate, theta)
+
+        #Split off one site at a time, the singular values move on to the right
+        for offset in range(k-1):
+            rest = 2**(k-offset-1)
+            u, s, vh = np.linalg.svd(theta.reshape(left*2, rest*right), full_matrices=False)
+            s, u, vh = self.truncate(s, u, vh)
+            self.tensors[site+offset] = u.reshape(left, 2, len(s))
+            left = len(s)
+            theta = (s[:, None] * vh).reshape(left, rest, right)
+            self.largest_bond = max(self.largest_bond, left)
+        self.tensors[site+k-1] = theta.reshape(left, 2, right)
+        self.center = site+k-1
+
+    def truncate(self, s, u, vh):
+        '''Drops the smallest singular values, adds their weight to the truncation error and renormalizes'''
+        total = float(np.sum(s**2))
+        if total <= 0:
+            return s[:1], u[:, :1], vh[:1]
+        keep = int(np.count_nonzero(s > self.cutoff * s[0]))
+        keep = max(1, min(keep, self.max_bond))
+        if keep < len(s):
+            kept = float(np.sum(s[:keep]**2))
+            self.fidelity *= kept / total
+            s, u, vh = s[:keep] / math.sqrt(kept / total), u[:, :keep], vh[:keep]
+        return s, u, vh
+
+    @property
+    def truncation_error(self):
+        '''Returns 1 - the estimated fidelity of the state, 0 if nothing has been truncated'''
+        return 1.0 - self.fidelity
+
+    def swap_sites(self, site):
+        '''Swaps the qubits on site and site+1'''
+        self.apply_block(self.SWAP, site, 2)
+        qubit1, qubit2 = self.order[site], self.order[site+1]
+        self.order[site], self.order[site+1] = qubit2, qubit1
+        self.sites[qubit1], self.sites[qubit2] = site+1, site
+        self.nr_swaps += 1
+
+    def gather(self, qubits):
+        '''Moves qubits onto neighbouring sites with adjacent swaps
+
+        Output
+        ------
+        The first site of the block, and the swaps that were done (to undo them)
+        '''
+        positions = sorted(self.sites[qubit] for qubit in qubits)
+        #Move everything towards the median, which needs the fewest swaps
+        anchor_idx = len(positions)//2
+        anchor = positions[anchor_idx]
+        swaps = []
+        for idx in range(anchor_idx-1, -1, -1):
+            target = anchor - (anchor_idx - idx)
+            for site in range(positions[idx], target):
+                self.swap_sites(site)
+                swaps.append(site)
+        for idx in range(anchor_idx+1, len(positions)):
+            target = anchor + (idx - anchor_idx)
+            for site in range(positions[idx]-1, target-1, -1):
+                self.swap_sites(site)
+                swaps.append(site)
+        return anchor - anchor_idx, swaps
+
+    def apply_gate(self, matrix, qubits):
+        '''Applies a gate to any qubits
+
+        Parameters
+        ----------
+        matrix : NumPy array
+            The gate as a 2^k x 2^k matrix, in which qubits[0] is the most significant bit
+        qubits : list of integers
+            The k qubits
+        '''
+        k = len(qubits)
+        if k == 1:
+            self.apply_local(matrix, self.sites[qubits[0]])
+            self.nr_gates += 1
+            return
+
+        first, swaps = self.gather(qubits)
+        #Reorder the matrix such that it follows the order of the qubits on the sites
+        block = [self.order[site] for site in range(first, first+k)]
+        permutation = [qubits.index(qubit) for qubit in block]
+        tensor = np.asarray(matrix, dtype=np.complex128).reshape((2,)*(2*k))
+        tensor = tensor.transpose(permutation + [k+idx for idx in permutation])
+        self.apply_block(tensor.reshape(2**k, 2**k), first, k)
+
+        for site in reversed(swaps):
+            self.swap_sites(site)
+        self.nr_gates += 1
+
+    def controlled(self, matrix, nr_controls):
+        '''Returns the matrix of a gate whose last qubit is the target of matrix, if all nr_controls controls are 1'''
+        size = 2**(nr_controls+1)
+        full = np.eye(size, dtype=np.complex128)
+        full[size-2:, size-2:] = matrix
+        return full
+
+    def swap(self, qubit1, qubit2):
+        '''Swaps two qubits by relabeling their sites'''
+        site1, site2 = self.sites[qubit1], self.sites[qubit2]
+        self.sites[qubit1], self.sites[qubit2] = site2, site1
+        self.order[site1], self.order[site2] = qubit2, qubit1
+        self.nr_gates += 1
+
+    def collapse(self, qubit):
+        '''Measures qubit, collapses the state accordingly and returns the outcome'''
+        site = self.sites[qubit]
+        self.move_center(site)
+        tensor = self.tensors[site]
+        p_one = float(np.vdot(tensor[:, 1, :], tensor[:, 1, :]).real)
+        p_total = float(np.vdot(tensor, tensor).real)
+        outcome = 1 if self.rng.random() * p_total < p_one else 0
+
+        p_keep = p_one if outcome else p_total - p_one
+        tensor = tensor.copy()
+        tensor[:, 1-outcome, :] = 0
+        if p_keep > 0:
+            tensor /= math.sqrt(p_keep)
+        self.tensors[site] = tensor
+        return outcome
+
+    def measure(self, qubit):
+        '''Measures qubit in the computational basis, and stores the outcome in its classical bit'''
+        self.bits[qubit] = self.collapse(qubit)
+        self.nr_gates += 1
+
+    def prepz(self, qubit):
+        '''Resets qubit to |0>'''
+        if self.collapse(qubit):
+            self.apply_local(self.MATRICES['x'], self.sites[qubit])
+        self.nr_gates += 1
+
+    def run(self, operations):
+        '''Applies the operations of a circuit, see CircuitModel.operations()
+
+        Parameters
+        ----------
+        operations : list
+            (gate, rows, angle) tuples
+        '''
+        n = self.nr_qubits
+        for gate, rows, angle in operations:
+            if gate in self.MATRICES:
+                self.apply_gate(self.MATRICES[gate], rows[:1])
+            elif gate in ('rx', 'ry', 'rz'):
+                self.apply_gate(StatevectorSimulator.rotation(gate, angle), rows[:1])
+            elif gate in self.CONTROLLED_GATES:
+                matrix = self.controlled(self.MATRICES[self.CONTROLLED_GATES[gate]], len(rows)-1)
+                self.apply_gate(matrix, list(rows))
+            elif gate == 'swap':
+                self.swap(rows[0], rows[1])
+            elif gate in self.CLASSICAL_GATES:
+                if all(self.bits[row-n] for row in rows if row >= n):
+                    for row in rows:
+                        if row < n:
+                            self.apply_gate(self.MATRICES[self.CLASSICAL_GATES[gate]], [row])
+            elif gate == 'measure':
+                self.measure(rows[0])
+            elif gate == 'prepz':
+                self.prepz(rows[0])
+            else:
+                raise ValueError(f'MPSSimulator does not support the gate {gate}')
+
+    def sample(self, shots):
+        '''Draws shots samples of all the qubits from the current state, without collapsing it
+
+        Output
+        ------
+        NumPy array of shape (shots, nr_qubits) with the outcome of every qubit
+        '''
+        self.move_center(0)
+        samples = np.zeros((shots, self.nr_qubits), dtype=np.uint8)
+        #The left environment of every shot, all sites to the right of the center are right-canonical
+        environment = np.ones((shots, 1), dtype=np.complex128)
+        for site, tensor in enumerate(self.tensors):
+            branches = np.einsum('sa,aib->sib', environment, tensor)
+            weights = np.sum(np.abs(branches)**2, axis=2)
+            p_one = weights[:, 1] / np.maximum(weights.sum(axis=1), 1e-300)
+            outcomes = (self.rng.random(shots) < p_one).astype(np.uint8)
+            samples[:, self.order[site]] = outcomes
+            environment = branches[np.arange(shots), outcomes]
+            norms = np.sqrt(np.maximum(weights[np.arange(shots), outcomes], 1e-300))
+            environment /= norms[:, None]
+        return samples
+
+    def report(self, shots=0, top=None):
+        '''Returns the classical bits, the truncation and the counts of the shots as text
+
+        Parameters
+        ----------
+        shots = 0 : integer
+            Amount of samples of the final state
+        top = None : integer
+            Amount of different outcomes to list, defaults to TOP_OUTCOMES
+        '''
+        top = top if top else self.TOP_OUTCOMES
+        n = self.nr_qubits
+        lines = [classical_bits(self.bits),
+                 f'Largest bond dimension: {self.largest_bond} (maximum {self.max_bond}), ' + \
+                 f'truncation error: {self.truncation_error:.3e}']
+        if shots > 0:
+            counts = collections.Counter(''.join(str(bit) for bit in reversed(sample)) for sample in self.sample(shots))
+            lines.append(f'Outcomes of {shots} shot(s) (q{n-1} ... q0):')
+            for outcome, count in counts.most_common(top):
+                lines.append(f'|{outcome}>  {count}  p = {count/shots:.6f}')
+            if len(counts) > top:
+                lines.append(f'... and {len(counts)-top} other outcome(s)')
+        return '\n'.join(lines)
+
+def simulate(data, max_bond=None, cutoff=None, shots=0, seed=None, top=None):
+    '''Parses and simulates the code of a circuit, returns the report as text
+
+    Parameters
+    ----------
+    data : string
+        The code of the circuit
+    max_bond = None : integer
+        The maximum bond dimension
+    cutoff = None : float
+        The relative cutoff of the singular values
+    shots = 0 : integer
+        Amount of samples of the final state
+    seed = None : integer
+        Seed of the random generator of the measurements and the shots
+    top = None : integer
+        Amount of different outcomes to list
+    '''
+    start = time.perf_counter()
+    model = read_circuit(data)
+    simulator = MPSSimulator(model.nr_qubits, max_bond=max_bond, cutoff=cutoff, seed=seed)
+    simulator.run(model.operations())
+    report = simulator.report(shots=shots, top=top)
+
+    header = f'MPS simulation of {model.nr_qubits} qubit(s), {simulator.nr_gates} gate(s) and ' + \
+             f'{simulator.nr_swaps} routing swap(s) in {time.perf_counter()-start:.3f} s'
+    return simulation_report(header, model, report)
+
+def simulate_file(filename, max_bond=None, cutoff=None, shots=0, seed=None, top=None):
+    '''Simulates the circuit in a .qc file, see simulate(...)'''
+    with open(filename, 'r') as file:
+        return simulate(file.read(), max_bond=max_bond, cutoff=cutoff, shots=shots, seed=seed, top=top)
+
+def main(argv=None):
+    '''Runs the simulator from the command line, see the module docstring.'''
+    argparser = simulator_argparser('MPSSimulator', 'Simulates a .qc file with a matrix product state.')
+    argparser.add_argument('--max-bond', type=int, default=None, help=f'maximum bond dimension ({MPSSimulator.MAX_BOND})')
+    argparser.add_argument('--cutoff', type=float, default=None, help=f'relative cutoff of the singular values ({MPSSimulator.CUTOFF})')
+    argparser.add_argument('--shots', type=int, default=0, help='amount of samples of the final state')
+    argparser.add_argument('--seed', type=int, default=None, help='seed of the measurement outcomes and the shots')
+    argparser.add_argument('--top', type=int, default=None, help='amount of different outcomes to list')
+
+    def run(args):
+        return simulate_file(args.file, max_bond=args.max_bond, cutoff=args.cutoff, shots=args.shots, seed=args.seed, \
+                             top=args.top)
+    return run_main(argparser, run, argv)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,439 @@
+'''Monte Carlo simulation of the noise of the 'error_model' statements, with many independent trajectories.
+
+Usage: python -m NoisySimulator FILE [--trajectories N] [--target HALF_WIDTH] [--confidence LEVEL]
+                                     [-j JOBS] [--batch SIZE] [--seed SEED] [--top TOP]
+
+The noise of a circuit is given by its 'error_model' statements, which apply to the whole circuit:
+
+    error_model depolarizing_channel, 0.001            #after every gate, on every qubit of the gate
+    error_model depolarizing_channel, 0.01, cnot, cz   #overrides the probability for these gates
+    error_model bit_flip_channel, 0.001                #an x error
+    error_model phase_flip_channel, 0.001              #a z error
+    error_model measurement_error, 0.02                #flips the outcome of a measurement
+
+A depolarizing channel with probability p applies x, y or z with probability p/3 each. Every trajectory applies its
+own random errors, and the outcomes of its measurements (its classical bits) are counted.
+
+The trajectories are simulated in batches: one StatevectorSimulator state holds all the trajectories of a batch next to
+each other, so every gate is applied to the whole batch at once, and the errors and measurements only differ per
+trajectory. The batches run in a process pool. Batch i always uses the i-th seed that is spawned from the seed of the
+run and the counts are added up in the order of the batches, so a run is reproducible for any amount of workers.
+
+The run stops early as soon as the confidence interval of every outcome probability is narrower than +- target.
+'''
+import collections
+import concurrent.futures
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+from StatevectorSimulator import StatevectorSimulator, check_circuit, read_circuit, run_main, simulation_report, \
+                                 simulator_argparser
+
+class NoiseModel(object):
+    '''NoiseModel gives the error probabilities of every gate, from the 'error_model' statements of a CircuitModel'''
+
+    #The errors of every channel, as (x error, z error) pairs that are equally likely
+    CHANNELS = {'depolarizing_channel': ((1, 0), (1, 1), (0, 1)),
+                'bit_flip_channel': ((1, 0),),
+                'phase_flip_channel': ((0, 1),)}
+    #Names of the same gate
+    ALIASES = {'not': 'x', 'ph': 's', 'cx': 'cnot', 'cphase': 'cz', 'class_cx': 'c-x', 'class_cz': 'c-z'}
+
+    def __init__(self, error_models=()):
+        '''Initializes the NoiseModel
+
+        Parameters
+        ----------
+        error_models = () : list
+            The CircuitModel.error_models: dictionaries with the 'channel', 'probability' and 'gates'
+        '''
+        #Per channel, the probability for all gates (None) and for specific gates
+        self.probabilities = {}
+        for error_model in error_models:
+            channel = self.probabilities.setdefault(error_model['channel'], {})
+            for gate in error_model['gates'] or [None]:
+                channel[self.ALIASES.get(gate, gate)] = error_model['probability']
+
+    def probability(self, channel, gate):
+        '''Returns the probability of channel after gate'''
+        probabilities = self.probabilities.get(channel, {})
+        return probabilities.get(self.ALIASES.get(gate, gate), probabilities.get(None, 0.0))
+
+    def gate_errors(self, gate):
+        '''Returns the (probability, errors) of every channel that acts after gate'''
+        result = []
+        for channel, errors in self.CHANNELS.items():
+            probability = self.probability(channel, gate)
+            if probability > 0:
+                result.append( (probability, errors) )
+        return result
+
+    def measurement_error(self):
+        '''Returns the probability that a measurement outcome is flipped'''
+        return self.probabilities.get('measurement_error', {}).get(None, 0.0)
+
+    def __bool__(self):
+        return any(probability > 0 for channel in self.probabilities.values() for probability in channel.values())
+
+class BatchSimulator(StatevectorSimulator):
+    '''BatchSimulator simulates a batch of trajectories at once: its state is the StatevectorSimulator state of every
+    trajectory, interleaved such that the trajectory is the fastest changing index'''
+
+    def __init__(self, nr_qubits, batch, seed=None):
+        '''Initializes the BatchSimulator with every trajectory in the state |0...0>
+
+        Parameters
+        ----------
+        nr_qubits : integer
+            The amount of qubits
+        batch : integer
+            The amount of trajectories
+        seed = None : integer or SeedSequence
+            Seed of the random generator of the errors and the measurements
+        '''
+        super().__init__(nr_qubits, seed=seed)
+        self.batch = batch
+        self.state = np.zeros(2**nr_qubits * batch, dtype=np.complex128)
+        self.state[:batch] = 1
+        #The classical bits of every trajectory
+        self.bits = np.zeros((nr_qubits, batch), dtype=np.uint8)
+
+    def split(self, qubits):
+        '''See StatevectorSimulator.split(...), with an extra last axis for the trajectories'''
+        shape, axes = self.split_shape(qubits)
+        return self.state.reshape(shape + [self.batch]), axes
+
+    def apply_masked(self, x, z, qubit, mask):
+        '''Applies the Pauli error x^x z^z to qubit in the trajectories of the boolean mask (up to a phase)'''
+        if not mask.any():
+            return
+        zero, one = self.halves(qubit)
+        if z:
+            one[..., mask] *= -1
+        if x:
+            old_zero = zero[..., mask]
+            zero[..., mask] = one[..., mask]
+            one[..., mask] = old_zero
+
+    def collapse(self, qubit):
+        '''Measures qubit in every trajectory, collapses the states and returns the outcomes'''
+        zero, one = self.halves(qubit)
+        axes = tuple(range(one.ndim-1))
+        p_one = np.sum(one.real**2 + one.imag**2, axis=axes)
+        outcomes = self.rng.random(self.batch) < p_one
+
+        zero[..., outcomes] = 0
+        one[..., ~outcomes] = 0
+        p_keep = np.where(outcomes, p_one, 1 - p_one)
+        scale = 1 / np.sqrt(np.where(p_keep > 0, p_keep, 1))
+        zero *= scale
+        one *= scale
+        return outcomes
+
+    def measure(self, qubit, flip=0.0):
+        '''Measures qubit in every trajectory, stores the outcomes in its classical bit, flipped with probability flip'''
+        outcomes = self.collapse(qubit)
+        if flip > 0:
+            outcomes ^= self.rng.random(self.batch) < flip
+        self.bits[qubit] = outcomes
+        self.nr_gates += 1
+
+    def prepz(self, qubit):
+        '''Resets qubit to |0> in every trajectory'''
+        self.apply_masked(1, 0, qubit, self.collapse(qubit))
+        self.nr_gates += 1
+
+    def noise(self, errors, rows):
+        '''Applies random errors to the qubits in rows of every trajectory
+
+        Parameters
+        ----------
+        errors : list
+            The output of NoiseModel.gate_errors(...)
+        rows : list of integers
+            The rows of the gate, the classical bits among them are skipped
+        '''
+        for row in rows:
+            if row >= self.nr_qubits:
+                continue
+            for probability, choices in errors:
+                hit = self.rng.random(self.batch) < probability
+                if not hit.any():
+                    continue
+                choice = self.rng.integers(len(choices), size=self.batch)
+                for idx, (x, z) in enumerate(choices):
+                    self.apply_masked(x, z, row, hit & (choice == idx))
+
+    def run(self, operations, noise_model):
+        '''Applies the operations of a circuit with the errors of noise_model, see CircuitModel.operations()
+
+        Parameters
+        ----------
+        operations : list
+            (gate, rows, angle) tuples
+        noise_model : NoiseModel
+            The errors
+        '''
+        n = self.nr_qubits
+        flip = noise_model.measurement_error()
+        errors = {}
+        for gate, rows, angle in operations:
+            if gate == 'measure':
+                self.measure(rows[0], flip=flip)
+                continue
+            if gate == 'prepz':
+                self.prepz(rows[0])
+            elif gate in self.CLASSICAL_GATES:
+                mask = np.ones(self.batch, dtype=bool)
+                for row in rows:
+                    if row >= n:
+                        mask &= self.bits[row-n].astype(bool)
+                x, z = (1, 0) if self.CLASSICAL_GATES[gate] == 'x' else (0, 1)
+                for row in rows:
+                    if row < n:
+                        self.apply_masked(x, z, row, mask)
+                self.nr_gates += 1
+            else:
+                super().run( [(gate, rows, angle)] )
+
+            if gate not in errors:
+                errors[gate] = noise_model.gate_errors(gate)
+            if errors[gate]:
+                self.noise(errors[gate], rows)
+
+    def counts(self):
+        '''Returns a Counter of the classical bits of the trajectories, as strings b(n-1) ... b0'''
+        values, counts = np.unique(self.bits[::-1].T, axis=0, return_counts=True)
+        return collections.Counter( {''.join(str(bit) for bit in value): int(count) \
+                                     for value, count in zip(values, counts)} )
+
+def run_batch(nr_qubits, operations, error_models, size, seed):
+    '''Simulates one batch of trajectories. Runs inside a worker process.
+
+    Parameters
+    ----------
+    nr_qubits : integer
+        The amount of qubits
+    operations : list
+        The CircuitModel.operations()
+    error_models : list
+        The CircuitModel.error_models
+    size : integer
+        The amount of trajectories
+    seed : SeedSequence
+        The seed of this batch
+
+    Output
+    ------
+    Counter of the classical bits of the trajectories
+    '''
+    noise_model = NoiseModel(error_models)
+    counts = collections.Counter()
+    #Keep the state of the batch in memory, a large circuit is split into smaller parts
+    part = max(1, min(size, NoisySimulator.MAX_AMPLITUDES // 2**nr_qubits))
+    rng = np.random.default_rng(seed)
+    done = 0
+    while done < size:
+        simulator = BatchSimulator(nr_qubits, min(part, size-done), seed=rng.integers(2**63))
+        simulator.run(operations, noise_model)
+        counts.update(simulator.counts())
+        done += simulator.batch
+    return counts
+
+def confidence_half_width(counts, total, z):
+    '''Returns the largest half width of the (Wilson) confidence intervals of the outcome probabilities'''
+    if total == 0:
+        return 1.0
+    worst = 0.0
+    #The half width is largest for the probability closest to 1/2, and an unseen outcome has probability 0
+    for count in list(counts.values()) + [0]:
+        p = count / total
+        worst = max(worst, z * math.sqrt(p*(1-p)/total + z*z/(4*total*total)) / (1 + z*z/total))
+    return worst
+
+class NoisySimulator(object):
+    '''NoisySimulator runs the trajectories of a noisy circuit in a process pool, and adds up their outcomes'''
+
+    #Standard amount of trajectories, and of trajectories per batch
+    TRAJECTORIES = 100000
+    BATCH = 1000
+    #Maximum amount of amplitudes of one BatchSimulator state (256 MB)
+    MAX_AMPLITUDES = 2**24
+    #Standard confidence level of the early stopping
+    CONFIDENCE = 0.95
+
+    def __init__(self, model, seed=None, jobs=None, batch=None):
+        '''Initializes the NoisySimulator
+
+        Parameters
+        ----------
+        model : CircuitModel
+            The parsed circuit, with its error_models
+        seed = None : integer
+            Seed of the run, every batch gets its own seed that is spawned from it
+        jobs = None : integer
+            The amount of worker processes, defaults to the amount of CPUs. 1 runs the batches in this process.
+        batch = None : integer
+            The amount of trajectories per batch, defaults to BATCH
+        '''
+        check_circuit(model)
+        if model.nr_qubits > StatevectorSimulator.MAX_QUBITS:
+            raise ValueError(f'NoisySimulator supports at most {StatevectorSimulator.MAX_QUBITS} qubits')
+        self.model = model
+        self.operations = model.operations()
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.jobs = jobs
+        self.batch = batch if batch else self.BATCH
+
+        self.counts = collections.Counter()
+        self.total = 0
+        self.half_width = 1.0
+
+    def run(self, trajectories=None, target=None, confidence=None, progress=None):
+        '''Runs trajectories until there are enough, or until the confidence intervals are narrow enough
+
+        Parameters
+        ----------
+        trajectories = None : integer
+            The maximum amount of trajectories, defaults to TRAJECTORIES
+        target = None : float
+            Stop as soon as every outcome probability is known within +- target, None never stops early
+        confidence = None : float
+            The confidence level of the intervals, defaults to CONFIDENCE
+        progress = None : function
+            Called as progress(simulator) after every batch that has been added up, can return True to stop
+
+        Output
+        ------
+        The Counter of the outcomes
+        '''
+        trajectories = trajectories if trajectories else self.TRAJECTORIES
+        z = self.z_score(confidence if confidence else self.CONFIDENCE)
+        sizes = [min(self.batch, trajectories - start) for start in range(0, trajectories, self.batch)]
+        seeds = self.seed_sequence.spawn(len(sizes))
+        arguments = lambda idx: (self.model.nr_qubits, self.operations, self.model.error_models, sizes[idx], seeds[idx])
+
+        def add(counts):
+            #Returns True if the run can stop
+            self.counts.update(counts)
+            self.total += sum(counts.values())
+            self.half_width = confidence_half_width(self.counts, self.total, z)
+            stop = progress(self) if progress else False
+            return stop or (target is not None and self.half_width <= target)
+
+        if self.jobs == 1 or len(sizes) == 1:
+            for idx in range(len(sizes)):
+                if add(run_batch(*arguments(idx))):
+                    break
+            return self.counts
+
+        workers = self.jobs if self.jobs else (os.cpu_count() or 1)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            #Keep every worker busy, but do not queue more batches than needed to stop early
+            in_flight = 2 * workers
+            futures = {}
+            finished = {}
+            next_submit = next_add = 0
+            while next_add < len(sizes):
+                while next_submit < len(sizes) and len(futures) < in_flight:
+                    futures[executor.submit(run_batch, *arguments(next_submit))] = next_submit
+                    next_submit += 1
+                done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    finished[futures.pop(future)] = future.result()
+                #Add the batches up in order, such that the result does not depend on the timing of the workers
+                stop = False
+                while next_add in finished and not stop:
+                    stop = add(finished.pop(next_add))
+                    next_add += 1
+                if stop:
+                    for future in futures:
+                        future.cancel()
+                    break
+        return self.counts
+
+    @staticmethod
+    def z_score(confidence):
+        '''Returns the z score of a two-sided confidence level, such as 1.96 for 0.95'''
+        from statistics import NormalDist
+        return NormalDist().inv_cdf(0.5 + confidence/2)
+
+    def report(self, top=None):
+        '''Returns the counts of the outcomes as text
+
+        Parameters
+        ----------
+        top = None : integer
+            Amount of outcomes to list, defaults to StatevectorSimulator.TOP_STATES
+        '''
+        top = top if top else StatevectorSimulator.TOP_STATES
+        n = self.model.nr_qubits
+        lines = [f'{self.total} trajectories, confidence interval of the probabilities +- {self.half_width:.5f}',
+                 f'Outcomes (b{n-1} ... b0):']
+        for outcome, count in self.counts.most_common(top):
+            lines.append(f'{outcome}  {count}  p = {count/self.total:.6f}')
+        if len(self.counts) > top:
+            lines.append(f'... and {len(self.counts)-top} other outcome(s)')
+        return '\n'.join(lines)
+
+def simulate(data, trajectories=None, target=None, confidence=None, seed=None, jobs=None, batch=None, top=None, \
+             progress=None):
+    '''Parses the code of a circuit and runs its noisy trajectories, returns the report as text
+
+    Parameters
+    ----------
+    data : string
+        The code of the circuit
+    trajectories, target, confidence, progress : see NoisySimulator.run(...)
+    seed, jobs, batch : see NoisySimulator(...)
+    top = None : integer
+        Amount of outcomes to list
+    '''
+    start = time.perf_counter()
+    model = read_circuit(data)
+    simulator = NoisySimulator(model, seed=seed, jobs=jobs, batch=batch)
+    simulator.run(trajectories=trajectories, target=target, confidence=confidence, progress=progress)
+
+    noise = ', '.join(f"{e['channel']} {e['probability']:g}" + (f" ({', '.join(e['gates'])})" if e['gates'] else '') \
+                      for e in model.error_models)
+    header = f'Noisy simulation of {model.nr_qubits} qubit(s) in {time.perf_counter()-start:.3f} s, ' + \
+             f'noise: {noise if noise else "none"}'
+    return simulation_report(header, model, simulator.report(top=top))
+
+def simulate_file(filename, **kwargs):
+    '''Runs the noisy trajectories of the circuit in a .qc file, see simulate(...)'''
+    with open(filename, 'r') as file:
+        return simulate(file.read(), **kwargs)
+
+def main(argv=None):
+    '''Runs the simulator from the command line, see the module docstring.'''
+    argparser = simulator_argparser('NoisySimulator', 'Simulates the noise of the error_model statements of a .qc file.')
+    argparser.add_argument('--trajectories', type=int, default=None, \
+                           help=f'maximum amount of trajectories ({NoisySimulator.TRAJECTORIES})')
+    argparser.add_argument('--target', type=float, default=None, help='stop once every probability is known within +- TARGET')
+    argparser.add_argument('--confidence', type=float, default=None, \
+                           help=f'confidence level of the intervals ({NoisySimulator.CONFIDENCE})')
+    argparser.add_argument('-j', '--jobs', type=int, default=None, help='amount of worker processes')
+    argparser.add_argument('--batch', type=int, default=None, help=f'trajectories per batch ({NoisySimulator.BATCH})')
+    argparser.add_argument('--seed', type=int, default=None, help='seed of the run')
+    argparser.add_argument('--top', type=int, default=None, help='amount of outcomes to list')
+
+    def progress(simulator):
+        sys.stderr.write(f'\r{simulator.total} trajectories, +- {simulator.half_width:.5f}')
+        sys.stderr.flush()
+
+    def run(args):
+        report = simulate_file(args.file, trajectories=args.trajectories, target=args.target, \
+                               confidence=args.confidence, seed=args.seed, jobs=args.jobs, batch=args.batch, \
+                               top=args.top, progress=progress)
+        #End the line of the progress
+        sys.stderr.write('\n')
+        return report
+    return run_main(argparser, run, argv)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,341 @@
+'''Runs a .qc file with symbolic rotation angles, such as "rx q0, {theta}", for many concrete values of the symbols.
+
+Usage: python -m ParameterSweep FILE -p theta=0:pi:11 [-p phi=0,pi/2] [--zip] [--exe SIMULATOR] [-j JOBS]
+                                [--csv TABLE] [--variants DIRECTORY] [--no-cache]
+
+A range "start:stop:num" gives num evenly spaced values from start up to and including stop, a list "a,b,c" gives
+exactly those values. Values may use pi, e.g. "pi/4" or "-2*pi". By default every combination of the values of the
+symbols is a variant (a grid), with --zip the i-th values of all the symbols form the i-th variant.
+
+Every variant is run through the Simulator in a process pool. The output of a variant is cached on disk, keyed by its
+concrete code and the Simulator, so extending a sweep only runs the new points. All the outputs are collected in one
+CSV table with a column per symbol.
+'''
+import argparse
+import ast
+import concurrent.futures
+import csv
+import hashlib
+import io
+import itertools
+import math
+import operator
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+#A symbolic angle in the code: {name} as an argument, after a comma. A one-statement parallel block such as
+#'{ measure }' is not a symbolic angle.
+PARAMETER = re.compile(r'(?<=,)(?P<space>\s*)\{\s*(?P<name>[A-Za-z_]\w*)\s*\}')
+#Standard directory of the result cache, in the current working directory
+CACHE_DIR_NAME = '.qc_sweep_cache'
+#Amount of variants that a worker handles at once
+CHUNK_SIZE = 4
+
+#The operations that are allowed in a value
+OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv, \
+             ast.Pow: operator.pow, ast.USub: operator.neg, ast.UAdd: operator.pos}
+CONSTANTS = {'pi': math.pi, 'e': math.e}
+
+def find_parameters(code):
+    '''Returns the names of the symbolic angles in code, in order of first appearance
+
+    Parameters
+    ----------
+    code : string
+        The code of the circuit
+    '''
+    names = []
+    for match in PARAMETER.finditer(code):
+        if match.group('name') not in names:
+            names.append(match.group('name'))
+    return names
+
+def substitute(code, values):
+    '''Returns the concrete code in which every symbolic angle is replaced by its value
+
+    Parameters
+    ----------
+    code : string
+        The code of the circuit
+    values : dictionary
+        The value of every symbol
+    '''
+    def replace(match):
+        name = match.group('name')
+        if name not in values:
+            raise KeyError(f'ParameterSweep has no value for the symbol {name}')
+        return match.group('space') + format_value(values[name])
+    return PARAMETER.sub(replace, code)
+
+def format_value(value):
+    '''Returns value as text, with enough digits to reproduce the angle'''
+    return f'{value:.12g}'
+
+def parse_value(text):
+    '''Evaluates a number such as "0.5", "pi/4" or "-2*pi", without using eval(...)
+
+    Parameters
+    ----------
+    text : string
+        The value
+    '''
+    def evaluate(node):
+        if isinstance(node, ast.Expression):
+            return evaluate(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return float(node.value)
+        if isinstance(node, ast.Name) and node.id in CONSTANTS:
+            return CONSTANTS[node.id]
+        if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+            return OPERATORS[type(node.op)](evaluate(node.left), evaluate(node.right))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in OPERATORS:
+            return OPERATORS[type(node.op)](evaluate(node.operand))
+        raise ValueError(f'ParameterSweep does not understand the value {text}')
+    try:
+        return evaluate(ast.parse(text.strip(), mode='eval'))
+    except SyntaxError:
+        raise ValueError(f'ParameterSweep does not understand the value {text}')
+
+def parse_range(text):
+    '''Returns the values of a range "start:stop:num" or of a list "a,b,c"
+
+    Parameters
+    ----------
+    text : string
+        The range or list
+    '''
+    if ':' in text:
+        parts = text.split(':')
+        if len(parts) != 3:
+            raise ValueError(f'ParameterSweep expects a range start:stop:num, not {text}')
+        start, stop, num = parse_value(parts[0]), parse_value(parts[1]), int(parts[2])
+        if num < 1:
+            raise ValueError(f'ParameterSweep needs at least one value in the range {text}')
+        if num == 1:
+            return [start]
+        return [start + (stop-start)*idx/(num-1) for idx in range(num)]
+    return [parse_value(value) for value in text.split(',') if value.strip()]
+
+def parse_ranges(specs):
+    '''Returns the values of every symbol
+
+    Parameters
+    ----------
+    specs : list of strings
+        Ranges of the form "name=start:stop:num" or "name=a,b,c"
+
+    Output
+    ------
+    Dictionary with a list of values per symbol, in the order of specs
+    '''
+    ranges = {}
+    for spec in specs:
+        if '=' not in spec:
+            raise ValueError(f'ParameterSweep expects name=values, not {spec}')
+        name, values = spec.split('=', 1)
+        ranges[name.strip()] = parse_range(values)
+    return ranges
+
+def variants(ranges, zip_=False):
+    '''Returns the values of the symbols for every variant
+
+    Parameters
+    ----------
+    ranges : dictionary
+        The values per symbol, see parse_ranges(...)
+    zip_ = False : Boolean
+        If False, every combination of the values is a variant. If True, the i-th values of all the symbols form the
+        i-th variant, so all the ranges need the same length.
+
+    Output
+    ------
+    List of dictionaries with the value of every symbol
+    '''
+    names = list(ranges.keys())
+    if zip_:
+        lengths = set(len(values) for values in ranges.values())
+        if len(lengths) > 1:
+            raise ValueError('ParameterSweep --zip needs ranges of the same length')
+        combinations = zip(*ranges.values())
+    else:
+        combinations = itertools.product(*ranges.values())
+    return [dict(zip(names, combination)) for combination in combinations]
+
+def variant_key(exe_filename, code):
+    '''Returns the cache key of a concrete variant: the hash of the code and of the Simulator (path, size and mtime)'''
+    stat = os.stat(exe_filename)
+    key = f'{os.path.abspath(exe_filename)}\0{stat.st_size}\0{stat.st_mtime}\0{code}'
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def run_variant(exe_filename, code, cache_dir=None):
+    '''Runs one concrete variant through the Simulator. Runs inside a worker process.
+
+    Parameters
+    ----------
+    exe_filename : string
+        The path to the Simulator
+    code : string
+        The concrete code of the variant
+    cache_dir = None : string
+        The directory of the result cache. If None, the variant is always run.
+
+    Output
+    ------
+    Tuple (output, cached)
+    '''
+    cache_filename = None
+    if cache_dir:
+        cache_filename = os.path.join(cache_dir, variant_key(exe_filename, code) + '.txt')
+        try:
+            with open(cache_filename, 'r', encoding='utf-8') as file:
+                return file.read(), True
+        except OSError:
+            pass
+
+    #The Simulator reads files, so every variant gets its own temporary file
+    fd, qc_filename = tempfile.mkstemp(suffix='.qc')
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(code)
+        output = subprocess.run([exe_filename, qc_filename], stdout=subprocess.PIPE).stdout.decode('utf-8', errors='replace')
+    finally:
+        os.remove(qc_filename)
+
+    if cache_filename:
+        #Write through a temporary file, such that a parallel worker never reads half an output
+        try:
+            fd, tmp_filename = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                file.write(output)
+            os.replace(tmp_filename, cache_filename)
+        except OSError:
+            pass
+    return output, False
+
+def write_variants(code, points, directory, stem='variant'):
+    '''Writes the concrete code of every variant to directory, as stem_0.qc, stem_1.qc, ...
+
+    Output
+    ------
+    List of the file names
+    '''
+    os.makedirs(directory, exist_ok=True)
+    filenames = []
+    for idx, values in enumerate(points):
+        filename = os.path.join(directory, f'{stem}_{idx}.qc')
+        with open(filename, 'w') as file:
+            file.write(substitute(code, values))
+        filenames.append(filename)
+    return filenames
+
+def sweep(code, ranges, exe_filename, zip_=False, jobs=None, cache_dir=CACHE_DIR_NAME):
+    '''Runs every variant of code through the Simulator
+
+    Parameters
+    ----------
+    code : string
+        The code of the circuit, with symbolic angles
+    ranges : dictionary
+        The values per symbol, see parse_ranges(...)
+    exe_filename : string
+        The path to the Simulator
+    zip_ = False : Boolean
+        See variants(...)
+    jobs = None : integer
+        The amount of worker processes, defaults to the amount of CPUs
+    cache_dir = CACHE_DIR_NAME : string
+        The directory of the result cache, None disables the cache
+
+    Output
+    ------
+    List of rows (values, output, cached), in the order of variants(...)
+    '''
+    missing = [name for name in find_parameters(code) if name not in ranges]
+    if missing:
+        raise ValueError(f'ParameterSweep has no range for the symbol(s) {", ".join(missing)}')
+
+    points = variants(ranges, zip_=zip_)
+    codes = [substitute(code, values) for values in points]
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    exe_filenames = [exe_filename] * len(codes)
+    cache_dirs = [cache_dir] * len(codes)
+    if len(codes) > 1 and jobs != 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(run_variant, exe_filenames, codes, cache_dirs, chunksize=CHUNK_SIZE))
+    else:
+        results = [run_variant(*args) for args in zip(exe_filenames, codes, cache_dirs)]
+
+    return [(values, output, cached) for values, (output, cached) in zip(points, results)]
+
+def table(rows, names, file):
+    '''Writes the results of sweep(...) as a CSV table, with a column per symbol and a column with the output
+
+    Parameters
+    ----------
+    rows : list
+        The output of sweep(...)
+    names : list of strings
+        The names of the symbols, in the order of the columns
+    file : File
+        The file to write to
+    '''
+    writer = csv.writer(file)
+    writer.writerow(['variant'] + names + ['cached', 'output'])
+    for idx, (values, output, cached) in enumerate(rows):
+        writer.writerow([idx] + [format_value(values[name]) for name in names] + [int(cached), output.strip()])
+
+def table_text(rows, names):
+    '''Returns the CSV table of table(...) as a string'''
+    file = io.StringIO()
+    table(rows, names, file)
+    return file.getvalue()
+
+def main(argv=None):
+    '''Runs a sweep from the command line, see the module docstring.'''
+    argparser = argparse.ArgumentParser(prog='python -m ParameterSweep', \
+                                        description='Runs a .qc file for many values of its symbolic angles.')
+    argparser.add_argument('file', help='.qc file with symbolic angles such as {theta}')
+    argparser.add_argument('-p', '--param', action='append', default=[], help='name=start:stop:num or name=a,b,c')
+    argparser.add_argument('--zip', action='store_true', help='zip the ranges instead of taking every combination')
+    argparser.add_argument('--exe', help='path to the Simulator, without it only the variants are generated')
+    argparser.add_argument('-j', '--jobs', type=int, default=None, help='amount of worker processes')
+    argparser.add_argument('--csv', help='write the table to this file instead of stdout')
+    argparser.add_argument('--variants', help='write the concrete .qc file of every variant to this directory')
+    argparser.add_argument('--no-cache', action='store_true', help='run every variant, and do not store the outputs')
+    args = argparser.parse_args(argv)
+
+    with open(args.file, 'r') as file:
+        code = file.read()
+
+    try:
+        ranges = parse_ranges(args.param)
+        points = variants(ranges, zip_=args.zip)
+        if args.variants:
+            stem = os.path.splitext(os.path.basename(args.file))[0]
+            filenames = write_variants(code, points, args.variants, stem=stem)
+            sys.stderr.write(f'{len(filenames)} variant(s) written to {args.variants}\n')
+        if not args.exe:
+            return 0
+        rows = sweep(code, ranges, args.exe, zip_=args.zip, jobs=args.jobs, \
+                     cache_dir=None if args.no_cache else CACHE_DIR_NAME)
+    except (ValueError, KeyError) as e:
+        sys.stderr.write(f'{e}\n')
+        return 2
+
+    names = list(ranges.keys())
+    if args.csv:
+        with open(args.csv, 'w', newline='') as file:
+            table(rows, names, file)
+    else:
+        table(rows, names, sys.stdout)
+
+    sys.stderr.write(f'{len(rows)} variant(s), {sum(cached for _, _, cached in rows)} from the cache\n')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+'''Keeps the parsed circuit and the highlight tokens of files on disk, such that reopening an unchanged file needs
+neither the highlighter nor the circuit parser.
+
+Every file has one entry in the cache directory. An entry is a small binary header followed by a zlib-compressed JSON
+payload:
+
+    magic (4 bytes) | format version (uint16) | crc32 of the payload (uint32) | length of the payload (uint32)
+
+An entry is only used if the path, the mtime and size, and the content hash of the file all still match. Entries that
+are truncated, corrupt or of another format version are thrown away.
+'''
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import zlib
+
+class ParseCache(object):
+    '''On-disk cache of the parsed circuit and the highlight tokens, per file'''
+
+    #Identifies the entries of this cache, and the version of their format. Increase VERSION whenever the payload,
+    #the tokenizer of the FileEditor or the state of the CircuitModel changes.
+    MAGIC = b'QCPC'
+    VERSION = 4
+    HEADER = struct.Struct('<4sHII')
+
+    #Standard directory of the cache, in the current working directory, just like the preferences
+    DIRECTORY_NAME = '.qc_parse_cache'
+    #Extension of the entries
+    EXTENSION = '.qcc'
+    #The least recently used entries are removed as soon as the cache grows beyond this amount of bytes
+    MAX_BYTES = 32 * 1024 * 1024
+
+    def __init__(self, directory=None, max_bytes=None):
+        '''Initializes the ParseCache
+
+        Parameters
+        ----------
+        directory = None : string
+            The directory in which the entries are stored, defaults to DIRECTORY_NAME
+        max_bytes = None : integer
+            The maximum size of all the entries together, defaults to MAX_BYTES
+        '''
+        self.directory = directory if directory else self.DIRECTORY_NAME
+        self.max_bytes = max_bytes if max_bytes else self.MAX_BYTES
+
+    @staticmethod
+    def content_hash(content):
+        '''Returns the hash of the content of a file
+
+        Parameters
+        ----------
+        content : string
+            The content of the file
+        '''
+        return hashlib.sha1(content.encode('utf-8', errors='replace')).hexdigest()
+
+    def entry_filename(self, path):
+        '''Returns the filename of the entry that belongs to path'''
+        key = hashlib.sha1(os.path.abspath(path).encode('utf-8', errors='replace')).hexdigest()
+        return os.path.join(self.directory, key + self.EXTENSION)
+
+    def get(self, path, content_hash):
+        '''Returns the cached entry of path, or None if there is no valid entry
+
+        Parameters
+        ----------
+        path : string
+            The path to the file
+        content_hash : string
+            The content_hash(...) of the current content of the file
+
+        Output
+        ------
+        Dictionary with the 'tokens' of the highlighter and the 'model' state of the CircuitModel (either can be None)
+        '''
+        entry_filename = self.entry_filename(path)
+        try:
+            stat = os.stat(path)
+            with open(entry_filename, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        try:
+            payload = self.decode(data)
+        except (ValueError, struct.error, zlib.error, UnicodeDecodeError):
+            #A corrupt entry is useless, make sure we do not read it again
+            self.remove(entry_filename)
+            return None
+
+        if payload.get('path') != os.path.abspath(path) or payload.get('mtime') != stat.st_mtime or \
+           payload.get('size') != stat.st_size or payload.get('hash') != content_hash:
+            return None
+
+        #Mark the entry as recently used, for the eviction
+        try:
+            os.utime(entry_filename)
+        except OSError:
+            pass
+        return {'tokens': payload.get('tokens'), 'model': payload.get('model')}
+
+    def put(self, path, content_hash, tokens=None, model=None):
+        '''Stores the entry of path. Failures are ignored, as the cache is only an optimization.
+
+        Parameters
+        ----------
+        path : string
+            The path to the file
+        content_hash : string
+            The content_hash(...) of the content of the file that tokens and model belong to
+        tokens = None : list
+            The highlight tokens of the file, see FileEditor.tokenize(...)
+        model = None : dictionary
+            The state of the CircuitModel of the file, see CircuitModel.get_state()
+        '''
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+
+        payload = {'path': os.path.abspath(path), 'mtime': stat.st_mtime, 'size': stat.st_size, \
+                   'hash': content_hash, 'tokens': tokens, 'model': model}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self.write(self.entry_filename(path), self.encode(payload))
+        except (OSError, TypeError, ValueError):
+            return
+
+        self.evict()
+
+    def encode(self, payload):
+        '''Returns the bytes of an entry with the dictionary payload'''
+        data = zlib.compress(json.dumps(payload, separators=(',',':')).encode('utf-8'))
+        return self.HEADER.pack(self.MAGIC, self.VERSION, zlib.crc32(data), len(data)) + data
+
+    def decode(self, data):
+        '''Returns the dictionary payload of the bytes of an entry, raises a ValueError if the entry is invalid'''
+        magic, version, crc, length = self.HEADER.unpack_from(data)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError('ParseCache entry has an unknown format')
+        data = data[self.HEADER.size:]
+        if len(data) != length or zlib.crc32(data) != crc:
+            raise ValueError('ParseCache entry is corrupt')
+        payload = json.loads(zlib.decompress(data).decode('utf-8'))
+        if not isinstance(payload, dict):
+            raise ValueError('ParseCache entry is corrupt')
+        return payload
+
+    def write(self, entry_filename, data):
+        '''Writes an entry through a temporary file, such that a crash halfway never leaves a partial entry behind'''
+        fd, tmp_filename = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_filename, entry_filename)
+        except OSError:
+            self.remove(tmp_filename)
+            raise
+
+    def remove(self, filename):
+        '''Removes a file of the cache, if it still exists'''
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+    def evict(self):
+        '''Removes the least recently used entries until the cache is no larger than self.max_bytes'''
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for dir_entry in it:
+                    if dir_entry.name.endswith(self.EXTENSION):
+                        stat = dir_entry.stat()
+                        entries.append( (stat.st_mtime, stat.st_size, dir_entry.path) )
+        except OSError:
+            return
+
+        total = sum(size for _, size, _ in entries)
+        #Oldest first
+        entries.sort()
+        for _, size, entry_filename in entries:
+            if total <= self.max_bytes:
+                break
+            self.remove(entry_filename)
+            total -= size
@@ -0,0 +1,343 @@
+'''Estimates the memory and the runtime that a simulator needs for a circuit, before it runs.
+
+Usage: python -m ResourceEstimator FILE [--backend BACKEND]
+
+The estimate only needs the parsed circuit: the amount of qubits, the gate counts (with the repeats of the subroutines
+unrolled), the depth and the measurements. Every backend has a model of its memory, and of the amount of work per gate
+in 'units' (roughly the amount of numbers that a gate touches, plus a fixed overhead per gate).
+
+The runtime is units times the seconds per unit of the backend. That factor is calibrated from the previous runs: every
+finished run records its units and its duration in a small JSON file, and the median of the recent factors is used.
+Without any runs, a conservative standard factor is used.
+'''
+import argparse
+import collections
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+
+from CircuitRender2 import CircuitModel
+
+class ResourceEstimator(object):
+    '''ResourceEstimator predicts the memory and the runtime of a simulation, and learns from the finished runs'''
+
+    #Standard file of the calibration, in the current working directory, just like the preferences
+    CALIBRATION_FILE_NAME = '.qc_resource_calibration.json'
+    #Amount of runs per backend that the calibration remembers
+    MAX_SAMPLES = 50
+
+    #Standard seconds per unit of every backend, before any run has been recorded
+    SECONDS_PER_UNIT = {'exe': 5e-9, 'statevector': 5e-9, 'stabilizer': 5e-9, 'mps': 5e-9, 'noisy': 5e-9}
+    #Fixed amount of work per gate: the Python and process overhead
+    GATE_OVERHEAD = 2000
+    #Fixed memory of a simulator process: the interpreter and its libraries
+    BASE_MEMORY = 50 * 1024**2
+    #Bytes per complex amplitude
+    AMPLITUDE_BYTES = 16
+    #Maximum amount of amplitudes of one batch of the NoisySimulator (NoisySimulator.MAX_AMPLITUDES, which would
+    #import NumPy), and its standard amount of trajectories and trajectories per batch
+    NOISY_MAX_AMPLITUDES = 2**24
+    NOISY_TRAJECTORIES = 100000
+    NOISY_BATCH = 1000
+    #Above this amount of qubits the statevector backend runs Clifford-only circuits on the stabilizer backend instead
+    #(StatevectorSimulator.MAX_QUBITS)
+    STATEVECTOR_MAX_QUBITS = 30
+
+    def __init__(self, filename=None):
+        '''Initializes the ResourceEstimator
+
+        Parameters
+        ----------
+        filename = None : string
+            The calibration file, defaults to CALIBRATION_FILE_NAME
+        '''
+        self.filename = filename if filename else self.CALIBRATION_FILE_NAME
+        #Per backend, the list of [units, seconds] of the recent runs
+        self.samples = {}
+        try:
+            with open(self.filename, 'r') as file:
+                samples = json.load(file)
+            if isinstance(samples, dict):
+                self.samples = {backend: [list(sample) for sample in runs if len(sample) == 2] \
+                                for backend, runs in samples.items() if isinstance(runs, list)}
+        except (OSError, ValueError, TypeError):
+            pass
+
+    @staticmethod
+    def column_repeats(model):
+        '''Returns the amount of times that every column of a parsed circuit runs, see CircuitModel.operations()'''
+        times = [1] * (model.max_col + 1)
+        for subroutine in model.subroutines:
+            if subroutine['repeat'] > 1:
+                for col in range(subroutine['start'], min(subroutine['end'], len(times))):
+                    times[col] = subroutine['repeat']
+        return times
+
+    @staticmethod
+    def profile(model):
+        '''Returns the figures of a parsed circuit that the estimate needs
+
+        Parameters
+        ----------
+        model : CircuitModel
+            The parsed circuit
+
+        Output
+        ------
+        Dictionary with 'nr_qubits', the 'gates' (Counter per gate), 'nr_gates' (without measurements),
+        'measurements', 'depth' (amount of columns that are executed) and 'repeats' (extra executions of subroutines)
+        '''
+        #Count every gate in the grid once, times the amount of times that its column runs, instead of unrolling the
+        #repeats with model.operations(). Every participant of a gate has its own GridElement, so only count the
+        #first one, and a measurement once per measured qubit.
+        gates = collections.Counter()
+        times = ResourceEstimator.column_repeats(model)
+        for row, grid_row in enumerate(model.grid):
+            for col, ge in grid_row.items():
+                if (row < model.nr_qubits if ge.gate == 'measure' else row == ge.participant_rows[0]):
+                    gates[ge.gate] += times[col]
+        repeats = sum( (subroutine['repeat']-1) * (subroutine['end']-subroutine['start']) \
+                       for subroutine in model.subroutines if subroutine['repeat'] > 1 )
+        return {'nr_qubits': model.nr_qubits, 'gates': gates, 'measurements': gates['measure'], \
+                'nr_gates': sum(gates.values()) - gates['measure'], 'depth': model.max_col + 1 + repeats, \
+                'repeats': repeats}
+
+    def memory(self, profile, backend, max_bond=64, batch=NOISY_BATCH):
+        '''Returns the estimated memory in bytes of a backend as a float, see estimate(...)'''
+        n = profile['nr_qubits']
+        if backend == 'stabilizer':
+            words = (n + 63) // 64
+            #X and Z bits of 2n rows, and the copies of a measurement
+            return float(self.BASE_MEMORY + 4 * 2*n * words * 8)
+        if backend == 'mps':
+            bond = float(min(max_bond, power_of_two(n//2)))
+            #The tensors, and the contraction and SVD of a gate on 3 sites
+            return self.BASE_MEMORY + n * bond**2 * 2 * self.AMPLITUDE_BYTES + 4 * bond**2 * 8 * self.AMPLITUDE_BYTES
+        if backend == 'noisy':
+            amplitudes = min(batch * power_of_two(n), max(self.NOISY_MAX_AMPLITUDES, power_of_two(n)))
+            #Every worker process holds its own batch
+            return (self.BASE_MEMORY + 2 * amplitudes * self.AMPLITUDE_BYTES) * (os.cpu_count() or 1)
+        #A statevector, and the temporary copy of half of it that some gates make
+        return self.BASE_MEMORY + power_of_two(n) * self.AMPLITUDE_BYTES * 1.5
+
+    def units(self, profile, backend, max_bond=64, trajectories=NOISY_TRAJECTORIES, batch=NOISY_BATCH):
+        '''Returns the estimated amount of work of a backend as a float (inf if it is too large), see estimate(...)'''
+        n = profile['nr_qubits']
+        operations = profile['nr_gates'] + profile['measurements']
+        if operations == 0:
+            return 0.0
+        if backend == 'stabilizer':
+            size = float(2*n * ((n + 63) // 64))
+        elif backend == 'mps':
+            bond = float(min(max_bond, power_of_two(n//2)))
+            #A two-qubit gate needs an SVD of a 2 bond x 2 bond matrix, and a long-range gate many swaps
+            size = 8 * bond**3 * max(1, n//4)
+        elif backend == 'noisy':
+            batches = math.ceil(trajectories / batch)
+            return batches * operations * (batch * power_of_two(n) + self.GATE_OVERHEAD)
+        else:
+            size = power_of_two(n)
+        return operations * (size + self.GATE_OVERHEAD)
+
+    def runs_on(self, model, backend):
+        '''Returns the backend that actually simulates a circuit: the statevector backend hands Clifford-only circuits
+        that are too large for a statevector to the stabilizer backend'''
+        if backend != 'statevector' or model.nr_qubits <= self.STATEVECTOR_MAX_QUBITS:
+            return backend
+        try:
+            #NumPy is only needed for this check, and without NumPy there is no statevector backend either
+            import StabilizerSimulator
+        except ImportError:
+            return backend
+        #Whether a gate is Clifford only depends on its name, its amount of rows and its angle, so only check every
+        #kind of gate once
+        kinds = { (ge.gate, len(ge.participant_rows), ge.angle) for grid_row in model.grid for ge in grid_row.values() }
+        if StabilizerSimulator.StabilizerSimulator.non_clifford([ (gate, [None]*size, angle) \
+                                                                  for gate, size, angle in kinds ]):
+            return backend
+        return 'stabilizer'
+
+    def seconds_per_unit(self, backend):
+        '''Returns the calibrated seconds per unit of a backend, and the amount of runs it is based on'''
+        runs = [seconds/units for units, seconds in self.samples.get(backend, []) if units > 0 and seconds > 0]
+        if not runs:
+            return self.SECONDS_PER_UNIT.get(backend, max(self.SECONDS_PER_UNIT.values())), 0
+        return statistics.median(runs), len(runs)
+
+    def estimate(self, model, backend, **options):
+        '''Estimates the resources of simulating a circuit
+
+        Parameters
+        ----------
+        model : CircuitModel
+            The parsed circuit
+        backend : string
+            One of the TextEditor.SIMULATOR_BACKENDS: 'exe', 'statevector', 'stabilizer', 'mps' or 'noisy'
+        **options
+            max_bond (mps), trajectories and batch (noisy)
+
+        Output
+        ------
+        Dictionary with the 'backend' that actually runs (see runs_on(...)), the 'profile', the 'memory' in bytes,
+        the amount of work in 'units', the runtime in 'seconds', and the amount of runs the runtime is 'calibrated'
+        on. The figures are floats, inf if they are too large to represent. The noisy backend also gives the maximum
+        amount of 'trajectories' and the 'batch' size that the units are based on.
+        '''
+        backend = self.runs_on(model, backend)
+        profile = self.profile(model)
+        memory_options = {key: value for key, value in options.items() if key in ('max_bond', 'batch')}
+        units = self.units(profile, backend, **options)
+        seconds_per_unit, calibrated = self.seconds_per_unit(backend)
+        estimate = {'backend': backend, 'profile': profile, 'memory': self.memory(profile, backend, **memory_options), \
+                    'units': units, 'seconds': units * seconds_per_unit, 'calibrated': calibrated}
+        if backend == 'noisy':
+            estimate['trajectories'] = options.get('trajectories', self.NOISY_TRAJECTORIES)
+            estimate['batch'] = options.get('batch', self.NOISY_BATCH)
+        return estimate
+
+    @staticmethod
+    def units_done(estimate, backend=None, trajectories=None):
+        '''Returns the units of the work that a run actually did, or None if its estimate does not describe that work
+
+        Parameters
+        ----------
+        estimate : dictionary
+            The output of estimate(...) of the run
+        backend = None : string
+            The backend that actually ran, if the run reported it
+        trajectories = None : integer
+            The amount of trajectories that a noisy run actually ran, if it reported it (it can stop early)
+        '''
+        if backend is not None and backend != estimate['backend']:
+            return None
+        if not math.isfinite(estimate['units']):
+            return None
+        if estimate['backend'] == 'noisy':
+            if trajectories is None or trajectories <= 0:
+                return None
+            batches = math.ceil(estimate['trajectories'] / estimate['batch'])
+            return estimate['units'] * math.ceil(trajectories / estimate['batch']) / batches
+        return estimate['units']
+
+    def record(self, backend, units, seconds):
+        '''Records a finished run, and stores the calibration. Failures are ignored.
+
+        Parameters
+        ----------
+        backend : string
+            The backend of the run
+        units : integer
+            The 'units' of the estimate of the run
+        seconds : float
+            The duration of the run
+        '''
+        if not 0 < units < math.inf or seconds <= 0:
+            return
+        runs = self.samples.setdefault(backend, [])
+        runs.append([units, seconds])
+        del runs[:-self.MAX_SAMPLES]
+
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        try:
+            fd, tmp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as file:
+                json.dump(self.samples, file)
+            os.replace(tmp_filename, self.filename)
+        except OSError:
+            pass
+
+    @staticmethod
+    def exceeds(estimate, max_memory=None, max_seconds=None):
+        '''Returns the reasons why an estimate exceeds the limits (an empty list if it does not)
+
+        Parameters
+        ----------
+        estimate : dictionary
+            The output of estimate(...)
+        max_memory = None : integer
+            The maximum amount of bytes, None for no limit
+        max_seconds = None : float
+            The maximum runtime, None for no limit
+        '''
+        reasons = []
+        if max_memory is not None and estimate['memory'] > max_memory:
+            reasons.append(f"it needs about {format_bytes(estimate['memory'])} of memory, " + \
+                           f'the limit is {format_bytes(max_memory)}')
+        if max_seconds is not None and estimate['seconds'] > max_seconds:
+            reasons.append(f"it takes about {format_seconds(estimate['seconds'])}, " + \
+                           f'the limit is {format_seconds(max_seconds)}')
+        return reasons
+
+def power_of_two(exponent):
+    '''Returns 2**exponent as a float, or inf if it is too large for a float'''
+    try:
+        return math.ldexp(1.0, exponent)
+    except OverflowError:
+        return math.inf
+
+def format_bytes(amount):
+    '''Returns an amount of bytes as text, such as '1.5 GB' '''
+    if math.isinf(amount):
+        return 'out of range'
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB', 'PB'):
+        if amount < 1024 or unit == 'PB':
+            return f'{amount:.0f} {unit}' if unit == 'B' else f'{amount:.1f} {unit}'
+        amount /= 1024
+
+def format_seconds(seconds):
+    '''Returns a duration as text, such as '2.5 s' or '3.0 h' '''
+    if math.isinf(seconds):
+        return 'out of range'
+    if seconds < 60:
+        return f'{seconds:.1f} s' if seconds >= 0.1 else '< 0.1 s'
+    if seconds < 3600:
+        return f'{seconds/60:.1f} min'
+    if seconds < 86400:
+        return f'{seconds/3600:.1f} h'
+    return f'{seconds/86400:.1f} days'
+
+def summary(estimate):
+    '''Returns a short description of an estimate, for next to the Run button'''
+    calibrated = '' if estimate['calibrated'] else '?'
+    memory, seconds = format_bytes(estimate['memory']), format_seconds(estimate['seconds'])
+    if not math.isfinite(estimate['seconds']):
+        return f'{memory}, {seconds}'
+    return f"~{memory}, {'' if seconds.startswith('<') else '~'}{seconds}{calibrated}"
+
+def report(estimate):
+    '''Returns an estimate and the profile of its circuit as text'''
+    profile = estimate['profile']
+    lines = [f"Backend: {estimate['backend']}",
+             f"Qubits: {profile['nr_qubits']}, gates: {profile['nr_gates']}, measurements: {profile['measurements']}, " + \
+             f"depth: {profile['depth']}" + (f" ({profile['repeats']} columns from repeats)" if profile['repeats'] else ''),
+             'Gates: ' + ', '.join(f'{gate} {count}' for gate, count in sorted(profile['gates'].items())),
+             f"Memory: ~{format_bytes(estimate['memory'])}",
+             f"Runtime: ~{format_seconds(estimate['seconds'])} " + \
+             (f"(calibrated on {estimate['calibrated']} run(s))" if estimate['calibrated'] else '(not calibrated yet)')]
+    return '\n'.join(lines) + '\n'
+
+def main(argv=None):
+    '''Estimates the resources of a file from the command line, see the module docstring.'''
+    argparser = argparse.ArgumentParser(prog='python -m ResourceEstimator', \
+                                        description='Estimates the memory and runtime of simulating a .qc file.')
+    argparser.add_argument('file', help='.qc file to estimate')
+    argparser.add_argument('--backend', default='statevector', choices=sorted(ResourceEstimator.SECONDS_PER_UNIT), \
+                           help='the simulator backend')
+    args = argparser.parse_args(argv)
+
+    try:
+        with open(args.file, 'r') as file:
+            data = file.read()
+    except OSError as e:
+        sys.stderr.write(f'{e}\n')
+        return 1
+    model = CircuitModel()
+    model.read(data)
+    sys.stdout.write(report(ResourceEstimator().estimate(model, args.backend)))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,289 @@
+'''Keeps the output of every simulator run, such that runs can be looked up and compared later.
+
+Every run is a row of a small SQLite database: the file that ran, the hash of its code, the simulator, when it ran,
+how long it took, its exit code, and its output (compressed with zlib). The runs of a file are found through an index.
+The oldest runs are removed as soon as there are more than max_runs, or their outputs take more than max_bytes.
+
+The outputs of two runs are compared with diff(...), which compares the hashes of the lines instead of the lines
+themselves. The common start and end are skipped in chunks, and long ranges are split at lines that occur once on both
+sides before a SequenceMatcher compares them. Long runs of equal lines are collapsed, so even the diff of outputs with
+a million lines is small enough to show.
+'''
+import difflib
+import hashlib
+import sqlite3
+import time
+import zlib
+
+class RunHistory(object):
+    '''RunHistory stores the runs of the simulator in an SQLite database'''
+
+    #Standard file of the database, in the current working directory, just like the preferences
+    FILE_NAME = '.qc_run_history.sqlite'
+    #Standard retention limits: the amount of runs, and the compressed size of their outputs
+    MAX_RUNS = 500
+    MAX_BYTES = 256 * 1024**2
+    #zlib compression level of the outputs
+    COMPRESSION_LEVEL = 6
+
+    #The fields of a run, without its output
+    FIELDS = ('run_id', 'filename', 'source_hash', 'simulator', 'timestamp', 'duration', 'exit_code', 'output_size', \
+              'stored_size')
+
+    def __init__(self, filename=None, max_runs=None, max_bytes=None):
+        '''Initializes the RunHistory, and creates the database if it does not exist yet. If the database cannot be
+        opened, the RunHistory stays empty and does not record anything.
+
+        Parameters
+        ----------
+        filename = None : string
+            The database file, defaults to FILE_NAME
+        max_runs = None : integer
+            The maximum amount of runs, defaults to MAX_RUNS
+        max_bytes = None : integer
+            The maximum compressed size of all outputs together, defaults to MAX_BYTES
+        '''
+        self.filename = filename if filename else self.FILE_NAME
+        self.max_runs = max_runs if max_runs else self.MAX_RUNS
+        self.max_bytes = max_bytes if max_bytes else self.MAX_BYTES
+
+        try:
+            self.connection = sqlite3.connect(self.filename)
+            #Give the space of removed runs back to the file system, must be set before the table is created
+            self.connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            self.connection.executescript('''
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id INTEGER PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    source_hash TEXT NOT NULL,
+                    simulator TEXT NOT NULL,
+                    timestamp REAL NOT NULL,
+                    duration REAL NOT NULL,
+                    exit_code INTEGER,
+                    output_size INTEGER NOT NULL,
+                    stored_size INTEGER NOT NULL,
+                    output BLOB NOT NULL);
+                CREATE INDEX IF NOT EXISTS runs_per_file ON runs (filename, timestamp);''')
+        except sqlite3.Error:
+            self.connection = None
+
+    @staticmethod
+    def source_hash(code):
+        '''Returns the hash of the code of a run
+
+        Parameters
+        ----------
+        code : string or bytes
+            The code of the file that ran
+        '''
+        if isinstance(code, str):
+            code = code.encode('utf-8')
+        return hashlib.sha256(code).hexdigest()
+
+    def record(self, filename, source_hash, simulator, duration, exit_code, output, timestamp=None):
+        '''Stores a run, and removes the oldest runs that exceed the retention limits. Failures are ignored.
+
+        Parameters
+        ----------
+        filename : string
+            The path of the file that ran
+        source_hash : string
+            The source_hash(...) of its code
+        simulator : string
+            The simulator that ran it, such as the path of the Simulator .exe
+        duration : float
+            The duration of the run in seconds
+        exit_code : integer
+            The exit code of the simulator, 0 if it succeeded
+        output : string
+            The output of the run
+        timestamp = None : float
+            When the run started, defaults to now
+
+        Output
+        ------
+        The run_id of the run, or None if it was not stored
+        '''
+        if self.connection is None:
+            return None
+        data = output.encode('utf-8')
+        blob = zlib.compress(data, self.COMPRESSION_LEVEL)
+        try:
+            with self.connection:
+                cursor = self.connection.execute( \
+                    'INSERT INTO runs (filename, source_hash, simulator, timestamp, duration, exit_code, output_size, ' + \
+                    'stored_size, output) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', \
+                    (filename, source_hash, simulator, time.time() if timestamp is None else timestamp, duration, \
+                     exit_code, len(data), len(blob), blob) )
+                self.enforce_limits()
+            return cursor.lastrowid
+        except sqlite3.Error:
+            return None
+
+    def enforce_limits(self):
+        '''Removes the oldest runs beyond max_runs, and beyond max_bytes of compressed output. The newest run is
+        always kept.'''
+        rows = self.connection.execute('SELECT run_id, stored_size FROM runs ORDER BY timestamp DESC, run_id DESC')
+        removed = []
+        total = 0
+        for idx, (run_id, stored_size) in enumerate(rows):
+            total += stored_size
+            if idx > 0 and (idx >= self.max_runs or total > self.max_bytes):
+                removed.append( (run_id,) )
+        if removed:
+            self.connection.executemany('DELETE FROM runs WHERE run_id = ?', removed)
+            self.connection.execute('PRAGMA incremental_vacuum')
+
+    def runs(self, filename=None):
+        '''Returns the runs, newest first, as dictionaries with the FIELDS
+
+        Parameters
+        ----------
+        filename = None : string
+            Only the runs of this file, through the index. All runs if None.
+        '''
+        if self.connection is None:
+            return []
+        query = f"SELECT {', '.join(self.FIELDS)} FROM runs"
+        if filename is None:
+            rows = self.connection.execute(query + ' ORDER BY timestamp DESC')
+        else:
+            rows = self.connection.execute(query + ' WHERE filename = ? ORDER BY timestamp DESC', (filename,))
+        return [ dict(zip(self.FIELDS, row)) for row in rows ]
+
+    def output(self, run_id):
+        '''Returns the output of a run, or None if the run does not exist (anymore)
+
+        Parameters
+        ----------
+        run_id : integer
+            The run_id of the run
+        '''
+        if self.connection is None:
+            return None
+        row = self.connection.execute('SELECT output FROM runs WHERE run_id = ?', (run_id,)).fetchone()
+        return zlib.decompress(row[0]).decode('utf-8') if row else None
+
+    def close(self):
+        '''Closes the database'''
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+def common_length(ids1, ids2, chunk=4096):
+    '''Returns the length of the common start of two lists, comparing whole chunks at a time'''
+    length = 0
+    limit = min(len(ids1), len(ids2))
+    while length < limit:
+        end = min(length+chunk, limit)
+        if ids1[length:end] == ids2[length:end]:
+            length = end
+        elif chunk > 1:
+            chunk //= 8
+        else:
+            break
+    return length
+
+#Ranges with more lines than this are split at a line that occurs once on both sides, before they are compared by
+#a SequenceMatcher (which is slow for long ranges), and the amount of lines that are tried
+SPLIT_SIZE = 5000
+ANCHOR_TRIES = 16
+
+def match_ranges(ids1, ids2, lo1, hi1, lo2, hi2, opcodes):
+    '''Appends the opcodes of a SequenceMatcher that turn ids1[lo1:hi1] into ids2[lo2:hi2] to opcodes'''
+    #Most outputs only differ in a few places, so first skip the common start and end
+    start = common_length(ids1[lo1:hi1], ids2[lo2:hi2])
+    if start:
+        opcodes.append( ('equal', lo1, lo1+start, lo2, lo2+start) )
+        lo1, lo2 = lo1+start, lo2+start
+    end = common_length(ids1[lo1:hi1][::-1], ids2[lo2:hi2][::-1])
+    hi1, hi2 = hi1-end, hi2-end
+
+    if lo1 == hi1 or lo2 == hi2:
+        if lo1 < hi1:
+            opcodes.append( ('delete', lo1, hi1, lo2, lo2) )
+        elif lo2 < hi2:
+            opcodes.append( ('insert', lo1, lo1, lo2, hi2) )
+    else:
+        anchor = find_anchor(ids1, ids2, lo1, hi1, lo2, hi2) if max(hi1-lo1, hi2-lo2) > SPLIT_SIZE else None
+        if anchor:
+            #Both halves are compared separately, the anchor itself is the common start of the second half
+            match_ranges(ids1, ids2, lo1, anchor[0], lo2, anchor[1], opcodes)
+            match_ranges(ids1, ids2, anchor[0], hi1, anchor[1], hi2, opcodes)
+        else:
+            matcher = difflib.SequenceMatcher(None, ids1[lo1:hi1], ids2[lo2:hi2])
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                opcodes.append( (tag, i1+lo1, i2+lo1, j1+lo2, j2+lo2) )
+
+    if end:
+        opcodes.append( ('equal', hi1, hi1+end, hi2, hi2+end) )
+
+def find_anchor(ids1, ids2, lo1, hi1, lo2, hi2):
+    '''Returns the positions (i, j) of a line that occurs exactly once in ids1[lo1:hi1] and in ids2[lo2:hi2], trying
+    the lines closest to the middle first. Returns None if there is none among the ANCHOR_TRIES tried lines.'''
+    range1, range2 = ids1[lo1:hi1], ids2[lo2:hi2]
+    middle = len(range1) // 2
+    step = max(len(range1) // (2*ANCHOR_TRIES), 1)
+    for k in range(ANCHOR_TRIES):
+        i = middle + (k+1)//2 * step * (1 if k % 2 else -1)
+        if not 0 < i < len(range1):
+            continue
+        line = range1[i]
+        if range1.count(line) == 1 and range2.count(line) == 1:
+            j = range2.index(line)
+            if 0 < j:
+                return (lo1+i, lo2+j)
+    return None
+
+def diff(lines1, lines2, context=3):
+    '''Compares two lists of lines, for a side-by-side view
+
+    Parameters
+    ----------
+    lines1, lines2 : list of strings
+        The lines of the old and the new output
+    context = 3 : integer
+        The amount of equal lines that are shown around every difference, longer runs of equal lines are collapsed
+
+    Output
+    ------
+    List of rows (kind, line1, line2): kind is 'equal', 'replace', 'delete', 'insert' or 'skip', line1 and line2 are
+    the indices of the lines on the left and right (None if the side is empty). A 'skip' row has a fourth element,
+    the amount of collapsed equal lines from line1 and line2 onwards.
+    '''
+    #Compare the hashes of the lines instead of the lines themselves. Strings cache their hash, so this is cheap.
+    ids1 = list(map(hash, lines1))
+    ids2 = list(map(hash, lines2))
+    opcodes = []
+    match_ranges(ids1, ids2, 0, len(ids1), 0, len(ids2), opcodes)
+
+    #Join the adjacent opcodes of the same kind
+    merged = []
+    for opcode in opcodes:
+        if merged and merged[-1][0] == opcode[0]:
+            merged[-1] = (opcode[0], merged[-1][1], opcode[2], merged[-1][3], opcode[4])
+        else:
+            merged.append(opcode)
+    opcodes = merged
+
+    rows = []
+    for idx, (tag, i1, i2, j1, j2) in enumerate(opcodes):
+        if tag == 'equal':
+            #Keep the context after the previous difference and before the next one
+            head = context if idx > 0 else 0
+            tail = context if idx < len(opcodes)-1 else 0
+            if i2 - i1 > head + tail:
+                rows += [ ('equal', i, j1 + i - i1) for i in range(i1, i1+head) ]
+                rows.append( ('skip', i1+head, j1+head, i2-i1-head-tail) )
+                rows += [ ('equal', i, j1 + i - i1) for i in range(i2-tail, i2) ]
+            else:
+                rows += [ ('equal', i, j1 + i - i1) for i in range(i1, i2) ]
+        else:
+            #Pair up the lines of both sides, the longer side gets empty lines on the other side
+            for k in range(max(i2-i1, j2-j1)):
+                line1 = i1+k if i1+k < i2 else None
+                line2 = j1+k if j1+k < j2 else None
+                kind = tag if line1 is not None and line2 is not None else ('delete' if line2 is None else 'insert')
+                rows.append( (kind, line1, line2) )
+    #An empty skip row is left out
+    return [row for row in rows if row[0] != 'skip' or row[3] > 0]
@@ -0,0 +1,225 @@
+import os
+import queue
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk
+
+import RunHistory
+from ResourceEstimator import format_bytes, format_seconds
+
+class RunHistoryWindow(object):
+    '''RunHistoryWindow: a separate window that lists the recorded runs of a file, with their time, duration, exit code,
+    simulator and code hash. Selecting two runs and pressing Compare shows their outputs side by side, with the
+    differences marked.
+
+    The diff is computed in a separate thread and polled from the tkinter main loop, so the window stays responsive
+    for large outputs. Both sides of the diff are inserted at once, and at most MAX_ROWS rows are shown.
+    '''
+
+    COLUMNS = ('time', 'duration', 'exit code', 'simulator', 'code', 'output')
+
+    #Amount of milliseconds between two polls of the diff thread
+    POLL_INTERVAL = 50
+    #Maximum amount of rows of the diff that are shown
+    MAX_ROWS = 20000
+    #Background colours of the rows of the diff
+    COLOURS = {'delete':'MistyRose', 'insert':'honeydew', 'replace':'LightYellow', 'skip':'gray85'}
+
+    def __init__(self, texteditor, run_history, filename=None):
+        '''Initializes the RunHistoryWindow.
+
+        Parameters
+        ----------
+        texteditor : TextEditor
+            The TextEditor that this RunHistoryWindow is a part of
+        run_history : RunHistory
+            The RunHistory whose runs are listed
+        filename = None : string
+            The absolute path of the file whose runs are listed, all runs if None
+        '''
+
+        self.texteditor = texteditor
+        self.run_history = run_history
+        self.filename = filename
+
+        self.window = tk.Toplevel(texteditor.root)
+        self.window.geometry('900x600')
+
+        self.panes = ttk.PanedWindow(self.window, orient=tk.VERTICAL)
+        self.panes.pack(fill=tk.BOTH, expand=1)
+
+        ######################## Create the list of runs
+        self.list_frame = ttk.Frame(self.panes)
+        self.tree = ttk.Treeview(self.list_frame, columns=self.COLUMNS, show='headings', selectmode='extended', \
+                                 height=8)
+        for column, width in zip(self.COLUMNS, (150, 80, 70, 320, 80, 80)):
+            self.tree.heading(column, text=column.capitalize())
+            self.tree.column(column, width=width, anchor=tk.W if column == 'simulator' else tk.CENTER)
+        self.tree.pack(fill=tk.BOTH, expand=1)
+
+        self.buttons = ttk.Frame(self.list_frame)
+        self.buttons.pack(fill=tk.X)
+        self.outputbutton = ttk.Button(self.buttons, text='Show output', command=self.show_selected)
+        self.outputbutton.pack(side=tk.LEFT)
+        self.comparebutton = ttk.Button(self.buttons, text='Compare', command=self.compare_selected)
+        self.comparebutton.pack(side=tk.LEFT)
+        self.status = tk.StringVar()
+        ttk.Label(self.buttons, textvariable=self.status).pack(side=tk.LEFT, padx=10)
+        self.panes.add(self.list_frame, weight=1)
+
+        ######################## Create the side-by-side diff, both sides scroll together
+        self.diff_frame = ttk.Frame(self.panes)
+        self.scrollbar = ttk.Scrollbar(self.diff_frame, orient=tk.VERTICAL, command=self.scroll_both)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.left = tk.Text(self.diff_frame, wrap=tk.NONE, width=1, font=('Consolas', 10))
+        self.right = tk.Text(self.diff_frame, wrap=tk.NONE, width=1, font=('Consolas', 10))
+        for text, other in ((self.left, self.right), (self.right, self.left)):
+            text.configure(yscrollcommand=lambda first, last, other=other: self.scrolled(other, first, last))
+            for kind, colour in self.COLOURS.items():
+                text.tag_configure(kind, background=colour)
+            text.pack(side=tk.LEFT, fill=tk.BOTH, expand=1)
+        self.panes.add(self.diff_frame, weight=3)
+
+        #Keep track of the diff thread: its results, and the scheduled poll
+        self.results = queue.Queue()
+        self.poll_id = None
+
+        #Set up the event handling
+        self.setup_event_handling()
+        self.set_filename(filename)
+
+    def setup_event_handling(self):
+        '''Sets up all the event handling that this RunHistoryWindow does.'''
+        self.tree.bind('<Double-1>', lambda e: self.show_selected())
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+    def set_filename(self, filename):
+        '''Lists the runs of another file
+
+        Parameters
+        ----------
+        filename : string
+            The absolute path of the file, all runs if None
+        '''
+        self.filename = filename
+        self.window.title('Run History' + (f' - {os.path.basename(filename)}' if filename else ''))
+        self.refresh()
+
+    def refresh(self):
+        '''Updates the list of runs, newest first'''
+        self.tree.delete(*self.tree.get_children())
+        for run in self.run_history.runs(self.filename):
+            values = (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run['timestamp'])), \
+                      format_seconds(run['duration']), '' if run['exit_code'] is None else run['exit_code'], \
+                      run['simulator'] if self.filename else f"{os.path.basename(run['filename'])}: {run['simulator']}", \
+                      run['source_hash'][:8], format_bytes(run['output_size']))
+            self.tree.insert('', tk.END, iid=str(run['run_id']), values=values)
+
+    def selected_runs(self):
+        '''Returns the run_ids of the selected runs, oldest first'''
+        return sorted(int(item) for item in self.tree.selection())
+
+    def show_selected(self):
+        '''Shows the output of the selected run in the output view'''
+        run_ids = self.selected_runs()
+        if len(run_ids) != 1:
+            self.status.set('Select one run to show its output')
+            return
+        output = self.run_history.output(run_ids[0])
+        if output is None:
+            self.status.set('This run has been removed from the history')
+            return
+        self.texteditor.show_output(self.tree.set(str(run_ids[0]), 'time'), output)
+
+    def compare_selected(self):
+        '''Compares the outputs of the two selected runs, the oldest on the left. The diff is computed in a thread.'''
+        run_ids = self.selected_runs()
+        if len(run_ids) != 2:
+            self.status.set('Select two runs to compare')
+            return
+        outputs = [self.run_history.output(run_id) for run_id in run_ids]
+        if None in outputs:
+            self.status.set('A run has been removed from the history')
+            return
+
+        self.status.set('Comparing...')
+        self.comparebutton.state(['disabled'])
+        threading.Thread(target=self.work, args=outputs, daemon=True).start()
+        if self.poll_id is None:
+            self.poll_id = self.window.after(self.POLL_INTERVAL, self.poll)
+
+    def work(self, output1, output2):
+        '''Computes the diff of two outputs. Runs inside a separate thread, so this may never touch tkinter.'''
+        lines1, lines2 = output1.splitlines(), output2.splitlines()
+        self.results.put( (lines1, lines2, RunHistory.diff(lines1, lines2)) )
+
+    def poll(self):
+        '''Shows the diff as soon as the thread has computed it. Runs in the tkinter main loop.'''
+        self.poll_id = None
+        try:
+            lines1, lines2, rows = self.results.get_nowait()
+        except queue.Empty:
+            self.poll_id = self.window.after(self.POLL_INTERVAL, self.poll)
+            return
+        self.show_diff(lines1, lines2, rows)
+        self.comparebutton.state(['!disabled'])
+
+    def show_diff(self, lines1, lines2, rows):
+        '''Shows the rows of a diff side by side
+
+        Parameters
+        ----------
+        lines1, lines2 : list of strings
+            The lines of the old and the new output
+        rows : list of tuples
+            The output of RunHistory.diff(lines1, lines2)
+        '''
+        nr_changes = sum(1 for row in rows if row[0] not in ('equal', 'skip'))
+        self.status.set(f'{nr_changes} changed line(s)' if nr_changes else 'The outputs are equal')
+
+        width = len(str(max(len(lines1), len(lines2))))
+        for text, lines, side in ((self.left, lines1, 1), (self.right, lines2, 2)):
+            #Build the whole side first, and mark the ranges of rows of the same kind at once
+            parts, ranges = [], {}
+            for number, row in enumerate(rows[:self.MAX_ROWS], start=1):
+                kind, line = row[0], row[side]
+                if kind == 'skip':
+                    parts.append(f"{'':>{width}}   ... {row[3]} equal line(s) ...")
+                elif line is None:
+                    parts.append('')
+                else:
+                    parts.append(f'{line+1:>{width}}   {lines[line]}')
+                if kind != 'equal':
+                    spans = ranges.setdefault(kind, [])
+                    if spans and spans[-1][1] == number:
+                        spans[-1][1] = number + 1
+                    else:
+                        spans.append([number, number + 1])
+            if len(rows) > self.MAX_ROWS:
+                parts.append(f'... {len(rows) - self.MAX_ROWS} more row(s) are not shown')
+
+            text.configure(state=tk.NORMAL)
+            text.delete('1.0', tk.END)
+            text.insert('1.0', '\n'.join(parts))
+            for kind, spans in ranges.items():
+                text.tag_add(kind, *(f'{line}.0' for span in spans for line in span))
+            text.configure(state=tk.DISABLED)
+
+    def scroll_both(self, *args):
+        '''Scrolls both sides of the diff, called by the scrollbar'''
+        self.left.yview(*args)
+        self.right.yview(*args)
+
+    def scrolled(self, other, first, last):
+        '''Moves the scrollbar and the other side along with the side of the diff that scrolled'''
+        self.scrollbar.set(first, last)
+        if other.yview()[0] != float(first):
+            other.yview_moveto(first)
+
+    def close(self):
+        '''Closes this RunHistoryWindow.'''
+        if self.poll_id is not None:
+            self.window.after_cancel(self.poll_id)
+        self.texteditor.run_history_window_closed(self)
+        self.window.destroy()
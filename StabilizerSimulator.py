@@ -0,0 +1,370 @@
+'''Built-in stabilizer simulator for circuits that only use Clifford gates, which scales to thousands of qubits.
+
+Usage: python -m StabilizerSimulator FILE [--seed SEED]
+
+The state of n qubits is a stabilizer tableau (Aaronson and Gottesman, "Improved simulation of stabilizer circuits"):
+n destabilizer and n stabilizer rows, each a Pauli string with a sign. The X and Z parts of the rows are bit-packed into
+arrays of uint64 words, 64 qubits per word. A gate changes one or two bit columns of all rows at once, a measurement
+multiplies rows with bitwise operations on whole words and counts the phases with popcounts.
+
+The Clifford gates are h, x, y, z, s (ph), cnot (cx), cz (cphase) and swap, plus rx, ry and rz over multiples of pi/2,
+prepz, measure and the classically controlled c-x and c-z. A circuit with any other gate (t, tdag, toffoli, cr, or an
+arbitrary rotation) is rejected with a NonCliffordError that lists those gates.
+'''
+import collections
+import math
+import sys
+import time
+
+import numpy as np
+
+from StatevectorSimulator import classical_bits, read_circuit, run_main, simulation_report, simulator_argparser
+
+class NonCliffordError(ValueError):
+    '''Raised when a circuit contains gates that the StabilizerSimulator cannot simulate'''
+
+    #Amount of locations that the message lists
+    MAX_LOCATIONS = 10
+
+    def __init__(self, gates, locations=()):
+        '''Initializes the NonCliffordError
+
+        Parameters
+        ----------
+        gates : Counter
+            The amount of every non-Clifford gate (with its angle for rotations)
+        locations = () : list
+            (gate, column, row names) of the non-Clifford gates in the circuit
+        '''
+        self.gates = gates
+        self.locations = list(locations)
+        message = 'The circuit is not Clifford-only, it contains: ' + \
+                  ', '.join(f'{count}x {gate}' for gate, count in gates.most_common())
+        for gate, col, names in self.locations[:self.MAX_LOCATIONS]:
+            message += f'\n    {gate} {", ".join(names)} in column {col}'
+        if len(self.locations) > self.MAX_LOCATIONS:
+            message += f'\n    ... and {len(self.locations)-self.MAX_LOCATIONS} more'
+        super().__init__(message)
+
+def popcount(words):
+    '''Returns the amount of 1 bits of every row of a 2-D array of uint64 words'''
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    #Older NumPy: count the bits of the separate bytes
+    return np.unpackbits(words.view(np.uint8), axis=-1).sum(axis=-1, dtype=np.int64)
+
+def phase_sum(x1, z1, x2, z2):
+    '''Returns, per row, the sum over all qubits of the exponent of i that appears when the Pauli (x1,z1) is
+    multiplied with the Pauli (x2,z2), i.e. the function g of Aaronson and Gottesman, summed'''
+    plus = (x1 & z1 & z2 & ~x2) | (x1 & ~z1 & z2 & x2) | (~x1 & z1 & x2 & ~z2)
+    minus = (x1 & z1 & x2 & ~z2) | (x1 & ~z1 & z2 & ~x2) | (~x1 & z1 & x2 & z2)
+    return popcount(plus) - popcount(minus)
+
+class StabilizerSimulator(object):
+    '''StabilizerSimulator keeps track of the stabilizer tableau of the qubits, and of the classical bits'''
+
+    #The gates that map Paulis to Paulis
+    CLIFFORD_GATES = ('h', 'x', 'not', 'y', 'z', 's', 'ph', 'cnot', 'cx', 'cz', 'cphase', 'swap', \
+                      'prepz', 'measure', 'c-x', 'class_cx', 'c-z', 'class_cz')
+    ROTATIONS = ('rx', 'ry', 'rz')
+    #Below this amount of qubits, report() lists the stabilizers
+    MAX_LISTED_QUBITS = 16
+
+    def __init__(self, nr_qubits, seed=None):
+        '''Initializes the StabilizerSimulator in the state |0...0>
+
+        Parameters
+        ----------
+        nr_qubits : integer
+            The amount of qubits
+        seed = None : integer
+            Seed of the random generator of the measurements
+        '''
+        n = nr_qubits
+        self.nr_qubits = n
+        self.nr_words = (n + 63) // 64
+
+        #Rows 0..n-1 are the destabilizers X_i, rows n..2n-1 the stabilizers Z_i
+        self.x = np.zeros((2*n, self.nr_words), dtype=np.uint64)
+        self.z = np.zeros((2*n, self.nr_words), dtype=np.uint64)
+        self.r = np.zeros(2*n, dtype=np.uint8)
+        for qubit in range(n):
+            word, mask = self.position(qubit)
+            self.x[qubit, word] |= mask
+            self.z[n+qubit, word] |= mask
+
+        #The classical bits b0, b1, ... that the measurements write to
+        self.bits = [0] * n
+        self.rng = np.random.default_rng(seed)
+
+        #Amount of gates that have been applied
+        self.nr_gates = 0
+
+    @staticmethod
+    def position(qubit):
+        '''Returns the word and the bit mask of qubit'''
+        return qubit >> 6, np.uint64(1 << (qubit & 63))
+
+    def column(self, array, qubit):
+        '''Returns the bits of qubit in all rows of array (self.x or self.z), as an array of 0 and 1'''
+        word, mask = self.position(qubit)
+        return ((array[:, word] & mask) != 0).astype(np.uint8)
+
+    def flip(self, array, qubit, bits):
+        '''Flips the bit of qubit in the rows of array where bits is 1'''
+        word, mask = self.position(qubit)
+        array[:, word] ^= bits.astype(np.uint64) * mask
+
+    def h(self, qubit):
+        '''Applies a Hadamard gate'''
+        xa, za = self.column(self.x, qubit), self.column(self.z, qubit)
+        self.r ^= xa & za
+        #Swap the X and Z bit where they differ
+        differ = xa ^ za
+        self.flip(self.x, qubit, differ)
+        self.flip(self.z, qubit, differ)
+
+    def s(self, qubit):
+        '''Applies a phase gate'''
+        xa, za = self.column(self.x, qubit), self.column(self.z, qubit)
+        self.r ^= xa & za
+        self.flip(self.z, qubit, xa)
+
+    def pauli(self, gate, qubit):
+        '''Applies x, y or z: a Pauli only changes the signs of the rows that anticommute with it'''
+        if gate == 'x':
+            self.r ^= self.column(self.z, qubit)
+        elif gate == 'z':
+            self.r ^= self.column(self.x, qubit)
+        else:
+            self.r ^= self.column(self.x, qubit) ^ self.column(self.z, qubit)
+
+    def cnot(self, control, target):
+        '''Applies a controlled X'''
+        xa, za = self.column(self.x, control), self.column(self.z, control)
+        xb, zb = self.column(self.x, target), self.column(self.z, target)
+        self.r ^= xa & zb & (xb ^ za ^ 1)
+        self.flip(self.x, target, xa)
+        self.flip(self.z, control, zb)
+
+    def cz(self, qubit1, qubit2):
+        '''Applies a controlled Z'''
+        self.h(qubit2)
+        self.cnot(qubit1, qubit2)
+        self.h(qubit2)
+
+    def swap(self, qubit1, qubit2):
+        '''Swaps two qubits, which only exchanges their bit columns'''
+        for array in (self.x, self.z):
+            bits1, bits2 = self.column(array, qubit1), self.column(array, qubit2)
+            differ = bits1 ^ bits2
+            self.flip(array, qubit1, differ)
+            self.flip(array, qubit2, differ)
+
+    def rotation(self, gate, qubit, angle):
+        '''Applies rx, ry or rz over a multiple of pi/2 (up to a global phase)'''
+        quarter_turns = self.quarter_turns(angle)
+        if quarter_turns is None:
+            raise NonCliffordError(collections.Counter([f'{gate}({angle})']))
+        for _ in range(quarter_turns):
+            if gate == 'rz':
+                self.s(qubit)
+            elif gate == 'rx':
+                self.h(qubit)
+                self.s(qubit)
+                self.h(qubit)
+            else:
+                #ry(pi/2) is x.h up to a global phase
+                self.h(qubit)
+                self.pauli('x', qubit)
+
+    @staticmethod
+    def quarter_turns(angle):
+        '''Returns the angle as a multiple of pi/2 (0...3), or None if it is not such a multiple'''
+        try:
+            turns = float(angle) / (math.pi/2)
+        except (TypeError, ValueError):
+            return None
+        if abs(turns - round(turns)) > 1e-9:
+            return None
+        return int(round(turns)) % 4
+
+    def measure(self, qubit):
+        '''Measures qubit in the computational basis, stores the outcome in its classical bit and returns it'''
+        outcome = self.collapse(qubit)
+        self.bits[qubit] = outcome
+        self.nr_gates += 1
+        return outcome
+
+    def collapse(self, qubit):
+        '''Measures qubit, updates the tableau and returns the outcome'''
+        n = self.nr_qubits
+        xa = self.column(self.x, qubit)
+        anticommuting = np.flatnonzero(xa[n:])
+
+        if len(anticommuting):
+            #Random outcome: stabilizer p anticommutes with Z_qubit
+            p = n + anticommuting[0]
+            rows = np.flatnonzero(xa)
+            rows = rows[rows != p]
+            if len(rows):
+                #Multiply stabilizer p into all the other rows that anticommute, all at once
+                phase = 2*self.r[rows].astype(np.int64) + 2*int(self.r[p]) + \
+                        phase_sum(self.x[p], self.z[p], self.x[rows], self.z[rows])
+                self.r[rows] = (np.mod(phase, 4) // 2).astype(np.uint8)
+                self.x[rows] ^= self.x[p]
+                self.z[rows] ^= self.z[p]
+
+            outcome = int(self.rng.integers(2))
+            #The destabilizer becomes the old stabilizer, the stabilizer becomes +-Z_qubit
+            self.x[p-n], self.z[p-n], self.r[p-n] = self.x[p], self.z[p], self.r[p]
+            word, mask = self.position(qubit)
+            self.x[p] = 0
+            self.z[p] = 0
+            self.z[p, word] = mask
+            self.r[p] = outcome
+            return outcome
+
+        #Deterministic outcome: the product of the stabilizers whose destabilizer anticommutes with Z_qubit
+        rows = n + np.flatnonzero(xa[:n])
+        x_rows, z_rows = self.x[rows], self.z[rows]
+        #The product is built up row by row, the phase of every step depends on the product so far
+        x_before = np.bitwise_xor.accumulate(x_rows, axis=0)
+        z_before = np.bitwise_xor.accumulate(z_rows, axis=0)
+        x_before = np.vstack([np.zeros((1, self.nr_words), dtype=np.uint64), x_before[:-1]])
+        z_before = np.vstack([np.zeros((1, self.nr_words), dtype=np.uint64), z_before[:-1]])
+        phase = 2*int(self.r[rows].astype(np.int64).sum()) + int(phase_sum(x_rows, z_rows, x_before, z_before).sum())
+        return (phase % 4) // 2
+
+    def prepz(self, qubit):
+        '''Resets qubit to |0>'''
+        if self.collapse(qubit):
+            self.pauli('x', qubit)
+        self.nr_gates += 1
+
+    @classmethod
+    def non_clifford(cls, operations):
+        '''Returns a Counter of the gates in operations that the StabilizerSimulator cannot simulate'''
+        gates = collections.Counter()
+        for gate, rows, angle in operations:
+            if gate in cls.ROTATIONS:
+                if cls.quarter_turns(angle) is None:
+                    gates[f'{gate}({angle})'] += 1
+            #A cx, cz or cphase with more than two rows is multi-controlled, such as a toffoli
+            elif gate not in cls.CLIFFORD_GATES or (gate in ('cx', 'cz', 'cphase') and len(rows) != 2):
+                gates[gate] += 1
+        return gates
+
+    @classmethod
+    def locate_non_clifford(cls, model):
+        '''Returns (gate, column, row names) of every non-Clifford gate in a parsed CircuitModel, by column'''
+        locations = []
+        for col in range(model.max_col+1):
+            for operation in model.column_operations(col):
+                for gate in cls.non_clifford([operation]):
+                    names = [f'q{row}' if row < model.nr_qubits else f'b{row-model.nr_qubits}' for row in operation[1]]
+                    locations.append( (gate, col, names) )
+        return locations
+
+    def run(self, operations):
+        '''Applies the operations of a circuit, see CircuitModel.operations()
+
+        Parameters
+        ----------
+        operations : list
+            (gate, rows, angle) tuples
+        '''
+        non_clifford = self.non_clifford(operations)
+        if non_clifford:
+            raise NonCliffordError(non_clifford)
+
+        n = self.nr_qubits
+        for gate, rows, angle in operations:
+            if gate == 'h':
+                self.h(rows[0])
+            elif gate in ('s', 'ph'):
+                self.s(rows[0])
+            elif gate in ('x', 'not', 'y', 'z'):
+                self.pauli('x' if gate == 'not' else gate, rows[0])
+            elif gate in self.ROTATIONS:
+                self.rotation(gate, rows[0], angle)
+            elif gate in ('cnot', 'cx'):
+                self.cnot(rows[0], rows[1])
+            elif gate in ('cz', 'cphase'):
+                self.cz(rows[0], rows[1])
+            elif gate == 'swap':
+                self.swap(rows[0], rows[1])
+            elif gate in ('c-x', 'class_cx', 'c-z', 'class_cz'):
+                if all(self.bits[row-n] for row in rows if row >= n):
+                    for row in rows:
+                        if row < n:
+                            self.pauli('x' if 'x' in gate else 'z', row)
+            elif gate == 'measure':
+                self.measure(rows[0])
+            elif gate == 'prepz':
+                self.prepz(rows[0])
+            if gate not in ('measure', 'prepz'):
+                self.nr_gates += 1
+
+    def stabilizers(self):
+        '''Returns the stabilizer generators as strings such as '+XZI', with qubit 0 first'''
+        n = self.nr_qubits
+        result = []
+        for row in range(n, 2*n):
+            paulis = []
+            for qubit in range(n):
+                word, mask = self.position(qubit)
+                x, z = bool(self.x[row, word] & mask), bool(self.z[row, word] & mask)
+                paulis.append('Y' if x and z else 'X' if x else 'Z' if z else 'I')
+            result.append(('-' if self.r[row] else '+') + ''.join(paulis))
+        return result
+
+    def report(self):
+        '''Returns the classical bits, and for small circuits the stabilizers, as text'''
+        n = self.nr_qubits
+        lines = [classical_bits(self.bits)]
+        if n <= self.MAX_LISTED_QUBITS:
+            lines.append('Stabilizer generators (q0 ... q{}):'.format(n-1))
+            lines += ['    ' + stabilizer for stabilizer in self.stabilizers()]
+        return '\n'.join(lines)
+
+def simulate(data, seed=None):
+    '''Parses and simulates the code of a Clifford circuit, returns the report as text
+
+    Parameters
+    ----------
+    data : string
+        The code of the circuit
+    seed = None : integer
+        Seed of the random generator of the measurements
+    '''
+    start = time.perf_counter()
+    model = read_circuit(data)
+    operations = model.operations()
+    non_clifford = StabilizerSimulator.non_clifford(operations)
+    if non_clifford:
+        raise NonCliffordError(non_clifford, StabilizerSimulator.locate_non_clifford(model))
+
+    simulator = StabilizerSimulator(model.nr_qubits, seed=seed)
+    simulator.run(operations)
+
+    header = f'Stabilizer simulation of {model.nr_qubits} qubit(s), {simulator.nr_gates} gate(s) in ' + \
+             f'{time.perf_counter()-start:.3f} s'
+    return simulation_report(header, model, simulator.report())
+
+def simulate_file(filename, seed=None):
+    '''Simulates the Clifford circuit in a .qc file, see simulate(...)'''
+    with open(filename, 'r') as file:
+        return simulate(file.read(), seed=seed)
+
+def main(argv=None):
+    '''Runs the simulator from the command line, see the module docstring.'''
+    argparser = simulator_argparser('StabilizerSimulator', 'Simulates a Clifford-only .qc file with a stabilizer tableau.')
+    argparser.add_argument('--seed', type=int, default=None, help='seed of the measurement outcomes')
+
+    def run(args):
+        return simulate_file(args.file, seed=args.seed)
+    return run_main(argparser, run, argv)
+
+if __name__ == '__main__':
+    sys.exit(main())
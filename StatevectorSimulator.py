@@ -0,0 +1,438 @@
+'''Built-in statevector simulator, an alternative to the external Simulator .exe that runs inside the editor.
+
+Usage: python -m StatevectorSimulator FILE [--seed SEED] [--top TOP] [--single]
+
+The state of n qubits is a NumPy array of 2^n amplitudes, in which qubit 0 is the least significant bit of a basis
+state. A gate never builds a 2^n x 2^n matrix: the state is reshaped such that every qubit of the gate gets an axis of
+length 2, and all other qubits are merged into as few axes as possible. The gate then works on the two halves of that
+view in which its target qubit is 0 and 1, and a controlled gate only touches the part in which all its controls are 1.
+Those parts are views, so every gate is applied in place. The views are processed in blocks of BLOCK amplitudes, such
+that the temporaries of a gate stay in the CPU cache instead of taking another pass over the memory of the state. A
+run of single-qubit gates on the same qubit is fused into one matrix first, and a fused identity is not applied at all.
+
+Measurements are projective and sample an outcome with a seeded random generator. The 'cr' statement has no angle in
+this grammar, it is simulated as a controlled phase of pi/2 (a controlled S).
+'''
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+
+from CircuitRender2 import CircuitModel
+
+class TooManyQubitsError(ValueError):
+    '''Raised when the state of a circuit does not fit in memory'''
+
+class StatevectorSimulator(object):
+    '''StatevectorSimulator keeps track of the state of the qubits and of the classical bits of a circuit'''
+
+    #Above this amount of qubits the state does not fit in the memory of a laptop
+    MAX_QUBITS = 30
+    #Amount of basis states that report() lists
+    TOP_STATES = 32
+    #Basis states with a smaller probability are not reported
+    MIN_PROBABILITY = 1e-12
+    #Amount of amplitudes of a half that a gate processes at once, its temporaries should fit in the CPU cache
+    BLOCK = 2**14
+    #Entries of a fused matrix that are this close to 0 or 1 are rounded, such that h h is recognised as the identity
+    FUSE_TOLERANCE = 1e-12
+
+    SQRT_HALF = 1/math.sqrt(2)
+    MATRICES = {'h': ((SQRT_HALF, SQRT_HALF), (SQRT_HALF, -SQRT_HALF)),
+                'x': ((0, 1), (1, 0)),
+                'not': ((0, 1), (1, 0)),
+                'y': ((0, -1j), (1j, 0)),
+                'z': ((1, 0), (0, -1)),
+                's': ((1, 0), (0, 1j)),
+                'ph': ((1, 0), (0, 1j)),
+                't': ((1, 0), (0, complex(SQRT_HALF, SQRT_HALF))),
+                'tdag': ((1, 0), (0, complex(SQRT_HALF, -SQRT_HALF)))}
+
+    #Gates whose last row is the target and whose other rows are quantum controls, with the matrix of the target
+    CONTROLLED_GATES = {'cnot': 'x', 'cx': 'x', 'toffoli': 'x', 'cz': 'z', 'cphase': 'z', 'cr': 's'}
+    #Gates that act on all their qubit rows if all their classical bits are 1
+    CLASSICAL_GATES = {'c-x': 'x', 'class_cx': 'x', 'c-z': 'z', 'class_cz': 'z'}
+
+    def __init__(self, nr_qubits, seed=None, dtype=np.complex128):
+        '''Initializes the StatevectorSimulator in the state |0...0>
+
+        Parameters
+        ----------
+        nr_qubits : integer
+            The amount of qubits
+        seed = None : integer
+            Seed of the random generator of the measurements
+        dtype = np.complex128 : NumPy dtype
+            The precision of the state, np.complex64 halves the memory
+        '''
+        if nr_qubits > self.MAX_QUBITS:
+            raise TooManyQubitsError(f'StatevectorSimulator supports at most {self.MAX_QUBITS} qubits, not {nr_qubits}')
+
+        self.nr_qubits = nr_qubits
+        self.state = np.zeros(2**nr_qubits, dtype=dtype)
+        self.state[0] = 1
+        #The classical bits b0, b1, ... that the measurements write to
+        self.bits = [0] * nr_qubits
+        self.rng = np.random.default_rng(seed)
+
+        #Amount of gates that have been applied
+        self.nr_gates = 0
+
+    def split(self, qubits):
+        '''Returns a view of self.state with an axis of length 2 for every qubit in qubits, and the axes of those
+        qubits. The other qubits are merged into the remaining axes, few axes keep NumPy fast.'''
+        shape, axes = self.split_shape(qubits)
+        return self.state.reshape(shape), axes
+
+    def split_shape(self, qubits):
+        '''Returns the shape of the view of split(qubits), and the axes of the qubits'''
+        shape = []
+        axes = {}
+        high = self.nr_qubits
+        for qubit in sorted(qubits, reverse=True):
+            shape.append(2**(high-qubit-1))
+            axes[qubit] = len(shape)
+            shape.append(2)
+            high = qubit
+        shape.append(2**high)
+        return shape, axes
+
+    def view(self, values):
+        '''Returns the view of self.state in which every qubit in values has the given value (0 or 1)'''
+        view, axes = self.split(values.keys())
+        index = [slice(None)] * view.ndim
+        for qubit, value in values.items():
+            index[axes[qubit]] = value
+        return view[tuple(index)]
+
+    def halves(self, target, controls=()):
+        '''Returns the views of self.state in which all controls are 1, and the target is 0 and 1 respectively'''
+        values = {control: 1 for control in controls}
+        values[target] = 0
+        zero = self.view(values)
+        values[target] = 1
+        one = self.view(values)
+        return zero, one
+
+    def blocks(self, *views):
+        '''Yields the same block of every view (all of the same shape), of about BLOCK amplitudes each. The inner axes
+        of the views are the most contiguous, so a block keeps them whole as long as they fit.'''
+        shape = views[0].shape
+        #Find the outermost axis whose inner axes fit in a block, and split that axis
+        axis, inner = len(shape), 1
+        while axis > 0 and inner * shape[axis-1] <= self.BLOCK:
+            axis -= 1
+            inner *= shape[axis]
+        if axis == 0:
+            yield views
+            return
+        axis -= 1
+        step = max(1, self.BLOCK // inner)
+        for outer in np.ndindex(*shape[:axis]):
+            for start in range(0, shape[axis], step):
+                index = outer + (slice(start, start+step),)
+                yield tuple(view[index] for view in views)
+
+    def apply(self, matrix, target, controls=()):
+        '''Applies the 2x2 matrix to target, only where all the controls are 1
+
+        Parameters
+        ----------
+        matrix : tuple of tuples
+            ((a, b), (c, d))
+        target : integer
+            The qubit that the matrix acts on
+        controls = () : list of integers
+            The control qubits
+        '''
+        (a, b), (c, d) = matrix
+        zero, one = self.halves(target, controls)
+
+        if b == 0 and c == 0:
+            #Diagonal gates (z, s, t, rz, ...) only scale the halves
+            if a != 1:
+                zero *= a
+            if d != 1:
+                one *= d
+        elif a == 0 and d == 0:
+            #Anti-diagonal gates (x, y) swap the halves
+            for zero_block, one_block in self.blocks(zero, one):
+                old_zero = zero_block.copy()
+                zero_block[...] = one_block
+                one_block[...] = old_zero
+                if b != 1:
+                    zero_block *= b
+                if c != 1:
+                    one_block *= c
+        elif a == b == c == -d:
+            #Hadamard-like gates can be done without any temporary copy of the halves
+            for zero_block, one_block in self.blocks(zero, one):
+                zero_block += one_block
+                one_block *= -2
+                one_block += zero_block
+                if a != 1:
+                    zero_block *= a
+                    one_block *= a
+        else:
+            for zero_block, one_block in self.blocks(zero, one):
+                new_zero = a*zero_block
+                new_zero += b*one_block
+                one_block *= d
+                one_block += c*zero_block
+                zero_block[...] = new_zero
+        self.nr_gates += 1
+
+    def swap(self, qubit1, qubit2):
+        '''Swaps two qubits'''
+        zero_one = self.view({qubit1: 0, qubit2: 1})
+        one_zero = self.view({qubit1: 1, qubit2: 0})
+
+        for zero_one_block, one_zero_block in self.blocks(zero_one, one_zero):
+            old = zero_one_block.copy()
+            zero_one_block[...] = one_zero_block
+            one_zero_block[...] = old
+        self.nr_gates += 1
+
+    def collapse(self, qubit):
+        '''Measures qubit, collapses the state accordingly and returns the outcome'''
+        zero, one = self.halves(qubit)
+        #np.vdot copies a view that is not contiguous, so add it up per block
+        p_one = sum(float(np.vdot(block, block).real) for block, in self.blocks(one))
+        outcome = 1 if self.rng.random() < p_one else 0
+
+        keep, discard = (one, zero) if outcome else (zero, one)
+        discard[...] = 0
+        p_keep = p_one if outcome else 1 - p_one
+        if p_keep > 0:
+            keep /= math.sqrt(p_keep)
+        return outcome
+
+    def measure(self, qubit):
+        '''Measures qubit in the computational basis, and stores the outcome in its classical bit'''
+        self.bits[qubit] = self.collapse(qubit)
+        self.nr_gates += 1
+
+    def prepz(self, qubit):
+        '''Resets qubit to |0>'''
+        if self.collapse(qubit):
+            self.apply(self.MATRICES['x'], qubit)
+        else:
+            self.nr_gates += 1
+
+    @staticmethod
+    def rotation(gate, angle):
+        '''Returns the matrix of the rotation rx, ry or rz over angle'''
+        try:
+            theta = float(angle)
+        except (TypeError, ValueError):
+            raise ValueError(f'The simulator needs a numeric angle for {gate}, not {angle}')
+        cos, sin = math.cos(theta/2), math.sin(theta/2)
+        if gate == 'rx':
+            return ((cos, -1j*sin), (-1j*sin, cos))
+        if gate == 'ry':
+            return ((cos, -sin), (sin, cos))
+        return ((complex(cos, -sin), 0), (0, complex(cos, sin)))
+
+    def fused(self, matrix):
+        '''Returns a fused matrix as a tuple of tuples, with the entries that are almost 0 or 1 rounded, or None if it
+        is the identity'''
+        entries = []
+        for entry in np.asarray(matrix).reshape(-1):
+            entry = complex(entry)
+            if abs(entry) < self.FUSE_TOLERANCE:
+                entry = 0
+            elif abs(entry - 1) < self.FUSE_TOLERANCE:
+                entry = 1
+            entries.append(entry)
+        if entries == [1, 0, 0, 1]:
+            return None
+        return ( (entries[0], entries[1]), (entries[2], entries[3]) )
+
+    def flush(self, pending, qubits):
+        '''Applies the fused single-qubit gates of run(...) that wait on qubits
+
+        Parameters
+        ----------
+        pending : dictionary
+            For every qubit with waiting gates, the fused matrix and the amount of gates in it
+        qubits : iterable of integers
+            The qubits whose gates are applied
+        '''
+        for qubit in qubits:
+            if qubit not in pending:
+                continue
+            matrix, count = pending.pop(qubit)
+            matrix = self.fused(matrix)
+            if matrix is None:
+                self.nr_gates += count
+            else:
+                self.apply(matrix, qubit)
+                self.nr_gates += count - 1
+
+    def run(self, operations):
+        '''Applies the operations of a circuit, see CircuitModel.operations()
+
+        Parameters
+        ----------
+        operations : list
+            (gate, rows, angle) tuples
+        '''
+        n = self.nr_qubits
+        #Single-qubit gates wait until another operation involves their qubit, the gates in between commute with them
+        pending = {}
+        for gate, rows, angle in operations:
+            if gate in self.MATRICES or gate in ('rx', 'ry', 'rz'):
+                matrix = self.MATRICES[gate] if gate in self.MATRICES else self.rotation(gate, angle)
+                previous, count = pending.get(rows[0], (np.eye(2), 0))
+                pending[rows[0]] = (np.dot(matrix, previous), count + 1)
+                continue
+            self.flush(pending, [row for row in rows if row < n])
+
+            if gate in self.CONTROLLED_GATES:
+                self.apply(self.MATRICES[self.CONTROLLED_GATES[gate]], rows[-1], controls=rows[:-1])
+            elif gate == 'swap':
+                self.swap(rows[0], rows[1])
+            elif gate in self.CLASSICAL_GATES:
+                if all(self.bits[row-n] for row in rows if row >= n):
+                    for row in rows:
+                        if row < n:
+                            self.apply(self.MATRICES[self.CLASSICAL_GATES[gate]], row)
+            elif gate == 'measure':
+                self.measure(rows[0])
+            elif gate == 'prepz':
+                self.prepz(rows[0])
+            else:
+                raise ValueError(f'StatevectorSimulator does not support the gate {gate}')
+        self.flush(pending, list(pending))
+
+    def probabilities(self):
+        '''Returns the probability of every basis state, indexed by the integer value of the basis state'''
+        return self.state.real**2 + self.state.imag**2
+
+    def report(self, top=None):
+        '''Returns the classical bits and the most likely basis states as text
+
+        Parameters
+        ----------
+        top = None : integer
+            Amount of basis states to list, defaults to TOP_STATES
+        '''
+        top = top if top else self.TOP_STATES
+        n = self.nr_qubits
+        flat = self.state
+        probabilities = self.probabilities()
+
+        #Only sort the largest ones, a full sort of 2^n probabilities is slow
+        if len(probabilities) > top:
+            largest = np.argpartition(probabilities, -top)[-top:]
+        else:
+            largest = np.arange(len(probabilities))
+        largest = largest[np.argsort(-probabilities[largest], kind='stable')]
+
+        lines = [classical_bits(self.bits), f'Most likely basis states (q{n-1} ... q0):']
+        for idx in largest:
+            if probabilities[idx] < self.MIN_PROBABILITY:
+                break
+            amplitude = flat[idx]
+            lines.append(f'|{int(idx):0{n}b}>  p = {probabilities[idx]:.6f}  amplitude = ' + \
+                         f'{amplitude.real:+.6f}{amplitude.imag:+.6f}j')
+        return '\n'.join(lines)
+
+def check_circuit(model):
+    '''Raises a ValueError with the diagnostics of a parsed circuit if it has no qubits, and so cannot be simulated'''
+    if model.nr_qubits <= 0:
+        raise ValueError('; '.join(d['message'] for d in model.diagnostics) or 'The circuit has no qubits')
+
+def read_circuit(data):
+    '''Returns the CircuitModel of the code of a circuit, see check_circuit(...)'''
+    model = CircuitModel()
+    model.read(data)
+    check_circuit(model)
+    return model
+
+def classical_bits(bits):
+    '''Returns the line of the report of a simulator with the classical bits, b0 is the last one'''
+    return f'Classical bits (b{len(bits)-1} ... b0): ' + ''.join(str(bit) for bit in reversed(bits))
+
+def simulation_report(header, model, report):
+    '''Returns the output of a simulation as text: the header, the lines that the parser skipped, and the report of
+    the simulator'''
+    lines = [header]
+    lines += [f"Skipped line {d['line']}: {d['message']}" for d in model.diagnostics]
+    lines.append(report)
+    return '\n'.join(lines) + '\n'
+
+def simulator_argparser(name, description):
+    '''Returns the ArgumentParser of the command line of the simulator module name, with its 'file' argument'''
+    argparser = argparse.ArgumentParser(prog=f'python -m {name}', description=description)
+    argparser.add_argument('file', help='.qc file to simulate')
+    return argparser
+
+def run_main(argparser, run, argv=None):
+    '''Runs the command line of a simulator module: writes run(args) to stdout, or the error to stderr
+
+    Parameters
+    ----------
+    argparser : argparse.ArgumentParser
+        The parser of the arguments, see simulator_argparser(...)
+    run : callable
+        Called with the parsed arguments, returns the output of the simulation
+    argv = None : list of strings
+        The arguments, defaults to sys.argv
+
+    Output
+    ------
+    The exit code: 0 if the simulation succeeded, 1 otherwise
+    '''
+    args = argparser.parse_args(argv)
+    try:
+        output = run(args)
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f'{e}\n')
+        return 1
+    sys.stdout.write(output)
+    return 0
+
+def simulate(data, seed=None, top=None, single=False):
+    '''Parses and simulates the code of a circuit, returns the report as text
+
+    Parameters
+    ----------
+    data : string
+        The code of the circuit
+    seed = None : integer
+        Seed of the random generator of the measurements
+    top = None : integer
+        Amount of basis states to list
+    single = False : Boolean
+        If True, uses single precision, which halves the memory and the time per gate
+    '''
+    start = time.perf_counter()
+    model = read_circuit(data)
+    simulator = StatevectorSimulator(model.nr_qubits, seed=seed, dtype=np.complex64 if single else np.complex128)
+    simulator.run(model.operations())
+
+    header = f'Statevector simulation of {model.nr_qubits} qubit(s), {simulator.nr_gates} gate(s) in ' + \
+             f'{time.perf_counter()-start:.3f} s'
+    return simulation_report(header, model, simulator.report(top=top))
+
+def simulate_file(filename, seed=None, top=None, single=False):
+    '''Simulates the circuit in a .qc file, see simulate(...)'''
+    with open(filename, 'r') as file:
+        return simulate(file.read(), seed=seed, top=top, single=single)
+
+def main(argv=None):
+    '''Runs the simulator from the command line, see the module docstring.'''
+    argparser = simulator_argparser('StatevectorSimulator', 'Simulates a .qc file with the built-in statevector simulator.')
+    argparser.add_argument('--seed', type=int, default=None, help='seed of the measurement outcomes')
+    argparser.add_argument('--top', type=int, default=None, help='amount of basis states to list')
+    argparser.add_argument('--single', action='store_true', help='use single precision, half the memory')
+
+    def run(args):
+        return simulate_file(args.file, seed=args.seed, top=args.top, single=args.single)
+    return run_main(argparser, run, argv)
+
+if __name__ == '__main__':
+    sys.exit(main())
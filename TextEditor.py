@@ -1,15 +1,28 @@
 import tkinter as tk
 from tkinter import messagebox
 from tkinter import filedialog
+from tkinter import simpledialog
 import tkinter.scrolledtext as tkst
 from tkinter import ttk
 
-import subprocess
+import sys
 import time
 import configparser
+import os
 
 from FileEditor import FileEditor
-from CircuitRender2 import CircuitRender
+from CircuitRender2 import CircuitRender, CircuitModel
+from CircuitWindow import CircuitWindow
+from CircuitMinimap import CircuitMinimap
+from ParseCache import ParseCache
+from JobQueue import JobQueue
+from JobsWindow import JobsWindow
+from RunHistoryWindow import RunHistoryWindow
+from FileWatcher import FileWatcher
+import ParameterSweep
+import CircuitOptimizer
+import ResourceEstimator
+import RunHistory
 
 class TextEditor(object):
     '''Holds all the information for an entirely functional GUI.'''
@@ -20,21 +33,50 @@ class TextEditor(object):
     #Adjust this to a higher number if you see that rescaling the window is too slow.
     RENDER_TIME_INTERVAL = 0.5
     
+    #Maximum amount of parser diagnostics that is listed in the warning after a build
+    MAX_SHOWN_DIAGNOSTICS = 10
+    
+    #Standard maximum amount of Simulator processes that run at the same time
+    MAX_JOBS = 2
+    
+    #The simulators that can run a file: the external Simulator .exe, the built-in StatevectorSimulator (NumPy), the
+    #built-in StabilizerSimulator (NumPy) for Clifford-only circuits, the built-in MPSSimulator (NumPy) or the built-in
+    #NoisySimulator (NumPy) that runs trajectories with the noise of the error_model statements
+    SIMULATOR_BACKENDS = (('exe', 'External Simulator.exe'), ('statevector', 'Built-in statevector (NumPy)'), \
+                          ('stabilizer', 'Built-in stabilizer, Clifford only (NumPy)'), \
+                          ('mps', 'Built-in matrix product state (NumPy)'), \
+                          ('noisy', 'Built-in noisy trajectories (NumPy)'))
+    #Standard maximum bond dimension of the MPSSimulator, and the amount of shots it samples from the final state
+    MPS_MAX_BOND = 64
+    MPS_SHOTS = 1024
+    #The NoisySimulator stops as soon as every outcome probability is known within +- this half width
+    NOISY_TARGET = 0.002
+    
+    #Standard limits of a run, in MB and seconds, above which the ResourceEstimator warns or blocks the run
+    MAX_MEMORY_MB = 4096
+    MAX_RUNTIME = 600
+    
     #Standard configparser file in which we save the preferences
     PREF_FILE_NAME = 'preferences.ini'
     
-    def __init__(self, root, output_separate_window=False):
+    def __init__(self, root, output_separate_window=False, profile=False):
         '''Initializes the TextEditor, using the tkinter window root.
         
         Parameters
         ----------
         output_separate_window: Boolean 
             If true, creates a separate window to run the Simulator, otherwise runs it in the same window.
+        profile = False : Boolean
+            If true, prints how long the startup of the editor takes.
         '''
         
         self.root = root
         self.output_separate_window = output_separate_window
         
+        #Startup profiling
+        self.profile = profile
+        self.start_time = time.perf_counter()
+        
         #Editor frame in which all the editors and the Simulator output is contained
         self.editor_paned_window = None
 
@@ -53,11 +95,28 @@ class TextEditor(object):
         self.file_editors = []
         #Active File Editor
         self.active_editor = None
+        #Placeholder File Editors of the previous session, whose files still have to be read in idle time
+        self.pending_editors = []
         
         #Circuit canvas frame, circuit builder (a CircuitRenderer) and a circuit canvas
         self.circuit_frame = None
         self.circuit_builder = None
         self.circuit_canvas = None
+        self.circuit_minimap = None
+        
+        #The parsed circuit, shared by the circuit_builder and all separate CircuitWindows, so we only parse once
+        self.circuit_model = None
+        self.circuit_windows = []
+        #The FileEditor whose code was parsed into the circuit_model, its lines belong to the drawn gates, and that code
+        self.circuit_editor = None
+        self.circuit_source = None
+        
+        #On-disk cache of the highlight tokens and parsed circuits of files, so reopening a file is fast
+        self.parse_cache = ParseCache()
+        
+        #Notices when another program changes one of the open files, such that it can be reloaded
+        self.file_watcher = FileWatcher(self.root, self.file_changed)
+        self.file_watcher.start()
         
         #Make sure the CircuitRender is not called too often
         self.circuit_render_timeout = -1
@@ -66,10 +125,34 @@ class TextEditor(object):
         self.circuit_automatic_render.set(1)
         self.circuit_resize_render = tk.BooleanVar()
         self.circuit_resize_render.set(1)
+        self.circuit_pack_columns = tk.BooleanVar()
+        self.circuit_pack_columns.set(0)
         
         
         #File path to the Simulator .exe
         self.exe_filename = None
+        #The simulator that runs the files, one of SIMULATOR_BACKENDS
+        self.simulator_backend = tk.StringVar()
+        self.simulator_backend.set('exe')
+        #Maximum bond dimension of the MPSSimulator
+        self.mps_max_bond = self.MPS_MAX_BOND
+        #Predicts the memory and runtime of a run, and the limits above which the user is warned, or the run is blocked
+        self.resource_estimator = ResourceEstimator.ResourceEstimator()
+        self.max_memory_mb = self.MAX_MEMORY_MB
+        self.max_runtime = self.MAX_RUNTIME
+        self.block_over_limits = tk.BooleanVar()
+        self.block_over_limits.set(0)
+        self.simulator_backend.trace_add('write', lambda *args: self.update_estimate())
+        #Whether redundant gates are removed by the CircuitOptimizer before a file is run
+        self.optimize_before_run = tk.BooleanVar()
+        self.optimize_before_run.set(0)
+        
+        #Runs the Simulator in the background, several files at once, and the window that lists its jobs
+        self.job_queue = JobQueue(self.root, max_workers=self.MAX_JOBS, on_finish=self.job_finished)
+        self.jobs_window = None
+        #Keeps the output of every run, and the window that lists and compares the runs of a file
+        self.run_history = RunHistory.RunHistory()
+        self.run_history_window = None
         
         #Menus in the window
         self.menubar = None
@@ -84,6 +167,19 @@ class TextEditor(object):
         #Initialize user preferences
         self.get_preferences()
         
+        self.profile_message('window ready')
+        
+    def profile_message(self, message) -> None:
+        '''Prints the time since the start of the editor, if profiling is enabled.
+        
+        Parameters
+        ----------
+        message : string
+            What happened at this moment in time
+        '''
+        if self.profile:
+            print(f'[profile] {message}: {time.perf_counter()-self.start_time:.3f} s', file=sys.stderr)
+        
     def init(self) -> None:
         '''Further initializes part of the text editor by building the window widgets'''
         
@@ -123,17 +219,52 @@ class TextEditor(object):
         
         self.setupmenu.add_command(label='Setup Simulator.exe', command=self.set_exe_filename)
         self.setupmenu.add_command(label='Toggle output mode', command=self.toggle_output_mode)
+        self.setupmenu.add_command(label='Set maximum concurrent jobs', command=self.set_max_jobs)
+        self.backendmenu = tk.Menu(self.setupmenu, activebackground='skyblue', tearoff=0 )
+        for backend, label in self.SIMULATOR_BACKENDS:
+            self.backendmenu.add_radiobutton(label=label, value=backend, variable=self.simulator_backend)
+        self.setupmenu.add_cascade(label='Simulator backend', menu=self.backendmenu)
+        self.setupmenu.add_command(label='Set MPS bond dimension', command=self.set_mps_max_bond)
+        self.setupmenu.add_command(label='Set resource limits', command=self.set_resource_limits)
+        self.setupmenu.add_checkbutton(label='Block runs above the resource limits', onvalue=1, offvalue=0, variable=self.block_over_limits)
+        self.setupmenu.add_checkbutton(label='Optimize circuit before running', onvalue=1, offvalue=0, variable=self.optimize_before_run)
         self.setupmenu.add_checkbutton(label='Automatic circuit rendering', onvalue=1, offvalue=0, variable=self.circuit_automatic_render)
         self.setupmenu.add_checkbutton(label='Rerender circuit on resize', onvalue=1, offvalue=0, variable=self.circuit_resize_render)
+        self.setupmenu.add_checkbutton(label='Compact circuit columns', onvalue=1, offvalue=0, variable=self.circuit_pack_columns)
         self.menubar.add_cascade(label='Options', menu=self.setupmenu)
         
+        ######################## Create the circuit menu
+        self.circuitmenu = tk.Menu(self.menubar, activebackground='skyblue', tearoff=0 )
+        
+        self.circuitmenu.add_command(label='New circuit window', command=self.new_circuit_window)
+        #Lists the other open files when it is opened
+        self.comparemenu = tk.Menu(self.circuitmenu, activebackground='skyblue', tearoff=0, \
+                                   postcommand=self.update_compare_menu )
+        self.circuitmenu.add_cascade(label='Check equivalence with', menu=self.comparemenu)
+        self.menubar.add_cascade(label='Circuit', menu=self.circuitmenu)
+        
+        ######################## Create the jobs menu
+        self.jobsmenu = tk.Menu(self.menubar, activebackground='skyblue', tearoff=0 )
+        
+        self.jobsmenu.add_command(label='Show jobs', command=self.show_jobs_window)
+        self.jobsmenu.add_command(label='Run history', command=self.show_run_history_window)
+        self.jobsmenu.add_command(label='Parameter sweep...', command=self.sweep_file)
+        self.menubar.add_cascade(label='Jobs', menu=self.jobsmenu)
+        
         ######################## Create the circuit builder
         self.circuit_canvas = tk.Canvas(self.circuit_frame,\
                                         width=int(self.circuit_frame.winfo_width()), \
                                         height=int(self.circuit_frame.winfo_height()), background='white' )
-        self.circuit_canvas.pack(fill=tk.BOTH, expand=1)
         
-        self.circuit_builder = CircuitRender(self.circuit_canvas)
+        self.circuit_model = CircuitModel()
+        self.circuit_builder = CircuitRender(self.circuit_canvas, self.circuit_model)
+        self.circuit_builder.enable_navigation()
+        self.circuit_builder.on_select = self.show_source
+        
+        #The minimap strip under the circuit canvas: pack it first, such that the canvas cannot push it away
+        self.circuit_minimap = CircuitMinimap(self.circuit_frame, self.circuit_builder)
+        self.circuit_minimap.canvas.pack(side=tk.BOTTOM, fill=tk.X)
+        self.circuit_canvas.pack(fill=tk.BOTH, expand=1)
         
         self.circuit_canvas.bind('<Configure>', self.canvas_resize )
         
@@ -216,7 +347,7 @@ class TextEditor(object):
         
         self.editor_paned_window.paneconfig(child, minsize=0)
         
-    def openfile(self,filename=None, suppress=True) -> None:
+    def openfile(self,filename=None, suppress=True, deferred=False) -> None:
         '''Opens a FileEditor with a file that is selected by the user
         
         Parameters
@@ -226,11 +357,26 @@ class TextEditor(object):
             String literal containing the file path
         suppress = True : Boolean
             Suppresses errros whilst opening a file.
+        deferred = False : Boolean
+            Only creates a placeholder FileEditor, the file is read in idle time by load_pending_editors().
         '''
         
         #Remove focus from the current element
         self.root.focus()
         
+        if deferred:
+            #Skip files that disappeared since the previous session, just like a failing open() would
+            if not os.path.isfile(filename):
+                return
+            self.amount_open += 1
+            fe = FileEditor(self, self.editor_paned_window, self.amount_open -1, filename = filename, deferred = True)
+            self.add_to_editor_paned_window(fe.frame)
+            
+            self.file_editors.append( fe )
+            self.active_editor = fe
+            self.pending_editors.append( fe )
+            return
+        
         file = None
         
         try:
@@ -276,6 +422,8 @@ class TextEditor(object):
     
         #Find the active editor
         fe = self.active_editor
+        #Never overwrite a file with the empty text of a placeholder
+        fe.ensure_loaded()
         
         #Check whether the active editor is actually an Untitled file, then we need saveas:
         if not fe.filename:
@@ -295,6 +443,7 @@ class TextEditor(object):
             
         #Update the fe to let the user know the save was successful
         fe.save_was_successful()
+        self.file_saved(fe, data)
         
         return True
     
@@ -319,6 +468,7 @@ class TextEditor(object):
         
         #Find the active editor
         fe = self.active_editor
+        fe.ensure_loaded()
         
         try:
             filename = filedialog.asksaveasfilename(title='Save File As...', defaultextension='.qc', initialfile='untitled.qc',\
@@ -335,9 +485,40 @@ class TextEditor(object):
             
         #Update the fe title name
         fe.set_filename(filename)
+        self.file_saved(fe, data)
         
         return True
     
+    def file_saved(self, fe, data) -> None:
+        '''Remembers that fe was saved, such that the FileWatcher does not report our own save as a change
+        
+        Parameters
+        ----------
+        fe : FileEditor
+            The FileEditor that was saved
+        data : string
+            The text that was written
+        '''
+        fe.disk_text = data
+        fe.txtarea.edit_modified(False)
+        self.file_watcher.refresh(fe.filename)
+    
+    def file_changed(self, path) -> None:
+        '''Called by the FileWatcher when another program changed a file: reloads the changed lines of every
+        FileEditor of that file, and rebuilds the circuit if that is the active one
+        
+        Parameters
+        ----------
+        path : string
+            The absolute path of the file
+        '''
+        for fe in self.file_editors:
+            #A placeholder reads the new contents anyway
+            if not fe.filename or not fe.loaded or os.path.abspath(fe.filename) != path:
+                continue
+            if fe.reload_from_disk() and fe is self.active_editor:
+                self.build_circuit(suppress=True)
+    
     #TODO: implement methods that keep track whether there are unsaved changes.
     def exit(self,*args) -> None:
         '''Exits the editor after asking for permission.
@@ -349,6 +530,7 @@ class TextEditor(object):
         '''
         
         if messagebox.askyesno('WARNING','Unsaved data might be lost!'):
+            self.file_watcher.stop()
             self.root.destroy()
             
     def canvas_resize(self,*args) -> None:
@@ -391,6 +573,11 @@ class TextEditor(object):
         fe : FileEditor
             The FileEditor that will become the active editor.
         '''
+        #The user wants to work with this file right now, so it cannot wait for idle time
+        fe.ensure_loaded()
+        #Show the Simulator output that belongs to this file
+        if fe is not self.active_editor and fe is not self.output_file_editor and fe.run_output is not None:
+            self.show_output(fe.short_filename, fe.run_output)
         self.active_editor = fe
     
     def wants_to_close(self, fe) -> bool:
@@ -413,6 +600,8 @@ class TextEditor(object):
                 
             self.file_editors.remove(fe)
             self.amount_open -= 1
+            if fe.filename and not any(other.filename == fe.filename for other in self.file_editors):
+                self.file_watcher.unwatch(fe.filename)
             return True
         return False
     
@@ -470,11 +659,19 @@ class TextEditor(object):
             self.config_parser['OPENED FILES'] = { idx : fe.filename for idx,fe in enumerate(named_editors) }
             
         #Save the preference of running the simulator in a separate window or in a FileEditor
-        self.config_parser['RUNNING PREFERENCE'] = {'separate_window' : self.output_separate_window }
+        self.config_parser['RUNNING PREFERENCE'] = {'separate_window' : self.output_separate_window,
+                                                    'max_jobs' : self.job_queue.max_workers,
+                                                    'simulator_backend' : self.simulator_backend.get(),
+                                                    'mps_max_bond' : self.mps_max_bond,
+                                                    'max_memory_mb' : self.max_memory_mb,
+                                                    'max_runtime' : self.max_runtime,
+                                                    'block_over_limits' : self.block_over_limits.get() == 1,
+                                                    'optimize_before_run' : self.optimize_before_run.get() == 1 }
         
         #Automatic rendering of the circuit
         self.config_parser['RENDERING PREFERENCES'] = { 'circuit_automatic_render' : self.circuit_automatic_render.get() == 1,
-                                                        'circuit_resize_render' : self.circuit_resize_render.get() == 1 }
+                                                        'circuit_resize_render' : self.circuit_resize_render.get() == 1,
+                                                        'circuit_pack_columns' : self.circuit_pack_columns.get() == 1 }
             
     def get_preferences(self) -> None:
         '''Attempts to get the user preferences through the configparser'''
@@ -486,18 +683,34 @@ class TextEditor(object):
                 if 'dir' in self.config_parser['EXE DIRECTORY']:
                     self.exe_filename = self.config_parser['EXE DIRECTORY']['dir']
                     
-            #Open saved files
+            #Open saved files as placeholders, their contents are read in idle time once the window is shown
             if 'OPENED FILES' in self.config_parser:
                 for idx in self.config_parser['OPENED FILES']:
-                    #self.root.after_idle(lambda: self.openfile( \
-                    #        filename=self.config_parser['OPENED FILES'][idx], suppress=True ) )
-                    self.openfile(filename=self.config_parser['OPENED FILES'][idx], suppress=True )
+                    self.openfile(filename=self.config_parser['OPENED FILES'][idx], suppress=True, deferred=True )
+                if self.pending_editors:
+                    self.root.after_idle(self.schedule_pending_editors)
                     
             #Change preference of running the simulator in a separate window
             if 'RUNNING PREFERENCE' in self.config_parser:
                 if 'separate_window' in self.config_parser['RUNNING PREFERENCE']:
                     if self.config_parser.getboolean('RUNNING PREFERENCE','separate_window') != self.output_separate_window:
                         self.toggle_output_mode()
+                if 'max_jobs' in self.config_parser['RUNNING PREFERENCE']:
+                    self.job_queue.set_max_workers(self.config_parser.getint('RUNNING PREFERENCE','max_jobs'))
+                if 'max_memory_mb' in self.config_parser['RUNNING PREFERENCE']:
+                    self.max_memory_mb = self.config_parser.getint('RUNNING PREFERENCE','max_memory_mb')
+                if 'max_runtime' in self.config_parser['RUNNING PREFERENCE']:
+                    self.max_runtime = self.config_parser.getint('RUNNING PREFERENCE','max_runtime')
+                if 'block_over_limits' in self.config_parser['RUNNING PREFERENCE']:
+                    self.block_over_limits.set( \
+                        1 if self.config_parser.getboolean('RUNNING PREFERENCE','block_over_limits') else 0)
+                if 'mps_max_bond' in self.config_parser['RUNNING PREFERENCE']:
+                    self.mps_max_bond = max(1, self.config_parser.getint('RUNNING PREFERENCE','mps_max_bond'))
+                if 'optimize_before_run' in self.config_parser['RUNNING PREFERENCE']:
+                    self.optimize_before_run.set( \
+                        1 if self.config_parser.getboolean('RUNNING PREFERENCE','optimize_before_run') else 0)
+                if self.config_parser['RUNNING PREFERENCE'].get('simulator_backend') in dict(self.SIMULATOR_BACKENDS):
+                    self.simulator_backend.set(self.config_parser['RUNNING PREFERENCE']['simulator_backend'])
                         
             #Set the automatic rendering of the circuit
             if 'RENDERING PREFERENCES' in self.config_parser:
@@ -507,43 +720,446 @@ class TextEditor(object):
                 if 'circuit_resize_render' in self.config_parser['RENDERING PREFERENCES']:
                     self.circuit_resize_render.set( \
                         1 if self.config_parser.getboolean('RENDERING PREFERENCES','circuit_resize_render') else 0)
+                if 'circuit_pack_columns' in self.config_parser['RENDERING PREFERENCES']:
+                    self.circuit_pack_columns.set( \
+                        1 if self.config_parser.getboolean('RENDERING PREFERENCES','circuit_pack_columns') else 0)
                     
         except Exception as e:
             messagebox.showerror('Exception in ConfigParser', e)
         
         
     
-    def run_file(self, filename) -> bool:
-        '''Attempts to run a .qc file from the FileEditor
+    def schedule_pending_editors(self) -> None:
+        '''Orders the placeholder FileEditors such that the active and visible ones are read first, and starts reading'''
+        #Make sure the widths of the editors are known, a collapsed pane is not visible
+        self.root.update_idletasks()
+        
+        def priority(fe):
+            if fe is self.active_editor:
+                return 0
+            return 1 if fe.frame.winfo_width() > 1 else 2
+        
+        self.pending_editors.sort(key=priority)
+        self.root.after(1, self.load_pending_editors)
+        
+    def load_pending_editors(self) -> None:
+        '''Reads one placeholder FileEditor, and reschedules itself for the next one, so the GUI stays responsive'''
+        #Editors could have been loaded (by activating them) or closed in the meanwhile
+        while self.pending_editors:
+            fe = self.pending_editors.pop(0)
+            if not fe.loaded and fe in self.file_editors:
+                fe.load_from_disk()
+                break
+        
+        if self.pending_editors:
+            self.root.after(1, self.load_pending_editors)
+        else:
+            self.profile_message('session restored')
+    
+    def run_file(self, filename, fe=None) -> bool:
+        '''Queues a run of a .qc file from the FileEditor, the output is shown as soon as it is finished
         
         Parameters
         ----------
         filename : string
             Contains the path to the file.
+        fe = None : FileEditor
+            The FileEditor that the file belongs to, which receives the output
         '''
         
+        name = fe.short_filename if fe else os.path.basename(filename)
+        
+        #The run history keeps the runs under the original file and its code, also when an optimized copy runs
+        source_filename = os.path.abspath(filename)
+        try:
+            with open(filename, 'rb') as file:
+                source_hash = RunHistory.RunHistory.source_hash(file.read())
+        except OSError:
+            source_hash = ''
+        
+        #Run a smaller, equivalent circuit instead, if the user wants to
+        description = ''
+        if self.optimize_before_run.get():
+            try:
+                filename, report = CircuitOptimizer.optimize_file(filename)
+            except (OSError, ValueError) as e:
+                messagebox.showerror('Exception', e)
+                return False
+            description = f'Ran {os.path.basename(filename)}: {report}\n'
+        
+        #The circuit that was built from the code that runs does not have to be parsed again
+        model = None
+        if fe is not None and fe is self.circuit_editor and not self.optimize_before_run.get() and \
+                fe.txtarea.get('1.0', tk.END) == self.circuit_source:
+            model = self.circuit_model
+        
+        backend = self.simulator_backend.get()
+        estimate = self.check_resources(filename, backend, model=model)
+        if estimate is False:
+            return False
+        
+        #What the run reports about the work that it actually did, see ResourceEstimator.units_done(...)
+        work = {}
+        if backend == 'mps':
+            max_bond, shots = self.mps_max_bond, self.MPS_SHOTS
+            def run_mps():
+                import MPSSimulator
+                return MPSSimulator.simulate_file(filename, max_bond=max_bond, shots=shots)
+            job = self.job_queue.submit(name, function=run_mps, editor=fe, description=description)
+        
+        elif backend == 'noisy':
+            target = self.NOISY_TARGET
+            def run_noisy():
+                import NoisySimulator
+                #It stops as soon as the target is reached, so keep track of the trajectories that it actually ran
+                return NoisySimulator.simulate_file(filename, target=target, \
+                                                    progress=lambda simulator: work.update(trajectories=simulator.total))
+            job = self.job_queue.submit(name, function=run_noisy, editor=fe, description=description)
+        
+        elif backend in ('statevector', 'stabilizer'):
+            #NumPy is only needed for these backends, so they are imported as late as possible
+            def run_builtin():
+                import StabilizerSimulator
+                import StatevectorSimulator
+                if backend == 'statevector':
+                    try:
+                        work['backend'] = 'statevector'
+                        return StatevectorSimulator.simulate_file(filename)
+                    except StatevectorSimulator.TooManyQubitsError as e:
+                        #Too large for a statevector, but a Clifford-only circuit still fits in a tableau
+                        try:
+                            work['backend'] = 'stabilizer'
+                            return StabilizerSimulator.simulate_file(filename)
+                        except StabilizerSimulator.NonCliffordError as clifford_error:
+                            raise ValueError(f'{e}\n{clifford_error}')
+                work['backend'] = 'stabilizer'
+                return StabilizerSimulator.simulate_file(filename)
+            job = self.job_queue.submit(name, function=run_builtin, editor=fe, description=description)
+        
+        else:
+            if not self.exe_filename:
+                if not self.set_exe_filename():
+                    messagebox.showerror('Exception', 'No exe filename has been set!')
+                    return False
+            job = self.job_queue.submit(name, command=[self.exe_filename, filename], editor=fe, description=description)
+        
+        job.estimate = estimate
+        job.work = work
+        job.run_info = {'filename': source_filename, 'source_hash': source_hash, \
+                        'simulator': self.exe_filename if backend == 'exe' else f'built-in {backend}'}
+        return True
+    
+    def estimate_options(self, backend) -> dict:
+        '''Returns the options of a backend that matter to the ResourceEstimator'''
+        if backend == 'mps':
+            return {'max_bond': self.mps_max_bond}
+        return {}
+    
+    def check_resources(self, filename, backend, model=None):
+        '''Estimates the resources of running a file, and warns the user (or refuses) if they exceed the limits
+        
+        Parameters
+        ----------
+        filename : string
+            The file that is about to run
+        backend : string
+            One of SIMULATOR_BACKENDS
+        model = None : CircuitModel
+            The parsed circuit of the file, if it is already parsed. If None, the file is parsed.
+        
+        Output
+        ------
+        The estimate (None if the file could not be parsed), or False if the run should not go ahead
+        '''
+        if model is None:
+            try:
+                with open(filename, 'r') as file:
+                    model = CircuitModel()
+                    model.read(file.read())
+            except OSError:
+                return None
+        if model.nr_qubits <= 0:
+            return None
+        
+        estimate = self.resource_estimator.estimate(model, backend, **self.estimate_options(backend))
+        reasons = ResourceEstimator.ResourceEstimator.exceeds(estimate, max_memory=self.max_memory_mb*1024**2, \
+                                                              max_seconds=self.max_runtime)
+        if reasons:
+            message = f'{os.path.basename(filename)} exceeds the resource limits: ' + '; '.join(reasons)
+            if self.block_over_limits.get():
+                messagebox.showerror('Resource limits', message + '.\nThe run is blocked, see Options.')
+                return False
+            if not messagebox.askokcancel('Resource limits', message + '.\nRun it anyway?'):
+                return False
+        return estimate
+    
+    def update_estimate(self, fe=None, model=None) -> None:
+        '''Shows the estimated resources of a run next to the Run button of a FileEditor
+        
+        Parameters
+        ----------
+        fe = None : FileEditor
+            The FileEditor, defaults to the active editor
+        model = None : CircuitModel
+            Its parsed circuit, defaults to the circuit_model (which belongs to the active editor)
+        '''
+        fe = fe if fe else self.active_editor
+        model = model if model else self.circuit_model
+        if not fe or fe is self.output_file_editor or not fe.loaded:
+            return
+        if model.nr_qubits <= 0:
+            fe.estimate.set('')
+            return
+        backend = self.simulator_backend.get()
+        estimate = self.resource_estimator.estimate(model, backend, **self.estimate_options(backend))
+        fe.estimate.set(ResourceEstimator.summary(estimate))
+    
+    def sweep_file(self,*args) -> bool:
+        '''Queues a ParameterSweep of the symbolic angles (such as {theta}) in the active file, and stores the table
+        
+        Parameters
+        ----------
+        *args : object
+            Specifically added such that event handler that automatically pass along an event object can call this function
+        '''
+        fe = self.active_editor
+        if not fe or fe is self.output_file_editor:
+            messagebox.showerror('Exception', 'There is no self.active_editor!')
+            return False
+        fe.ensure_loaded()
+        code = fe.txtarea.get('1.0', tk.END)
+        
+        names = ParameterSweep.find_parameters(code)
+        if not names:
+            messagebox.showerror('Parameter sweep', 'This file has no symbolic angles, such as rx q0, {theta}')
+            return False
+        
         if not self.exe_filename:
             if not self.set_exe_filename():
                 messagebox.showerror('Exception', 'No exe filename has been set!')
                 return False
         
-
-        result = subprocess.run([self.exe_filename,filename], stdout=subprocess.PIPE).stdout.decode('utf-8')
+        specs = simpledialog.askstring('Parameter sweep', 'Values per symbol, separated by ";", e.g.\n' + \
+                                       '; '.join(f'{name}=0:pi:11' for name in names), parent=self.root)
+        if not specs:
+            return False
+        try:
+            ranges = ParameterSweep.parse_ranges([spec for spec in specs.split(';') if spec.strip()])
+            nr_variants = len(ParameterSweep.variants(ranges))
+        except ValueError as e:
+            messagebox.showerror('Parameter sweep', e)
+            return False
         
+        csv_filename = filedialog.asksaveasfilename(title='Save sweep table as...', defaultextension='.csv', \
+                                                    filetypes=(('CSV Files', '.csv'), ('All Files','*.*')))
+        if not csv_filename:
+            return False
+        
+        exe_filename = self.exe_filename
+        def run_sweep():
+            rows = ParameterSweep.sweep(code, ranges, exe_filename, cache_dir=ParameterSweep.CACHE_DIR_NAME)
+            with open(csv_filename, 'w', newline='') as file:
+                ParameterSweep.table(rows, list(ranges.keys()), file)
+            return f'Table of {len(rows)} variant(s) written to {csv_filename}\n\n' + \
+                   ParameterSweep.table_text(rows, list(ranges.keys()))
+        
+        name = fe.short_filename if fe.short_filename else 'Untitled'
+        self.job_queue.submit(f'{name} (sweep of {nr_variants})', function=run_sweep, editor=fe)
+        return True
+        
+    def update_compare_menu(self) -> None:
+        '''Fills the 'Check equivalence with' menu with the open files other than the active one'''
+        self.comparemenu.delete(0, tk.END)
+        others = [fe for fe in self.file_editors if fe is not self.active_editor and fe is not self.output_file_editor]
+        for fe in others:
+            self.comparemenu.add_command(label=fe.short_filename if fe.short_filename else 'Untitled', \
+                                         command=lambda other=fe: self.compare_files(other))
+        if not others:
+            self.comparemenu.add_command(label='(no other open files)', state=tk.DISABLED)
+            
+    def compare_files(self, other) -> bool:
+        '''Queues a check whether the circuit in the active FileEditor is equivalent to the one in other
+        
+        Parameters
+        ----------
+        other : FileEditor
+            The FileEditor to compare with, its current (possibly unsaved) code is used
+        '''
+        fe = self.active_editor
+        if not fe or fe is self.output_file_editor:
+            messagebox.showerror('Exception', 'There is no self.active_editor!')
+            return False
+        fe.ensure_loaded()
+        other.ensure_loaded()
+        code1, code2 = fe.txtarea.get('1.0', tk.END), other.txtarea.get('1.0', tk.END)
+        
+        #NumPy is only needed for the comparison, so it is imported as late as possible
+        def run_compare():
+            import CircuitEquivalence
+            return CircuitEquivalence.compare(code1, code2)[1]
+        
+        name1 = fe.short_filename if fe.short_filename else 'Untitled'
+        name2 = other.short_filename if other.short_filename else 'Untitled'
+        self.job_queue.submit(f'{name1} = {name2}?', function=run_compare, editor=fe)
+        return True
+        
+    def job_finished(self, job) -> None:
+        '''Called by the JobQueue when a job has finished, routes the output to the FileEditor that started it
+        
+        Parameters
+        ----------
+        job : Job
+            The finished job
+        '''
+        output = job.description + job.output
+        if job.error:
+            output = f'{job.name}: {job.error}\n' + output
+        elif job.status == job.CANCELLED:
+            output = f'{job.name}: cancelled\n' + output
+            
+        #Calibrate the runtime estimates with every successful run that did the work that was estimated
+        if job.estimate is not None and job.status == job.DONE:
+            units = ResourceEstimator.ResourceEstimator.units_done(job.estimate, **job.work)
+            if units is not None:
+                self.resource_estimator.record(job.estimate['backend'], units, job.elapsed())
+            
+        #Keep the output of every run that was not cancelled, a failed function only has its error as output
+        if job.run_info is not None and job.status in (job.DONE, job.FAILED):
+            run_output = job.output if job.output or not job.error else job.error + '\n'
+            self.run_history.record(job.run_info['filename'], job.run_info['source_hash'], job.run_info['simulator'], \
+                                    job.elapsed(), job.exit_code, run_output, timestamp=job.start_time)
+            if self.run_history_window is not None:
+                self.run_history_window.refresh()
+            
+        if job.editor is not None:
+            job.editor.run_output = output
+            #The output of a file in the background waits until the user activates that file
+            if job.editor is not self.active_editor:
+                return
+        self.show_output(job.name, output)
+        
+    def show_output(self, name, output) -> None:
+        '''Shows Simulator output in the output widget
+        
+        Parameters
+        ----------
+        name : string
+            The name of the file that produced the output
+        output : string
+            The output of the Simulator
+        '''
         if self.output_separate_window:
             text_widget = self.runwindow_text
+            self.runwindow.title(f'Simulator Output Window: {name}')
         else:
             text_widget = self.output_file_editor.txtarea
             text_widget.configure(state='normal')
+            self.output_file_editor.title.set(f'Simulator Output: {name}')
         
         text_widget.delete(1.0,tk.END)
-        for line in result.split('\n'):
+        for line in output.split('\n'):
             text_widget.insert(tk.END, line+'\n')
         
         if not self.output_separate_window:
             self.output_file_editor.txtarea.configure(state='disabled')
             
-        return True
+    def set_max_jobs(self,*args) -> None:
+        '''Asks the user for the maximum amount of Simulator processes that run at the same time
+        
+        Parameters
+        ----------
+        *args : object
+            Specifically added such that event handler that automatically pass along an event object can call this function
+        '''
+        max_jobs = simpledialog.askinteger('Concurrent jobs', 'Maximum amount of simulations that run at the same time:', \
+                                           initialvalue=self.job_queue.max_workers, minvalue=1, parent=self.root)
+        if max_jobs:
+            self.job_queue.set_max_workers(max_jobs)
+            
+    def set_mps_max_bond(self,*args) -> None:
+        '''Asks the user for the maximum bond dimension of the MPSSimulator
+        
+        Parameters
+        ----------
+        *args : object
+            Specifically added such that event handler that automatically pass along an event object can call this function
+        '''
+        max_bond = simpledialog.askinteger('MPS bond dimension', 'Maximum bond dimension of the matrix product state:', \
+                                           initialvalue=self.mps_max_bond, minvalue=1, parent=self.root)
+        if max_bond:
+            self.mps_max_bond = max_bond
+            
+    def set_resource_limits(self,*args) -> None:
+        '''Asks the user for the memory and runtime above which a run is warned about, or blocked
+        
+        Parameters
+        ----------
+        *args : object
+            Specifically added such that event handler that automatically pass along an event object can call this function
+        '''
+        max_memory_mb = simpledialog.askinteger('Resource limits', 'Maximum estimated memory of a run, in MB:', \
+                                                initialvalue=self.max_memory_mb, minvalue=1, parent=self.root)
+        if not max_memory_mb:
+            return
+        max_runtime = simpledialog.askinteger('Resource limits', 'Maximum estimated runtime of a run, in seconds:', \
+                                              initialvalue=self.max_runtime, minvalue=1, parent=self.root)
+        if not max_runtime:
+            return
+        self.max_memory_mb, self.max_runtime = max_memory_mb, max_runtime
+        
+    def show_jobs_window(self,*args) -> None:
+        '''Opens the window that lists the Simulator jobs, or raises it if it is already open
+        
+        Parameters
+        ----------
+        *args : object
+            Specifically added such that event handler that automatically pass along an event object can call this function
+        '''
+        if self.jobs_window is None:
+            self.jobs_window = JobsWindow(self, self.job_queue)
+        else:
+            self.jobs_window.window.lift()
+            
+    def jobs_window_closed(self, jobs_window) -> None:
+        '''Called by the JobsWindow when it is closed
+        
+        Parameters
+        ----------
+        jobs_window : JobsWindow
+            The JobsWindow that was closed
+        '''
+        if self.jobs_window is jobs_window:
+            self.jobs_window = None
+            
+    def show_run_history_window(self,*args) -> None:
+        '''Opens the window that lists the recorded runs of the active file (of all files if it has no file name), or
+        switches the open window to that file
+        
+        Parameters
+        ----------
+        *args : object
+            Specifically added such that event handler that automatically pass along an event object can call this function
+        '''
+        fe = self.active_editor
+        filename = None
+        if fe and fe is not self.output_file_editor and fe.filename:
+            filename = os.path.abspath(fe.filename)
+        if self.run_history_window is None:
+            self.run_history_window = RunHistoryWindow(self, self.run_history, filename)
+        else:
+            self.run_history_window.set_filename(filename)
+            self.run_history_window.window.lift()
+            
+    def run_history_window_closed(self, run_history_window) -> None:
+        '''Called by the RunHistoryWindow when it is closed
+        
+        Parameters
+        ----------
+        run_history_window : RunHistoryWindow
+            The RunHistoryWindow that was closed
+        '''
+        if self.run_history_window is run_history_window:
+            self.run_history_window = None
             
     def build_circuit(self, suppress=False, from_keypress=False) -> None:
         '''Builds the circuit, using the active file editor
@@ -572,12 +1188,91 @@ class TextEditor(object):
         '''
         try:
             fe = self.active_editor
+            fe.ensure_loaded()
             data = fe.txtarea.get('1.0', tk.END)
-            self.circuit_builder.read(data)
-            self.circuit_builder.render()
+            self.circuit_model.pack_columns = self.circuit_pack_columns.get() == 1
+            #The parser skips the statements it does not understand, and reports all of them at once.
+            #A file that did not change since it was parsed in a previous session comes from the ParseCache.
+            if not fe.load_cached_model(self.circuit_model, data):
+                self.circuit_model.read(data)
+                fe.store_cached_model(self.circuit_model, data)
+            fe.show_diagnostics(self.circuit_model.diagnostics)
+            self.update_estimate(fe, self.circuit_model)
+            self.circuit_editor, self.circuit_source = fe, data
+            
+            #Render whatever could be parsed
+            if self.circuit_model.nr_qubits > 0:
+                self.circuit_builder.render()
+                #The separate windows draw the very same model, no need to parse again
+                for circuit_window in self.circuit_windows:
+                    circuit_window.render()
+            self.circuit_minimap.update()
         except Exception as e:
             if not suppress:
                 messagebox.showerror('Exception',e)
+            return
+        
+        diagnostics = self.circuit_model.diagnostics
+        if diagnostics and not suppress:
+            messages = [f"Line {d['line']}: {d['message']}" for d in diagnostics[:self.MAX_SHOWN_DIAGNOSTICS]]
+            if len(diagnostics) > self.MAX_SHOWN_DIAGNOSTICS:
+                messages.append(f'... and {len(diagnostics)-self.MAX_SHOWN_DIAGNOSTICS} more')
+            messagebox.showwarning(f'{len(diagnostics)} problem(s) in the circuit', '\n'.join(messages))
+                
+    def select_source(self, fe, line, col=None) -> None:
+        '''Highlights the gates of a source position in all the drawn circuits, if they were parsed from fe
+        
+        Parameters
+        ----------
+        fe : FileEditor
+            The FileEditor of the source position
+        line : integer
+            The source line, starting at 1
+        col = None : integer
+            The position in the line
+        '''
+        if fe is not self.circuit_editor:
+            return
+        for circuit_builder in [self.circuit_builder] + [window.circuit_builder for window in self.circuit_windows]:
+            circuit_builder.select_source(line, col)
+            
+    def show_source(self, ge) -> None:
+        '''Shows the statement of a gate that was clicked on in one of the drawn circuits
+        
+        Parameters
+        ----------
+        ge : GridElement
+            The gate, with its source span
+        '''
+        fe = self.circuit_editor
+        if fe is None or fe not in self.file_editors:
+            return
+        line, col, end = ge.source
+        fe.show_source(line, col, end)
+        self.select_source(fe, line, col)
+        
+    def new_circuit_window(self,*args) -> None:
+        '''Opens a separate window that renders the current circuit, sharing the parsed circuit_model
+        
+        Parameters
+        ----------
+        *args : object
+            Specifically added such that event handler that automatically pass along an event object can call this function
+        '''
+        circuit_window = CircuitWindow(self, self.circuit_model)
+        circuit_window.circuit_builder.on_select = self.show_source
+        self.circuit_windows.append(circuit_window)
+        
+    def circuit_window_closed(self, circuit_window) -> None:
+        '''Called by a CircuitWindow when it is closed
+        
+        Parameters
+        ----------
+        circuit_window : CircuitWindow
+            The CircuitWindow that was closed
+        '''
+        if circuit_window in self.circuit_windows:
+            self.circuit_windows.remove(circuit_window)
                 
     def wants_to_close_program(self,*args) -> None:
         '''Runs when the user wants to close the window using the red cross
@@ -590,9 +1285,11 @@ class TextEditor(object):
         if self.amount_open > 0:
             if messagebox.askokcancel("Quit", "You have open files! Do you want to quit?"):
                 self.write_preferences(set_=True)
+                self.file_watcher.stop()
                 self.root.destroy()
         else:
             self.write_preferences(set_=True)
+            self.file_watcher.stop()
             self.root.destroy()
             
             
@@ -607,7 +1304,7 @@ if __name__ == '__main__':
     #Make the window half the size of the computer screen, and center it
     root.geometry(f'{int(3*max_width/4)}x{int(3*max_height/4)}+{int(max_width/8)}+{int(max_height/8)}')
     
-    TextEditor(root, output_separate_window=False)
+    TextEditor(root, output_separate_window=False, profile='--profile' in sys.argv)
     root.lift()
     root.attributes('-topmost',True)
     root.after_idle(root.attributes,'-topmost',False)
@@ -0,0 +1,60 @@
+'''Checks that the clifford and unitary methods of the CircuitEquivalence agree.'''
+import random
+
+import pytest
+
+import CircuitEquivalence
+from StabilizerSimulator import NonCliffordError
+
+#Pairs of Clifford circuits on 3 qubits, and whether they are equivalent
+PAIRS = [('h q0\nh q0\n', '', True),
+         ('cnot q0,q1\n', 'h q1\ncz q0,q1\nh q1\n', True),
+         ('swap q0,q2\n', 'cnot q0,q2\ncnot q2,q0\ncnot q0,q2\n', True),
+         ('s q0\ns q0\n', 'z q0\n', True),
+         ('x q0\nz q0\n', 'y q0\n', True),
+         ('x q0\n', 'z q0\n', False),
+         ('cnot q0,q1\n', 'cnot q1,q0\n', False),
+         ('h q0\ns q0\n', 's q0\nh q0\n', False),
+         ('cz q0,q1\n', 'cz q1,q2\n', False)]
+
+def random_clifford(rng, nr_gates=12):
+    '''Returns the code of the gates of a random Clifford circuit on 3 qubits'''
+    lines = []
+    for _ in range(nr_gates):
+        gate = rng.choice(['h', 's', 'x', 'z', 'cnot', 'cz', 'swap'])
+        if gate in ('cnot', 'cz', 'swap'):
+            q1, q2 = rng.sample(range(3), 2)
+            lines.append(f'{gate} q{q1},q{q2}')
+        else:
+            lines.append(f'{gate} q{rng.randrange(3)}')
+    return '\n'.join(lines) + '\n'
+
+def random_pairs():
+    '''Returns pairs of random circuits: the same circuit with cancelling gates added, and a different circuit'''
+    rng = random.Random(1)
+    pairs = []
+    for _ in range(20):
+        code = random_clifford(rng)
+        pairs.append( (code, code + 'h q1\nh q1\ncz q0,q2\ncz q0,q2\n') )
+        pairs.append( (code, random_clifford(rng)) )
+    return pairs
+
+def check(code1, code2, method):
+    return CircuitEquivalence.compare('qubits 3\n' + code1, 'qubits 3\n' + code2, method=method, seed=1)[0]
+
+@pytest.mark.parametrize('code1, code2, equivalent', PAIRS)
+def test_known_pairs(code1, code2, equivalent):
+    assert check(code1, code2, 'clifford')['equivalent'] == equivalent
+    assert check(code1, code2, 'unitary')['equivalent'] == equivalent
+    assert check(code1, code2, 'auto')['method'] == 'clifford'
+
+@pytest.mark.parametrize('code1, code2', random_pairs())
+def test_methods_agree(code1, code2):
+    assert check(code1, code2, 'clifford')['equivalent'] == check(code1, code2, 'unitary')['equivalent']
+
+def test_multi_controlled_cz_is_not_compared_as_clifford():
+    result = check('cz q0,q1,q2\n', 'cz q0,q1\n', 'auto')
+    assert result['method'] == 'unitary'
+    assert not result['equivalent']
+    with pytest.raises(NonCliffordError):
+        check('cz q0,q1,q2\n', 'cz q0,q1\n', 'clifford')
@@ -0,0 +1,79 @@
+'''Checks that the CircuitLinter only parses the files that changed since its index was written, and its exit code.'''
+import json
+import os
+
+import pytest
+
+import CircuitLinter
+
+GOOD = 'qubits 2\nh q0\ncnot q0,q1\n'
+BAD = 'qubits 2\nh q0\nfoo q1\n'
+
+@pytest.fixture
+def directory(tmp_path):
+    '''Returns a directory with three .qc files, one of them in a subdirectory and one with a problem'''
+    (tmp_path / 'circuits').mkdir()
+    (tmp_path / 'circuits' / 'sub').mkdir()
+    (tmp_path / 'circuits' / 'a.qc').write_text(GOOD)
+    (tmp_path / 'circuits' / 'b.qc').write_text(BAD)
+    (tmp_path / 'circuits' / 'sub' / 'c.qc').write_text(GOOD)
+    (tmp_path / 'circuits' / 'notes.txt').write_text(BAD)
+    return tmp_path / 'circuits'
+
+def lint(directory, tmp_path):
+    '''Lints directory with the index in tmp_path, in this process'''
+    return CircuitLinter.lint([str(directory)], index_filename=str(tmp_path / 'index.json'), jobs=1)
+
+def test_unchanged_files_are_not_parsed_again(directory, tmp_path):
+    results, parsed = lint(directory, tmp_path)
+    assert parsed == 3
+    assert sorted(os.path.basename(path) for path in results) == ['a.qc', 'b.qc', 'c.qc']
+
+    again, parsed = lint(directory, tmp_path)
+    assert parsed == 0
+    assert again == results
+
+    #Only the edited file is parsed again
+    (directory / 'a.qc').write_text(BAD + 'x q1\n')
+    again, parsed = lint(directory, tmp_path)
+    assert parsed == 1
+    assert len(again[str(directory / 'a.qc')]) == 1
+    assert again[str(directory / 'b.qc')] == results[str(directory / 'b.qc')]
+
+def test_touched_file_with_same_content_is_not_parsed(directory, tmp_path):
+    lint(directory, tmp_path)
+    stat = os.stat(directory / 'b.qc')
+    os.utime(directory / 'b.qc', ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    results, parsed = lint(directory, tmp_path)
+    assert parsed == 0
+    assert len(results[str(directory / 'b.qc')]) == 1
+
+    #The new mtime is stored, so the content hash is not even computed the next time
+    with open(tmp_path / 'index.json') as file:
+        index = json.load(file)
+    assert index['files'][str(directory / 'b.qc')]['mtime'] == os.stat(directory / 'b.qc').st_mtime
+
+@pytest.mark.parametrize('attribute, value', [('parser_version', lambda: 'other parser'), ('INDEX_VERSION', 0)])
+def test_outdated_index_is_thrown_away(directory, tmp_path, monkeypatch, attribute, value):
+    lint(directory, tmp_path)
+    monkeypatch.setattr(CircuitLinter, attribute, value)
+    assert lint(directory, tmp_path)[1] == 3
+
+def test_corrupt_index_is_thrown_away(directory, tmp_path):
+    lint(directory, tmp_path)
+    (tmp_path / 'index.json').write_text('{"version": 1, "par')
+    assert lint(directory, tmp_path)[1] == 3
+
+def test_exit_code(directory, tmp_path, capsys):
+    index = str(tmp_path / 'index.json')
+    assert CircuitLinter.main(['--index', index, '-j', '1', str(directory)]) == 1
+    diagnostic, = [ json.loads(line) for line in capsys.readouterr().out.splitlines() ]
+    assert diagnostic['file'] == str(directory / 'b.qc') and diagnostic['line'] == 3
+
+    #The second run reports the same problem from the index
+    assert CircuitLinter.main(['--index', index, '-j', '1', str(directory)]) == 1
+    assert '0 parsed, 1 problem(s)' in capsys.readouterr().err
+
+    (directory / 'b.qc').write_text(GOOD)
+    assert CircuitLinter.main(['--index', index, '-j', '1', str(directory)]) == 0
+    assert capsys.readouterr().out == ''
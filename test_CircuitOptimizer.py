@@ -0,0 +1,80 @@
+'''Checks the rewrites and the barriers of the CircuitOptimizer, and that the optimized circuits are equivalent.'''
+import math
+import random
+
+import pytest
+
+import CircuitEquivalence
+from CircuitOptimizer import optimize_code
+
+def statements(code):
+    '''Returns the statements of code after the 'qubits' statement, without white lines'''
+    return [line.strip() for line in code.split('\n')[1:] if line.strip()]
+
+def optimized(code):
+    '''Returns the statements of the optimized code of the gates in code, on 2 qubits'''
+    return statements(optimize_code('qubits 2\n' + code)[0])
+
+@pytest.mark.parametrize('code, expected', [
+    ('h q0\nh q0\n', []),
+    ('cnot q0,q1\ncnot q0,q1\n', []),
+    ('cz q0,q1\ncz q1,q0\n', []),
+    ('t q0\ntdag q0\n', []),
+    ('tdag q0\nt q0\n', []),
+    ('t q0\nt q0\n', ['s q0']),
+    ('s q0\ns q0\n', ['z q0']),
+    ('t q0\nt q0\nt q0\nt q0\n', ['z q0']),
+    ('rz q0, 1.0\nrz q0, 0.5\n', ['rz q0, 1.5']),
+    (f'rx q0, {2*math.pi}\nrx q0, {2*math.pi}\n', []),
+    #Gates on other qubits in between do not matter
+    ('h q1\nh q0\nh q1\n', ['h q0']),
+    #Different gates stay
+    ('cnot q0,q1\ncnot q1,q0\n', ['cnot q0, q1', 'cnot q1, q0']),
+    ('rx q0, 1.0\nrz q0, 1.0\n', ['rx q0, 1.0', 'rz q0, 1.0']),
+])
+def test_rewrites(code, expected):
+    assert optimized(code) == expected
+
+def test_rotation_over_two_pi_stays():
+    #A rotation over 2 pi is minus the identity, which matters once the gate is controlled
+    statement, = optimized(f'rz q0, {math.pi}\nrz q0, {math.pi}\n')
+    assert statement.startswith('rz q0, ') and float(statement.split(',')[1]) == pytest.approx(2*math.pi)
+
+@pytest.mark.parametrize('barrier', ['measure q0', 'prepz q0', 'display', 'error_model depolarizing_channel, 0.01', \
+                                     'c-x b0, q0'])
+def test_barriers(barrier):
+    assert optimized(f'h q0\n{barrier}\nh q0\n') == ['h q0', barrier, 'h q0']
+
+def test_subroutine_keeps_its_repeat():
+    code = optimize_code('qubits 2\nh q0\n.loop(3)\n    h q0\n    h q0\n    x q1\nh q0\n')[0]
+    assert statements(code) == ['h q0', '.loop(3)', 'x q1', 'h q0']
+    #The gates around a subroutine do not cancel through it
+    assert '    x q1' in code.split('\n')
+
+def random_code(rng, nr_qubits=3, nr_gates=30):
+    '''Returns the code of a random circuit that contains many pairs that the optimizer rewrites'''
+    lines = [f'qubits {nr_qubits}']
+    for _ in range(nr_gates):
+        gate = rng.choice(['h', 'x', 'y', 'z', 's', 't', 'tdag', 'rx', 'ry', 'rz', 'cnot', 'cz', 'swap', 'toffoli'])
+        if gate in ('cnot', 'cz', 'swap'):
+            statement = f'{gate} ' + ','.join(f'q{q}' for q in rng.sample(range(nr_qubits), 2))
+        elif gate == 'toffoli':
+            statement = f'{gate} ' + ','.join(f'q{q}' for q in rng.sample(range(nr_qubits), 3))
+        elif gate in ('rx', 'ry', 'rz'):
+            angle = rng.choice([rng.uniform(-math.pi, math.pi), math.pi, 2*math.pi, 4*math.pi])
+            statement = f'{gate} q{rng.randrange(nr_qubits)}, {angle}'
+        else:
+            statement = f'{gate} q{rng.randrange(nr_qubits)}'
+        lines.append(statement)
+        #Repeat a statement now and then, such that there is something to rewrite
+        if rng.random() < 0.4:
+            lines.append(statement)
+    return '\n'.join(lines) + '\n'
+
+@pytest.mark.parametrize('seed', range(30))
+def test_random_circuits_stay_equivalent(seed):
+    code = random_code(random.Random(seed))
+    optimized_code = optimize_code(code)[0]
+    assert len(statements(optimized_code)) <= len(statements(code))
+    result, _ = CircuitEquivalence.compare(code, optimized_code, method='unitary')
+    assert result['equivalent']
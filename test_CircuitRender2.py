@@ -0,0 +1,106 @@
+'''Checks the CircuitModel parser: the spans of its diagnostics, the sources of the gates, the subroutines and the
+names of the qubits.'''
+import pytest
+
+from CircuitRender2 import CircuitModel
+
+def parse(code, strict=False):
+    '''Returns the CircuitModel of code'''
+    model = CircuitModel()
+    model.read(code, strict=strict)
+    return model
+
+def span(diagnostic):
+    '''Returns the (line, col, end) of a diagnostic'''
+    return (diagnostic['line'], diagnostic['col'], diagnostic['end'])
+
+def gates(model):
+    '''Returns the (gate, row, col, source) of every GridElement of the qubits'''
+    return sorted( (ge.gate, row, col, ge.source) for row, grid_row in enumerate(model.grid[:model.nr_qubits]) \
+                   for col, ge in grid_row.items() )
+
+@pytest.mark.parametrize('code, line, statement', [
+    ('qubits 2\nh q0\nfoo q1\n', 3, 'foo q1'),
+    #Inside a parallel block, the span covers only the bad sub-statement
+    ('qubits 2\n{h q0 | foo q1}\n', 2, 'foo q1'),
+    ('qubits 2\n{foo q0 | h q1}\n', 2, 'foo q0'),
+    ('qubits 3\n  { h q0 | x q1 |  foo q2 }  # comment\n', 2, 'foo q2'),
+    #Inside a subroutine, the span leaves out the indentation
+    ('qubits 2\n.loop(2)\n    h q0\n    foo q1\n', 4, 'foo q1'),
+    ('qubits 2\n.loop(2)\n    {h q0 | cnot q1, q7}\n', 3, 'cnot q1, q7'),
+    ('qubits 2\nh q0\ncnot q0  # one qubit\n', 3, 'cnot q0'),
+])
+def test_diagnostic_spans(code, line, statement):
+    model = parse(code)
+    diagnostic, = model.diagnostics
+    source_line = code.split('\n')[line-1]
+    assert span(diagnostic) == (line, source_line.index(statement), source_line.index(statement) + len(statement))
+
+def test_all_diagnostics_are_reported():
+    model = parse('qubits 2\nfoo q0\nh q0\n{x q1 | bar q0}\n.loop(2)\n    baz q1\nx q0\n')
+    assert [span(diagnostic) for diagnostic in model.diagnostics] == [(2, 0, 6), (4, 8, 14), (6, 4, 10)]
+    #The rest of the circuit is still built, and the parallel block keeps its single column
+    assert [(gate, row, col) for gate, row, col, _ in gates(model)] == [('h', 0, 0), ('x', 0, 2), ('x', 1, 1)]
+
+def test_missing_qubits_statement():
+    model = parse('h q0\nx q1\n')
+    assert model.nr_qubits == 0
+    diagnostic, = model.diagnostics
+    assert 'qubits' in diagnostic['message']
+
+def test_sources_of_parallel_statements():
+    model = parse('qubits 3\nh q0\n  {x q0 |  cnot q1,q2 }\n')
+    assert not model.diagnostics
+    assert gates(model) == [('cnot', 1, 1, (3, 11, 21)), ('cnot', 2, 1, (3, 11, 21)), ('h', 0, 0, (2, 0, 4)), \
+                            ('x', 0, 1, (3, 3, 7))]
+
+@pytest.mark.parametrize('code', ['qubits 2\nfoo q0\n', 'qubits 2\n{h q0 | foo q1}\n', 'qubits 2\nh q5\n', \
+                                  'qubits\nh q0\n'])
+def test_strict_raises(code):
+    with pytest.raises((SyntaxWarning, ValueError, IndexError)):
+        parse(code, strict=True)
+    assert parse(code).diagnostics
+
+def test_strict_accepts_valid_code():
+    assert parse('qubits 2\n.loop(2)\n    {h q0 | x q1}\ncnot q0,q1\n', strict=True).diagnostics == []
+
+@pytest.mark.parametrize('code, end', [
+    #An indented parallel block is still part of the subroutine
+    ('qubits 2\n.loop(2)\n    {h q0 | x q1}\n    h q1\nx q0\n', 2),
+    #The sub-statements of a parallel block that is not indented end the subroutine, also after a '| '
+    ('qubits 2\n.loop(2)\n    h q0\n{h q0 | x q1}\n', 1),
+    ('qubits 2\n.loop(2)\n    h q0\n{ h q0 | x q1 }\n    x q0\n', 1),
+])
+def test_subroutine_indentation(code, end):
+    model = parse(code)
+    assert not model.diagnostics
+    assert [(subroutine['start'], subroutine['end'], subroutine['repeat']) for subroutine in model.subroutines] == \
+        [(0, end, 2)]
+
+@pytest.mark.parametrize('name, row', [
+    ('q0', 0), ('q2', 2), ('b0', 3), ('b2', 5),
+    ('aq1', None), ('q1junk', None), ('q01', None), ('b00', None), ('q7', None), ('b3', None), ('q', None),
+    ('Q1', None), ('q-1', None), ('q 1', None), ('', None),
+])
+def test_numeric_row(name, row):
+    assert parse('qubits 3\n').numeric_row(name) == row
+
+@pytest.mark.parametrize('statement', ['h aq1', 'h q1junk', 'h q01', 'h q7', 'cnot q0, b01', 'map q7, anc', \
+                                       'map x1, anc'])
+def test_invalid_names_are_diagnosed(statement):
+    diagnostic, = parse(f'qubits 3\n{statement}\n').diagnostics
+    assert span(diagnostic) == (2, 0, len(statement))
+
+def test_mapped_names():
+    model = parse('qubits 3\nmap q1, anc\nmap b2, flag\nh anc\nmeasure q1\nc-x flag, q0\n')
+    assert not model.diagnostics
+    assert (model.symbols['anc'], model.symbols['flag']) == (1, 5)
+    assert [(gate, row) for gate, row, _, _ in gates(model) if gate == 'h'] == [('h', 1)]
+    #The numeric names stay valid next to the mapped ones
+    assert model.numeric_row('q1') == 1 and model.symbols['q1'] == 1
+
+def test_remapped_name_is_no_longer_valid():
+    model = parse('qubits 2\nmap q1, anc\nmap q1, data\nh data\nh anc\n')
+    diagnostic, = model.diagnostics
+    assert span(diagnostic) == (5, 0, 5)
+    assert 'anc' not in model.symbols and model.symbols['data'] == 1
@@ -0,0 +1,72 @@
+'''Checks the MPSSimulator against the StatevectorSimulator, with long-range gates and swaps.'''
+import math
+import random
+
+import numpy as np
+import pytest
+
+from CircuitRender2 import CircuitModel
+from MPSSimulator import MPSSimulator
+from StatevectorSimulator import StatevectorSimulator
+
+def random_code(nr_qubits, nr_gates, rng):
+    '''Returns the code of a random circuit without measurements, with many long-range gates'''
+    lines = [f'qubits {nr_qubits}']
+    for _ in range(nr_gates):
+        gate = rng.choice(['h', 't', 'rx', 'ry', 'cnot', 'cr', 'cz', 'swap', 'toffoli'])
+        if gate in ('cnot', 'cr', 'cz', 'swap'):
+            q1, q2 = rng.sample(range(nr_qubits), 2)
+            lines.append(f'{gate} q{q1},q{q2}')
+        elif gate == 'toffoli':
+            q1, q2, q3 = rng.sample(range(nr_qubits), 3)
+            lines.append(f'{gate} q{q1},q{q2},q{q3}')
+        elif gate in ('rx', 'ry'):
+            lines.append(f'{gate} q{rng.randrange(nr_qubits)}, {rng.uniform(-math.pi, math.pi)}')
+        else:
+            lines.append(f'{gate} q{rng.randrange(nr_qubits)}')
+    return '\n'.join(lines) + '\n'
+
+def run_both(code, max_bond=None):
+    '''Runs the code on both simulators, returns (mps, statevector)'''
+    model = CircuitModel()
+    model.read(code)
+    assert not model.diagnostics
+    mps = MPSSimulator(model.nr_qubits, max_bond=max_bond, seed=1)
+    mps.run(model.operations())
+    statevector = StatevectorSimulator(model.nr_qubits, seed=1)
+    statevector.run(model.operations())
+    return mps, statevector
+
+def contract(mps):
+    '''Returns the state of an MPSSimulator as a statevector, in the order of the StatevectorSimulator'''
+    n = mps.nr_qubits
+    state = mps.tensors[0]
+    for tensor in mps.tensors[1:]:
+        state = np.tensordot(state, tensor, axes=(-1, 0))
+    #One axis per site, and the axes of the qubits n-1 ... 0 in that order, as qubit 0 is the least significant bit
+    state = state.reshape([2] * n)
+    return np.transpose(state, [mps.sites[qubit] for qubit in reversed(range(n))]).reshape(-1)
+
+@pytest.mark.parametrize('seed', range(15))
+def test_random_circuits_match_the_statevector(seed):
+    mps, statevector = run_both(random_code(6, 40, random.Random(seed)))
+    overlap = abs(np.vdot(contract(mps), statevector.state))
+    assert overlap == pytest.approx(1.0, abs=1e-9)
+    assert mps.truncation_error == pytest.approx(0.0, abs=1e-12)
+
+def test_samples_follow_the_probabilities():
+    mps, statevector = run_both(random_code(4, 25, random.Random(7)))
+    shots = 20000
+    samples = mps.sample(shots)
+    #The basis state of every shot, qubit 0 is the least significant bit
+    indices = samples.astype(np.int64) @ (1 << np.arange(mps.nr_qubits))
+    frequencies = np.bincount(indices, minlength=2**mps.nr_qubits) / shots
+    assert np.max(np.abs(frequencies - statevector.probabilities())) < 0.02
+
+def test_small_max_bond_truncates():
+    code = random_code(8, 80, random.Random(3))
+    mps, statevector = run_both(code, max_bond=2)
+    assert mps.largest_bond <= 2
+    assert mps.truncation_error > 0
+    #The truncated state is no longer the exact one
+    assert abs(np.vdot(contract(mps), statevector.state)) < 1 - 1e-6
@@ -0,0 +1,58 @@
+'''Checks the error_model statements and the statistics and reproducibility of the NoisySimulator.'''
+import pytest
+
+from CircuitRender2 import CircuitModel
+from NoisySimulator import NoisySimulator
+
+def parse(code):
+    '''Returns the CircuitModel of code'''
+    model = CircuitModel()
+    model.read(code)
+    return model
+
+@pytest.mark.parametrize('statement, message', [
+    ('error_model foo_channel, 0.1', 'expects error_model channel'),
+    ('error_model depolarizing_channel, 1.5', 'probability between 0 and 1'),
+    ('error_model depolarizing_channel, -0.1', 'probability between 0 and 1'),
+    ('error_model depolarizing_channel, x', 'does not understand the probability x'),
+    ('error_model depolarizing_channel, 0.1, frob', 'does not know the gate frob'),
+])
+def test_invalid_error_models(statement, message):
+    model = parse(f'qubits 1\n{statement}\nh q0\n')
+    assert model.error_models == []
+    diagnostic, = model.diagnostics
+    assert diagnostic['line'] == 2 and diagnostic['col'] == 0 and diagnostic['end'] == len(statement)
+    assert message in diagnostic['message']
+
+def test_error_model_with_gates():
+    model = parse('qubits 2\nerror_model depolarizing_channel, 0.01, cnot, toffoli\ncnot q0,q1\n')
+    assert not model.diagnostics
+    assert model.error_models == [{'channel': 'depolarizing_channel', 'probability': 0.01, 'gates': ['cnot', 'toffoli']}]
+
+def flip_rate(code, trajectories=20000, seed=5):
+    '''Returns the fraction of the trajectories in which the measured b0 is not 1'''
+    simulator = NoisySimulator(parse(code), seed=seed, jobs=1)
+    simulator.run(trajectories=trajectories)
+    assert simulator.total == trajectories
+    return sum(count for outcome, count in simulator.counts.items() if outcome[-1] != '1') / simulator.total
+
+@pytest.mark.parametrize('error_model, rate', [
+    #Two of the three errors of the depolarizing channel (x and y) flip the outcome
+    ('error_model depolarizing_channel, 0.3', 0.2),
+    ('error_model bit_flip_channel, 0.1', 0.1),
+    ('error_model phase_flip_channel, 0.3', 0.0),
+    ('error_model measurement_error, 0.25', 0.25),
+    #The noise only acts after the listed gates
+    ('error_model depolarizing_channel, 0.3, cnot', 0.0),
+])
+def test_flip_statistics(error_model, rate):
+    assert flip_rate(f'qubits 1\n{error_model}\nx q0\nmeasure q0\n') == pytest.approx(rate, abs=0.015)
+
+def test_jobs_do_not_change_the_counts():
+    model = parse('qubits 3\nerror_model depolarizing_channel, 0.05\nh q0\ncnot q0,q1\ncnot q1,q2\nmeasure\n')
+    counts = []
+    for jobs in (1, 3):
+        simulator = NoisySimulator(model, seed=11, jobs=jobs, batch=500)
+        simulator.run(trajectories=5000)
+        counts.append(simulator.counts)
+    assert counts[0] == counts[1]
@@ -0,0 +1,39 @@
+'''Checks how a ParameterSweep finds and fills in the symbolic angles of a circuit, and parses their values.'''
+import math
+
+import pytest
+
+import ParameterSweep
+
+@pytest.mark.parametrize('code, names', [
+    ('qubits 1\nrx q0, {theta}\n', ['theta']),
+    ('qubits 2\nrx q0, { theta }\nry q1,{phi}\nrz q0, {theta}\n', ['theta', 'phi']),
+    ('qubits 2\n{ rx q0, {theta} | ry q1, {phi} }\n', ['theta', 'phi']),
+    #One-statement parallel blocks are not symbolic angles
+    ('qubits 1\n{ measure }\n', []),
+    ('qubits 2\n{h q0}\n{ display }\nrx q1, {alpha}\n', ['alpha']),
+])
+def test_find_parameters(code, names):
+    assert ParameterSweep.find_parameters(code) == names
+
+def test_substitute_keeps_parallel_blocks():
+    code = 'qubits 2\n{ measure }\n{ rx q0, {theta} | h q1 }\nrz q1,  {phi}\n'
+    assert ParameterSweep.substitute(code, {'theta': 0.5, 'phi': math.pi}) == \
+        f'qubits 2\n{{ measure }}\n{{ rx q0, 0.5 | h q1 }}\nrz q1,  {math.pi:.12g}\n'
+
+def test_substitute_needs_every_value():
+    with pytest.raises(KeyError):
+        ParameterSweep.substitute('qubits 1\nrx q0, {theta}\n', {'phi': 1.0})
+
+@pytest.mark.parametrize('text, values', [
+    ('0:1:3', [0.0, 0.5, 1.0]),
+    ('0:pi:1', [0.0]),
+    ('pi/2, -2*pi', [math.pi/2, -2*math.pi]),
+])
+def test_parse_range(text, values):
+    assert ParameterSweep.parse_range(text) == pytest.approx(values)
+
+@pytest.mark.parametrize('text', ['0:1', '0:1:0', '__import__("os")', 'pi +'])
+def test_invalid_ranges(text):
+    with pytest.raises(ValueError):
+        ParameterSweep.parse_range(text)
@@ -0,0 +1,100 @@
+'''Checks the entries of the ParseCache: their header, when they are valid, and their eviction.'''
+import os
+
+import pytest
+
+from ParseCache import ParseCache
+
+CODE = 'qubits 2\nh q0\ncnot q0,q1\n'
+MODEL = {'nr_qubits': 2}
+TOKENS = [['keyword', '1.0', '1.6']]
+
+def write_file(path, code=CODE):
+    '''Writes code to path, returns its content_hash'''
+    path.write_text(code)
+    return ParseCache.content_hash(code)
+
+@pytest.fixture
+def cache(tmp_path):
+    '''Returns a ParseCache in a temporary directory'''
+    return ParseCache(directory=str(tmp_path / 'cache'))
+
+def test_round_trip_and_header(tmp_path, cache):
+    path = tmp_path / 'circuit.qc'
+    content_hash = write_file(path)
+    cache.put(str(path), content_hash, tokens=TOKENS, model=MODEL)
+    assert cache.get(str(path), content_hash) == {'tokens': TOKENS, 'model': MODEL}
+
+    with open(cache.entry_filename(str(path)), 'rb') as file:
+        data = file.read()
+    magic, version, crc, length = ParseCache.HEADER.unpack_from(data)
+    assert (magic, version) == (ParseCache.MAGIC, ParseCache.VERSION)
+    assert length == len(data) - ParseCache.HEADER.size
+    assert cache.decode(data)['hash'] == content_hash
+
+def test_missing_entry(tmp_path, cache):
+    path = tmp_path / 'circuit.qc'
+    assert cache.get(str(path), write_file(path)) is None
+
+@pytest.mark.parametrize('change', ['mtime', 'size', 'hash'])
+def test_changed_file_is_not_used(tmp_path, cache, change):
+    path = tmp_path / 'circuit.qc'
+    content_hash = write_file(path)
+    cache.put(str(path), content_hash, tokens=TOKENS, model=MODEL)
+    if change == 'mtime':
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    elif change == 'size':
+        content_hash = write_file(path, CODE + 'h q1\n')
+    else:
+        #Same size and mtime, but other content
+        content_hash = ParseCache.content_hash(CODE.replace('h q0', 'x q0'))
+    assert cache.get(str(path), content_hash) is None
+
+def test_other_version_is_thrown_away(tmp_path, cache, monkeypatch):
+    path = tmp_path / 'circuit.qc'
+    content_hash = write_file(path)
+    cache.put(str(path), content_hash, tokens=TOKENS, model=MODEL)
+    monkeypatch.setattr(ParseCache, 'VERSION', ParseCache.VERSION + 1)
+    assert cache.get(str(path), content_hash) is None
+    assert not os.path.exists(cache.entry_filename(str(path)))
+
+@pytest.mark.parametrize('damage', [
+    lambda data: data[:-5],
+    lambda data: data[:ParseCache.HEADER.size - 2],
+    lambda data: data[:-1] + bytes([data[-1] ^ 0xff]),
+    lambda data: b'JUNK' + data[4:],
+    lambda data: b'',
+])
+def test_corrupt_entry_is_thrown_away(tmp_path, cache, damage):
+    path = tmp_path / 'circuit.qc'
+    content_hash = write_file(path)
+    cache.put(str(path), content_hash, tokens=TOKENS, model=MODEL)
+    entry_filename = cache.entry_filename(str(path))
+    with open(entry_filename, 'rb') as file:
+        data = file.read()
+    with open(entry_filename, 'wb') as file:
+        file.write(damage(data))
+    assert cache.get(str(path), content_hash) is None
+    assert not os.path.exists(entry_filename)
+
+    #The next put writes a valid entry again
+    cache.put(str(path), content_hash, tokens=TOKENS, model=MODEL)
+    assert cache.get(str(path), content_hash) == {'tokens': TOKENS, 'model': MODEL}
+
+def test_least_recently_used_entries_are_evicted(tmp_path, cache):
+    paths = [ tmp_path / f'circuit{idx}.qc' for idx in range(4) ]
+    hashes = [ write_file(path) for path in paths ]
+    for path, content_hash in zip(paths[:3], hashes):
+        cache.put(str(path), content_hash, model=MODEL)
+    entry_filenames = [ cache.entry_filename(str(path)) for path in paths ]
+    size = os.path.getsize(entry_filenames[0])
+    #Make the entries 0, 1 and 2 used from long ago to recently, then use entry 0 again
+    for idx, entry_filename in enumerate(entry_filenames[:3]):
+        os.utime(entry_filename, (1000 + idx, 1000 + idx))
+    assert cache.get(str(paths[0]), hashes[0]) is not None
+
+    #Room for three entries, so the fourth evicts the least recently used one
+    cache.max_bytes = 3*size + size//2
+    cache.put(str(paths[3]), hashes[3], model=MODEL)
+    assert [ os.path.exists(entry_filename) for entry_filename in entry_filenames ] == [True, False, True, True]
@@ -0,0 +1,43 @@
+'''Checks the profile and the estimates of the ResourceEstimator.'''
+import collections
+import math
+
+import pytest
+
+from CircuitRender2 import CircuitModel
+from ResourceEstimator import ResourceEstimator
+
+def parse(code):
+    '''Returns the CircuitModel of code'''
+    model = CircuitModel()
+    model.read(code)
+    return model
+
+@pytest.mark.parametrize('code', [
+    'qubits 3\nh q0\n.loop(5)\n    cnot q0,q1\n    t q2\n.other(2)\n    h q1\n    c-x b0,q2\nmeasure\n',
+    'qubits 3\ntoffoli q0,q1,q2\nmeasure q1\n{h q0 | x q1 | cz q2,q0}\n',
+    'qubits 2\n.twice(2)\n    { h q0 | h q1 }\n    measure q0\nrz q1, 0.5\n',
+])
+def test_profile_counts_the_unrolled_operations(code):
+    model = parse(code)
+    profile = ResourceEstimator.profile(model)
+    assert profile['gates'] == collections.Counter(gate for gate, _, _ in model.operations())
+
+def test_large_clifford_statevector_runs_on_stabilizer(tmp_path):
+    model = parse('qubits 1100\nh q0\ncnot q0,q1\nmeasure\n')
+    estimate = ResourceEstimator(filename=str(tmp_path / 'calibration.json')).estimate(model, 'statevector')
+    assert estimate['backend'] == 'stabilizer'
+    assert math.isfinite(estimate['units'])
+
+def test_large_non_clifford_statevector_saturates(tmp_path):
+    model = parse('qubits 1100\nh q0\nt q0\n')
+    estimate = ResourceEstimator(filename=str(tmp_path / 'calibration.json')).estimate(model, 'statevector')
+    assert estimate['backend'] == 'statevector'
+    assert estimate['units'] == math.inf and estimate['memory'] == math.inf
+    assert ResourceEstimator.units_done(estimate) is None
+
+def test_noisy_units_done_scale_with_the_trajectories(tmp_path):
+    estimate = ResourceEstimator(filename=str(tmp_path / 'calibration.json')).estimate(parse('qubits 3\nh q0\nmeasure\n'), 'noisy')
+    assert ResourceEstimator.units_done(estimate, trajectories=estimate['trajectories']) == estimate['units']
+    assert ResourceEstimator.units_done(estimate, trajectories=2500) == pytest.approx(estimate['units'] * 3 / 100)
+    assert ResourceEstimator.units_done(estimate, backend='stabilizer') is None
@@ -0,0 +1,125 @@
+'''Checks the diff of two outputs and the retention limits of the RunHistory.'''
+import os
+import random
+
+import pytest
+
+import RunHistory
+
+def expand(rows):
+    '''Returns the rows of a diff, with every 'skip' row expanded into its equal rows'''
+    expanded = []
+    for row in rows:
+        if row[0] == 'skip':
+            _, line1, line2, count = row
+            expanded += [ ('equal', line1+k, line2+k) for k in range(count) ]
+        else:
+            expanded.append(row)
+    return expanded
+
+def check_round_trip(lines1, lines2, context=3):
+    '''Checks that both sides of the diff of lines1 and lines2 can be read back from its rows'''
+    rows = expand(RunHistory.diff(lines1, lines2, context=context))
+    assert [lines1[row[1]] for row in rows if row[1] is not None] == lines1
+    assert [lines2[row[2]] for row in rows if row[2] is not None] == lines2
+    for kind, line1, line2 in rows:
+        if kind == 'equal':
+            assert lines1[line1] == lines2[line2]
+        elif kind == 'delete':
+            assert line2 is None
+        elif kind == 'insert':
+            assert line1 is None
+    return rows
+
+def mutate(lines, rng, changes):
+    '''Returns a copy of lines with changes random replaced, deleted and inserted lines'''
+    lines = list(lines)
+    for _ in range(changes):
+        kind = rng.choice(['replace', 'delete', 'insert'])
+        idx = rng.randrange(len(lines))
+        if kind == 'replace':
+            lines[idx] = f'changed {rng.random()}'
+        elif kind == 'delete':
+            del lines[idx]
+        else:
+            lines.insert(idx, f'inserted {rng.random()}')
+    return lines
+
+@pytest.mark.parametrize('seed', range(10))
+def test_diff_round_trip(seed):
+    rng = random.Random(seed)
+    #Repeated lines as well, such as the same measurement outcome on many lines
+    lines1 = [ f'line {rng.randrange(50)}' if rng.random() < 0.3 else f'line {idx}' for idx in range(300) ]
+    lines2 = mutate(lines1, rng, rng.randrange(1, 10))
+    check_round_trip(lines1, lines2, context=rng.randrange(0, 4))
+
+@pytest.mark.parametrize('lines1, lines2', [
+    ([], []),
+    ([], ['a', 'b']),
+    (['a', 'b'], []),
+    (['a'] * 20, ['a'] * 20),
+    (['a', 'b', 'c'], ['x', 'y']),
+])
+def test_diff_edge_cases(lines1, lines2):
+    check_round_trip(lines1, lines2)
+
+def test_long_equal_runs_are_skipped():
+    lines1 = [ f'line {idx}' for idx in range(1000) ]
+    lines2 = list(lines1)
+    lines2[500] = 'changed'
+    rows = RunHistory.diff(lines1, lines2, context=3)
+    assert [row[0] for row in rows] == ['skip'] + ['equal']*3 + ['replace'] + ['equal']*3 + ['skip']
+    assert rows[0] == ('skip', 0, 0, 497) and rows[-1] == ('skip', 504, 504, 496)
+
+def test_anchor_split(monkeypatch):
+    monkeypatch.setattr(RunHistory, 'SPLIT_SIZE', 10)
+    anchors = []
+    find_anchor = RunHistory.find_anchor
+    def recording_find_anchor(*args):
+        anchor = find_anchor(*args)
+        anchors.append(anchor)
+        return anchor
+    monkeypatch.setattr(RunHistory, 'find_anchor', recording_find_anchor)
+
+    rng = random.Random(3)
+    lines1 = [ f'line {idx}' for idx in range(400) ]
+    #Changes spread over the whole output, such that the common start and end do not cover the long ranges
+    lines2 = mutate(lines1, rng, 40)
+    lines2[0], lines2[-1] = 'first', 'last'
+    check_round_trip(lines1, lines2)
+    assert any(anchor is not None for anchor in anchors)
+
+def test_find_anchor_needs_unique_lines():
+    ids = [1, 2] * 20
+    assert RunHistory.find_anchor(ids, ids, 0, len(ids), 0, len(ids)) is None
+    ids1, ids2 = list(range(40)), [-1] + list(range(40))
+    i, j = RunHistory.find_anchor(ids1, ids2, 0, len(ids1), 0, len(ids2))
+    assert ids1[i] == ids2[j]
+
+def record(history, idx, size):
+    '''Records run idx, with an output of size random hexadecimal digits, which hardly compresses'''
+    output = os.urandom(size // 2).hex()
+    return history.record('circuit.qc', history.source_hash(str(idx)), 'Simulator.exe', 0.1, 0, output, timestamp=idx)
+
+def test_retention_by_count(tmp_path):
+    history = RunHistory.RunHistory(filename=str(tmp_path / 'history.sqlite'), max_runs=3)
+    run_ids = [ record(history, idx, 100) for idx in range(6) ]
+    assert [run['run_id'] for run in history.runs()] == run_ids[:2:-1]
+    assert history.output(run_ids[0]) is None
+    history.close()
+
+def test_retention_by_bytes(tmp_path):
+    history = RunHistory.RunHistory(filename=str(tmp_path / 'history.sqlite'))
+    run_ids = [ record(history, 0, 1000) ]
+    #Room for two and a half of these runs
+    history.max_bytes = history.runs()[0]['stored_size'] * 5 // 2
+    run_ids += [ record(history, idx, 1000) for idx in range(1, 5) ]
+    runs = history.runs()
+    assert [run['run_id'] for run in runs] == run_ids[:2:-1]
+    assert sum(run['stored_size'] for run in runs) <= history.max_bytes
+
+    #The newest run is kept, even if it does not fit on its own
+    run_id = record(history, 5, 10 * history.max_bytes)
+    assert [run['run_id'] for run in history.runs()] == [run_id]
+    assert len(history.output(run_id)) == 10 * history.max_bytes
+    history.close()
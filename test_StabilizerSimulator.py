@@ -0,0 +1,73 @@
+'''Checks the StabilizerSimulator against the StatevectorSimulator on Clifford circuits.'''
+import math
+import random
+
+import numpy as np
+import pytest
+
+from CircuitRender2 import CircuitModel
+from StabilizerSimulator import NonCliffordError, StabilizerSimulator
+import StabilizerSimulator as stabilizer_module
+from StatevectorSimulator import StatevectorSimulator
+
+#Pauli matrices of the stabilizer strings
+PAULIS = {'I': np.eye(2), 'X': np.array([[0, 1], [1, 0]]), 'Y': np.array([[0, -1j], [1j, 0]]), \
+          'Z': np.array([[1, 0], [0, -1]])}
+
+def random_clifford_code(nr_qubits, nr_gates, rng):
+    '''Returns the code of a random Clifford circuit without measurements'''
+    lines = [f'qubits {nr_qubits}']
+    for _ in range(nr_gates):
+        gate = rng.choice(['h', 'x', 'y', 'z', 's', 'rx', 'ry', 'rz', 'cnot', 'cz', 'swap'])
+        if gate in ('cnot', 'cz', 'swap'):
+            q1, q2 = rng.sample(range(nr_qubits), 2)
+            lines.append(f'{gate} q{q1},q{q2}')
+        elif gate in ('rx', 'ry', 'rz'):
+            lines.append(f'{gate} q{rng.randrange(nr_qubits)}, {rng.choice([-1, 1, 2, 3]) * math.pi / 2}')
+        else:
+            lines.append(f'{gate} q{rng.randrange(nr_qubits)}')
+    return '\n'.join(lines) + '\n'
+
+def run_both(code):
+    '''Runs the code on both simulators, returns (stabilizer, statevector)'''
+    model = CircuitModel()
+    model.read(code)
+    assert not model.diagnostics
+    stabilizer = StabilizerSimulator(model.nr_qubits, seed=1)
+    stabilizer.run(model.operations())
+    statevector = StatevectorSimulator(model.nr_qubits, seed=1)
+    statevector.run(model.operations())
+    return stabilizer, statevector
+
+def expectation(pauli_string, state):
+    '''Returns <state|P|state> of a stabilizer string such as '+XZI', with qubit 0 first'''
+    sign = -1 if pauli_string[0] == '-' else 1
+    #Qubit 0 is the least significant bit of the state, so it is the last factor of the Kronecker product
+    matrix = np.array([[1]])
+    for pauli in pauli_string[1:]:
+        matrix = np.kron(PAULIS[pauli], matrix)
+    return sign * np.vdot(state, matrix @ state).real
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_clifford_states_match(seed):
+    rng = random.Random(seed)
+    stabilizer, statevector = run_both(random_clifford_code(4, 30, rng))
+    for pauli_string in stabilizer.stabilizers():
+        assert expectation(pauli_string, statevector.state) == pytest.approx(1.0, abs=1e-9)
+
+def test_deterministic_measurements_match():
+    code = 'qubits 3\nx q0\ncnot q0,q1\nh q2\ns q2\ns q2\nh q2\nmeasure\n'
+    stabilizer, statevector = run_both(code)
+    assert stabilizer.bits == statevector.bits == [1, 1, 1]
+
+def test_multi_controlled_cz_is_not_clifford():
+    code = 'qubits 3\nh q0\ncz q0,q1,q2\nh q2\nmeasure q2\n'
+    model = CircuitModel()
+    model.read(code)
+    assert StabilizerSimulator.non_clifford(model.operations())
+    with pytest.raises(NonCliffordError):
+        stabilizer_module.simulate(code, seed=1)
+    #The statevector simulator treats it as a controlled-controlled Z, which leaves q2 in |0>
+    statevector = StatevectorSimulator(model.nr_qubits, seed=1)
+    statevector.run(model.operations())
+    assert statevector.bits[2] == 0
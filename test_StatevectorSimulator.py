@@ -0,0 +1,110 @@
+'''Checks the StatevectorSimulator, with its blocks and fused gates, against full matrices.'''
+import math
+import random
+
+import numpy as np
+import pytest
+
+from CircuitRender2 import CircuitModel
+from StatevectorSimulator import StatevectorSimulator
+
+def random_code(nr_qubits, nr_gates, rng):
+    '''Returns the code of a random circuit without measurements, with runs of single-qubit gates'''
+    lines = [f'qubits {nr_qubits}']
+    for _ in range(nr_gates):
+        gate = rng.choice(['h', 'x', 'y', 'z', 's', 't', 'tdag', 'rx', 'ry', 'rz', 'cnot', 'cz', 'cr', 'swap', 'toffoli'])
+        if gate in ('cnot', 'cz', 'cr', 'swap'):
+            q1, q2 = rng.sample(range(nr_qubits), 2)
+            lines.append(f'{gate} q{q1},q{q2}')
+        elif gate == 'toffoli':
+            q1, q2, q3 = rng.sample(range(nr_qubits), 3)
+            lines.append(f'{gate} q{q1},q{q2},q{q3}')
+        elif gate in ('rx', 'ry', 'rz'):
+            lines.append(f'{gate} q{rng.randrange(nr_qubits)}, {rng.uniform(-math.pi, math.pi)}')
+        else:
+            lines.append(f'{gate} q{rng.randrange(nr_qubits)}')
+    return '\n'.join(lines) + '\n'
+
+def full_matrix(nr_qubits, gate, rows, angle):
+    '''Returns the 2^n x 2^n matrix of a gate, qubit 0 is the least significant bit of a basis state'''
+    size = 2**nr_qubits
+    matrix = np.zeros((size, size), dtype=complex)
+    if gate == 'swap':
+        for state in range(size):
+            bit1, bit2 = (state >> rows[0]) & 1, (state >> rows[1]) & 1
+            swapped = state & ~(1 << rows[0]) & ~(1 << rows[1]) | (bit1 << rows[1]) | (bit2 << rows[0])
+            matrix[swapped, state] = 1
+        return matrix
+    if gate in StatevectorSimulator.CONTROLLED_GATES:
+        small = np.array(StatevectorSimulator.MATRICES[StatevectorSimulator.CONTROLLED_GATES[gate]])
+        controls, target = rows[:-1], rows[-1]
+    else:
+        small = np.array(StatevectorSimulator.MATRICES[gate] if gate in StatevectorSimulator.MATRICES else \
+                         StatevectorSimulator.rotation(gate, angle))
+        controls, target = [], rows[0]
+    for state in range(size):
+        if not all((state >> control) & 1 for control in controls):
+            matrix[state, state] = 1
+            continue
+        bit = (state >> target) & 1
+        for new_bit in (0, 1):
+            matrix[state & ~(1 << target) | (new_bit << target), state] = small[new_bit, bit]
+    return matrix
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_circuits_match_full_matrices(seed, monkeypatch):
+    #Tiny blocks, such that every gate is split into many blocks
+    monkeypatch.setattr(StatevectorSimulator, 'BLOCK', 2)
+    rng = random.Random(seed)
+    model = CircuitModel()
+    model.read(random_code(4, 40, rng))
+    assert not model.diagnostics
+
+    simulator = StatevectorSimulator(model.nr_qubits)
+    simulator.run(model.operations())
+
+    expected = np.zeros(2**model.nr_qubits, dtype=complex)
+    expected[0] = 1
+    for gate, rows, angle in model.operations():
+        expected = full_matrix(model.nr_qubits, gate, rows, angle) @ expected
+    assert np.allclose(simulator.state, expected, atol=1e-9)
+    assert simulator.nr_gates == len(model.operations())
+
+def test_fused_identity_is_not_applied(monkeypatch):
+    model = CircuitModel()
+    model.read('qubits 2\nh q0\nt q1\nh q0\ntdag q1\ncnot q0,q1\n')
+    applied = []
+    original = StatevectorSimulator.apply
+    monkeypatch.setattr(StatevectorSimulator, 'apply', lambda self, matrix, target, controls=(): \
+                        applied.append(target) or original(self, matrix, target, controls))
+    simulator = StatevectorSimulator(model.nr_qubits)
+    simulator.run(model.operations())
+    #Only the cnot is applied, h h and t tdag are the identity
+    assert applied == [1]
+    assert simulator.nr_gates == 5
+    assert simulator.state[0] == pytest.approx(1)
+
+def test_measurement_after_fused_gates():
+    model = CircuitModel()
+    model.read('qubits 2\nh q0\nz q0\nh q0\nmeasure q0\nx q1\nmeasure q1\n')
+    simulator = StatevectorSimulator(model.nr_qubits, seed=1)
+    simulator.run(model.operations())
+    assert simulator.bits == [1, 1]
+
+@pytest.mark.parametrize('module_name', ['StatevectorSimulator', 'StabilizerSimulator', 'MPSSimulator', 'NoisySimulator'])
+def test_command_lines_report_the_same_way(module_name, tmp_path, capsys):
+    module = __import__(module_name)
+    path = tmp_path / 'circuit.qc'
+    path.write_text('qubits 2\nh q0\nfoo q1\ncnot q0,q1\nmeasure\n')
+    assert module.main([str(path), '--seed', '1']) == 0
+    lines = capsys.readouterr().out.split('\n')
+    assert lines[1] == 'Skipped line 3: CircuitRenderer does not understand command foo q1'
+    #The NoisySimulator lists the counts of the outcomes instead of the classical bits of one run
+    if module_name != 'NoisySimulator':
+        assert lines[2].startswith('Classical bits (b1 ... b0): ')
+
+    #Without qubits there is nothing to simulate, the diagnostics are the error
+    path.write_text('h q0\n')
+    assert module.main([str(path)]) == 1
+    assert capsys.readouterr().err.endswith('CircuitRender did not find "qubits"-line in code\n')
+    assert module.main([str(tmp_path / 'missing.qc')]) == 1